@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Measure how fast core.multiplexer.Multiplexer moves output from several children.
+
+Each producer is a Python child that writes ``--megabytes`` of output in
+``--line-length`` byte lines as fast as it can. All of them are registered on one
+Multiplexer and ``processall`` is timed while the prefixed lines it prints are
+sent to /dev/null. ``--line-length 0`` sends carriage-return separated progress
+output with no newlines at all, like a SteamCMD download.
+
+Save a run with ``--output FILE`` and compare later runs against it with
+``--baseline FILE``; the script exits with status 1 when throughput drops by more
+than ``--threshold`` percent.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "src"))
+
+from core.multiplexer import Multiplexer  # noqa: E402 pylint: disable=wrong-import-position
+
+PRODUCER = """
+import sys
+total, line_length = int(sys.argv[1]), int(sys.argv[2])
+if line_length > 0:
+    line = b"x" * (line_length - 1) + b"\\n"
+else:
+    line = b"progress 42.0%\\r"
+chunk = line * max(1, 65536 // len(line))
+out = sys.stdout.buffer
+written = 0
+while written < total:
+    out.write(chunk)
+    written += len(chunk)
+out.flush()
+"""
+
+
+def run_benchmark(producers: int, megabytes: float, line_length: int) -> dict[str, object]:
+    """Push the output of *producers* children through one Multiplexer and time it."""
+    total = int(megabytes * 1024 * 1024)
+    multi = Multiplexer()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for index in range(producers):
+            multi.run(
+                "producer{}".format(index),
+                [sys.executable, "-c", PRODUCER, str(total), str(line_length)],
+                stdout=subprocess.PIPE,
+            )
+        multi.processall()
+        elapsed = time.perf_counter() - start
+    returnvalues = multi.checkreturnvalues()
+    moved = total * producers / (1024 * 1024)
+    return {
+        "producers": producers,
+        "megabytes": moved,
+        "line_length": line_length,
+        "seconds": elapsed,
+        "mb_per_second": moved / elapsed,
+        "failed": sorted(tag for tag, ret in returnvalues.items() if ret != 0),
+    }
+
+
+def compare(result: dict[str, object], baseline: dict[str, object], threshold: float) -> list[str]:
+    """Return a description of the throughput drop if it is more than *threshold* percent."""
+    new, old = result["mb_per_second"], baseline["mb_per_second"]
+    if old > 0 and new < old * (1 - threshold / 100.0):
+        return ["throughput {:.1f} MB/s vs baseline {:.1f} MB/s (-{:.0f}%)".format(new, old, (1 - new / old) * 100)]
+    return []
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--producers", type=int, default=4, help="number of children writing at once")
+    parser.add_argument("--megabytes", type=float, default=64.0, help="output written by each producer in MiB")
+    parser.add_argument("--line-length", type=int, default=80, help="bytes per line, 0 for no newlines at all")
+    parser.add_argument("--output", help="write the result as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a result previously saved with --output")
+    parser.add_argument("--threshold", type=float, default=20.0, help="allowed throughput drop in percent")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    result = run_benchmark(max(args.producers, 1), args.megabytes, max(args.line_length, 0))
+    print(
+        "{producers} producers, {megabytes:.0f} MiB in {seconds:.2f} s: {mb_per_second:.1f} MB/s".format(**result)
+    )
+    if result["failed"]:
+        print("Producers failed:", ", ".join(result["failed"]), file=sys.stderr)
+        return 2
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(result, baseline, args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Compare per-port bind probes with a /proc/net listener snapshot.
+
+Port conflict checks need to know whether a live socket already holds each
+claimed endpoint. ``server.port_manager.probe_live_listener`` binds a TCP and a
+UDP socket per endpoint, while ``ListenerSnapshot`` reads the socket tables in
+/proc/net once and answers from a set. This times both over ``--endpoints``
+consecutive ports from ``--start-port``, alternating between the wildcard and
+the loopback address, with a few of the ports held by real listeners so that
+the two answers can be checked against each other.
+
+Save a run with ``--output FILE`` and compare later runs against it with
+``--baseline FILE``; the script exits with status 1 when the snapshot gets more
+than ``--threshold`` percent slower.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "src"))
+CONFIG = """[core]
+alphagsm_path = {root}
+
+[server]
+datapath = {root}/conf
+"""
+
+
+def load_port_manager():
+    """Import server.port_manager, with a throwaway config if none is set."""
+    if "ALPHAGSM_CONFIG_LOCATION" not in os.environ:
+        root = tempfile.mkdtemp(prefix="alphagsm-bench-")
+        config_path = os.path.join(root, "alphagsm.conf")
+        with open(config_path, "w", encoding="utf-8") as fh:
+            fh.write(CONFIG.format(root=root))
+        os.environ["ALPHAGSM_CONFIG_LOCATION"] = config_path
+        os.environ.setdefault("ALPHAGSM_USERCONFIG_LOCATION", config_path)
+    from server import port_manager  # pylint: disable=import-outside-toplevel
+
+    return port_manager
+
+
+def make_endpoints(count: int, start_port: int) -> list[tuple[str, int]]:
+    """Return *count* (ip, port) endpoints on consecutive ports."""
+    return [("0.0.0.0" if index % 2 else "127.0.0.1", start_port + index) for index in range(count)]
+
+
+def hold_ports(endpoints: list[tuple[str, int]], every: int) -> list[socket.socket]:
+    """Listen on every *every*-th endpoint's port and return the sockets."""
+    held = []
+    for _ip, port in endpoints[::every]:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.bind(("127.0.0.1", port))
+            sock.listen()
+        except OSError:
+            sock.close()
+            continue
+        held.append(sock)
+    return held
+
+
+def run_benchmark(count: int, start_port: int, hold_every: int = 50) -> dict[str, object]:
+    """Answer "is it held?" for *count* endpoints both ways and time each."""
+    port_manager = load_port_manager()
+    endpoints = make_endpoints(count, start_port)
+    held = hold_ports(endpoints, hold_every)
+    try:
+        start = time.perf_counter()
+        probed = [port_manager.probe_live_listener(ip, port) for ip, port in endpoints]
+        probe_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        snapshot = port_manager.ListenerSnapshot.read()
+        if snapshot is None:
+            snapshot_seconds = None
+            mismatches = []
+        else:
+            answers = [snapshot.holds(ip, port) for ip, port in endpoints]
+            snapshot_seconds = time.perf_counter() - start
+            mismatches = [
+                "{}:{}".format(ip, port)
+                for (ip, port), old, new in zip(endpoints, probed, answers)
+                if old != new
+            ]
+    finally:
+        for sock in held:
+            sock.close()
+    return {
+        "endpoints": count,
+        "held": len(held),
+        "probe_seconds": probe_seconds,
+        "snapshot_seconds": snapshot_seconds,
+        "speedup": probe_seconds / snapshot_seconds if snapshot_seconds else None,
+        "mismatches": mismatches,
+    }
+
+
+def compare(result: dict[str, object], baseline: dict[str, object], threshold: float) -> list[str]:
+    """Return a description of the snapshot slowdown if it is more than *threshold* percent."""
+    new, old = result["snapshot_seconds"], baseline["snapshot_seconds"]
+    if new and old and new > old * (1 + threshold / 100.0):
+        return ["snapshot {:.4f} s vs baseline {:.4f} s (+{:.0f}%)".format(new, old, (new / old - 1) * 100)]
+    return []
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", type=int, default=1000, help="number of endpoints to check")
+    parser.add_argument("--start-port", type=int, default=40000, help="first port checked")
+    parser.add_argument("--output", help="write the result as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a result previously saved with --output")
+    parser.add_argument("--threshold", type=float, default=20.0, help="allowed slowdown in percent")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    count = max(args.endpoints, 1)
+    if not 0 < args.start_port <= 65536 - count:
+        print("--start-port leaves no room for", count, "endpoints", file=sys.stderr)
+        return 2
+    result = run_benchmark(count, args.start_port)
+    print("{endpoints} endpoints ({held} held), bind probes: {probe_seconds:.4f} s".format(**result))
+    if result["snapshot_seconds"] is None:
+        print("No /proc/net on this system, the snapshot isn't available")
+    else:
+        print("/proc/net snapshot: {snapshot_seconds:.4f} s ({speedup:.0f}x faster)".format(**result))
+    if result["mismatches"]:
+        print("Answers differ for:", ", ".join(result["mismatches"]), file=sys.stderr)
+        return 2
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(result, baseline, args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
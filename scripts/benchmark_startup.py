@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Measure how long the alphagsm command takes to start up and run cheap commands.
+
+A throwaway configuration and a synthetic datastore of servers are created in a
+temporary directory so the numbers don't depend on the servers on this machine.
+For each benchmarked command the wall time of several cold runs is recorded
+along with the import time reported by ``python -X importtime``.
+
+Save a run with ``--output FILE`` and compare later runs against it with
+``--baseline FILE``; the script exits with status 1 when a command's median
+wall time or import time regresses by more than ``--threshold`` percent.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+ALPHAGSM = REPO_ROOT / "alphagsm"
+SERVER_MODULE = "minecraft.vanilla"
+COMMANDS = {
+    "help": ["--help"],
+    "list": ["*", "list"],
+    "status": ["bench0", "status"],
+    "dump": ["bench0", "dump"],
+}
+CONFIG_TEMPLATE = """[core]
+userconf = {root}
+alphagsm_path = {root}
+
+[server]
+datapath = {root}/conf
+
+[process]
+backend = subprocess
+
+[downloader]
+
+[screen]
+"""
+
+
+def create_environment(root: Path, servers: int) -> dict[str, str]:
+    """Write a config and *servers* datastores under *root* and return the env to use."""
+    conf_dir = root / "conf"
+    conf_dir.mkdir(parents=True, exist_ok=True)
+    config_path = root / "alphagsm.conf"
+    config_path.write_text(CONFIG_TEMPLATE.format(root=root), encoding="utf-8")
+    for index in range(servers):
+        data = {
+            "module": SERVER_MODULE,
+            "dir": str(root / "servers" / "bench{}".format(index)),
+            "port": 25565 + index,
+        }
+        (conf_dir / "bench{}.json".format(index)).write_text(json.dumps(data), encoding="utf-8")
+    env = dict(os.environ)
+    env["ALPHAGSM_CONFIG_LOCATION"] = str(config_path)
+    env.pop("ALPHAGSM_USERCONFIG_LOCATION", None)
+    #  measure the cold path, not a running alphagsmd
+    env["ALPHAGSM_NO_DAEMON"] = "1"
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def parse_importtime(stderr: str) -> tuple[float, dict[str, float]]:
+    """Return the total import time and per top-level module times in ms from -X importtime output."""
+    total = 0.0
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2]
+        if name.startswith(" ") and not name.startswith("  "):
+            cumulative = int(parts[1]) / 1000.0
+            total += cumulative
+            modules[name.strip()] = modules.get(name.strip(), 0.0) + cumulative
+    return total, modules
+
+
+def _run(args: list[str], env: dict[str, str], cwd: Path, importtime: bool = False) -> subprocess.CompletedProcess:
+    """Run alphagsm once with *args*."""
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += [str(ALPHAGSM)] + args
+    return subprocess.run(cmd, env=env, cwd=str(cwd), capture_output=True, text=True, check=False)
+
+
+def benchmark_command(args: list[str], env: dict[str, str], cwd: Path, repeat: int, top: int) -> dict[str, object]:
+    """Time *repeat* runs of alphagsm *args* plus one import-time run."""
+    _run(args, env, cwd)  # warm the bytecode and OS file caches
+    wall = []
+    returncode = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = _run(args, env, cwd)
+        wall.append((time.perf_counter() - start) * 1000.0)
+        returncode = returncode or proc.returncode
+    proc = _run(args, env, cwd, importtime=True)
+    import_total, modules = parse_importtime(proc.stderr)
+    slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "args": args,
+        "returncode": returncode,
+        "wall_ms": {
+            "median": statistics.median(wall),
+            "min": min(wall),
+            "max": max(wall),
+        },
+        "import_ms": import_total,
+        "slowest_imports": [{"module": name, "ms": ms} for name, ms in slowest],
+    }
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+    """Return a description of every metric that is more than *threshold* percent worse than *baseline*."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for label, new, old in (
+            ("wall time", result["wall_ms"]["median"], base["wall_ms"]["median"]),
+            ("import time", result["import_ms"], base["import_ms"]),
+        ):
+            if old > 0 and new > old * (1 + threshold / 100.0):
+                regressions.append(
+                    "{}: {} {:.1f} ms vs baseline {:.1f} ms (+{:.0f}%)".format(
+                        name, label, new, old, (new / old - 1) * 100
+                    )
+                )
+    return regressions
+
+
+def print_report(results: dict[str, dict]) -> None:
+    """Print a human readable summary of *results*."""
+    for name, result in results.items():
+        wall = result["wall_ms"]
+        print(
+            "{:<8} wall median {:7.1f} ms (min {:.1f}, max {:.1f})  imports {:7.1f} ms  status {}".format(
+                name, wall["median"], wall["min"], wall["max"], result["import_ms"], result["returncode"]
+            )
+        )
+        for entry in result["slowest_imports"]:
+            print("           {:7.1f} ms  {}".format(entry["ms"], entry["module"]))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "commands", nargs="*", help="commands to benchmark: {} (default: all)".format(", ".join(COMMANDS))
+    )
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per command")
+    parser.add_argument("--servers", type=int, default=3, help="servers in the synthetic datastore")
+    parser.add_argument("--top", type=int, default=5, help="slowest top-level imports to show")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results previously saved with --output")
+    parser.add_argument("--threshold", type=float, default=20.0, help="allowed regression in percent")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    names = args.commands or list(COMMANDS)
+    unknown = [name for name in names if name not in COMMANDS]
+    if unknown:
+        print("Unknown command:", ", ".join(unknown), file=sys.stderr)
+        return 2
+    with tempfile.TemporaryDirectory(prefix="alphagsm-bench-") as tmp:
+        root = Path(tmp)
+        env = create_environment(root, max(args.servers, 1))
+        results = {
+            name: benchmark_command(COMMANDS[name], env, root, max(args.repeat, 1), args.top)
+            for name in names
+        }
+    print_report(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
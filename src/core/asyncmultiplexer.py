@@ -0,0 +1,268 @@
+"""A Multiplexer driven by an asyncio event loop, with per-process deadlines.
+
+:class:`AsyncMultiplexer` keeps the whole :class:`core.multiplexer.Multiplexer`
+interface, including the ready-line hooks used by ``addtomultiafter`` and
+``addalltomultiafter``, but waits for output on an asyncio loop. The loop also
+runs a timer per process: when a process passes its deadline it is sent SIGTERM,
+then SIGKILL if it is still running after a grace period, and finally its pipes
+are abandoned if something it started keeps them open. Processes stopped this
+way are reported by :meth:`~core.multiplexer.Multiplexer.checkreturnvalues` with
+:data:`TIMEOUT_STATUS`, or :data:`CANCELLED_STATUS` when the whole run was
+interrupted.
+
+This lives in its own module so that asyncio is only imported by commands that
+need it.
+"""
+
+import asyncio
+import os
+import selectors
+import signal
+import sys
+import time
+
+from .multiplexer import Multiplexer
+
+__all__ = ["AsyncMultiplexer", "CANCELLED_STATUS", "TIMEOUT_STATUS"]
+
+#  the same status as coreutils' timeout(1)
+TIMEOUT_STATUS = 124
+#  the status a shell reports for a command stopped by SIGINT
+CANCELLED_STATUS = 130
+
+
+class _LoopSelector(object):
+    """The part of the selectors interface Multiplexer uses, backed by an asyncio loop."""
+
+    def __init__(self, loop):
+        """Watch file objects for reading on *loop*."""
+        self.loop = loop
+        self.keys = {}
+        self.ready = []
+
+    def register(self, fileobj, events, data=None):
+        """Start watching *fileobj*."""
+        key = selectors.SelectorKey(fileobj, fileobj.fileno(), events, data)
+        self.keys[fileobj] = key
+        self.loop.add_reader(key.fd, self._onready, key)
+        return key
+
+    def unregister(self, fileobj):
+        """Stop watching *fileobj*."""
+        key = self.keys.pop(fileobj)
+        self.loop.remove_reader(key.fd)
+        return key
+
+    def _onready(self, key):
+        """Record a readable stream and return control to :meth:`select`."""
+        self.ready.append((key, selectors.EVENT_READ))
+        self.wake()
+
+    def wake(self):
+        """Return control from :meth:`wait`, e.g. because a timer changed something."""
+        self.loop.stop()
+
+    def wait(self, timeout=None):
+        """Run the loop until :meth:`wake` is called or *timeout* passes.
+
+        The loop is only ever run with ``run_forever`` so that waking it
+        early is never an error, whoever is waiting.
+        """
+        handle = None
+        if timeout is not None:
+            handle = self.loop.call_later(max(timeout, 0), self.wake)
+        try:
+            self.loop.run_forever()
+        finally:
+            if handle is not None:
+                handle.cancel()
+
+    def select(self, timeout=None):
+        """Wait until a stream is readable, a timer wakes the loop or *timeout* passes."""
+        self.wait(timeout)
+        ready, self.ready = self.ready, []
+        return ready
+
+    def close(self):
+        """Stop watching everything."""
+        for key in self.keys.values():
+            self.loop.remove_reader(key.fd)
+        self.keys = {}
+
+
+class AsyncMultiplexer(Multiplexer):
+    """Poll and print output from multiple processes with per-process deadlines.
+
+    *timeout* is the default number of seconds each process may run for, ``None``
+    or ``0`` for no limit. It can be changed per process with :meth:`settimeout`
+    or the *timeout* argument of :meth:`run`. *kill_grace* is how long a process
+    gets to exit after SIGTERM before it is sent SIGKILL.
+    """
+
+    #  how often stream-less processes are polled for exit
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, timeout=None, kill_grace=10):
+        """Create the event loop and the deadline bookkeeping."""
+        super().__init__()
+        self.selector.close()
+        self.loop = asyncio.new_event_loop()
+        self.selector = _LoopSelector(self.loop)
+        self.timeout = timeout
+        self.kill_grace = kill_grace
+        self.deadlines = {}
+        self.timers = {}
+        self.stopped = {}
+
+    def empty(self):
+        """Return a new, empty multiplexer with the same timeouts."""
+        return AsyncMultiplexer(self.timeout, self.kill_grace)
+
+    def close(self):
+        """Cancel outstanding timers and close the event loop."""
+        for timer in self.timers.values():
+            timer.cancel()
+        self.timers = {}
+        self.selector.close()
+        self.loop.close()
+
+    def run(self, tag, *args, timeout=None, **kwargs):
+        """Start a subprocess, optionally with its own *timeout*, and register it."""
+        proc = super().run(tag, *args, **kwargs)
+        if timeout is not None:
+            self.settimeout(proc, timeout)
+        return proc
+
+    def addbareproc(self, tag, proc):
+        """Register a process and start its default deadline."""
+        super().addbareproc(tag, proc)
+        if proc not in self.deadlines and self.timeout:
+            self.settimeout(proc, self.timeout)
+
+    def settimeout(self, proc, timeout):
+        """Give *proc* *timeout* seconds from now to finish, or no limit if falsy."""
+        if timeout:
+            self.setdeadline(proc, self.loop.time() + timeout)
+        else:
+            self._canceltimer(proc)
+            self.deadlines[proc] = None
+
+    def setdeadline(self, proc, deadline):
+        """Stop *proc* if it is still running at *deadline* on the loop's clock."""
+        self._canceltimer(proc)
+        self.deadlines[proc] = deadline
+        self.timers[proc] = self.loop.call_at(deadline, self._expire, proc)
+
+    def _canceltimer(self, proc):
+        """Cancel the pending timer for *proc* if there is one."""
+        timer = self.timers.pop(proc, None)
+        if timer is not None:
+            timer.cancel()
+
+    def transfer(self, target, proc):
+        """Move a process to another multiplexer, keeping its deadline."""
+        deadline = self.deadlines.pop(proc, None)
+        self._canceltimer(proc)
+        super().transfer(target, proc)
+        if deadline is not None and isinstance(target, AsyncMultiplexer):
+            target.setdeadline(proc, deadline)
+
+    def _signal(self, proc, signum):
+        """Send *signum* to *proc*, returning whether that was possible."""
+        try:
+            os.kill(proc.pid, signum)
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            print(
+                "Can't signal {}: permission denied".format(self.procs[proc].tag),
+                file=sys.stderr,
+            )
+            return False
+        return True
+
+    def _expire(self, proc):
+        """Deadline timer: stop a process that has run too long."""
+        self.timers.pop(proc, None)
+        if proc in self.procs and proc.poll() is None:
+            print("{} has timed out, stopping it".format(self.procs[proc].tag))
+            self.stop(proc, TIMEOUT_STATUS)
+        self.selector.wake()
+
+    def stop(self, proc, status=CANCELLED_STATUS):
+        """Ask *proc* to exit with SIGTERM and escalate if it doesn't.
+
+        Once it has gone it is reported with *status* instead of its own exit
+        status.
+        """
+        if proc not in self.procs or proc in self.stopped or proc.poll() is not None:
+            return
+        self.stopped[proc] = status
+        self._canceltimer(proc)
+        if self._signal(proc, signal.SIGTERM):
+            self.timers[proc] = self.loop.call_later(self.kill_grace, self._kill, proc)
+        else:
+            self.timers[proc] = self.loop.call_later(self.kill_grace, self._abandon, proc)
+
+    def stopall(self, status=CANCELLED_STATUS):
+        """Stop every process that is still being tracked."""
+        for proc in list(self.procs):
+            self.stop(proc, status)
+
+    def _kill(self, proc):
+        """Grace period timer: SIGKILL a process that ignored SIGTERM."""
+        self.timers.pop(proc, None)
+        if proc in self.procs and proc.poll() is None:
+            print("{} didn't stop, killing it".format(self.procs[proc].tag))
+            self._signal(proc, signal.SIGKILL)
+        self.timers[proc] = self.loop.call_later(self.kill_grace, self._abandon, proc)
+        self.selector.wake()
+
+    def _abandon(self, proc):
+        """Final timer: stop waiting on a stopped process's output and exit."""
+        self.timers.pop(proc, None)
+        if proc not in self.procs:
+            return
+        for stream in list(self.procs[proc].streams):
+            stream_data = self.streams[stream]
+            if stream_data.buffered():  # write out any part line anyway
+                self._writepartial(stream_data, self.gettag(stream))
+            self.removestream(stream)
+            stream.close()
+        if proc.poll() is None:
+            #  it can't be signalled or won't die, stop waiting for it
+            print("Giving up on", self.procs[proc].tag)
+            self._finish(proc, None)
+        self.selector.wake()
+
+    def _finish(self, proc, ret):
+        """Report a finished process, using the stop status if it was stopped."""
+        self._canceltimer(proc)
+        self.deadlines.pop(proc, None)
+        super()._finish(proc, self.stopped.pop(proc, ret))
+
+    def _waitforexit(self, timeout=None):
+        """Wait for a stream-less process to exit while the timers keep running.
+
+        Returns after *timeout* seconds if given, and also once none are left,
+        e.g. because :meth:`_abandon` gave up on the last one.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.streamlessprocs and not any(proc.poll() is not None for proc in self.streamlessprocs):
+            interval = self.POLL_INTERVAL
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                interval = min(interval, remaining)
+            self.selector.wait(interval)
+
+    def processall(self):
+        """Process events until no processes remain, stopping them all on Ctrl-C."""
+        try:
+            super().processall()
+        except KeyboardInterrupt:
+            print("Interrupted, stopping remaining processes", file=sys.stderr)
+            self.stopall(CANCELLED_STATUS)
+            super().processall()
+            raise
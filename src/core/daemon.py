@@ -0,0 +1,438 @@
+"""The optional ``alphagsmd`` daemon.
+
+The daemon loads settings, the process backend, the runtime layer and the game
+modules used by the current user's servers once, then listens on a Unix socket
+(see :func:`utils.daemonclient.socket_path`). Each request from the thin client
+in :mod:`utils.daemonclient` is run in a fork of the warm interpreter through
+:func:`core.inprocess.forkcall`, so a ``status`` or ``send`` costs a fork rather
+than a Python start-up and the whole ``core.main`` import chain. Datastores are
+still read by every command so edits made outside the daemon are always seen.
+Commands run with the client's environment (e.g. its ``DOCKER_HOST``) rather
+than the daemon's.
+
+Only requests from the daemon's own user with the same configuration file
+locations and home directory are served, as settings paths were resolved when
+the daemon started. Anything else is refused and the client falls back to
+running the command itself.
+
+Client sockets are non-blocking. Output for each client is queued on its
+connection and flushed as the socket becomes writable, so a client that stops
+reading doesn't hold up the others. Once a client has more than
+``_CLIENT_BUFFER_LIMIT`` bytes queued its child's output stops being read
+until the client catches up.
+"""
+
+import importlib
+import json
+import os
+import selectors
+import signal
+import socket
+import struct
+import sys
+
+from utils import daemonclient
+from . import inprocess
+
+__all__ = ["Daemon", "main"]
+
+_MAX_REQUEST_SIZE = 1024 * 1024
+#  queued output above which a client's child is no longer read from
+_CLIENT_BUFFER_LIMIT = 1024 * 1024
+#  how often children are polled for their exit where pidfds aren't available
+_REAP_INTERVAL = 0.05
+
+
+class _Output(object):
+    """Output queued for a client and whether the connection is closing."""
+
+    def __init__(self):
+        """Start with nothing queued."""
+        self.queue = bytearray()
+        #  whether the socket is registered for EVENT_WRITE while output is left
+        self.writing = False
+        #  whether to close the socket once the queue is sent
+        self.closing = False
+        #  whether the client hung up, after which output is dropped
+        self.gone = False
+
+
+class _Connection(object):
+    """State for one client connection."""
+
+    def __init__(self, sock):
+        """Track *sock* while its request is read and its command runs."""
+        self.sock = sock
+        self.buffer = b""
+        self.proc = None
+        #  the child's open output streams and the frame kind of each
+        self.streams = {}
+        self.paused = False
+        self.output = _Output()
+        self.pidfd = None
+
+
+def _peer_uid(sock):
+    """Return the uid of the process on the other end of *sock* if known."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _pid, uid, _gid = struct.unpack("3i", creds)
+    return uid
+
+
+def _run_request(request):
+    """Run a client request inside the forked child. Returns the exit status."""
+    main_module = importlib.import_module("core.main")
+
+    os.chdir(request["cwd"])
+    if request.get("debug") is not None:
+        main_module.DEBUG = bool(int(request["debug"] or 0))
+    return main_module.main(request["name"], list(request["args"]))
+
+
+class Daemon(object):
+    """Serve AlphaGSM commands from a warm interpreter over a Unix socket."""
+
+    def __init__(self, path=None, handler=None):
+        """Create a daemon listening on *path* that runs requests with *handler*.
+
+        *handler* is called as ``handler(request)`` in the forked child and
+        returns the exit status. It defaults to running ``core.main``.
+        """
+        self.path = path or daemonclient.socket_path()
+        self.handler = handler or _run_request
+        self.selector = selectors.DefaultSelector()
+        self.listener = None
+        self.running = False
+        #  connections whose child has closed its output but not exited yet
+        self.reaping = []
+
+    def warm(self):
+        """Import everything commands need so forked children start warm.
+
+        Returns the number of servers whose game module was loaded.
+        """
+        import screen
+        from server import server as servermodule
+        from server import registry
+        from utils import query  # noqa: F401 pylint: disable=unused-import
+        from utils.backups import backups  # noqa: F401 pylint: disable=unused-import
+
+        try:
+            screen.get_backend()
+        except screen.ProcessError as ex:
+            print("Can't initialise the process backend:", ex, file=sys.stderr)
+        loaded = 0
+        try:
+            records = registry.records(servermodule.DATAPATH)
+        except OSError:
+            records = []
+        for record in records:
+            try:
+                servermodule.find_module(record.module)
+            except Exception as ex:  # pylint: disable=broad-except
+                print("Can't preload", record.name + ":", ex, file=sys.stderr)
+                continue
+            loaded += 1
+        return loaded
+
+    def _socket_in_use(self):
+        """Return whether another daemon is already answering on our path."""
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            return False
+        finally:
+            probe.close()
+        return True
+
+    def bind(self):
+        """Create the listening socket, replacing a stale one if needed."""
+        if os.path.exists(self.path):
+            if self._socket_in_use():
+                raise OSError("alphagsmd is already running on " + self.path)
+            os.remove(self.path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        oldmask = os.umask(0o177)
+        try:
+            listener.bind(self.path)
+        finally:
+            os.umask(oldmask)
+        listener.listen(64)
+        listener.setblocking(False)
+        self.listener = listener
+        self.selector.register(listener, selectors.EVENT_READ, ("accept",))
+
+    def close(self):
+        """Stop listening and remove the socket file."""
+        if self.listener is not None:
+            self.selector.unregister(self.listener)
+            self.listener.close()
+            self.listener = None
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def shutdown(self, *_args):
+        """Ask :meth:`serve_forever` to return after the current round."""
+        self.running = False
+
+    def serve_forever(self):
+        """Handle requests until :meth:`shutdown` is called."""
+        if self.listener is None:
+            self.bind()
+        self.running = True
+        while self.running:
+            self.serve_once(1.0)
+
+    def serve_once(self, timeout=None):
+        """Handle one round of socket, child-output and child-exit events."""
+        if self.reaping:
+            timeout = _REAP_INTERVAL if timeout is None else min(timeout, _REAP_INTERVAL)
+        for key, _events in self.selector.select(timeout):
+            action = key.data[0]
+            if action == "accept":
+                self._accept()
+            elif action == "request":
+                self._read_request(key.data[1])
+            elif action == "output":
+                self._forward_output(key.fileobj, key.data[1], key.data[2])
+            elif action == "send":
+                self._flush(key.data[1])
+            elif action == "exit":
+                self._exited(key.data[1])
+        for conn in list(self.reaping):
+            if conn.proc.poll() is not None:
+                self.reaping.remove(conn)
+                self._finish(conn, daemonclient.FRAME_EXIT, str(conn.proc.returncode).encode())
+
+    def _accept(self):
+        """Accept a new client connection."""
+        try:
+            sock, _addr = self.listener.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        sock.setblocking(False)
+        conn = _Connection(sock)
+        self.selector.register(sock, selectors.EVENT_READ, ("request", conn))
+
+    def _queue(self, conn, kind, payload=b""):
+        """Queue a frame for the client and send as much as it will take now."""
+        if conn.output.gone:
+            return
+        conn.output.queue += daemonclient.encode_frame(kind, payload)
+        self._flush(conn)
+
+    def _flush(self, conn):
+        """Send queued output until the client's socket is full.
+
+        Waits for the socket to become writable while output is left, pauses
+        the child's output while too much is queued, and closes the connection
+        once a finished command's output has all been sent.
+        """
+        while conn.output.queue and not conn.output.gone:
+            try:
+                sent = conn.sock.send(conn.output.queue)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                #  keep draining the child so it isn't blocked on a full pipe
+                conn.output.gone = True
+                conn.output.queue.clear()
+                break
+            del conn.output.queue[:sent]
+        if conn.output.queue and not conn.output.writing:
+            self.selector.register(conn.sock, selectors.EVENT_WRITE, ("send", conn))
+            conn.output.writing = True
+        elif not conn.output.queue and conn.output.writing:
+            self.selector.unregister(conn.sock)
+            conn.output.writing = False
+        self._throttle(conn, len(conn.output.queue) > _CLIENT_BUFFER_LIMIT)
+        if conn.output.closing and not conn.output.queue:
+            conn.sock.close()
+
+    def _throttle(self, conn, pause):
+        """Stop or resume reading the output of *conn*'s child."""
+        if pause == conn.paused:
+            return
+        conn.paused = pause
+        for stream, kind in conn.streams.items():
+            if pause:
+                self.selector.unregister(stream)
+            else:
+                self.selector.register(stream, selectors.EVENT_READ, ("output", conn, kind))
+
+    def _finish(self, conn, kind=None, payload=b""):
+        """Queue a final frame and close the client connection once it is sent."""
+        conn.output.closing = True
+        if kind is not None:
+            self._queue(conn, kind, payload)
+        if not conn.output.writing:
+            conn.sock.close()
+
+    def _refuse(self, conn, reason):
+        """Tell the client to run the command itself."""
+        self.selector.unregister(conn.sock)
+        self._finish(conn, daemonclient.FRAME_REFUSED, reason.encode())
+
+    def _read_request(self, conn):
+        """Read a request and start its command once it is complete."""
+        try:
+            chunk = conn.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            chunk = b""
+        if not chunk:
+            self.selector.unregister(conn.sock)
+            conn.sock.close()
+            return
+        conn.buffer += chunk
+        if b"\n" not in conn.buffer:
+            if len(conn.buffer) > _MAX_REQUEST_SIZE:
+                self._refuse(conn, "request too large")
+            return
+        try:
+            request = json.loads(conn.buffer.split(b"\n", 1)[0])
+        except ValueError:
+            self._refuse(conn, "malformed request")
+            return
+        reason = self._check_request(conn, request)
+        if reason is not None:
+            self._refuse(conn, reason)
+            return
+        self.selector.unregister(conn.sock)
+        conn.proc = inprocess.forkcall(self._child_entry, request, merge_stderr=False)
+        for stream, kind in (
+            (conn.proc.stdout, daemonclient.FRAME_STDOUT),
+            (conn.proc.stderr, daemonclient.FRAME_STDERR),
+        ):
+            self.selector.register(stream, selectors.EVENT_READ, ("output", conn, kind))
+            conn.streams[stream] = kind
+
+    def _child_entry(self, request):
+        """Drop the daemon's own state in the forked child and run *request*."""
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        for key in list(self.selector.get_map().values()):
+            try:
+                if isinstance(key.fileobj, int):
+                    os.close(key.fileobj)
+                else:
+                    key.fileobj.close()
+            except OSError:
+                pass
+        self.selector.close()
+        self.listener = None
+        os.environ.clear()
+        os.environ.update(request["env"])
+        return self.handler(request)
+
+    def _check_request(self, conn, request):
+        """Return why *request* can't be served here, or ``None`` if it can."""
+        if not isinstance(request, dict) or request.get("version") != daemonclient.PROTOCOL_VERSION:
+            return "unsupported protocol version"
+        if not isinstance(request.get("name"), str) or not isinstance(request.get("args"), list):
+            return "malformed request"
+        peer_uid = _peer_uid(conn.sock)
+        if peer_uid is not None and peer_uid != os.getuid():
+            return "request from a different user"
+        if request.get("uid") != os.getuid():
+            return "request from a different user"
+        if request.get("config") != os.environ.get("ALPHAGSM_CONFIG_LOCATION"):
+            return "different ALPHAGSM_CONFIG_LOCATION"
+        if request.get("userconfig") != os.environ.get("ALPHAGSM_USERCONFIG_LOCATION"):
+            return "different ALPHAGSM_USERCONFIG_LOCATION"
+        if not isinstance(request.get("env"), dict):
+            return "malformed request"
+        if request["env"].get("HOME") != os.environ.get("HOME"):
+            return "different HOME"
+        if not os.path.isdir(str(request.get("cwd"))):
+            return "working directory doesn't exist"
+        return None
+
+    def _forward_output(self, stream, conn, kind):
+        """Pass child output on to the client and finish when the child is done."""
+        data = stream.read1(65536)
+        if data:
+            self._queue(conn, kind, data)
+            return
+        if not conn.paused:
+            self.selector.unregister(stream)
+        stream.close()
+        del conn.streams[stream]
+        if not conn.streams:
+            self._reap(conn)
+
+    def _reap(self, conn):
+        """Finish *conn* when its child exits, without holding up other clients.
+
+        A child can close its output and keep running for a while, so its exit
+        is waited for by the selector through a pidfd, or by polling each round
+        where pidfds aren't available.
+        """
+        ret = conn.proc.poll()
+        if ret is not None:
+            self._finish(conn, daemonclient.FRAME_EXIT, str(ret).encode())
+            return
+        try:
+            conn.pidfd = os.pidfd_open(conn.proc.pid)
+        except (AttributeError, OSError):
+            self.reaping.append(conn)
+            return
+        self.selector.register(conn.pidfd, selectors.EVENT_READ, ("exit", conn))
+
+    def _exited(self, conn):
+        """Finish *conn* now that its child's pidfd says it has exited."""
+        self.selector.unregister(conn.pidfd)
+        os.close(conn.pidfd)
+        conn.pidfd = None
+        ret = conn.proc.wait()
+        self._finish(conn, daemonclient.FRAME_EXIT, str(ret).encode())
+
+
+def main(argv):
+    """Run the daemon in the foreground. Used by the ``alphagsmd`` script."""
+    path = None
+    warm = True
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg in ("-s", "--socket") and args:
+            path = args.pop(0)
+        elif arg == "--no-warm":
+            warm = False
+        elif arg in ("-h", "--help"):
+            print("alphagsmd [--socket PATH] [--no-warm]")
+            print()
+            print("Serve AlphaGSM commands for the current user from a warm interpreter.")
+            print("The alphagsm command uses the daemon automatically when it is running.")
+            print("Commands run with the caller's environment; callers with another HOME or")
+            print("configuration file location run their commands themselves.")
+            return 0
+        else:
+            print("Unknown argument:", arg, file=sys.stderr)
+            return 2
+    if not inprocess.can_fork() or not hasattr(socket, "AF_UNIX"):
+        print("alphagsmd needs os.fork and Unix sockets", file=sys.stderr)
+        return 1
+    daemon = Daemon(path)
+    if warm:
+        print("Preloaded", daemon.warm(), "server modules", flush=True)
+    try:
+        daemon.bind()
+    except OSError as ex:
+        print(ex, file=sys.stderr)
+        return 1
+    signal.signal(signal.SIGTERM, daemon.shutdown)
+    signal.signal(signal.SIGINT, daemon.shutdown)
+    print("alphagsmd listening on", daemon.path, flush=True)
+    try:
+        daemon.serve_forever()
+    finally:
+        daemon.close()
+    return 0
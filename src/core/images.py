@@ -0,0 +1,126 @@
+"""``images prewarm``, readying the container images of docker servers ahead of time.
+
+Starting a docker server makes sure its image is there first, building
+AlphaGSM's default runtime family images from the repository or recording
+images that are already present (see :mod:`server.images`). On a fresh machine
+that can take minutes per image. ``alphagsm SERVER... images prewarm`` does it
+ahead of time for every image the servers use, several images at a time, so
+that later starts only have to read the records.
+"""
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from server import data as data_module
+from server import registry
+from server import runtime as runtime_module
+from utils.cmdparse.cmdspec import ArgSpec, CmdSpec, OptSpec
+from utils.settings import settings
+
+__all__ = [
+    "IMAGES_COMMAND_ARGS",
+    "IMAGES_COMMAND_DESCRIPTION",
+    "fleet_images",
+    "prewarm",
+    "run_images",
+]
+
+DEFAULT_PREWARM_JOBS = 4
+IMAGES_ACTIONS = ("prewarm",)
+
+
+def _action(value):
+    """Check an images action is one we know and return it."""
+    if value not in IMAGES_ACTIONS:
+        raise ValueError('unknown images command, expected "images prewarm"')
+    return value
+
+
+IMAGES_COMMAND_ARGS = CmdSpec(
+    requiredarguments=(ArgSpec("ACTION", "What to do with the images, only \"prewarm\" for now", _action),),
+    options=(
+        OptSpec(
+            "j",
+            ["jobs"],
+            "How many images to build or pull at once (default {})".format(DEFAULT_PREWARM_JOBS),
+            "jobs",
+            "JOBS",
+            int,
+        ),
+    ),
+)
+IMAGES_COMMAND_DESCRIPTION = (
+    "Manage the container images of docker servers. \"images prewarm\" builds or pulls "
+    "every image the servers use, several at a time, so that starting them doesn't have to."
+)
+
+
+def fleet_images(names, datapath):
+    """Return the ``{image: runtime family}`` the docker servers among *names* use.
+
+    The images are read from the servers' data stores in *datapath*, where
+    their runtime settings are kept (see
+    :func:`server.runtime.sync_runtime_metadata`).
+    """
+
+    wanted = set(names)
+    found = {}
+    for server in registry.records(datapath):
+        if server.name not in wanted or server.runtime != "docker":
+            continue
+        family = runtime_module.canonicalize_runtime_family(server.data.get("runtime_family"))
+        image = server.data.get("image") or runtime_module.RUNTIME_FAMILY_DEFAULTS.get(family, {}).get("image")
+        if image:
+            found.setdefault(image, family)
+    return found
+
+
+def prewarm(images, jobs=DEFAULT_PREWARM_JOBS, runtime=None):
+    """Build or pull every image in *images* (``{image: family}``), *jobs* at a time.
+
+    Returns ``{image: how}`` where *how* is what
+    :meth:`~server.runtime.ContainerRuntime.ensure_image` returned, or the
+    exception it raised.
+    """
+
+    runtime = runtime_module.ContainerRuntime() if runtime is None else runtime
+
+    def one(image):
+        try:
+            return runtime.ensure_image(image, images[image], pull=True)
+        except (runtime_module.RuntimeError, data_module.DataError) as ex:
+            return ex
+
+    if not images:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(images)))) as pool:
+        return dict(zip(images, pool.map(one, images)))
+
+
+def run_images(servers, opts, datapath):
+    """
+    Prewarm the images of *servers* with the parsed *opts* and return a status.
+
+    Only the current user's servers, whose data stores are in *datapath*, are
+    looked at. Returns 0 if every image is ready and 1 if any failed.
+    """
+
+    others = ["{}/{}".format(user, server) for user, server in servers if user is not None]
+    if others:
+        print("Only the current user's servers are prewarmed, skipping:", *others, file=sys.stderr)
+    backend = str(settings.user.getsection("runtime").get("backend", "process")).strip().lower()
+    if backend != "docker":
+        print("The runtime backend isn't docker, there are no images to prewarm")
+        return 0
+    images = fleet_images([server for user, server in servers if user is None], datapath)
+    if not images:
+        print("None of the servers use a docker image")
+        return 0
+    failed = 0
+    for image, how in prewarm(images, opts.get("jobs", DEFAULT_PREWARM_JOBS)).items():
+        if isinstance(how, Exception):
+            failed += 1
+            print(image, "failed:", how, file=sys.stderr)
+        else:
+            print(image, how or "not available")
+    return 1 if failed else 0
@@ -0,0 +1,146 @@
+"""Run AlphaGSM commands in forked copies of the current interpreter.
+
+Multi-server commands normally re-execute ``alphagsm-internal`` once per
+server, which means a fresh Python start-up and a full re-import of ``core``,
+``server``, ``screen``, the settings and the game module for every server.
+For servers owned by the current user that cost can be avoided by forking the
+already initialised interpreter instead. Each fork gets its own stdout and
+stderr pipe so it can be registered on a :class:`core.multiplexer.Multiplexer`
+exactly like a ``subprocess.Popen`` child, keeping the per-server output
+prefixes and exit statuses the multiplexer already provides.
+
+Forking also keeps every server in its own address space, so game modules
+that change the working directory or other process-wide state cannot affect
+each other the way they could on a thread pool.
+"""
+
+import io
+import os
+import sys
+import traceback
+
+__all__ = ["ForkedProcess", "can_fork", "forkcall"]
+
+#  exit status reported for a child whose real status was collected by someone else
+LOST_STATUS = 255
+
+
+def can_fork():
+    """Return whether this platform can run commands in forked interpreters."""
+    return hasattr(os, "fork") and hasattr(os, "waitpid")
+
+
+class ForkedProcess(object):
+    """A ``subprocess.Popen`` look-alike for a forked interpreter.
+
+    Only the parts of the Popen interface used by the multiplexer are
+    provided: ``pid``, ``stdout``, ``stderr``, ``returncode``, ``poll`` and
+    ``wait``. ``stderr`` is ``None`` when it was merged into stdout.
+    """
+
+    def __init__(self, pid, stdout, stderr=None):
+        """Wrap the child *pid* whose output can be read from the given pipes."""
+        self.pid = pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = None
+
+    def _reap(self, flags):
+        """Collect the child's exit status if it has finished."""
+        if self.returncode is not None:
+            return self.returncode
+        try:
+            pid, status = os.waitpid(self.pid, flags)
+        except ChildProcessError:
+            # Somebody else reaped it, we can't know the real status so don't claim success.
+            print(
+                "Exit status of process {} was lost, reporting {}".format(self.pid, LOST_STATUS),
+                file=sys.stderr,
+            )
+            self.returncode = LOST_STATUS
+            return self.returncode
+        if pid == 0:
+            return None
+        self.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+    def poll(self):
+        """Return the exit status if the child has finished, else ``None``."""
+        return self._reap(os.WNOHANG)
+
+    def wait(self):
+        """Wait for the child to finish and return its exit status."""
+        return self._reap(0)
+
+
+def _child_main(out_fd, err_fd, fn, args, kwargs):
+    """Run *fn* inside the forked child and return the process exit status."""
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    os.dup2(out_fd, 1)
+    os.dup2(err_fd, 2)
+    for fd in set((out_fd, err_fd)):
+        os.close(fd)
+    sys.stdin = io.TextIOWrapper(io.FileIO(0, "r", closefd=False))
+    sys.stdout = io.TextIOWrapper(
+        io.FileIO(1, "w", closefd=False), line_buffering=True, write_through=True
+    )
+    sys.stderr = io.TextIOWrapper(
+        io.FileIO(2, "w", closefd=False), line_buffering=True, write_through=True
+    )
+    try:
+        ret = fn(*args, **kwargs)
+    except SystemExit as ex:
+        ret = ex.code
+    except BaseException:  # pylint: disable=broad-except
+        traceback.print_exc()
+        ret = 3
+    if ret is None:
+        ret = 0
+    elif not isinstance(ret, int):
+        print(ret, file=sys.stderr)
+        ret = 1
+    return ret
+
+
+def forkcall(fn, *args, merge_stderr=True, **kwargs):
+    """Call ``fn(*args, **kwargs)`` in a forked child and return its process.
+
+    The child's stdin is ``/dev/null`` and its stdout and stderr, including
+    the output of any subprocesses it starts, are sent down pipes exposed as
+    the returned process's ``stdout`` and ``stderr``. Unless *merge_stderr* is
+    false both go down the one pipe and ``stderr`` is ``None``. The return
+    value of *fn* becomes the exit status of the child.
+    """
+    for stream in (sys.stdout, sys.stderr, sys.__stdout__, sys.__stderr__):
+        if stream is not None:
+            try:
+                stream.flush()
+            except (OSError, ValueError):
+                pass
+    out_read, out_write = os.pipe()
+    if merge_stderr:
+        err_read, err_write = None, out_write
+    else:
+        err_read, err_write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        ret = 1
+        try:
+            os.close(out_read)
+            if err_read is not None:
+                os.close(err_read)
+            ret = _child_main(out_write, err_write, fn, args, kwargs)
+        finally:
+            for stream in (sys.stdout, sys.stderr, sys.__stdout__, sys.__stderr__):
+                try:
+                    stream.flush()
+                except (AttributeError, OSError, ValueError):
+                    pass
+            os._exit(ret & 0xFF if ret >= 0 else 1)
+    os.close(out_write)
+    if err_read is None:
+        return ForkedProcess(pid, os.fdopen(out_read, "rb"))
+    os.close(err_write)
+    return ForkedProcess(pid, os.fdopen(out_read, "rb"), os.fdopen(err_read, "rb"))
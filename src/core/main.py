@@ -1,19 +1,25 @@
 """Top-level command-line entry points and dispatch helpers for AlphaGSM."""
 
 from utils.cmdparse import cmdparse
-from server import Server, ServerError, server as servermodule
+from utils.settings import settings
+from server import ServerError, commands as servercommands
 from . import multiplexer as mp
+from . import inprocess
 import subprocess as sp
-import screen
 import os
+import sys
 import traceback
 from . import program
+from utils import progress
 from sys import stderr, stdout
 from textwrap import dedent
+from functools import partial
 
 __all__ = ["main"]
 
 DEBUG = bool(int(os.environ.get("ALPHAGSM_DEBUG", 0)))
+#  seconds between fleet status lines when multi_progress is "live"
+LIVE_PROGRESS_INTERVAL = 5
 
 
 def print_handled_ex(ex):
@@ -26,6 +32,23 @@ def print_handled_ex(ex):
         print(ex, file=stderr)
 
 
+def report_lock_waits():
+    """Print how long this process waited for data store locks.
+
+    Printed in debug mode, and otherwise only if the waits added up to at
+    least server.data.LOCK_WAIT_WARNING seconds.
+    """
+    #  nothing was locked if the data store was never loaded
+    data_module = sys.modules.get("server.data")
+    if data_module is None:
+        return
+    summary = data_module.lock_summary()
+    if summary is None:
+        return
+    if DEBUG or data_module.lock_stats["wait_seconds"] >= data_module.LOCK_WAIT_WARNING:
+        print(summary, file=stderr)
+
+
 def main(name, args):
     """
     Main function called from the alphagsm executable
@@ -90,8 +113,11 @@ def main(name, args):
             "logs",
             "compose",
             "ps",
+            "rolling-restart",
+            "rolling-update",
+            "images",
         )
-        + Server.default_commands
+        + servercommands.DEFAULT_COMMANDS
     )
     for s in raw_servers:
         if s.lower() in banned:
@@ -149,6 +175,26 @@ def main(name, args):
         help(name, None)
         return 1
 
+    #  Rolling commands work through the servers in waves, even if there is only one.
+    if cmd in ("rolling-restart", "rolling-update"):
+        from . import rolling
+
+        parsed = _parse_fleet_args(name, cmd, rolling.ROLLING_COMMAND_ARGS[cmd], args)
+        if parsed is None:
+            return 2
+        return rolling.run_rolling(
+            servers, cmd, parsed[1], partial(run_multi_returnvalues, name), server_tag
+        )
+    #  Image commands work on the images the servers use, not on the servers.
+    elif cmd == "images":
+        from server import server as servermodule
+        from . import images
+
+        parsed = _parse_fleet_args(name, cmd, images.IMAGES_COMMAND_ARGS, args)
+        if parsed is None:
+            return 2
+        return images.run_images(servers, parsed[1], servermodule.DATAPATH)
+
     #  In AlphaGSM, you can either run one command on multiple servers
     #  or multiple commands on one server
     #  of which this is determined by whether the first argument is a number.
@@ -165,10 +211,28 @@ def main(name, args):
     return 0
 
 
+def _parse_fleet_args(name, cmd, spec, args):
+    """
+    Parse the *args* of a command run on the whole fleet rather than per server.
+
+    Returns the ``(args, opts)`` that :func:`cmdparse.parse` gives for *spec*,
+    or ``None`` after printing the error and the command's help.
+    """
+    try:
+        return cmdparse.parse(args, spec)
+    except cmdparse.OptionError as ex:
+        print("Error parsing arguments and options", file=stderr)
+        print_handled_ex(ex)
+        print(file=stderr)
+        help(name, None, cmd)
+        return None
+
+
 def run_one(name, server, cmd, args):
     """
     Run a single command or list of commands on a single server.
     """
+    from server import Server
 
     user, tag = server
     #  are we acting upon another user?
@@ -293,6 +357,8 @@ def run_one(name, server, cmd, args):
                 print("Error running command", file=stderr)
                 print_handled_ex(ex)
                 return 3
+            finally:
+                report_lock_waits()
     return 0
 
 
@@ -332,15 +398,25 @@ def get_all_all_servers(command):
     Get all servers for all users. What exactly this means is
     command dependent.
 
-    If command is "stop", "status", "message", "backup" or "list"
-    then uses the list of all currently running servers.
+    If command is "stop", "status", "message", "backup", "list",
+    "rolling-restart" or "rolling-update" then uses the list of all
+    currently running servers.
     If command is "start" then this returns the list of servers
     stopped by the most recent "stop" command issued by the current user.
 
     For all other commands this is not supported and returns an empty list
     """
-
-    if command in {"stop", "status", "message", "backup", "list"}:
+    import screen
+
+    if command in {
+        "stop",
+        "status",
+        "message",
+        "backup",
+        "list",
+        "rolling-restart",
+        "rolling-update",
+    }:
         servers = list(screen.list_all_screens())
         if command == "stop":
             print("Saving server list", file=stderr)
@@ -363,6 +439,7 @@ def get_all_user_servers():
     """
     Get the list of all known servers for the current user from the datapath.
     """
+    from server import server as servermodule
 
     try:
         servers = [
@@ -488,44 +565,225 @@ def _internal_is_running(line):
     return line.decode().strip() == "#%AlphaGSM-INTERNAL%#"
 
 
+def get_multi_launch_settings():
+    """
+    Return the (mode, limit) pair used by run_multi to launch children.
+
+    mode is "concurrent" (the default) which starts every child at once and
+    waits for their ready markers together, or "serial" which waits for each
+    child to become ready before starting the next one.
+
+    limit is the maximum number of children alive at once in concurrent mode,
+    read from the "multi_parallel" core setting. 0 means no limit.
+    """
+
+    core_settings = settings.user.getsection("core")
+    mode = str(core_settings.get("multi_launch", "concurrent")).strip().lower()
+    if mode not in ("concurrent", "serial"):
+        print("Unknown multi_launch mode", mode, "using concurrent", file=stderr)
+        mode = "concurrent"
+    try:
+        limit = max(0, int(core_settings.get("multi_parallel", 0)))
+    except (TypeError, ValueError):
+        print("Invalid multi_parallel setting, using no limit", file=stderr)
+        limit = 0
+    return mode, limit
+
+
+def get_multi_executor():
+    """
+    Return how run_multi executes commands on the current user's servers.
+
+    "inprocess" (the default where os.fork is available) runs each server's
+    command in a fork of this interpreter, so nothing has to be re-imported.
+    "exec" starts a fresh alphagsm-internal interpreter for every server.
+    Servers owned by other users always use alphagsm-internal through sudo.
+    """
+
+    executor = str(
+        settings.user.getsection("core").get("multi_executor", "inprocess")
+    ).strip().lower()
+    if executor not in ("inprocess", "exec"):
+        print("Unknown multi_executor", executor, "using inprocess", file=stderr)
+        executor = "inprocess"
+    if executor == "inprocess" and not inprocess.can_fork():
+        executor = "exec"
+    return executor
+
+
+def get_multi_progress():
+    """
+    Return how run_multi reports the progress events of the current user's servers.
+
+    "summary" (the default) prints a table of how long each server spent in
+    each phase once they have all finished. "live" also prints a one line
+    fleet status every few seconds while they run. "off" doesn't open a
+    progress channel at all. Servers owned by other users never report
+    progress as the channel can't be passed through sudo.
+    """
+
+    mode = str(
+        settings.user.getsection("core").get("multi_progress", "summary")
+    ).strip().lower()
+    if mode not in ("off", "summary", "live"):
+        print("Unknown multi_progress", mode, "using summary", file=stderr)
+        mode = "summary"
+    return mode
+
+
+def get_multi_timeout():
+    """
+    Return the (timeout, kill_grace) pair used by run_multi in seconds.
+
+    timeout is how long each per-server child may run before it is stopped,
+    read from the "multi_timeout" core setting. 0 (the default) means children
+    may run for as long as they like. kill_grace, from "multi_kill_grace", is
+    how long a child gets to exit after SIGTERM before it is sent SIGKILL.
+    """
+
+    core_settings = settings.user.getsection("core")
+    try:
+        timeout = max(0.0, float(core_settings.get("multi_timeout", 0)))
+    except (TypeError, ValueError):
+        print("Invalid multi_timeout setting, using no timeout", file=stderr)
+        timeout = 0.0
+    try:
+        kill_grace = max(0.0, float(core_settings.get("multi_kill_grace", 10)))
+    except (TypeError, ValueError):
+        print("Invalid multi_kill_grace setting, using 10 seconds", file=stderr)
+        kill_grace = 10.0
+    return timeout, kill_grace
+
+
+def _run_inprocess(name, server, args):
+    """
+    Entry point for a forked in-process child, equivalent to alphagsm-internal.
+    """
+
+    ret = main(name, [server] + list(args))
+    progress.result(ret)
+    return ret
+
+
 def run_multi(name, count, servers, args):
     """
     Run a single command on multiple servers
 
+    Returns 0 if it succeeded everywhere, the common status if every failure
+    had the same status, or 10 otherwise. See run_multi_returnvalues for how
+    the command is run.
+    """
+
+    retvals = list(run_multi_returnvalues(name, servers, args).values())
+    if len(retvals) != len(servers):
+        print("Warning: Not all servers have returned", file=stderr)
+    if all(val == 0 for val in retvals):
+        return 0
+    retvalsnon0 = [val for val in retvals if val != 0]
+    if all(val == retvalsnon0[0] for val in retvalsnon0):
+        return retvalsnon0[0]
+    else:
+        return 10
+
+
+def server_tag(user, server):
+    """Return the "user/server" (or just "server") tag multi-server commands use."""
+    return (user + "/" if user is not None else "") + server
+
+
+def run_multi_returnvalues(name, servers, args):
+    """
+    Run a single command on multiple servers and return {tag: status}
+
     This is used for e.g start and stop commands, anything that is trivial
     to run as a bulk action.
 
-    This is achieved by a multiplexer.
+    This is achieved by a multiplexer. By default every child is launched at
+    once and their ready markers are awaited in a single selector loop, see
+    get_multi_launch_settings for how to limit or serialise this. The current
+    user's servers are run in forks of this interpreter rather than fresh
+    alphagsm-internal processes unless get_multi_executor says otherwise.
+    If a multi_timeout is configured (see get_multi_timeout) children that
+    overrun it are stopped and reported with status
+    asyncmultiplexer.TIMEOUT_STATUS. The current user's servers report their
+    phases over a progress channel (see utils.progress), which is summarised
+    according to get_multi_progress. Forked children share one snapshot of the
+    Docker containers' state, see server.container_state.prime_for_fleet.
     """
 
-    multi = mp.Multiplexer()
+    timeout, kill_grace = get_multi_timeout()
+    if timeout:
+        from .asyncmultiplexer import AsyncMultiplexer
+
+        multi = AsyncMultiplexer(timeout, kill_grace)
+    else:
+        multi = mp.Multiplexer()
+    jobs = []
+    mode, limit = get_multi_launch_settings()
+    #  serial mode keeps the original one interpreter per server behaviour
+    use_inprocess = mode != "serial" and get_multi_executor() == "inprocess"
     for user, server in servers:
         if user is not None:
             cmd = get_run_as_cmd(name, user, server, args, True)
+        elif use_inprocess:
+            cmd = partial(inprocess.forkcall, _run_inprocess, name, server, args)
         else:
             cmd = get_run_cmd(name, server, args, True)
-        mp.addtomultiafter(
+        jobs.append((server_tag(user, server), cmd))
+    if use_inprocess and sum(1 for user, _server in servers if user is None) > 1:
+        #  one container listing shared by every forked child, rather than a
+        #  docker query per server. Children run as other users don't see it.
+        from server import container_state
+
+        container_state.prime_for_fleet()
+    progressmode = get_multi_progress()
+    events = None
+    if progressmode != "off":
+        fleet = progress.FleetProgress(
+            stdout, live_interval=LIVE_PROGRESS_INTERVAL if progressmode == "live" else None
+        )
+        if progressmode == "live":
+            #  redraw on a timer too, so stalled children still show up
+            multi.setticker(LIVE_PROGRESS_INTERVAL, fleet.tick)
+        local = set(tag for (user, _server), (tag, _cmd) in zip(servers, jobs) if user is None)
+
+        def events(tag):
+            if tag not in local:
+                return None
+            fleet.add(tag)
+            return partial(fleet.handle, tag)
+
+    if mode == "serial":
+        for tag, cmd in jobs:
+            mp.addtomultiafter(
+                multi,
+                tag,
+                _internal_is_running,
+                cmd,
+                events=events,
+                stdin=sp.DEVNULL,
+                stdout=sp.PIPE,
+                stderr=sp.STDOUT,
+            )
+    else:
+        mp.addalltomultiafter(
             multi,
-            (user + "/" if user is not None else "") + server,
+            jobs,
             _internal_is_running,
-            cmd,
+            limit=limit,
+            events=events,
             stdin=sp.DEVNULL,
             stdout=sp.PIPE,
             stderr=sp.STDOUT,
         )
     #  run the command on all of the servers
-    multi.processall()
-    #  check the status
-    retvals = list(multi.checkreturnvalues().values())
-    if len(retvals) != len(servers):
-        print("Warning: Not all servers have returned", file=stderr)
-    if all(val == 0 for val in retvals):
-        return 0
-    retvalsnon0 = [val for val in retvals if val != 0]
-    if all(val == retvalsnon0[0] for val in retvalsnon0):
-        return retvalsnon0[0]
-    else:
-        return 10
+    try:
+        multi.processall()
+    finally:
+        multi.close()
+    if events is not None:
+        fleet.printsummary()
+    return multi.checkreturnvalues()
 
 
 def help(name, server, cmd=None, *, file=stderr, full_help=False):
@@ -583,6 +841,12 @@ def help(name, server, cmd=None, *, file=stderr, full_help=False):
                            checking what servers a wildcard matched or in
                            scripts to list the servers in a script processable
                            way.
+          rolling-restart [OPTION]... : Restart the servers in waves, waiting
+                           for each wave to be ready before the next.
+          rolling-update [OPTION]... : Update and restart the servers in
+                           waves using the game module's update command.
+          images prewarm [OPTION]... : Build or pull the container images
+                           of the docker servers ahead of starting them.
         """),
             file=file,
         )
@@ -590,11 +854,11 @@ def help(name, server, cmd=None, *, file=stderr, full_help=False):
         #  if there is no server, then return a default set of server commands
         #  that are typical of every game server
         if server is None:
-            for cmd in Server.default_commands:
+            for cmd in servercommands.DEFAULT_COMMANDS:
                 cmdparse.shorthelp(
                     cmd,
-                    Server.default_command_descriptions.get(cmd, None),
-                    Server.default_command_args[cmd],
+                    servercommands.DEFAULT_COMMAND_DESCRIPTIONS.get(cmd, None),
+                    servercommands.DEFAULT_COMMAND_ARGS[cmd],
                 )
         #  otherwise return the commands specific to the server.
         else:
@@ -607,16 +871,31 @@ def help(name, server, cmd=None, *, file=stderr, full_help=False):
     else:
         #  if we have a command, return help relating to the command to the
         #  specific command
-        if server is None:
-            if cmd not in Server.default_commands:
+        if cmd in ("rolling-restart", "rolling-update"):
+            from . import rolling
+
+            cmdparse.longhelp(
+                cmd,
+                rolling.ROLLING_COMMAND_DESCRIPTIONS[cmd],
+                rolling.ROLLING_COMMAND_ARGS[cmd],
+                file=file,
+            )
+        elif cmd == "images":
+            from . import images
+
+            cmdparse.longhelp(
+                cmd, images.IMAGES_COMMAND_DESCRIPTION, images.IMAGES_COMMAND_ARGS, file=file
+            )
+        elif server is None:
+            if cmd not in servercommands.DEFAULT_COMMANDS:
                 print("Unknown Command", file=file)
                 print(file=file)
                 help(name, server, file=file, full_help=full_help)
                 return
             cmdparse.longhelp(
                 cmd,
-                Server.default_command_descriptions.get(cmd, None),
-                Server.default_command_args[cmd],
+                servercommands.DEFAULT_COMMAND_DESCRIPTIONS.get(cmd, None),
+                servercommands.DEFAULT_COMMAND_ARGS[cmd],
             )
         else:
             if cmd not in server.get_commands():
@@ -1,9 +1,15 @@
 """Utilities for running and monitoring multiple subprocesses together."""
 
 import os
+import select
 import selectors
 import subprocess as sp
 
+from utils import progress, waiting
+
+#  longest pause between polls for a stream-less process's exit without pidfds
+EXIT_POLL_INTERVAL = 0.5
+
 
 class OutputInteruptedException(Exception):
     """Raised when a watched output stream reaches an interrupt condition."""
@@ -25,28 +31,86 @@ class OutputInteruptedException(Exception):
             multi.streams[stream].linecheck = linecheck
 
 
-class StreamData(object):
-    """Track buffered data and metadata for one subprocess output stream."""
+#  the buffer's two cursors and the adaptive read size are separate on purpose, see below
+class StreamData(object):  # pylint: disable=too-many-instance-attributes
+    """Track buffered data and metadata for one subprocess output stream.
+
+    Output is kept in a ``bytearray`` with a cursor marking how much of it has
+    already been handed out as lines, so consuming a line copies just that line
+    rather than everything buffered after it. The consumed prefix is dropped
+    once it makes up most of the buffer. A second cursor remembers how far the
+    buffer has been searched for a newline so a long partial line (e.g. a
+    progress bar redrawn with carriage returns) isn't rescanned on every read.
+
+    ``data`` is still available, and assignable, as the ``bytes`` not yet
+    consumed.
+    """
+
+    #  read sizes used by Multiplexer.process. Reads grow while the child keeps
+    #  the pipe full and shrink again when it goes quiet.
+    MIN_READ = 4096
+    MAX_READ = 1024 * 1024
 
     def __init__(self, tag, proc, data=None):
         """Initialise the stream state for a specific process output handle."""
         self.tag = tag
         self.proc = proc
-        if data is None:
-            data = b""
-        self.data = data
+        self._buffer = bytearray()
+        self._start = 0
+        self._scanned = 0
+        if data is not None:
+            self._buffer += data
+        self.readsize = self.MIN_READ
         self.linecheck = None
+        self.linehandler = None
+
+    @property
+    def data(self):
+        """The buffered bytes that haven't been consumed as lines yet."""
+        return bytes(self._buffer[self._start :])
+
+    @data.setter
+    def data(self, value):
+        self._buffer = bytearray(value)
+        self._start = 0
+        self._scanned = 0
+
+    def buffered(self):
+        """Return the number of buffered bytes not yet consumed."""
+        return len(self._buffer) - self._start
+
+    def append(self, new):
+        """Add newly read output to the end of the buffer."""
+        if self._start:
+            if self._start == len(self._buffer):
+                self._buffer.clear()
+                self._scanned = 0
+                self._start = 0
+            elif self._start * 2 >= len(self._buffer):
+                del self._buffer[: self._start]
+                self._scanned -= self._start
+                self._start = 0
+        self._buffer += new
+
+    def adjustreadsize(self, got):
+        """Adapt the next read size to a read that returned *got* bytes."""
+        if got >= self.readsize:
+            self.readsize = min(self.readsize * 2, self.MAX_READ)
+        elif got * 4 < self.readsize:
+            self.readsize = max(self.readsize // 2, self.MIN_READ)
 
     def consumelines(self):
         """Yield complete newline-terminated chunks from the buffered data."""
-        while True:
-            i = self.data.find(b"\n")
-            if i < 0:
-                return
-            tmp = self.data[:i]
-
-            self.data = self.data[i + 1 :]
+        end = self._buffer.rfind(b"\n", max(self._start, self._scanned))
+        if end < 0:
+            self._scanned = len(self._buffer)
+            return
+        #  split every complete line in one go but move the cursor line by line
+        #  so lines the caller doesn't take are left in the buffer
+        for tmp in bytes(self._buffer[self._start : end]).split(b"\n"):
+            self._start = self._scanned = self._start + len(tmp) + 1
             yield tmp
+        self._scanned = len(self._buffer)
 
 
 class ProcData(object):
@@ -75,6 +139,12 @@ class Multiplexer(object):
         self.streamlessprocs = set()
         self.checkdata = set()
         self.returnvalues = {}
+        #  (interval, fn) set by setticker
+        self.ticker = None
+
+    def setticker(self, interval, fn):
+        """Call *fn* after every round of events and at least every *interval* seconds."""
+        self.ticker = (interval, fn)
 
     def run(self, tag, *args, **kwargs):
         """Start a subprocess and immediately register it for multiplexing."""
@@ -121,6 +191,11 @@ class Multiplexer(object):
         else:
             self.streams[stream].tag = tag
 
+    def addeventstream(self, stream, proc, handler):
+        """Register a stream whose lines are passed to *handler* instead of printed."""
+        self.addstream(stream, proc, "events")
+        self.streams[stream].linehandler = handler
+
     def removestream(self, stream):
         """Unregister a stream and return its process, tag, and buffered data."""
         self.selector.unregister(stream)
@@ -141,8 +216,10 @@ class Multiplexer(object):
     def transfer(self, target, proc):
         """Move a process and its streams from this multiplexer into another."""
         target.addbareproc(self.procs[proc].tag, proc)
-        for stream in self.procs[proc].streams:
+        for stream in list(self.procs[proc].streams):
+            handler = self.streams[stream].linehandler
             target.addstream(stream, *self.removestream(stream))
+            target.streams[stream].linehandler = handler
         # all streams removed so now should be in streamlessprocs
         self.streamlessprocs.remove(proc)
         del self.procs[proc]
@@ -163,64 +240,108 @@ class Multiplexer(object):
         interuptedstreams = {}
         for stream in self.checkdata:
             stream_data = self.streams[stream]
+            tag = self.gettag(stream)
+            handler = stream_data.linehandler
             for line in stream_data.consumelines():
                 if stream_data.linecheck and stream_data.linecheck(line):
                     interuptedstreams[stream] = (line, stream_data.linecheck)
                     stream_data.linecheck = None
                     break
+                elif handler is not None:
+                    handler(line)
                 else:
-                    print(self.gettag(stream), line.decode())
+                    print(tag, line.decode())
         self.checkdata = set()
+        if self.ticker is not None:
+            timeout = self.ticker[0] if timeout is None else min(timeout, self.ticker[0])
         if self.streams:
             inputs = self.selector.select(timeout)
             for key, _events in inputs:
                 stream = key.fileobj
                 stream_data = self.streams[stream]
-                new = stream.read1(1000)
-                stream_data.data += new
+                new = stream.read1(stream_data.readsize)
+                stream_data.adjustreadsize(len(new))
+                stream_data.append(new)
+                tag = self.gettag(stream)
+                handler = stream_data.linehandler
                 for line in stream_data.consumelines():
                     if stream_data.linecheck and stream_data.linecheck(line):
                         interuptedstreams[stream] = (line, stream_data.linecheck)
                         stream_data.linecheck = None
                         break
+                    elif handler is not None:
+                        handler(line)
                     else:
-                        print(self.gettag(stream), line.decode())
+                        print(tag, line.decode())
                 if not new:  # event but no new data means eof
-                    if stream_data.data:  # write out any part line anyway
-                        print(self.gettag(stream), stream_data.data.decode())
+                    if stream_data.buffered():  # write out any part line anyway
+                        self._writepartial(stream_data, tag)
                     self.removestream(
                         stream
                     )  # adds to streamlessprocs if no streams left
                     key.fileobj.close()
-            for proc in list(self.streamlessprocs):
-                if proc.poll() is not None:
-                    ret = proc.wait()
-                    print(
-                        "{} has finished with status {}".format(
-                            self.procs[proc].tag, ret
-                        )
-                    )
-                    self.returnvalues[self.procs[proc].tag] = ret
-                    del self.procs[proc]
-                    self.streamlessprocs.remove(proc)
+            self._reapfinished()
         else:
-            _, ret = os.waitpid(-1, 0)
-            for proc in list(self.streamlessprocs):
-                if proc.poll() is not None:
-                    ret = proc.wait()
-                    print(
-                        "{} has finished with status {}".format(
-                            self.procs[proc].tag, ret
-                        )
-                    )
-                    self.returnvalues[self.procs[proc].tag] = ret
-                    del self.procs[proc]
-                    self.streamlessprocs.remove(proc)
+            self._waitforexit(timeout)
+            self._reapfinished()
+        if self.ticker is not None:
+            self.ticker[1]()
         if interuptedstreams:
             self.checkdata.update(interuptedstreams.keys())
             raise OutputInteruptedException(interuptedstreams)
         return len(self.streams)
 
+    def _writepartial(self, stream_data, tag):
+        """Write out an unterminated last line left in a stream's buffer."""
+        if stream_data.linehandler is not None:
+            stream_data.linehandler(stream_data.data)
+        else:
+            print(tag, stream_data.data.decode())
+
+    def _reapfinished(self):
+        """Record the exit status of every stream-less process that has exited."""
+        for proc in list(self.streamlessprocs):
+            if proc.poll() is not None:
+                self._finish(proc, proc.wait())
+
+    def _finish(self, proc, ret):
+        """Report that *proc* exited with *ret* and stop tracking it."""
+        print("{} has finished with status {}".format(self.procs[proc].tag, ret))
+        self.returnvalues[self.procs[proc].tag] = ret
+        del self.procs[proc]
+        self.streamlessprocs.remove(proc)
+
+    def _waitforexit(self, timeout=None):
+        """Wait up to *timeout* seconds (``None`` for no limit) for a stream-less process to exit.
+
+        Only the tracked processes are waited for, through their pidfds where
+        the platform has them and otherwise by polling them, so other children
+        of this process exiting don't end the wait.
+        """
+        procs = list(self.streamlessprocs)
+        if any(proc.poll() is not None for proc in procs):
+            return
+        fds = []
+        try:
+            for proc in procs:
+                fds.append(os.pidfd_open(proc.pid))
+        except (AttributeError, OSError):
+            for fd in fds:
+                os.close(fd)
+            fds = None
+        if fds is None:
+            waiting.wait_until(
+                lambda: any(proc.poll() is not None for proc in procs),
+                float("inf") if timeout is None else timeout,
+                max_interval=EXIT_POLL_INTERVAL,
+            )
+            return
+        try:
+            select.select(fds, [], [], timeout)
+        finally:
+            for fd in fds:
+                os.close(fd)
+
     def processall(self):
         """Process events until no tracked subprocesses remain."""
         while self.process() is not None:
@@ -232,14 +353,61 @@ class Multiplexer(object):
         self.returnvalues = {}
         return tmp
 
+    def empty(self):
+        """Return a new, empty multiplexer configured like this one."""
+        return Multiplexer()
+
+    def close(self):
+        """Release the selector. The multiplexer can't be used afterwards."""
+        self.selector.close()
+
+
+def _start(multi, tag, job, handler, kwargs):
+    """Start *job* on *multi*, passing it a progress channel if *handler* is set.
+
+    *job* is a callable returning a Popen-like process or a tuple of
+    positional arguments for :class:`subprocess.Popen`. Lines the job writes
+    to its channel (see :mod:`utils.progress`) are given to *handler*.
+    """
+    if handler is None:
+        if callable(job):
+            return multi.addproc(tag, job())
+        return multi.run(tag, *job, **kwargs)
+    reader, write_fd = progress.open_channel()
+    try:
+        with progress.passed_to_children(write_fd):
+            if callable(job):
+                proc = multi.addproc(tag, job())
+            else:
+                kwargs = dict(kwargs)
+                kwargs["pass_fds"] = tuple(kwargs.get("pass_fds", ())) + (write_fd,)
+                proc = multi.run(tag, *job, **kwargs)
+    except BaseException:
+        reader.close()
+        raise
+    finally:
+        os.close(write_fd)
+    multi.addeventstream(reader, proc, handler)
+    return proc
+
+
+def _watchready(multi, proc, fn):
+    """Attach the ready predicate *fn* to the output streams of *proc*."""
+    for s in multi.procs[proc].streams:
+        if multi.streams[s].linehandler is None:
+            multi.streams[s].linecheck = fn
 
-def addtomultiafter(multi, tag, fn, *args, **kwargs):
-    """Add a process to a multiplexer once a line predicate reports readiness."""
-    tmp = Multiplexer()
+
+def addtomultiafter(multi, tag, fn, *args, events=None, **kwargs):
+    """Add a process to a multiplexer once a line predicate reports readiness.
+
+    *events* is the same as for :func:`addalltomultiafter`.
+    """
+    tmp = multi.empty()
     print("Running", tag, flush=True)
-    proc = tmp.run("", *args, **kwargs)
-    for s in tmp.procs[proc].streams:
-        tmp.streams[s].linecheck = fn
+    handler = events(tag) if events is not None else None
+    proc = _start(tmp, "", args, handler, kwargs)
+    _watchready(tmp, proc, fn)
     try:
         tmp.processall()
     except OutputInteruptedException:
@@ -248,5 +416,60 @@ def addtomultiafter(multi, tag, fn, *args, **kwargs):
         multi.procs[proc].tag = tag
     else:
         print("Process {} finished early".format(tag))
+    tmp.close()
     multi.process(1)
     multi.process(0)
+
+
+def addalltomultiafter(multi, jobs, fn, limit=None, events=None, **kwargs):
+    """Launch several processes together and wait for each to report readiness.
+
+    *jobs* is an iterable of ``(tag, args)`` pairs where ``args`` is the
+    argument vector passed to :class:`subprocess.Popen`. Every process is
+    registered on *multi* straight away and the ready predicate *fn* is
+    attached to its streams, so all children are watched from the one
+    selector loop instead of one temporary multiplexer per child.
+
+    ``args`` may instead be a callable that starts the job itself and returns
+    a Popen-like process (see :mod:`core.inprocess`). Such processes are
+    treated as ready as soon as they are started and ``kwargs`` are not
+    passed to them.
+
+    *limit* caps how many of the launched processes may be alive at once. When
+    the cap is reached the next job is started as soon as an earlier one
+    exits. ``None`` or ``0`` means no limit.
+
+    *events*, if given, is called with each job's tag and returns a function
+    to receive the lines of that job's progress channel (see
+    :mod:`utils.progress`), or ``None`` to start the job without one.
+
+    Returns once every job has been started and has either printed its ready
+    line or exited. Any remaining output is left for ``multi.processall()``.
+    """
+    pending = list(jobs)
+    launched = []
+    waiting = {}
+    while pending or waiting:
+        while pending and (
+            not limit or sum(1 for proc in launched if proc in multi.procs) < limit
+        ):
+            tag, args = pending.pop(0)
+            print("Running", tag, flush=True)
+            handler = events(tag) if events is not None else None
+            if callable(args):
+                launched.append(_start(multi, tag, args, handler, kwargs))
+                continue
+            proc = _start(multi, tag, (args,), handler, kwargs)
+            launched.append(proc)
+            _watchready(multi, proc, fn)
+            waiting[proc] = tag
+        try:
+            multi.process()
+        except OutputInteruptedException as ex:
+            for stream in ex.streams:
+                tag = waiting.pop(multi.streams[stream].proc, None)
+                if tag is not None:
+                    print(tag, "is running")
+        for proc in list(waiting):
+            if proc not in multi.procs:
+                print("Process {} finished early".format(waiting.pop(proc)))
@@ -0,0 +1,253 @@
+"""Rolling restarts and updates of several servers.
+
+``rolling-restart`` and ``rolling-update`` take the servers down in waves of at
+most ``max_unavailable`` servers. Each wave is run with the normal multi-server
+machinery (see :func:`core.run_multi_returnvalues`) and the next wave only
+starts once every server in the current one is ready again, as judged by
+``start --wait`` (see :mod:`server.readiness`). If more than ``max_failures``
+servers fail the remaining waves are skipped.
+
+Each wave starts by asking its servers whether they are running with ``status
+--check``. A rolling restart runs ``restart --wait`` on the running servers of a
+wave and leaves the stopped ones alone. A rolling update runs the game module's
+``update --restart`` and then ``ready`` on the running servers that updated,
+and a plain ``update`` on the stopped ones so that they stay stopped. Modules
+without an ``update`` command count as failures.
+"""
+
+import math
+import re
+import sys
+
+from utils.settings import settings
+from utils.cmdparse.cmdspec import CmdSpec, OptSpec
+
+__all__ = [
+    "ROLLING_COMMANDS",
+    "ROLLING_COMMAND_ARGS",
+    "ROLLING_COMMAND_DESCRIPTIONS",
+    "get_rolling_settings",
+    "plan_waves",
+    "resolve_count",
+    "run_rolling",
+]
+
+ROLLING_COMMANDS = ("rolling-restart", "rolling-update")
+
+_COUNT_RE = re.compile(r"\A(\d+)(%?)\Z")
+
+
+def _count(value):
+    """Check a server count option is "N" or "N%" and return it unchanged."""
+    value = str(value).strip()
+    if _COUNT_RE.match(value) is None:
+        raise ValueError("expected a number of servers or a percentage like 25%")
+    return value
+
+
+_COMMON_OPTIONS = (
+    OptSpec(
+        "u",
+        ["max-unavailable"],
+        "How many servers may be down at once, as a count or a percentage (default 1)",
+        "max_unavailable",
+        "COUNT",
+        _count,
+    ),
+    OptSpec(
+        "f",
+        ["max-failures"],
+        "How many servers may fail before the remaining waves are skipped, "
+        "as a count or a percentage (default 0)",
+        "max_failures",
+        "COUNT",
+        _count,
+    ),
+    OptSpec(
+        "t",
+        ["timeout"],
+        "Seconds each server may take to be ready again (default 300)",
+        "timeout",
+        "SECONDS",
+        int,
+    ),
+)
+
+ROLLING_COMMAND_ARGS = {
+    "rolling-restart": CmdSpec(options=_COMMON_OPTIONS),
+    "rolling-update": CmdSpec(
+        options=_COMMON_OPTIONS
+        + (
+            OptSpec(
+                "v",
+                ["validate"],
+                "Validate the server files after updating",
+                "validate",
+                None,
+                True,
+            ),
+        )
+    ),
+}
+
+ROLLING_COMMAND_DESCRIPTIONS = {
+    "rolling-restart": "Restart the servers a few at a time, waiting for each wave to be "
+    "ready for players before starting the next.",
+    "rolling-update": "Update and restart the servers a few at a time using each game "
+    "module's update command, waiting for each wave to be ready for players before "
+    "starting the next.",
+}
+
+
+def get_rolling_settings():
+    """
+    Return the default (max_unavailable, max_failures, timeout) of rolling commands.
+
+    These come from the "rolling_max_unavailable", "rolling_max_failures" and
+    "rolling_ready_timeout" core settings. The first two are a count or a
+    percentage of the servers.
+    """
+
+    core_settings = settings.user.getsection("core")
+    values = []
+    for key, default in (("rolling_max_unavailable", "1"), ("rolling_max_failures", "0")):
+        try:
+            values.append(_count(core_settings.get(key, default)))
+        except ValueError:
+            print("Invalid", key, "setting, using", default, file=sys.stderr)
+            values.append(default)
+    try:
+        timeout = max(1, int(core_settings.get("rolling_ready_timeout", 300)))
+    except (TypeError, ValueError):
+        print("Invalid rolling_ready_timeout setting, using 300 seconds", file=sys.stderr)
+        timeout = 300
+    return values[0], values[1], timeout
+
+
+def resolve_count(value, total, minimum=0):
+    """Turn a "N" or "N%" count of *total* servers into a number of servers.
+
+    Percentages are rounded up for batch sizes (*minimum* 1) so that "25%" of
+    two servers is one, and down for thresholds so that "10%" of five servers
+    tolerates no failures.
+    """
+
+    number, percent = _COUNT_RE.match(_count(value)).groups()
+    if not percent:
+        return max(minimum, int(number))
+    fraction = total * int(number) / 100.0
+    return max(minimum, math.ceil(fraction) if minimum else math.floor(fraction))
+
+
+def plan_waves(servers, max_unavailable):
+    """Split *servers* into consecutive waves of at most *max_unavailable*."""
+    size = max(1, max_unavailable)
+    return [servers[i : i + size] for i in range(0, len(servers), size)]
+
+
+def _wave_commands(cmd, timeout, validate, running=True):
+    """Return the per-server commands run, one after the other, on each wave.
+
+    *running* selects the commands for the servers of the wave that are
+    running. Stopped servers aren't restarted, so a rolling restart has no
+    commands for them.
+    """
+    if cmd == "rolling-restart":
+        return [["restart", "--wait", "--timeout", str(timeout)]] if running else []
+    update = ["update"] + (["--restart"] if running else []) + (["--validate"] if validate else [])
+    if not running:
+        return [update]
+    return [update, ["ready", "--timeout", str(timeout)]]
+
+
+def _run_commands(servers, commands, run, tag, failed):
+    """Run *commands* in turn on *servers* and return the servers none of them failed.
+
+    A server that fails a command is added to *failed* and isn't given the
+    later commands.
+    """
+    remaining = servers
+    for command in commands:
+        if not remaining:
+            break
+        retvals = run(remaining, command)
+        ok = []
+        for user, server in remaining:
+            server_tag = tag(user, server)
+            if retvals.get(server_tag) == 0:
+                ok.append((user, server))
+            else:
+                failed.append(server_tag)
+                print(
+                    server_tag,
+                    "failed",
+                    command[0],
+                    "with status",
+                    retvals.get(server_tag),
+                    file=sys.stderr,
+                )
+        remaining = ok
+    return remaining
+
+
+def run_rolling(servers, cmd, opts, run, tag):
+    """
+    Run the rolling command *cmd* with the parsed *opts* on *servers* and return a status.
+
+    *run* runs a command on a list of servers and returns their statuses by
+    tag, like :func:`core.main.run_multi_returnvalues`, and *tag* turns a
+    (user, server) pair into that tag. Servers that aren't running when their
+    wave comes up are left stopped rather than counted as failures. Returns 0
+    if every server came back or was left stopped and 1 if any failed or were
+    skipped.
+    """
+
+    max_unavailable, max_failures, timeout = get_rolling_settings()
+    max_unavailable = resolve_count(opts.get("max_unavailable", max_unavailable), len(servers), 1)
+    max_failures = resolve_count(opts.get("max_failures", max_failures), len(servers))
+    timeout = opts.get("timeout", timeout)
+    validate = opts.get("validate", False)
+
+    waves = plan_waves(list(servers), max_unavailable)
+    failed = []
+    done = []
+    stopped = []
+    for number, wave in enumerate(waves, 1):
+        tags = [tag(user, server) for user, server in wave]
+        print("Wave {}/{}: {}".format(number, len(waves), " ".join(tags)), flush=True)
+        retvals = run(wave, ["status", "--check"])
+        running = [(u, s) for u, s in wave if retvals.get(tag(u, s)) == 0]
+        not_running = [(u, s) for u, s in wave if retvals.get(tag(u, s)) != 0]
+        if not_running:
+            commands = _wave_commands(cmd, timeout, validate, running=False)
+            print(
+                "Not running, {}: {}".format(
+                    "updating without starting" if commands else "leaving stopped",
+                    " ".join(tag(u, s) for u, s in not_running),
+                ),
+                flush=True,
+            )
+            not_running = _run_commands(not_running, commands, run, tag, failed)
+            stopped.extend(tag(user, server) for user, server in not_running)
+        running = _run_commands(
+            running, _wave_commands(cmd, timeout, validate), run, tag, failed
+        )
+        done.extend(tag(user, server) for user, server in running)
+        if len(failed) > max_failures:
+            skipped = [tag(u, s) for later in waves[number:] for u, s in later]
+            if skipped:
+                print(
+                    "Stopping after {} failed servers, not touching: {}".format(
+                        len(failed), " ".join(skipped)
+                    ),
+                    file=sys.stderr,
+                )
+            break
+    else:
+        skipped = []
+    print(
+        "{}: {} ready, {} left stopped, {} failed, {} skipped".format(
+            cmd, len(done), len(stopped), len(failed), len(skipped)
+        )
+    )
+    return 0 if not failed and not skipped else 1
@@ -1,6 +1,7 @@
 """HTTP and archive-based download helpers used by the shared downloader cache."""
 
 from downloader import DownloaderError
+from utils import progress
 from datetime import date
 import urllib.request
 import os.path
@@ -23,6 +24,8 @@ def reporthook(blocknum, blocksize, totalsize):
         percent = readsofar * 1e2 / totalsize
         print("\r%5.1f%% %*d / %d" % (
                 percent, len(str(totalsize)), readsofar, totalsize),end='')
+        if int(percent) != int((readsofar - blocksize) * 1e2 / totalsize):
+            progress.percent("download", percent)
     else: # total size is unknown
         print("read %d" % (readsofar,))
     tenth=int(10*readsofar/totalsize)*totalsize/10
@@ -33,7 +36,7 @@ def reporthook(blocknum, blocksize, totalsize):
 def _download_url(url, targetname):
     """Download *url* to *targetname* using a proper User-Agent header."""
     request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
-    with urllib.request.urlopen(request) as response:
+    with progress.phase("download"), urllib.request.urlopen(request) as response:
         totalsize = int(response.headers.get("Content-Length", -1))
         blocksize = 8192
         blocknum = 0
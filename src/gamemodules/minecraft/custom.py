@@ -18,6 +18,9 @@ import random
 
 _confpat = re.compile(r"\s*([^ \t\n\r\f\v#]\S*)\s*=(?:\s*(\S+))?(\s*)\Z")
 
+# optional: the console line that shows the server is ready for players (start --wait)
+ready_log_pattern = r"\]: Done \([0-9.,]+m?s\)!"
+
 
 def updateconfig(filename, settings):
     """Rewrite a simple key/value config file with the provided settings."""
@@ -125,6 +125,11 @@ def check_screen_exists(name):
     return _get_backend().is_running(name)
 
 
+def wait_for_screen_exit(name, timeout):
+    """Wait up to *timeout* seconds for the named session to end. Returns whether it did."""
+    return _get_backend().wait_stopped(name, timeout)
+
+
 def connect_to_screen(name):
     """Attach the current terminal to the server session."""
     return _get_backend().connect(name)
@@ -147,6 +152,7 @@ __all__ = [
     "send_to_screen",
     "send_to_server",
     "check_screen_exists",
+    "wait_for_screen_exit",
     "connect_to_screen",
     "list_all_screens",
     "logpath",
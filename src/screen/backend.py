@@ -6,8 +6,11 @@ multiplexer or process launcher is in use.
 """
 
 import os
+import time
 from abc import ABC, abstractmethod
 
+from utils.waiting import wait_for_pid, wait_until
+
 
 class ProcessError(Exception):
     """Raised when a process management operation cannot be completed."""
@@ -51,6 +54,25 @@ class ProcessBackend(ABC):
     def is_running(self, name):
         """Return whether the named server session is alive."""
 
+    def wait_stopped(self, name, timeout):
+        """Wait up to *timeout* seconds for the named session to end.
+
+        Returns whether it has ended. If the backend can tell which process
+        runs the session the wait is woken by that process exiting, otherwise
+        the session is probed with a short but growing interval.
+        """
+        deadline = time.monotonic() + timeout
+        pid = self._session_pid(name)
+        if pid is not None:
+            wait_for_pid(pid, timeout)
+        return wait_until(
+            lambda: not self.is_running(name), max(deadline - time.monotonic(), 0)
+        )
+
+    @abstractmethod
+    def _session_pid(self, name):
+        """Return the pid whose exit ends the named session, or ``None`` if unknown."""
+
     @abstractmethod
     def connect(self, name):
         """Attach the current terminal to the named session."""
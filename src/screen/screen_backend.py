@@ -118,6 +118,33 @@ class ScreenBackend(ProcessBackend):
         except ProcessError:
             return False
 
+    def _socket_dirs(self):
+        """Return the directories screen may keep the current user's sockets in."""
+        import pwd  # pylint: disable=import-outside-toplevel
+
+        if os.environ.get("SCREENDIR"):
+            return [os.environ["SCREENDIR"]]
+        user = "S-" + pwd.getpwuid(os.getuid())[0]
+        return [
+            os.path.join("/run/screen", user),
+            os.path.join("/var/run/screen", user),
+            os.path.expanduser("~/.screen"),
+        ]
+
+    def _session_pid(self, name):
+        """Return the PID of the screen session from its socket name (``<pid>.<tag>``)."""
+        suffix = "." + self._tag(name)
+        for dirpath in self._socket_dirs():
+            try:
+                entries = os.listdir(dirpath)
+            except OSError:
+                continue
+            for entry in entries:
+                pid, _sep, rest = entry.partition(".")
+                if pid.isdigit() and "." + rest == suffix:
+                    return int(pid)
+        return None
+
     def connect(self, name):
         """Attach the current terminal to the named screen session."""
         try:
@@ -177,6 +177,15 @@ class SubprocessBackend(ProcessBackend):
         except PermissionError:
             return True
 
+    def _session_pid(self, name):
+        """Return the PID of the server process if it is known."""
+        if IS_WINDOWS:
+            return None
+        entry = _processes.get(name)
+        if entry is not None:
+            return entry[0].pid
+        return self._read_pid(name)
+
     def is_running(self, name):
         """Return whether the named session is still alive."""
         entry = _processes.get(name)
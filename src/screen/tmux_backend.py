@@ -110,6 +110,20 @@ class TmuxBackend(ProcessBackend):
         except (sp.CalledProcessError, OSError):
             return False
 
+    def _session_pid(self, name):
+        """Return the PID of the process running in the session's pane."""
+        try:
+            output = sp.check_output(
+                ["tmux", "display-message", "-p", "-t", self._tag(name), "#{pane_pid}"],
+                stderr=sp.DEVNULL,
+                shell=False,
+                text=True,
+            )
+        except (sp.CalledProcessError, OSError):
+            return None
+        output = output.strip()
+        return int(output) if output.isdigit() else None
+
     def connect(self, name):
         """Attach the current terminal to the named tmux session."""
         tag = self._tag(name)
@@ -1,8 +1,26 @@
 """The core server package.
 
 The Server and ServerException classes are imported from the server module in this package.
+Server is only loaded from there when it is first used so that commands that don't touch a
+server (e.g. help) don't pay for importing the runtime and port management code.
 
 Documentation for how to write a gameserver module is provdided in the gamemodules module.
 """
 
-from .server import *
+from typing import TYPE_CHECKING
+
+from .errors import ServerError
+
+if TYPE_CHECKING:
+    from .server import Server
+
+__all__ = ["Server", "ServerError"]
+
+
+def __getattr__(name):
+    """Load the Server class from the server module on first use."""
+    if name == "Server":
+        from .server import Server
+
+        return Server
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
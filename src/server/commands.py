@@ -0,0 +1,260 @@
+"""The commands every server understands, with their arguments and help text.
+
+These live outside :mod:`server.server` so that help can be printed without
+loading the server class and the runtime and port management code it needs.
+:class:`server.server.Server` exposes them as its ``default_commands``,
+``default_command_args`` and ``default_command_descriptions`` attributes.
+"""
+
+from utils.cmdparse.cmdspec import CmdSpec, ArgSpec, OptSpec
+
+__all__ = ["DEFAULT_COMMANDS", "DEFAULT_COMMAND_ARGS", "DEFAULT_COMMAND_DESCRIPTIONS"]
+
+DEFAULT_COMMANDS = (
+    "setup",
+    "start",
+    "stop",
+    "restart",
+    "kill",
+    "activate",
+    "deactivate",
+    "status",
+    "send",
+    "message",
+    "connect",
+    "logs",
+    "dump",
+    "set",
+    "backup",
+    "restore",
+    "wipe",
+    "query",
+    "info",
+    "ready",
+)
+DEFAULT_COMMAND_ARGS = {
+    "setup": CmdSpec(
+        options=(
+            OptSpec(
+                "n",
+                ["noask"],
+                "Don't ask for input. Just fail if we can't cope",
+                "ask",
+                None,
+                False,
+            ),
+        )
+    ),
+    "start": CmdSpec(
+        options=(
+            OptSpec(
+                "w",
+                ["wait"],
+                "Wait until the server is ready for players before returning",
+                "wait",
+                None,
+                True,
+            ),
+            OptSpec(
+                "t",
+                ["timeout"],
+                "Seconds to wait for the server to be ready (default 300)",
+                "wait_timeout",
+                "SECONDS",
+                int,
+            ),
+        )
+    ),
+    "stop": CmdSpec(),
+    "activate": CmdSpec(
+        options=(
+            OptSpec(
+                "d",
+                ["delay"],
+                "Delay starting the server just setup the crontab",
+                "start",
+                None,
+                False,
+            ),
+        )
+    ),
+    "deactivate": CmdSpec(
+        options=(
+            OptSpec(
+                "d",
+                ["delay"],
+                "Delay stopping the server just remove the crontab",
+                "stop",
+                None,
+                False,
+            ),
+        )
+    ),
+    "status": CmdSpec(
+        options=(
+            OptSpec(
+                "v",
+                ["verbose"],
+                "Verbose status. argument is the level from 0 (normal) to 3 (max)",
+                "verbose",
+                "LEVEL",
+                int,
+            ),
+            OptSpec(
+                "c",
+                ["check"],
+                "Exit with an error status if the server isn't running",
+                "check",
+                None,
+                True,
+            ),
+        )
+    ),
+    "restart": CmdSpec(
+        options=(
+            OptSpec(
+                "w",
+                ["wait"],
+                "Wait until the server is ready for players before returning",
+                "wait",
+                None,
+                True,
+            ),
+            OptSpec(
+                "t",
+                ["timeout"],
+                "Seconds to wait for the server to be ready (default 300)",
+                "wait_timeout",
+                "SECONDS",
+                int,
+            ),
+        )
+    ),
+    "kill": CmdSpec(),
+    "send": CmdSpec(
+        requiredarguments=(
+            ArgSpec("INPUT", "The text to send to the server console", str),
+        )
+    ),
+    "message": CmdSpec(
+        requiredarguments=(ArgSpec("MESSAGE", "The message to send", str),)
+    ),
+    "connect": CmdSpec(),
+    "logs": CmdSpec(
+        options=(
+            OptSpec(
+                "n",
+                ["lines"],
+                "Number of lines to show (default 50)",
+                "lines",
+                "N",
+                int,
+            ),
+        )
+    ),
+    "dump": CmdSpec(),
+    "set": CmdSpec(
+        requiredarguments=(
+            ArgSpec(
+                "KEY", "The key to set in the form of dot seperated elements", str
+            ),
+        ),
+        optionalarguments=(
+            ArgSpec(
+                "VALUE",
+                "The value to set. New nodes in the structure will be created as needed. "
+                "Exactly how many values can be specified is KEY dependant.",
+                str,
+            ),
+        ),
+        repeatable=True,
+    ),
+    "backup": CmdSpec(),
+    "restore": CmdSpec(
+        optionalarguments=(
+            ArgSpec(
+                "BACKUP",
+                "Backup file name or index to restore. "
+                "If omitted, available backups are listed.",
+                str,
+            ),
+        )
+    ),
+    "wipe": CmdSpec(),
+    "query": CmdSpec(),
+    "info": CmdSpec(
+        options=(
+            OptSpec(
+                "j",
+                ["json"],
+                "Output result as JSON instead of human-readable text",
+                "as_json",
+                None,
+                True,
+            ),
+            OptSpec(
+                "d",
+                ["detailed"],
+                "Include extended details (e.g. TeamSpeak 3 channel list)",
+                "detailed",
+                None,
+                True,
+            ),
+        )
+    ),
+    "ready": CmdSpec(
+        options=(
+            OptSpec(
+                "t",
+                ["timeout"],
+                "Seconds to wait for the server to be ready (default 300)",
+                "timeout",
+                "SECONDS",
+                int,
+            ),
+        )
+    ),
+}
+DEFAULT_COMMAND_DESCRIPTIONS = {
+    "setup": "Setup the game server.\nThis will include processing the required settings,"
+    " downloading or copying any needed files and doing any setup task so that a"
+    " 'start' should work.\nIf noask is specified then this may fail if extra "
+    "game server dependant settings are not provided.",
+    "start": "Start the server.\nWith --wait, don't return until the server is ready for players. "
+    "Readiness is taken from the game's ready log line where the game module defines one, "
+    "otherwise from the same probe the query command uses. The time it took is saved in the "
+    "data store under 'readiness'.",
+    "stop": "Stop the server.",
+    "restart": "Stop the server and start it again. --wait works as for start.",
+    "kill": "Force-kill the server process immediately without a graceful shutdown.",
+    "activate": "Set the server to restart on reboots and start now unless --delay is specified.",
+    "deactivate": "Stop the server from restarting on reboots and stop now unless --delay is specified.",
+    "status": "Check the status of the server. At the minimum will report if the server is running.\n"
+    "With --check the command fails if the server isn't running.",
+    "send": "Send a line of text directly to the server console (for admin commands, not player chat).",
+    "message": "Message the server. By default sends the message to all users.",
+    "connect": "Connect to the server's console session.",
+    "logs": "Show the last lines of the server console log (default 50). Use -n to change the count.",
+    "dump": "Dump the servers data store.",
+    "set": "Set a parameter in data store to a new value.\nFor keys that index into lists the special entry 'APPEND' my be used to create a new "
+    "entry at the end of the list. Also for some keys value 'DELETE' is a value that causes the entry to be deleted.\n\n"
+    "Which values are changable is game module dependent",
+    "backup": "Backup the game server",
+    "restore": "Restore the game server from a backup.\n"
+    "With no argument, lists available backups with their index numbers.\n"
+    "Pass an index or the exact filename to restore that backup.\n"
+    "The server will be stopped first if it is running.",
+    "wipe": "Delete game-world data for supported server types.\n"
+    "The server must be stopped before wiping. "
+    "Which files are removed is defined by the game module.",
+    "query": "Query the game server to check whether it is responding.\n"
+    "Uses the Source A2S protocol when a query port is configured, "
+    "otherwise falls back to a TCP ping on the game port.",
+    "info": "Retrieve detailed server information: player count, map, version, etc.\n"
+    "For Minecraft servers uses the Server List Ping (SLP) protocol.\n"
+    "For Source/Steam servers uses A2S_INFO.  Falls back to a TCP ping.\n"
+    "Use -j / --json to emit the result as a JSON object.\n"
+    "Use -d / --detailed to include extended data (e.g. TeamSpeak 3 channel list).",
+    "ready": "Wait until the running server is ready for players, the same way start --wait does.\n"
+    "Fails if the server stops or isn't ready in time.",
+}
@@ -0,0 +1,176 @@
+"""Batched state of AlphaGSM's Docker containers for commands over many servers.
+
+Asking Docker whether each server's container is running costs one request
+(or one docker CLI run) per server. :func:`take_snapshot` instead lists every
+AlphaGSM container in a fixed number of calls. Containers are found by the
+``alphagsm.server`` label, which the container runtime puts on everything it
+creates, and by the ``alphagsm-`` name prefix used by containers created before
+the label existed.
+
+A multi-server command primes a snapshot (see :func:`prime_for_fleet`) before
+forking a child per server, so every child answers
+:meth:`server.runtime.ContainerRuntime.is_running` from it. Entries are only
+trusted for :data:`SNAPSHOT_TTL` seconds, and the runtime forgets a
+container's entry as soon as it starts, stops or sends input to it, so a child
+never acts on state it has just changed.
+"""
+
+import json
+import subprocess as sp
+import time
+from collections import namedtuple
+
+from utils.settings import settings
+
+__all__ = [
+    "CONTAINER_LABEL",
+    "ContainerSnapshot",
+    "ContainerState",
+    "cached_running",
+    "forget",
+    "prime",
+    "prime_for_fleet",
+    "take_snapshot",
+]
+
+#  keep in step with server.runtime.CONTAINER_LABEL
+CONTAINER_LABEL = "alphagsm.server"
+NAME_PREFIX = "alphagsm-"
+SNAPSHOT_TTL = 10.0
+
+ContainerState = namedtuple("ContainerState", ("name", "id", "running", "state"))
+ContainerState.__doc__ = """One container, *state* being Docker's word for it like "running" or "exited"."""
+
+#  the snapshot handed to this process by prime()
+_snapshot = None
+
+
+class ContainerSnapshot:
+    """The AlphaGSM containers that existed when the snapshot was taken."""
+
+    def __init__(self, states, taken=None):
+        self.states = {state.name: state for state in states}
+        self.taken = time.monotonic() if taken is None else taken
+        #  containers whose state has changed since, see forget()
+        self.forgotten = set()
+
+    def fresh(self):
+        """Return whether the snapshot is recent enough to be trusted."""
+        return time.monotonic() - self.taken < SNAPSHOT_TTL
+
+    def knows(self, name):
+        """Return whether the snapshot can say if container *name* exists.
+
+        Only containers with the label or the usual name prefix are listed, so
+        a missing container with any other name may simply not have been
+        looked for.
+        """
+        if name in self.forgotten:
+            return False
+        return name in self.states or name.startswith(NAME_PREFIX)
+
+    def forget(self, name):
+        """Stop answering for container *name*."""
+        self.states.pop(name, None)
+        self.forgotten.add(name)
+
+    def get(self, name):
+        """Return the :class:`ContainerState` of *name*, or ``None`` if it doesn't exist."""
+        return self.states.get(name)
+
+
+def _api_state(entry):
+    """Return the :class:`ContainerState` of a ``GET /containers/json`` entry."""
+    names = entry.get("Names") or ["/" + entry.get("Id", "")]
+    return ContainerState(names[0].lstrip("/"), entry.get("Id"), entry.get("State") == "running", entry.get("State"))
+
+
+def _inspect_state(info):
+    """Return the :class:`ContainerState` of ``docker inspect`` output for one container."""
+    state = info.get("State") or {}
+    return ContainerState(
+        str(info.get("Name", "")).lstrip("/"), info.get("Id"), bool(state.get("Running")), state.get("Status")
+    )
+
+
+def _filters():
+    """Return the docker list filters matching AlphaGSM's containers, one list call each."""
+    return ({"label": [CONTAINER_LABEL]}, {"name": [NAME_PREFIX]})
+
+
+def _snapshot_from_api(client):
+    """List the containers through the Docker Engine API."""
+    entries = {}
+    for filters in _filters():
+        for entry in client.list_containers(filters):
+            entries[entry.get("Id")] = entry
+    return ContainerSnapshot([_api_state(entry) for entry in entries.values()])
+
+
+def _snapshot_from_cli():
+    """List the containers with the docker CLI, in three runs whatever their number."""
+    ids = []
+    for filters in _filters():
+        ((key, (value,)),) = filters.items()
+        output = sp.check_output(
+            ["docker", "ps", "-aq", "--no-trunc", "--filter", "{}={}".format(key, value)],
+            stderr=sp.DEVNULL,
+            text=True,
+        )
+        ids.extend(line.strip() for line in output.splitlines() if line.strip())
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return ContainerSnapshot([])
+    output = sp.check_output(["docker", "inspect"] + ids, stderr=sp.DEVNULL, text=True)
+    return ContainerSnapshot([_inspect_state(info) for info in json.loads(output or "[]")])
+
+
+def take_snapshot():
+    """Return a :class:`ContainerSnapshot` of AlphaGSM's containers, or ``None`` if Docker can't be asked."""
+    from server import docker_api
+
+    client = docker_api.get_client()
+    if client is not None:
+        try:
+            return _snapshot_from_api(client)
+        except (docker_api.DockerUnavailable, docker_api.DockerAPIError):
+            pass
+    try:
+        return _snapshot_from_cli()
+    except (OSError, ValueError, sp.SubprocessError):
+        return None
+
+
+def prime(snapshot):
+    """Make *snapshot* the one this process (and children it forks) answers from."""
+    global _snapshot  # pylint: disable=global-statement
+    _snapshot = snapshot
+
+
+def prime_for_fleet():
+    """Take and prime a snapshot if servers may run in Docker. Returns the snapshot."""
+    backend = str(settings.user.getsection("runtime").get("backend", "process")).strip().lower()
+    if backend != "docker":
+        return None
+    snapshot = take_snapshot()
+    prime(snapshot)
+    return snapshot
+
+
+def cached_running(name):
+    """Return whether container *name* is running according to the primed snapshot.
+
+    Returns ``True`` or ``False`` if the container is running or stopped,
+    ``None`` if it doesn't exist, and raises KeyError if there is no fresh
+    snapshot that can tell.
+    """
+    if _snapshot is None or not _snapshot.fresh() or not _snapshot.knows(name):
+        raise KeyError(name)
+    state = _snapshot.get(name)
+    return None if state is None else state.running
+
+
+def forget(name):
+    """Drop container *name* from the primed snapshot, e.g. after changing its state."""
+    if _snapshot is not None:
+        _snapshot.forget(name)
@@ -1,9 +1,60 @@
-"""This module provides the data store used by servers."""
+"""This module provides the data store used by servers.
 
+Saves are atomic: the data is written to a temporary file next to the store,
+synced to disk and renamed over the old file, so a crash mid-save leaves either
+the old or the new contents and never a truncated file. Saving is also skipped
+when the data hasn't changed since it was last loaded or saved. Changes are
+found by comparing the serialised data, so changes made inside nested lists and
+dicts are noticed without callers having to mark the store as changed. Changes
+made while holding the store's exclusive lock are saved when the lock is
+released, so those callers don't have to call save themselves; changes made
+outside a lock are only written by :meth:`JSONDataStore.save`.
+
+Several alphagsm commands can work on the same server at once (e.g. a cron
+backup and an operator's set), so access to each store is serialised with an
+fcntl lock on a ``.<name>.json.lock`` file beside it. :meth:`JSONDataStore.save`
+takes the lock exclusively and, if another process saved in the meantime,
+merges this process's changes into what is on disk key by key instead of
+overwriting them. :meth:`JSONDataStore.locked_update` holds the lock around a whole
+read-modify-write. How long commands had to wait for locks is kept in
+:data:`lock_stats` and summarised by :func:`lock_summary`, which alphagsm prints
+after a command in debug mode or when it waited noticeably. Locking is skipped
+where fcntl isn't available or the lock file can't be created.
+"""
+
+import contextlib
 import os
 import json
+import sys
+import tempfile
+import time
 from collections.abc import MutableMapping
 
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+#  how long to wait for another command to release a store before giving up
+LOCK_TIMEOUT = 120
+#  say why a command is stalled once a lock has been waited on this long
+LOCK_WAIT_WARNING = 1.0
+#  totals over this process, updated every time a lock is taken
+lock_stats = {"acquired": 0, "contended": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+
+def lock_summary():
+    """Return a line describing this process's waits for data store locks.
+
+    Returns ``None`` if no lock has been taken.
+    """
+    if not lock_stats["acquired"]:
+        return None
+    return (
+        "Data store locks: {acquired} taken, {contended} waited for, "
+        "{wait_seconds:.2f} seconds waiting in total, {max_wait_seconds:.2f} at most"
+    ).format(**lock_stats)
+
 
 class DataError(Exception):
     """Thrown when there is an error reading or writing the data store"""
@@ -14,6 +65,9 @@ class DataError(Exception):
 class JSONDataStore(MutableMapping):
     """Data store that uses json as it's storage engine"""
 
+    #  called with (filename, data) after every save that wrote the file
+    save_listeners = []
+
     def __init__(self, filename, _dict=None):
         """setup the data storeage backed by the file 'filename'.
 
@@ -21,6 +75,12 @@ class JSONDataStore(MutableMapping):
         from the file else just used the provided data store.
         """
         self.filename = filename
+        #  the serialised data as it is on disk, None if it may differ
+        self._saved = None
+        #  (mtime_ns, size, inode) of the file when _saved was read or written
+        self._savedstat = None
+        #  (open lock file or None, exclusive) while this store holds the lock
+        self._lock = None
         if _dict is None:
             self._dict = {}
             self.load()
@@ -65,16 +125,209 @@ class JSONDataStore(MutableMapping):
             raise DataError("file doesn't exist: " + self.filename)
         with open(self.filename, "r") as fp:
             data = json.load(fp)
+            stat = os.fstat(fp.fileno())
         self._dict = data
+        self._saved = self._serialise()
+        self._savedstat = _statkey(stat)
+
+    @contextlib.contextmanager
+    def lock(self, exclusive=True, timeout=None):
+        """Hold the store's cross-process lock for the duration of a ``with`` block.
+
+        Shared locks can be held by several processes at once, an exclusive
+        lock by only one. Nested use by the same store is allowed. When the
+        outermost exclusive block ends without an exception, changes to a store
+        that was loaded or saved before are saved. Raises DataError if the lock
+        isn't free within *timeout* seconds (default :data:`LOCK_TIMEOUT`).
+        """
+        if self._lock is not None:
+            fp, held_exclusive = self._lock
+            upgrade = exclusive and not held_exclusive and fp is not None
+            if upgrade:
+                _acquire(fp, True, self.filename, timeout)
+            self._lock = (fp, held_exclusive or exclusive)
+            try:
+                yield self
+            finally:
+                if upgrade:
+                    fcntl.flock(fp, fcntl.LOCK_SH)
+                self._lock = (fp, held_exclusive)
+            return
+        fp = _open_lockfile(self.filename)
+        try:
+            if fp is not None:
+                _acquire(fp, exclusive, self.filename, timeout)
+            self._lock = (fp, exclusive)
+            yield self
+            if exclusive and self._saved is not None and self.dirty():
+                self.save()
+        finally:
+            self._lock = None
+            if fp is not None:
+                fp.close()  # releases the lock
+
+    @contextlib.contextmanager
+    def locked_update(self, timeout=None):
+        """Read-modify-write the store under an exclusive lock.
+
+        The data is reloaded from disk when the block starts and saved when it
+        ends without an exception, with no other command able to save in
+        between.
+        """
+        with self.lock(True, timeout):
+            self.load()
+            yield self
+            self.save()
+
+    def _serialise(self):
+        """Return the data as it is written to the file."""
+        return json.dumps(self._dict)
+
+    def dirty(self):
+        """Return whether the data has changed since it was last loaded or saved."""
+        return self._saved is None or self._serialise() != self._saved
 
     def save(self):
-        """Save the data to the data store's file."""
-        with open(self.filename, "w") as fp:
-            json.dump(self._dict, fp)
+        """Save the data to the data store's file if it has changed.
+
+        The file is replaced atomically, see the module documentation.
+        """
+        text = self._serialise()
+        if text == self._saved:
+            return
+        with self.lock(True):
+            if self._saved is not None and self._changed_on_disk():
+                self._merge_from_disk()
+                text = self._serialise()
+            _atomic_write(self.filename, text)
+            self._saved = text
+            self._savedstat = _statkey(os.stat(self.filename))
+        for listener in self.save_listeners:
+            listener(self.filename, self._dict)
+
+    def _changed_on_disk(self):
+        """Return whether another process has written the file since we read or wrote it."""
+        try:
+            return _statkey(os.stat(self.filename)) != self._savedstat
+        except OSError:
+            return False
+
+    def _merge_from_disk(self):
+        """Take in changes saved by another process to keys this store hasn't changed."""
+        try:
+            with open(self.filename, "r") as fp:
+                disk = json.load(fp)
+        except (OSError, ValueError):
+            return
+        base = json.loads(self._saved)
+        for key in set(base) | set(disk):
+            if self._dict.get(key, _MISSING) != base.get(key, _MISSING):
+                continue  # changed here, this save wins
+            if key in disk:
+                self._dict[key] = disk[key]
+            else:
+                self._dict.pop(key, None)
 
     def prettydump(self):
         """A pretty formated string version of the data for showing to users."""
         return json.dumps(self._dict, indent=2, separators=(",", ": "), sort_keys=True)
 
 
+_MISSING = object()
+
+
+def _statkey(stat):
+    """Return what identifies one version of a store's file."""
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _open_lockfile(filename):
+    """Open the lock file of the store *filename*, or return None if locking isn't possible."""
+    if fcntl is None:
+        return None
+    directory, name = os.path.split(os.path.abspath(filename))
+    try:
+        return open(os.path.join(directory, "." + name + ".lock"), "a")
+    except OSError:
+        return None
+
+
+def _acquire(fp, exclusive, filename, timeout=None):
+    """Take the lock on *fp*, waiting for up to *timeout* seconds, and record the wait."""
+    mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+    if timeout is None:
+        timeout = LOCK_TIMEOUT
+    start = time.monotonic()
+    contended = warned = False
+    delay = 0.01
+    while True:
+        try:
+            fcntl.flock(fp, mode | fcntl.LOCK_NB)
+            break
+        except BlockingIOError:
+            waited = time.monotonic() - start
+            if waited >= timeout:
+                raise DataError(
+                    "Timed out after {:.0f} seconds waiting for another command to release {}".format(
+                        waited, filename
+                    )
+                )
+            if waited >= LOCK_WAIT_WARNING and not warned:
+                print("Waiting for another command to finish with", filename, file=sys.stderr)
+                warned = True
+            contended = True
+            time.sleep(min(delay, timeout - waited))
+            delay = min(delay * 2, 0.5)
+    waited = time.monotonic() - start
+    lock_stats["acquired"] += 1
+    if contended:
+        lock_stats["contended"] += 1
+        lock_stats["wait_seconds"] += waited
+        lock_stats["max_wait_seconds"] = max(lock_stats["max_wait_seconds"], waited)
+
+
+def _file_mode(filename):
+    """Return the permissions a replacement for *filename* should have."""
+    try:
+        return os.stat(filename).st_mode & 0o7777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def _atomic_write(filename, text):
+    """Replace *filename* with *text* so readers only ever see a whole file."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    mode = _file_mode(filename)
+    #  not ending in .json so a left over file is never taken for a server
+    fd, tmpname = tempfile.mkstemp(
+        dir=directory, prefix="." + os.path.basename(filename) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as fp:
+            fp.write(text)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.chmod(tmpname, mode)
+        os.replace(tmpname, filename)
+    except BaseException:
+        try:
+            os.remove(tmpname)
+        except OSError:
+            pass
+        raise
+    #  make the rename itself durable
+    try:
+        dirfd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dirfd)
+    except OSError:
+        pass
+    finally:
+        os.close(dirfd)
+
+
 __all__ = ["DataError", "JSONDataStore"]
@@ -0,0 +1,557 @@
+"""A small client for the Docker Engine API on the daemon's Unix socket.
+
+Running the docker CLI costs a fork/exec and a Go program start-up on every
+call. :class:`DockerClient` instead speaks HTTP to the daemon over its Unix
+socket and keeps the connection open between requests. It only covers the
+endpoints the container runtime (see :class:`server.runtime.ContainerRuntime`)
+needs.
+
+:func:`get_client` returns ``None`` when the API shouldn't be used, so callers
+use the CLI instead. That is the case when the ``[runtime] docker_api`` setting
+is ``cli``, when the daemon isn't on a ``unix://`` address or when the socket
+doesn't exist. Like the CLI, the address is taken from DOCKER_HOST, or else
+from the active ``docker context`` (DOCKER_CONTEXT or the ``currentContext``
+of the CLI's ``config.json``). A context whose endpoint can't be read is left
+to the CLI. Failing to reach the daemon raises :class:`DockerUnavailable`,
+which callers also answer by using the CLI. Errors reported by the daemon raise
+:class:`DockerAPIError`.
+
+Console input is written to a container's stdin over an attach connection
+(see :class:`ConsoleAttachment`) that the client holds open for the rest of the
+process, so a burst of console commands costs one write each rather than an
+exec and a shell per line.
+"""
+
+import hashlib
+import threading
+
+import http.client
+import json
+import os
+import select
+import socket
+import struct
+from urllib.parse import quote, urlencode
+
+from utils.settings import settings
+
+__all__ = [
+    "ConsoleAttachment",
+    "DockerAPIError",
+    "DockerClient",
+    "DockerUnavailable",
+    "console_attach_enabled",
+    "container_config",
+    "get_client",
+    "socket_path",
+]
+
+DEFAULT_SOCKET = "/var/run/docker.sock"
+#  seconds to wait for an answer to a request that doesn't block on the container
+REQUEST_TIMEOUT = 60
+
+#  .client holds the (pid, socket path, client) get_client hands out in each thread
+_local = threading.local()
+
+
+class DockerUnavailable(Exception):
+    """The daemon couldn't be reached, or didn't answer in time."""
+
+    def __init__(self, message, timed_out=False):
+        super().__init__(message)
+        self.timed_out = timed_out
+
+
+class DockerAPIError(Exception):
+    """The daemon answered a request with an error status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """An HTTP connection to a Unix socket."""
+
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+def _quote(name):
+    """Quote a container or image name for use in a request path."""
+    return quote(str(name), safe="/:@")
+
+
+def _demux(data):
+    """Split a multiplexed stdout/stderr stream into ``[(stream, bytes)]``.
+
+    Streams of containers with a TTY aren't multiplexed and come back as a
+    single stdout chunk.
+    """
+    chunks = []
+    offset = 0
+    while offset < len(data):
+        header = data[offset : offset + 8]
+        if len(header) < 8 or header[0] not in (0, 1, 2) or header[1:4] != b"\0\0\0":
+            return [(1, data)]
+        (size,) = struct.unpack(">I", header[4:])
+        chunks.append((2 if header[0] == 2 else 1, data[offset + 8 : offset + 8 + size]))
+        offset += 8 + size
+    return chunks
+
+
+class ConsoleAttachment:
+    """A container's stdin held open through ``POST /containers/{id}/attach``.
+
+    :meth:`send` writes straight to the stdin of the container's main process,
+    which is only open if the container was created with ``stdin_open``. Only
+    stdin is attached, so Docker has no output to hold for the connection and
+    nothing has to read from it. The attachment lasts as long as the
+    :class:`DockerClient` holding it, i.e. until the command's process exits.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._closed = False
+
+    @property
+    def closed(self):
+        """Whether the console was closed, by :meth:`close` or by Docker (e.g. on a restart)."""
+        if not self._closed:
+            try:
+                if not select.select([self.sock], [], [], 0)[0]:
+                    return False
+                data = self.sock.recv(1, socket.MSG_PEEK)
+            except OSError:
+                data = b""
+            self._closed = not data
+        return self._closed
+
+    def send(self, data):
+        """Write *data* to the container's stdin. Raises OSError if the console has gone."""
+        if self.closed:
+            raise BrokenPipeError("The container's console was closed")
+        self.sock.sendall(data)
+
+    def close(self):
+        """Close the connection. The container's stdin stays open."""
+        self._closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def _port_bindings(ports):
+    """Return the ExposedPorts and PortBindings of a container spec's ports."""
+    exposed = {}
+    bindings = {}
+    for port in ports:
+        if isinstance(port, dict):
+            host_ip, host, container = "", port["host"], port["container"]
+            proto = port.get("protocol", "tcp")
+        else:
+            mapping, _sep, proto = str(port).partition("/")
+            parts = mapping.split(":")
+            container = parts[-1]
+            host = parts[-2] if len(parts) > 1 else ""
+            host_ip = ":".join(parts[:-2])
+        key = "{}/{}".format(container, proto or "tcp")
+        exposed[key] = {}
+        bindings.setdefault(key, []).append({"HostIp": host_ip, "HostPort": str(host)})
+    return exposed, bindings
+
+
+def container_config(spec, labels=None):
+    """Return the create request body that ``docker run`` would send for *spec*."""
+    binds = []
+    for mount in spec.get("mounts", ()):
+        if isinstance(mount, dict):
+            mount = "{}:{}:{}".format(mount["source"], mount["target"], mount.get("mode", "rw"))
+        binds.append(str(mount))
+    #  the host network has nothing to publish, as docker run drops -p there too
+    host_network = str(spec.get("network_mode") or "").strip().lower() == "host"
+    exposed, bindings = _port_bindings(() if host_network else spec.get("ports", ()))
+    config = {
+        "Image": spec["image"],
+        "Env": ["{}={}".format(key, value) for key, value in sorted((spec.get("env") or {}).items())],
+        "OpenStdin": bool(spec.get("stdin_open", False)),
+        "Tty": bool(spec.get("tty", False)),
+        "ExposedPorts": exposed,
+        "Labels": dict(labels or {}),
+        "HostConfig": {"Binds": binds, "PortBindings": bindings},
+    }
+    if spec.get("command"):
+        config["Cmd"] = list(spec["command"])
+    if spec.get("working_dir"):
+        config["WorkingDir"] = spec["working_dir"]
+    if spec.get("network_mode"):
+        config["HostConfig"]["NetworkMode"] = spec["network_mode"]
+    return config
+
+
+class DockerClient:
+    """Docker Engine API requests over one reused Unix socket connection."""
+
+    def __init__(self, path=DEFAULT_SOCKET, timeout=REQUEST_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._conn = None
+        #  container name -> ConsoleAttachment held open by console()
+        self._consoles = {}
+
+    def close(self):
+        """Close the connection and any held consoles. The next request opens a new one."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        for console in self._consoles.values():
+            console.close()
+        self._consoles.clear()
+
+    def request(self, method, path, query=None, body=None, timeout=None):
+        """Send a request and return ``(status, body bytes)``.
+
+        Raises DockerAPIError for error statuses other than 404, which is
+        returned so that callers can treat a missing object as an answer.
+        """
+        url = path + ("?" + urlencode(query) if query else "")
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        timeout = self.timeout if timeout is None else timeout
+        for attempt in (1, 2):
+            reused = self._conn is not None and self._conn.sock is not None
+            if self._conn is None:
+                self._conn = _UnixHTTPConnection(self.path, timeout)
+            self._conn.timeout = timeout
+            if self._conn.sock is not None:
+                self._conn.sock.settimeout(timeout)
+            try:
+                self._conn.request(method, url, body=payload, headers=headers)
+                response = self._conn.getresponse()
+                data = response.read()
+            except socket.timeout as ex:
+                self.close()
+                raise DockerUnavailable("Timed out talking to docker", timed_out=True) from ex
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as ex:
+                self.close()
+                if reused and attempt == 1:
+                    continue  # the daemon closed the idle connection, try a fresh one
+                raise DockerUnavailable("Lost the connection to docker: " + str(ex)) from ex
+            except (OSError, http.client.HTTPException) as ex:
+                self.close()
+                raise DockerUnavailable("Can't talk to docker at " + self.path + ": " + str(ex)) from ex
+            break
+        if response.status >= 400 and response.status != 404:
+            raise DockerAPIError(response.status, self._error_message(response.status, data))
+        return response.status, data
+
+    @staticmethod
+    def _error_message(status, data):
+        """Return the message of an error response."""
+        try:
+            return json.loads(data.decode("utf-8"))["message"]
+        except (ValueError, KeyError, TypeError):
+            return "Docker API request failed with status {}".format(status)
+
+    def _json(self, method, path, query=None, body=None, timeout=None):
+        """Send a request and return ``(status, decoded JSON body or None)``."""
+        status, data = self.request(method, path, query, body, timeout)
+        try:
+            return status, json.loads(data.decode("utf-8")) if data else None
+        except ValueError:
+            return status, None
+
+    def _expect_found(self, status, data, what):
+        """Raise DockerAPIError for a 404 answer about *what*."""
+        if status == 404:
+            raise DockerAPIError(404, self._error_message(404, data) if data else "No such " + what)
+
+    def inspect_container(self, name):
+        """Return the inspect data of container *name*, or ``None`` if there isn't one."""
+        status, info = self._json("GET", "/containers/{}/json".format(_quote(name)))
+        return None if status == 404 else info
+
+    def container_running(self, name):
+        """Return ``True``/``False`` if container *name* exists, else ``None``."""
+        info = self.inspect_container(name)
+        if info is None:
+            return None
+        return bool((info.get("State") or {}).get("Running"))
+
+    def list_containers(self, filters=None):
+        """Return the ``docker ps -a`` entries of the containers matching *filters*."""
+        query = {"all": 1}
+        if filters:
+            query["filters"] = json.dumps(filters)
+        _status, listed = self._json("GET", "/containers/json", query)
+        return listed or []
+
+    def image_id(self, image):
+        """Return the id of *image* if it is available locally, else ``None``."""
+        status, info = self._json("GET", "/images/{}/json".format(_quote(image)))
+        if status == 404:
+            return None
+        return (info or {}).get("Id") or image
+
+    def image_exists(self, image):
+        """Return whether *image* is available locally."""
+        return self.image_id(image) is not None
+
+    def pull_image(self, image):
+        """Pull *image*, raising DockerUnavailable if the daemon can't.
+
+        Pulls that need registry credentials fail here, so callers fall back
+        to the CLI, which has them.
+        """
+        status, data = self.request(
+            "POST", "/images/create", {"fromImage": image}, timeout=max(self.timeout, 3600)
+        )
+        for line in data.decode("utf-8", "replace").splitlines():
+            try:
+                error = json.loads(line).get("error")
+            except (ValueError, AttributeError):
+                continue
+            if error:
+                raise DockerUnavailable("Pulling " + image + " failed: " + error)
+        if status == 404:
+            raise DockerUnavailable("Pulling " + image + " failed: not found")
+
+    def run_container(self, spec, labels=None):
+        """Create and start a container for a runtime container spec, like ``docker run -d``."""
+        name = spec["container_name"]
+        config = container_config(spec, labels)
+        status, data = self.request("POST", "/containers/create", {"name": name}, config)
+        if status == 404:
+            self.pull_image(spec["image"])
+            status, data = self.request("POST", "/containers/create", {"name": name}, config)
+            self._expect_found(status, data, "image: " + spec["image"])
+        container_id = json.loads(data.decode("utf-8"))["Id"]
+        status, data = self.request("POST", "/containers/{}/start".format(container_id))
+        self._expect_found(status, data, "container: " + name)
+        return container_id
+
+    def start_container(self, name):
+        """Start the existing container *name*, like ``docker start``."""
+        status, data = self.request("POST", "/containers/{}/start".format(_quote(name)))
+        self._expect_found(status, data, "container: " + name)
+
+    def stop_container(self, name, timeout=10):
+        """Stop container *name*, killing it after *timeout* seconds."""
+        status, data = self.request(
+            "POST",
+            "/containers/{}/stop".format(_quote(name)),
+            {"t": timeout},
+            timeout=timeout + self.timeout,
+        )
+        self._expect_found(status, data, "container: " + name)
+
+    def remove_container(self, name, force=True):
+        """Remove container *name*, like ``docker rm -f``."""
+        status, data = self.request(
+            "DELETE", "/containers/{}".format(_quote(name)), {"force": 1 if force else 0}
+        )
+        self._expect_found(status, data, "container: " + name)
+
+    def wait_container(self, name, timeout):
+        """Wait up to *timeout* seconds for container *name* to stop and return whether it has."""
+        try:
+            status, _data = self.request(
+                "POST", "/containers/{}/wait".format(_quote(name)), timeout=max(timeout, 0.001)
+            )
+        except DockerUnavailable as ex:
+            if ex.timed_out:
+                return False
+            raise
+        return True  # stopped, or already gone (404)
+
+    def exec_run(self, name, command):
+        """Run *command* in container *name* and return ``(exit code, output bytes)``."""
+        status, created = self._json(
+            "POST",
+            "/containers/{}/exec".format(_quote(name)),
+            body={"Cmd": list(command), "AttachStdout": True, "AttachStderr": True},
+        )
+        self._expect_found(status, b"", "container: " + name)
+        exec_id = created["Id"]
+        _status, data = self.request(
+            "POST", "/exec/{}/start".format(exec_id), body={"Detach": False, "Tty": False}
+        )
+        _status, info = self._json("GET", "/exec/{}/json".format(exec_id))
+        output = b"".join(chunk for _stream, chunk in _demux(data))
+        return (info or {}).get("ExitCode"), output
+
+    def attach(self, name):
+        """Attach to container *name*'s stdin on a connection of its own.
+
+        Returns a :class:`ConsoleAttachment`, or ``None`` if there is no such
+        container.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        request = (
+            "POST /containers/{}/attach?stream=1&stdin=1&stdout=0&stderr=0 HTTP/1.1\r\n"
+            "Host: docker\r\nConnection: Upgrade\r\nUpgrade: tcp\r\nContent-Length: 0\r\n\r\n"
+        ).format(_quote(name))
+        try:
+            sock.connect(self.path)
+            sock.sendall(request.encode("ascii"))
+            head = b""
+            while b"\r\n\r\n" not in head:
+                data = sock.recv(4096)
+                if not data:
+                    raise ConnectionResetError("docker closed the attach connection")
+                head += data
+        except socket.timeout as ex:
+            sock.close()
+            raise DockerUnavailable("Timed out attaching to " + name, timed_out=True) from ex
+        except OSError as ex:
+            sock.close()
+            raise DockerUnavailable("Can't attach to " + name + ": " + str(ex)) from ex
+        head, _sep, rest = head.partition(b"\r\n\r\n")
+        try:
+            status = int(head.split(b" ", 2)[1])
+        except (IndexError, ValueError):
+            status = 500
+        if status not in (101, 200):
+            sock.close()
+            if status == 404:
+                return None
+            raise DockerAPIError(status, self._error_message(status, rest))
+        return ConsoleAttachment(sock)
+
+    def console(self, name):
+        """Return the held :class:`ConsoleAttachment` of container *name*, attaching if needed.
+
+        Returns ``None`` if there is no such container.
+        """
+        console = self._consoles.get(name)
+        if console is None or console.closed:
+            console = self.attach(name)
+            if console is None:
+                self._consoles.pop(name, None)
+                return None
+            self._consoles[name] = console
+        return console
+
+    def send_console(self, name, data):
+        """Write *data* to container *name*'s stdin over its held console.
+
+        Returns ``False`` if there is no such container. A console the
+        container closed (e.g. because it restarted) is attached again once.
+        """
+        for attempt in (1, 2):
+            console = self.console(name)
+            if console is None:
+                return False
+            try:
+                console.send(data)
+                return True
+            except OSError as ex:
+                console.close()
+                self._consoles.pop(name, None)
+                if attempt == 2:
+                    raise DockerUnavailable("Lost the console of " + name + ": " + str(ex)) from ex
+        return False
+
+    def forget_console(self, name):
+        """Close the held console of container *name*, if there is one."""
+        console = self._consoles.pop(name, None)
+        if console is not None:
+            console.close()
+
+    def logs(self, name, tail=50):
+        """Return the last *tail* lines of container *name*'s output as ``[(stream, bytes)]``.
+
+        *stream* is 1 for stdout and 2 for stderr.
+        """
+        status, data = self.request(
+            "GET",
+            "/containers/{}/logs".format(_quote(name)),
+            {"stdout": 1, "stderr": 1, "tail": tail},
+        )
+        self._expect_found(status, data, "container: " + name)
+        return _demux(data)
+
+
+def _context_host():
+    """Return the daemon address of the active docker context.
+
+    Returns ``""`` for the default context, which uses :data:`DEFAULT_SOCKET`,
+    and ``None`` if the context's endpoint can't be read.
+    """
+    config_dir = os.environ.get("DOCKER_CONFIG") or os.path.join(os.path.expanduser("~"), ".docker")
+    name = os.environ.get("DOCKER_CONTEXT", "").strip()
+    if not name:
+        try:
+            with open(os.path.join(config_dir, "config.json")) as fp:
+                name = str(json.load(fp).get("currentContext") or "").strip()
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError):
+            return None
+    if not name or name == "default":
+        return ""
+    #  the CLI keeps each context's metadata in a directory named by the sha256 of its name
+    meta = os.path.join(
+        config_dir, "contexts", "meta", hashlib.sha256(name.encode("utf-8")).hexdigest(), "meta.json"
+    )
+    try:
+        with open(meta) as fp:
+            host = json.load(fp)["Endpoints"]["docker"]["Host"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return host.strip() if isinstance(host, str) and host.strip() else None
+
+
+def socket_path():
+    """Return the daemon socket the API client should use, or ``None`` to use the CLI."""
+    mode = str(settings.user.getsection("runtime").get("docker_api", "auto")).strip().lower()
+    if mode in ("cli", "off", "no", "false", "0"):
+        return None
+    host = os.environ.get("DOCKER_HOST", "").strip()
+    if not host:
+        host = _context_host()
+        if host is None:
+            return None
+    if host and not host.startswith("unix://"):
+        return None
+    path = host[len("unix://") :] if host else DEFAULT_SOCKET
+    return path if os.path.exists(path) else None
+
+
+def console_attach_enabled():
+    """Return whether console input should go over a held attach connection."""
+    value = str(settings.user.getsection("runtime").get("console_attach", "yes")).strip().lower()
+    return value not in ("no", "off", "false", "0")
+
+
+def get_client():
+    """Return this thread's :class:`DockerClient`, or ``None`` to use the docker CLI.
+
+    A client's connection can only carry one request at a time, so each
+    thread (e.g. of ``images prewarm``) gets a client of its own.
+    """
+    path = socket_path()
+    if path is None:
+        return None
+    pid, client_path, client = getattr(_local, "client", (None, None, None))
+    if client is None or pid != os.getpid() or client_path != path:
+        client = DockerClient(path)
+        _local.client = (os.getpid(), path, client)
+    return client
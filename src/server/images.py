@@ -0,0 +1,129 @@
+"""Records of the runtime images docker servers use.
+
+Before starting a container the docker runtime makes sure its image is there
+(see :meth:`server.runtime.ContainerRuntime.ensure_image`). AlphaGSM's default
+runtime family images are built from the Dockerfiles in the repository when
+they are missing, which can take minutes on a fresh machine. That is done under
+a per-image lock (:func:`image_lock`), so servers started at the same time wait
+for a single build rather than each running their own.
+
+The id of every image found, built or pulled this way is recorded in
+``.runtime-images`` in the data directory, and later starts take the record's
+word for it instead of asking Docker. If creating a container then fails the
+record is dropped (:func:`forget`), so a removed image is noticed on the next
+start.
+
+``alphagsm SERVER... images prewarm`` (see :mod:`core.images`) does all of this
+ahead of time for the images the fleet's servers use.
+"""
+
+import hashlib
+import os
+import sys
+import time
+
+from utils.settings import settings
+
+from . import data as data_module
+
+__all__ = [
+    "IMAGES_FILENAME",
+    "forget",
+    "image_lock",
+    "record",
+    "recorded_id",
+]
+
+IMAGES_FILENAME = ".runtime-images"
+#  how long a start waits for another command to finish building or pulling an image
+BUILD_LOCK_TIMEOUT = 3600
+DATAPATH = os.path.expanduser(
+    settings.user.getsection("server").get(
+        "datapath",
+        os.path.join(
+            settings.user.getsection("core").get("alphagsm_path", "~/.alphagsm"),
+            "conf",
+        ),
+    )
+)
+
+
+def _datapath():
+    """Return the data directory of this user's servers, honoring server module overrides."""
+
+    server_module = sys.modules.get("server.server")
+    if server_module is not None:
+        return getattr(server_module, "DATAPATH", DATAPATH)
+    return DATAPATH
+
+
+def _store(datapath):
+    """Return the (unloaded) data store holding the image records of *datapath*."""
+
+    return data_module.JSONDataStore(os.path.join(datapath, IMAGES_FILENAME), {})
+
+
+def _load(store):
+    """Load *store*, leaving it empty if there are no records yet."""
+
+    try:
+        store.load()
+    except data_module.DataError:
+        pass
+
+
+def recorded_id(image, datapath=None):
+    """Return the recorded id of *image*, or ``None`` if it hasn't been recorded."""
+
+    datapath = _datapath() if datapath is None else datapath
+    store = _store(datapath)
+    try:
+        _load(store)
+    except (OSError, ValueError):
+        return None
+    entry = store.get(image)
+    return entry.get("id") if isinstance(entry, dict) else None
+
+
+def _change(datapath, change):
+    """Apply *change* to the records of *datapath* under the store's lock."""
+
+    if not os.path.isdir(datapath):
+        return
+    store = _store(datapath)
+    try:
+        with store.lock():
+            _load(store)
+            change(store)
+            store.save()
+    except (data_module.DataError, OSError, ValueError):
+        pass  # only a cache, the next start asks Docker again
+
+
+def record(image, image_id, how, datapath=None):
+    """Record that *image* is available locally as *image_id*."""
+
+    def change(store):
+        store[image] = {"id": image_id, "how": how, "recorded": int(time.time())}
+
+    _change(_datapath() if datapath is None else datapath, change)
+
+
+def forget(image, datapath=None):
+    """Drop the record of *image*, so the next start checks for it again."""
+
+    datapath = _datapath() if datapath is None else datapath
+    if recorded_id(image, datapath) is not None:
+        _change(datapath, lambda store: store.pop(image, None))
+
+
+def image_lock(image, datapath=None):
+    """Return a context manager holding the cross-process lock of *image*.
+
+    Waits up to :data:`BUILD_LOCK_TIMEOUT` seconds for another command to
+    finish with the image. Does no locking if the data directory doesn't exist.
+    """
+
+    datapath = _datapath() if datapath is None else datapath
+    name = "runtime-image-" + hashlib.sha1(image.encode("utf-8")).hexdigest()[:16]
+    return data_module.JSONDataStore(os.path.join(datapath, name), {}).lock(True, BUILD_LOCK_TIMEOUT)
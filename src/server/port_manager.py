@@ -5,15 +5,21 @@ from __future__ import annotations
 import errno
 import copy
 from dataclasses import dataclass
+import hashlib
 from importlib import import_module
+from importlib.util import find_spec
+import json
 import os
 import socket
 import sys
+import time
 from types import SimpleNamespace
+import uuid
 
 from utils.settings import settings
 
 from . import data as data_module
+from . import registry
 from .errors import ServerError
 from . import runtime as runtime_module
 
@@ -34,6 +40,11 @@ DATAPATH = os.path.expanduser(
 SERVERMODULEPACKAGE = settings.system.getsection("server").get(
     "servermodulespackage", "gamemodules."
 )
+#  bump when collect_claim_set changes what it claims, so cached claims are redone
+CLAIMS_VERSION = 2
+#  no .json suffix, so it isn't mistaken for a server's data store
+LEASES_FILENAME = ".port-leases"
+LEASE_SECONDS = 600
 
 
 @dataclass(frozen=True)
@@ -75,6 +86,17 @@ class PortShiftRecommendation:
     values: dict[str, int]
 
 
+@dataclass(frozen=True)
+class PortLease:
+    """A port set reserved by :func:`allocate_port_blocks` until *expires*."""
+
+    lease_id: str
+    owner: str | None
+    offset: int
+    values: dict[str, int]
+    expires: float
+
+
 def is_port_key(key):
     """Return whether *key* looks like a port-bearing datastore field."""
 
@@ -257,6 +279,19 @@ def _runtime_port_endpoints(server, module, payload, allow_stale_saved_ports):
 
     endpoints = []
     port_specs = (spec or {}).get("ports", ()) if spec is not None else ()
+    if port_specs and runtime_module.uses_host_network(spec):
+        #  nothing is published: the game binds its container ports on the host itself
+        for entry in port_specs:
+            if not isinstance(entry, dict):
+                continue
+            port = _normalize_port_value(entry.get("container", entry.get("host")))
+            if port is None:
+                continue
+            for scope, ip in (("internal", payload["internal_ip"]), ("external", payload["external_ip"])):
+                candidate = PortEndpoint(scope, ip, port, "runtime:ports", derived=True, shiftable=False)
+                if not _endpoint_is_covered(endpoints, candidate):
+                    _add_endpoint(endpoints, candidate)
+        return endpoints
     if port_specs:
         for entry in port_specs:
             if not isinstance(entry, dict):
@@ -363,6 +398,15 @@ def collect_claim_set(server, overrides=None):
     )
 
 
+def _managed_server(datapath, record):
+    """Return a server-like namespace for a registry record."""
+
+    path = os.path.join(datapath, record.name + ".json")
+    store = data_module.JSONDataStore(path, record.data)
+    module = _load_server_module(SimpleNamespace(data=store, module=None))
+    return SimpleNamespace(name=record.name, data=store, module=module)
+
+
 def iter_managed_servers(server):
     """Yield other AlphaGSM servers from the datastore directory."""
 
@@ -370,19 +414,149 @@ def iter_managed_servers(server):
     if not datapath or not os.path.isdir(datapath):
         return
 
-    for filename in sorted(os.listdir(datapath)):
-        if not filename.endswith(".json"):
-            continue
-        other_name = filename[:-5]
-        if other_name == getattr(server, "name", None):
-            continue
-        path = os.path.join(datapath, filename)
-        try:
-            store = data_module.JSONDataStore(path)
-        except Exception:
+    for record in registry.records(datapath):
+        if record.name == getattr(server, "name", None):
             continue
-        module = _load_server_module(SimpleNamespace(data=store, module=None))
-        yield SimpleNamespace(name=other_name, data=store, module=module)
+        yield _managed_server(datapath, record)
+
+
+def _module_sources_fingerprint():
+    """Return what identifies the current game module sources.
+
+    Covers the path, size and modification time of every Python file in the
+    game module package, so editing or replacing any module changes it.
+    """
+
+    try:
+        spec = find_spec(SERVERMODULEPACKAGE.rstrip("."))
+    except (ImportError, ValueError):
+        spec = None
+    digest = hashlib.sha1()
+    for root in (spec.submodule_search_locations or ()) if spec is not None else ():
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if not filename.endswith(".py"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                digest.update("{}\0{}\0{}\n".format(path, stat.st_size, stat.st_mtime_ns).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def claims_key():
+    """Return the key the registry caches claims under.
+
+    Cached claims are only reused while everything :func:`collect_claim_set`
+    depends on besides the servers' own data stays the same: its
+    :data:`CLAIMS_VERSION`, the configured runtime backend (which decides the
+    container specs whose ports are claimed), the game module package and the
+    game modules' sources (whose port hooks are called).
+    """
+
+    backend = str(settings.user.getsection("runtime").get("backend", "process")).strip().lower()
+    parts = [CLAIMS_VERSION, backend, SERVERMODULEPACKAGE, _module_sources_fingerprint()]
+    return hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def managed_claims(server):
+    """Return {name: endpoints} for the other AlphaGSM servers.
+
+    The claims come from the registry's claim cache, so only servers whose
+    data changed since the last call, or all of them after :func:`claims_key`
+    changed, have :func:`collect_claim_set` run.
+    """
+
+    datapath = _managed_server_datapath()
+    if not datapath or not os.path.isdir(datapath):
+        return {}
+
+    def compute(record):
+        claim_set = collect_claim_set(_managed_server(datapath, record))
+        return [
+            (e.scope, e.ip, e.port, e.source_key, e.derived, e.shiftable)
+            for e in claim_set.endpoints
+        ]
+
+    cached = registry.claims(datapath, claims_key(), compute)
+    return {
+        name: [PortEndpoint(*row) for row in rows]
+        for name, rows in cached.items()
+        if name != getattr(server, "name", None)
+    }
+
+
+class ClaimIndex:
+    """The endpoints claimed by other servers, keyed by (scope, ip, port).
+
+    :meth:`lookup` finds the claims that overlap an endpoint with a few hash
+    lookups, honouring wildcard addresses in the internal scope.
+    """
+
+    def __init__(self, claims=()):
+        """Index *claims*, a {server name: endpoints} mapping."""
+
+        #  (scope, port) -> {ip: [(server name, endpoint)]}
+        self._claims = {}
+        for name, endpoints in dict(claims).items():
+            for endpoint in endpoints:
+                self.add(name, endpoint)
+
+    @classmethod
+    def for_server(cls, server):
+        """Return the index of every managed server's claims except *server*'s own.
+
+        Port sets leased to other owners count as claimed too.
+        """
+
+        index = cls(managed_claims(server))
+        datapath = _managed_server_datapath()
+        if datapath and os.path.isfile(os.path.join(datapath, LEASES_FILENAME)):
+            store = _lease_store(datapath)
+            try:
+                store.load()
+            except (data_module.DataError, OSError, ValueError):
+                return index
+            index.add_leases(store, exclude_owner=getattr(server, "name", None))
+        return index
+
+    def add_leases(self, store, exclude_owner=None, now=None):
+        """Index the unexpired leases in the lease *store*, except *exclude_owner*'s."""
+
+        now = time.time() if now is None else now
+        for lease_id, lease in store.get("leases", {}).items():
+            if lease.get("expires", 0) <= now:
+                continue
+            if exclude_owner is not None and lease.get("owner") == exclude_owner:
+                continue
+            for scope, ip, port in lease.get("endpoints", ()):
+                self.add("lease:" + lease_id, PortEndpoint(scope, ip, port, "lease"))
+
+    def add(self, server_name, endpoint):
+        """Record that *server_name* claims *endpoint*."""
+
+        by_ip = self._claims.setdefault((endpoint.scope, endpoint.port), {})
+        by_ip.setdefault(normalize_hosted_ip(endpoint.ip), []).append((server_name, endpoint))
+
+    def lookup(self, endpoint):
+        """Return the (server name, endpoint) claims that conflict with *endpoint*."""
+
+        by_ip = self._claims.get((endpoint.scope, endpoint.port))
+        if not by_ip:
+            return []
+        ip = normalize_hosted_ip(endpoint.ip)
+        if endpoint.scope != "internal":
+            return list(by_ip.get(ip, ()))
+        if ip in _WILDCARD_IPS:
+            return [claim for claims in by_ip.values() for claim in claims]
+        found = list(by_ip.get(ip, ()))
+        for wildcard in _WILDCARD_IPS:
+            if wildcard != ip:
+                found.extend(by_ip.get(wildcard, ()))
+        return found
 
 
 def _managed_server_datapath():
@@ -423,6 +597,138 @@ def probe_live_listener(ip, port):
     return False
 
 
+PROC_NET = "/proc/net"
+#  /proc/net file -> the socket state that counts as holding the port ("" for any)
+_PROC_NET_FILES = (("tcp", "0A"), ("tcp6", "0A"), ("udp", ""), ("udp6", ""))
+
+
+def _parse_proc_address(text):
+    """Turn a /proc/net address like ``0100007F:1F90`` into ``("127.0.0.1", 8080)``."""
+
+    address, port = text.split(":")
+    raw = bytes.fromhex(address)
+    if sys.byteorder == "little":
+        #  the kernel prints each 32-bit word of the address in host byte order
+        raw = b"".join(raw[i : i + 4][::-1] for i in range(0, len(raw), 4))
+    family = socket.AF_INET if len(raw) == 4 else socket.AF_INET6
+    ip = socket.inet_ntop(family, raw)
+    if ip.startswith("::ffff:") and "." in ip:
+        ip = ip[7:]
+    return normalize_hosted_ip(ip), int(port, 16)
+
+
+def _is_ip_literal(value):
+    """Return whether *value* is a numeric IPv4 or IPv6 address."""
+
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, value)
+        except (OSError, ValueError):
+            continue
+        return True
+    return False
+
+
+class ListenerSnapshot:
+    """The ports held by listening sockets on this host, read once from /proc/net.
+
+    :meth:`holds` answers the same question as :func:`probe_live_listener`
+    without binding a socket per endpoint. Numeric addresses that aren't
+    local are checked once each with a bind to port 0, and host names fall
+    back to the bind probe.
+    """
+
+    def __init__(self, listeners):
+        """Build a snapshot from an iterable of (ip, port) pairs."""
+
+        self._ports = {}
+        for ip, port in listeners:
+            self._ports.setdefault(port, set()).add(normalize_hosted_ip(ip))
+        self._local = {}
+
+    @classmethod
+    def read(cls, root=None):
+        """Return a snapshot of the sockets in *root* (default :data:`PROC_NET`).
+
+        Returns ``None`` if none of the socket tables can be read.
+        """
+
+        root = PROC_NET if root is None else root
+        listeners = []
+        found = False
+        for filename, state in _PROC_NET_FILES:
+            try:
+                with open(os.path.join(root, filename), "r") as fp:
+                    lines = fp.readlines()[1:]
+            except OSError:
+                continue
+            found = True
+            for line in lines:
+                fields = line.split()
+                if len(fields) < 4 or (state and fields[3] != state):
+                    continue
+                try:
+                    listeners.append(_parse_proc_address(fields[1]))
+                except (ValueError, OSError):
+                    continue
+        return cls(listeners) if found else None
+
+    def _is_local(self, ip):
+        """Return whether this host has the address *ip*, checking each address once."""
+
+        if ip in _WILDCARD_IPS:
+            return True
+        if ip not in self._local:
+            family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            try:
+                sock.bind((ip, 0))
+            except OSError as exc:
+                self._local[ip] = getattr(exc, "errno", None) != errno.EADDRNOTAVAIL
+            else:
+                self._local[ip] = True
+            finally:
+                sock.close()
+        return self._local[ip]
+
+    def holds(self, ip, port):
+        """Return ``True`` if a listening socket would stop a bind of *ip*:*port*."""
+
+        ip = normalize_hosted_ip(ip)
+        if not _is_ip_literal(ip):
+            return probe_live_listener(ip, port)
+        held = self._ports.get(port)
+        if not held or not self._is_local(ip):
+            return False
+        if ip == "::" or ip in held or "::" in held:
+            #  "::" sockets are dual-stack unless IPV6_V6ONLY is set
+            return True
+        if ":" in ip:
+            return False
+        if ip == LOCAL_WILDCARD_IP:
+            return any(":" not in other for other in held)
+        return LOCAL_WILDCARD_IP in held
+
+
+class _BindProbe:
+    """Stand-in for :class:`ListenerSnapshot` that probes each endpoint with a bind."""
+
+    def holds(self, ip, port):
+        """Return ``True`` if a TCP or UDP bind cannot claim *ip*:*port*."""
+
+        return probe_live_listener(ip, port)
+
+
+def live_listeners():
+    """Return an object whose ``holds(ip, port)`` says if a live socket holds a port.
+
+    On Linux this is a :class:`ListenerSnapshot` of /proc/net. Elsewhere each
+    endpoint is probed with :func:`probe_live_listener`.
+    """
+
+    return ListenerSnapshot.read() or _BindProbe()
+
+
 def _endpoint_conflicts(left, right):
     return (
         left.scope == right.scope
@@ -431,14 +737,19 @@ def _endpoint_conflicts(left, right):
     )
 
 
-def detect_conflicts(server, overrides=None, include_live=True):
-    """Return a list of conflicts for *server* with optional *overrides*."""
+def detect_conflicts(server, overrides=None, include_live=True, index=None, live=None):
+    """Return a list of conflicts for *server* with optional *overrides*.
+
+    *index* is the :class:`ClaimIndex` of the other servers' claims and
+    *live* the :func:`live_listeners` result. Both are built when not given;
+    pass them in when checking several candidates.
+    """
 
     claim_set = collect_claim_set(server, overrides=overrides)
     conflicts = []
 
-    for index, endpoint in enumerate(claim_set.endpoints):
-        for other in claim_set.endpoints[index + 1 :]:
+    for position, endpoint in enumerate(claim_set.endpoints):
+        for other in claim_set.endpoints[position + 1 :]:
             if not _endpoint_conflicts(endpoint, other):
                 continue
             conflicts.append(
@@ -452,44 +763,44 @@ def detect_conflicts(server, overrides=None, include_live=True):
                 )
             )
 
+    if index is None:
+        index = ClaimIndex.for_server(server)
     seen_managed = set()
-    for managed_server in iter_managed_servers(server):
-        other_claims = collect_claim_set(managed_server)
-        for endpoint in claim_set.endpoints:
-            for other in other_claims.endpoints:
-                if not _endpoint_conflicts(endpoint, other):
-                    continue
-                conflict_id = (
-                    managed_server.name,
-                    endpoint.ip,
-                    endpoint.port,
-                    endpoint.source_key,
-                    other.source_key,
-                )
-                if conflict_id in seen_managed:
-                    continue
-                seen_managed.add(conflict_id)
-                conflicts.append(
-                    PortConflict(
-                        "managed",
-                        endpoint,
-                        (
-                            f"{endpoint.source_key} conflicts with "
-                            f"{managed_server.name}:{other.source_key} on "
-                            f"{endpoint.ip}:{endpoint.port}"
-                        ),
-                        managed_server=managed_server.name,
-                    )
+    for endpoint in claim_set.endpoints:
+        for managed_name, other in index.lookup(endpoint):
+            conflict_id = (
+                managed_name,
+                endpoint.ip,
+                endpoint.port,
+                endpoint.source_key,
+                other.source_key,
+            )
+            if conflict_id in seen_managed:
+                continue
+            seen_managed.add(conflict_id)
+            conflicts.append(
+                PortConflict(
+                    "managed",
+                    endpoint,
+                    (
+                        f"{endpoint.source_key} conflicts with "
+                        f"{managed_name}:{other.source_key} on "
+                        f"{endpoint.ip}:{endpoint.port}"
+                    ),
+                    managed_server=managed_name,
                 )
+            )
 
     if include_live:
+        if live is None:
+            live = live_listeners()
         seen_live = set()
         for endpoint in claim_set.endpoints:
             live_id = (endpoint.ip, endpoint.port)
             if live_id in seen_live:
                 continue
             seen_live.add(live_id)
-            if not probe_live_listener(endpoint.ip, endpoint.port):
+            if not live.holds(endpoint.ip, endpoint.port):
                 continue
             conflicts.append(
                 PortConflict(
@@ -503,43 +814,159 @@ def detect_conflicts(server, overrides=None, include_live=True):
 
 
 def recommend_shift(server, max_offset=100, base_overrides=None):
-    """Return the first whole-group offset that avoids all detected conflicts."""
+    """Return the first whole-group offset that avoids all detected conflicts.
+
+    The other servers' claims are indexed and the live listeners read once,
+    and shared by every candidate.
+    """
 
     claim_set = collect_claim_set(server, overrides=base_overrides)
     if not claim_set.shift_group_keys:
         return None
 
-    offsets = []
-    for offset in range(1, max_offset + 1):
-        offsets.extend((offset, -offset))
-
     base_values = dict(server.data)
     if base_overrides:
         base_values.update(base_overrides)
 
-    for offset in offsets:
-        candidate = {}
-        valid = True
-        for key in claim_set.shift_group_keys:
-            current = _normalize_port_value(base_values.get(key))
-            if current is None:
-                valid = False
-                break
-            shifted = current + offset
-            if shifted <= 0 or shifted > 65535:
-                valid = False
-                break
-            candidate[key] = shifted
-        if not valid:
+    index = ClaimIndex.for_server(server)
+    live = live_listeners()
+    for offset in _shift_offsets(max_offset):
+        candidate = _shifted_values(base_values, claim_set.shift_group_keys, offset)
+        if candidate is None:
             continue
         if not detect_conflicts(
-            server, overrides=candidate, include_live=True
+            server, overrides=candidate, include_live=True, index=index, live=live
         ):
             return PortShiftRecommendation(offset=offset, values=candidate)
 
     return None
 
 
+def _lease_store(datapath):
+    """Return the (unloaded) data store holding the port leases of *datapath*."""
+
+    return data_module.JSONDataStore(os.path.join(datapath, LEASES_FILENAME), {})
+
+
+def _shift_offsets(max_offset, include_zero=False):
+    """Return 0 (optionally), 1, -1, 2, -2 ... up to *max_offset*."""
+
+    offsets = [0] if include_zero else []
+    for offset in range(1, max_offset + 1):
+        offsets.extend((offset, -offset))
+    return offsets
+
+
+def _shifted_values(base_values, keys, offset):
+    """Return *keys* of *base_values* moved by *offset*, or ``None`` if one can't be."""
+
+    values = {}
+    for key in keys:
+        current = _normalize_port_value(base_values.get(key))
+        if current is None:
+            return None
+        shifted = current + offset
+        if shifted <= 0 or shifted > 65535:
+            return None
+        values[key] = shifted
+    return values
+
+
+def allocate_port_blocks(server, count, owners=None, max_offset=1000, lease_seconds=LEASE_SECONDS):
+    """Find and lease *count* free, non-overlapping port sets shaped like *server*'s.
+
+    Each set moves all of *server*'s shift-group ports by one offset (tried
+    in the order 0, 1, -1, 2, -2, ...). Sets are checked against every managed
+    server's claims, including *server*'s own, other unexpired leases, the
+    live listeners and each other, all gathered once. The chosen sets are
+    leased for *lease_seconds* so concurrent setups don't pick them, and a
+    list of :class:`PortLease` is returned.
+
+    *owners* optionally names the server each set is meant for, in order.
+    That server's own conflict checks then ignore its lease. Leases end when
+    they expire or with :func:`release_port_leases`. Raises ServerError,
+    leasing nothing, if fewer than *count* sets are free.
+    """
+
+    owners = list(owners) if owners is not None else [None] * count
+    if len(owners) != count:
+        raise ServerError("Need one owner for each of the %d port sets" % (count,))
+    keys = collect_claim_set(server).shift_group_keys
+    if not keys:
+        raise ServerError("'%s' has no ports to allocate" % (getattr(server, "name", server),))
+    datapath = _managed_server_datapath()
+    if not datapath or not os.path.isdir(datapath):
+        raise ServerError("Can't lease ports without a data directory")
+    base_values = dict(server.data)
+
+    store = _lease_store(datapath)
+    with store.lock():
+        try:
+            store.load()
+        except data_module.DataError:
+            pass  # no leases yet
+        now = time.time()
+        #  drop expired leases, and earlier leases of the servers we allocate for
+        replaced = set(owners) - {None}
+        leases = {
+            lease_id: lease
+            for lease_id, lease in store.get("leases", {}).items()
+            if lease.get("expires", 0) > now and lease.get("owner") not in replaced
+        }
+        store["leases"] = leases
+        index = ClaimIndex(managed_claims(SimpleNamespace(name=None)))
+        index.add_leases(store, now=now)
+        live = live_listeners()
+
+        allocated = []
+        for offset in _shift_offsets(max_offset, include_zero=True):
+            if len(allocated) == count:
+                break
+            values = _shifted_values(base_values, keys, offset)
+            if values is None:
+                continue
+            endpoints = collect_claim_set(server, overrides=values).endpoints
+            if any(index.lookup(e) or live.holds(e.ip, e.port) for e in endpoints):
+                continue
+            lease_id = uuid.uuid4().hex
+            for endpoint in endpoints:
+                index.add("lease:" + lease_id, endpoint)
+            owner = owners[len(allocated)]
+            allocated.append(PortLease(lease_id, owner, offset, values, now + lease_seconds))
+            leases[lease_id] = {
+                "owner": owner,
+                "expires": now + lease_seconds,
+                "endpoints": sorted({(e.scope, e.ip, e.port) for e in endpoints}),
+            }
+        if len(allocated) < count:
+            raise ServerError(
+                "Only found %d of %d free port sets within %d ports of %s's"
+                % (len(allocated), count, max_offset, getattr(server, "name", "the server"))
+            )
+        store.save()
+    return allocated
+
+
+def release_port_leases(lease_ids=None, owner=None):
+    """End the leases in *lease_ids* and/or those of *owner*. Returns how many ended."""
+
+    datapath = _managed_server_datapath()
+    if not datapath or not os.path.isfile(os.path.join(datapath, LEASES_FILENAME)):
+        return 0
+    lease_ids = set(lease_ids or ())
+    store = _lease_store(datapath)
+    with store.locked_update():
+        leases = store.get("leases", {})
+        ended = [
+            lease_id
+            for lease_id, lease in leases.items()
+            if lease_id in lease_ids or (owner is not None and lease.get("owner") == owner)
+        ]
+        for lease_id in ended:
+            del leases[lease_id]
+    return len(ended)
+
+
 def describe_conflicts(conflicts):
     """Format conflicts into a compact user-facing diagnostic string."""
 
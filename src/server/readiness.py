@@ -0,0 +1,146 @@
+"""Wait for a started server to actually be ready for players.
+
+``start --wait`` uses this to block until the game is accepting players
+rather than returning as soon as the process has been launched. Readiness
+comes from the first of these the game module supports:
+
+* a log signature: a module level ``ready_log_pattern`` regular expression
+  that is searched for in the console log as it is written (e.g. Minecraft's
+  ``Done (4.2s)!``). Only used when the runtime keeps a log file.
+* a protocol probe: the same endpoint and protocol ``query`` uses, from the
+  module's ``get_query_address(server)`` hook, otherwise A2S on the query
+  port followed by a TCP ping of the game port.
+
+Both are polled with a growing interval and the wait fails early if the
+server stops running.
+"""
+
+import re
+import time
+
+from .errors import ServerError
+from utils.waiting import wait_until
+
+__all__ = ["DEFAULT_READY_TIMEOUT", "ready_log_pattern", "probe", "wait_until_ready"]
+
+DEFAULT_READY_TIMEOUT = 300
+#  first and longest pause between readiness checks
+READY_POLL_INTERVAL = 0.5
+MAX_READY_POLL_INTERVAL = 5.0
+#  how long a single protocol probe may take
+PROBE_TIMEOUT = 2.0
+
+
+def _module_value(module, name):
+    """Return *name* from a game module or its shared MODULE namespace."""
+    for owner in (module, getattr(module, "MODULE", None)):
+        value = getattr(owner, name, None)
+        if value is not None:
+            return value
+    return None
+
+
+def ready_log_pattern(server):
+    """Return the compiled ready log signature of *server*'s module, or ``None``."""
+    pattern = _module_value(server.module, "ready_log_pattern")
+    if not pattern:
+        return None
+    return re.compile(pattern) if isinstance(pattern, str) else pattern
+
+
+class _LogWatcher(object):
+    """Search a growing log file for a pattern, reading only what is new."""
+
+    def __init__(self, path, pattern):
+        """Watch *path* for *pattern* from the start of the file."""
+        self.path = path
+        self.pattern = pattern
+        self.offset = 0
+        self.partial = ""
+
+    def check(self):
+        """Return whether the pattern has appeared in the log yet."""
+        try:
+            with open(self.path, "r", encoding="utf-8", errors="replace") as fh:
+                fh.seek(self.offset)
+                new = fh.read()
+                self.offset = fh.tell()
+        except OSError:
+            return False
+        if not new:
+            return False
+        text = self.partial + new
+        lines = text.split("\n")
+        self.partial = lines.pop()
+        return any(self.pattern.search(line) for line in lines) or bool(
+            self.pattern.search(self.partial)
+        )
+
+
+def probe(server):
+    """Return whether *server* answers the protocol probe ``query`` would use."""
+    from utils import query as query_utils
+
+    get_addr = _module_value(server.module, "get_query_address")
+    if callable(get_addr):
+        host, port, protocol = get_addr(server)
+    else:
+        host = "127.0.0.1"
+        port = server.data.get("queryport", server.data["port"])
+        protocol = "a2s"
+    try:
+        if protocol == "a2s":
+            query_utils.a2s_info(host, port, timeout=PROBE_TIMEOUT)
+        elif protocol == "quake":
+            query_utils.quake_status(host, port, timeout=PROBE_TIMEOUT)
+        elif protocol == "udp":
+            query_utils.udp_ping(host, port, timeout=PROBE_TIMEOUT)
+        else:
+            #  tcp, and ts3 whose ServerQuery port accepts connections once it's up
+            query_utils.tcp_ping(host, port, timeout=PROBE_TIMEOUT)
+        return True
+    except query_utils.QueryError:
+        pass
+    if protocol != "a2s":
+        return False
+    #  like query, accept a game port that is open over TCP when A2S isn't answering
+    try:
+        query_utils.tcp_ping("127.0.0.1", server.data["port"], timeout=PROBE_TIMEOUT)
+    except query_utils.QueryError:
+        return False
+    return True
+
+
+def wait_until_ready(server, runtime, timeout=DEFAULT_READY_TIMEOUT):
+    """Block until *server* is ready and return ``(seconds, signal)``.
+
+    *signal* is ``"log"`` or ``"query"`` depending on what showed it was
+    ready. Raises :class:`ServerError` if it stops running or isn't ready
+    within *timeout* seconds.
+    """
+    start = time.monotonic()
+    pattern = ready_log_pattern(server)
+    log_path = runtime.log_path(server) if pattern is not None else None
+    if log_path is not None:
+        signal = "log"
+        ready = _LogWatcher(log_path, pattern).check
+    else:
+        signal = "query"
+
+        def ready():
+            return probe(server)
+
+    def check():
+        if ready():
+            return True
+        if not runtime.is_running(server):
+            raise ServerError("Server stopped before it was ready")
+        return False
+
+    if not wait_until(check, timeout, READY_POLL_INTERVAL, MAX_READY_POLL_INTERVAL):
+        raise ServerError(
+            "Server wasn't ready after {} seconds (waiting for {})".format(
+                timeout, "its ready log line" if signal == "log" else "it to answer queries"
+            )
+        )
+    return time.monotonic() - start, signal
@@ -0,0 +1,347 @@
+"""An index of the servers in a data directory, kept in a small SQLite file.
+
+Fleet-wide lookups (port conflict checks, daemon preloading) used to list the
+data directory and parse every ``<name>.json``. The registry
+keeps one row per server holding its module, install dir, runtime, container
+name, ports and full data, so those lookups cost one query.
+
+The index is checked against the data directory cheaply. Each indexed file is
+stat()ed on every lookup and only files whose mtime, size or inode changed are
+parsed again, so files edited in place by hand or by other tools are picked up
+too. Files modified in the last couple of seconds are always parsed again, as
+a later change in the same clock tick wouldn't move their mtime. The directory
+is only listed again when its mtime differs from the one recorded with the
+index, since adding, removing or renaming a file (which every data store save
+does, see :mod:`server.data`) updates it. A directory mtime from the last
+couple of seconds isn't trusted either. Saves made by this process update their
+row straight away.
+
+The index also caches each server's port claims (see :func:`claims`) in a
+table keyed by (scope, ip, port). A server's claims are thrown away whenever its
+row is replaced, so they are only worked out again for servers that changed.
+
+If the index can't be used (e.g. the data directory is read-only) lookups fall
+back to parsing the files directly.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+from . import data as data_module
+
+__all__ = ["INDEX_FILENAME", "ServerRecord", "claims", "get", "records"]
+
+INDEX_FILENAME = ".registry.sqlite3"
+#  bump when the table layout or the meaning of a column changes
+SCHEMA_VERSION = 2
+#  a file or directory mtime this recent may still change within the same clock tick
+RACY_NS = 2 * 10**9
+
+ServerRecord = namedtuple(
+    "ServerRecord", ("name", "module", "dir", "runtime", "container_name", "ports", "data")
+)
+ServerRecord.__doc__ = "What the registry knows about one server. *data* is a fresh dict."
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS servers (
+    name TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    module TEXT,
+    dir TEXT,
+    runtime TEXT,
+    container_name TEXT,
+    ports TEXT NOT NULL,
+    data TEXT NOT NULL,
+    claims_key TEXT
+);
+CREATE TABLE IF NOT EXISTS claims (
+    server TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    source_key TEXT NOT NULL,
+    derived INTEGER NOT NULL,
+    shiftable INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS claims_by_port ON claims (scope, ip, port);
+CREATE INDEX IF NOT EXISTS claims_by_server ON claims (server);
+"""
+
+#  replacing a row leaves claims_key NULL, marking the server's claims as stale
+_REPLACE_ROW = (
+    "INSERT OR REPLACE INTO servers"
+    " (name, mtime_ns, size, inode, module, dir, runtime, container_name, ports, data)"
+    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+#  datapath -> (pid, open connection). Connections aren't shared with forked children.
+_connections = {}
+
+
+def _ports(data):
+    """Return the port settings of a server's data as {key: port}."""
+    ports = {}
+    for key, value in data.items():
+        if "port" not in key.lower() or isinstance(value, bool):
+            continue
+        try:
+            ports[key] = int(value)
+        except (TypeError, ValueError):
+            continue
+    return ports
+
+
+def _row(name, stat, data):
+    """Return the servers table row for *data*."""
+    return (
+        name,
+        stat.st_mtime_ns,
+        stat.st_size,
+        stat.st_ino,
+        data.get("module"),
+        data.get("dir"),
+        data.get("runtime"),
+        data.get("container_name"),
+        json.dumps(_ports(data)),
+        json.dumps(data),
+    )
+
+
+def _record(row):
+    """Turn a (name, module, dir, runtime, container_name, ports, data) row into a record."""
+    name, module, directory, runtime, container_name, ports, data = row
+    return ServerRecord(
+        name, module, directory, runtime, container_name, json.loads(ports), json.loads(data)
+    )
+
+
+def _connect(datapath):
+    """Return the index connection for *datapath*, creating the index if needed."""
+    datapath = os.path.abspath(datapath)
+    pid, conn = _connections.get(datapath, (None, None))
+    if conn is not None and pid == os.getpid():
+        return conn
+    conn = sqlite3.connect(os.path.join(datapath, INDEX_FILENAME), timeout=30)
+    try:
+        version = None
+        if conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'meta'"
+        ).fetchone():
+            version = conn.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+        if version is not None and version[0] != str(SCHEMA_VERSION):
+            #  an older layout: start again from scratch
+            conn.executescript("DROP TABLE IF EXISTS servers; DROP TABLE IF EXISTS claims;")
+        #  keep the journal file around: creating and deleting it on every write
+        #  would change the directory mtime the index is validated with
+        conn.execute("PRAGMA journal_mode=PERSIST")
+        conn.executescript(_SCHEMA)
+        version = conn.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+        if version is None or version[0] != str(SCHEMA_VERSION):
+            with conn:
+                conn.execute("DELETE FROM servers")
+                conn.execute("DELETE FROM claims")
+                conn.execute("DELETE FROM meta")
+                conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('schema', ?)", (str(SCHEMA_VERSION),)
+                )
+    except sqlite3.Error:
+        conn.close()
+        raise
+    _connections[datapath] = (os.getpid(), conn)
+    return conn
+
+
+def _load_file(path):
+    """Return the parsed data store at *path*, or ``None`` if it can't be read."""
+    try:
+        with open(path, "r") as fp:
+            data = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _refresh(conn, datapath):
+    """Bring the index for *datapath* up to date with the files in it."""
+    dirmtime = str(os.stat(datapath).st_mtime_ns)
+    recorded = conn.execute("SELECT value FROM meta WHERE key = 'dirmtime'").fetchone()
+    known = {}
+    stored = {}
+    for name, mtime_ns, size, inode, data in conn.execute(
+        "SELECT name, mtime_ns, size, inode, data FROM servers"
+    ):
+        known[name] = [mtime_ns, size, inode]
+        stored[name] = data
+    listed = recorded is None or recorded[0] != dirmtime
+    if not listed:
+        #  no files were added or removed, but they may have been edited in place
+        filenames = [name + ".json" for name in known]
+    else:
+        filenames = [filename for filename in os.listdir(datapath) if filename.endswith(".json")]
+    now = time.time_ns()
+    seen = set()
+    with conn:
+        for filename in filenames:
+            name = filename[:-5]
+            path = os.path.join(datapath, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            seen.add(name)
+            #  saves replace the file, so a new inode catches same-tick rewrites
+            unchanged = known.get(name) == [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+            if unchanged and now - stat.st_mtime_ns > RACY_NS:
+                continue
+            data = _load_file(path)
+            if data is None:
+                seen.discard(name)
+                continue
+            row = _row(name, stat, data)
+            #  keep the cached claims of a recent file that hasn't really changed
+            if not unchanged or row[-1] != stored[name]:
+                conn.execute(_REPLACE_ROW, row)
+        for name in set(known) - seen:
+            conn.execute("DELETE FROM servers WHERE name = ?", (name,))
+            conn.execute("DELETE FROM claims WHERE server = ?", (name,))
+        if not listed:
+            return
+        if now - int(dirmtime) > RACY_NS:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('dirmtime', ?)", (dirmtime,)
+            )
+        else:
+            #  changes later in the same tick wouldn't move the mtime, check again next time
+            conn.execute("DELETE FROM meta WHERE key = 'dirmtime'")
+
+
+def _scan(datapath):
+    """Return the records of *datapath* by parsing every file, without the index."""
+    result = []
+    for filename in sorted(os.listdir(datapath)):
+        if not filename.endswith(".json"):
+            continue
+        data = _load_file(os.path.join(datapath, filename))
+        if data is None:
+            continue
+        result.append(
+            ServerRecord(
+                filename[:-5],
+                data.get("module"),
+                data.get("dir"),
+                data.get("runtime"),
+                data.get("container_name"),
+                _ports(data),
+                data,
+            )
+        )
+    return result
+
+
+def records(datapath):
+    """Return a :class:`ServerRecord` for every server in *datapath*, sorted by name."""
+    if not os.path.isdir(datapath):
+        return []
+    try:
+        conn = _connect(datapath)
+        _refresh(conn, datapath)
+        rows = conn.execute(
+            "SELECT name, module, dir, runtime, container_name, ports, data"
+            " FROM servers ORDER BY name"
+        ).fetchall()
+    except (sqlite3.Error, OSError):
+        return _scan(datapath)
+    return [_record(row) for row in rows]
+
+
+def get(datapath, name):
+    """Return the :class:`ServerRecord` of *name* in *datapath*, or ``None``."""
+    if not os.path.isdir(datapath):
+        return None
+    try:
+        conn = _connect(datapath)
+        _refresh(conn, datapath)
+        row = conn.execute(
+            "SELECT name, module, dir, runtime, container_name, ports, data"
+            " FROM servers WHERE name = ?",
+            (name,),
+        ).fetchone()
+    except (sqlite3.Error, OSError):
+        return next((record for record in _scan(datapath) if record.name == name), None)
+    return None if row is None else _record(row)
+
+
+def claims(datapath, key, compute):
+    """Return the cached port claims of every server in *datapath*.
+
+    The result maps each server name to a list of ``(scope, ip, port,
+    source_key, derived, shiftable)`` tuples. Servers whose data changed since
+    their claims were cached, or whose claims were cached with a different
+    *key*, have them worked out again with ``compute(record)``, which returns
+    tuples in the same form. Callers change *key* when the way claims are
+    worked out changes.
+    """
+    if not os.path.isdir(datapath):
+        return {}
+    try:
+        conn = _connect(datapath)
+        _refresh(conn, datapath)
+        stale = conn.execute(
+            "SELECT name, module, dir, runtime, container_name, ports, data, mtime_ns, inode"
+            " FROM servers WHERE claims_key IS NULL OR claims_key != ?",
+            (key,),
+        ).fetchall()
+        unsaved = {}
+        if stale:
+            computed = [(row[0], row[7:], list(compute(_record(row[:7])))) for row in stale]
+            with conn:
+                for name, (mtime_ns, inode), rows in computed:
+                    conn.execute("DELETE FROM claims WHERE server = ?", (name,))
+                    updated = conn.execute(
+                        "UPDATE servers SET claims_key = ?"
+                        " WHERE name = ? AND mtime_ns = ? AND inode = ?",
+                        (key, name, mtime_ns, inode),
+                    )
+                    if not updated.rowcount:
+                        #  saved again meanwhile, don't cache claims of the old data
+                        unsaved[name] = rows
+                        continue
+                    conn.executemany(
+                        "INSERT INTO claims VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(name,) + tuple(row) for row in rows],
+                    )
+        result = {name: [] for (name,) in conn.execute("SELECT name FROM servers ORDER BY name")}
+        for server, scope, ip, port, source_key, derived, shiftable in conn.execute(
+            "SELECT c.server, c.scope, c.ip, c.port, c.source_key, c.derived, c.shiftable"
+            " FROM claims c JOIN servers s ON s.name = c.server"
+            " WHERE s.claims_key = ? ORDER BY c.rowid",
+            (key,),
+        ):
+            result[server].append((scope, ip, port, source_key, bool(derived), bool(shiftable)))
+        result.update((name, rows) for name, rows in unsaved.items() if name in result)
+    except (sqlite3.Error, OSError):
+        return {record.name: list(compute(record)) for record in _scan(datapath)}
+    return result
+
+
+def _on_save(filename, data):
+    """Data store save listener: update the row of a server we have an index for."""
+    datapath = os.path.dirname(os.path.abspath(filename))
+    pid, conn = _connections.get(datapath, (None, None))
+    if conn is None or pid != os.getpid() or not filename.endswith(".json"):
+        return
+    try:
+        stat = os.stat(filename)
+        with conn:
+            conn.execute(_REPLACE_ROW, _row(os.path.basename(filename)[:-5], stat, data))
+    except (sqlite3.Error, OSError):
+        pass
+
+
+data_module.JSONDataStore.save_listeners.append(_on_save)
@@ -4,6 +4,12 @@ Supports the existing process-backed runtime and an additional Docker-backed
 container runtime. Game modules can describe Docker requirements via
 ``get_runtime_requirements(server)`` and ``get_container_spec(server)`` hooks,
 but Docker is only selected when configuration opts into it.
+
+:func:`resolve_runtime_metadata` and :func:`get_container_spec` are memoised
+per server: a command that asks for them again gets a copy of the earlier
+result for as long as the server's data, its module and the configured runtime
+backend are unchanged, without calling the module's hooks again. Saving a
+server's data store drops its entries, see :func:`forget_cached`.
 """
 
 # pylint: disable=too-many-lines
@@ -11,12 +17,16 @@ but Docker is only selected when configuration opts into it.
 from __future__ import annotations
 
 import copy
+import hashlib
 import json
 import os
+import re
 import shlex
 import subprocess as sp
+import sys
 
 import screen
+from utils.waiting import wait_until
 from utils.settings import settings
 from utils import proton
 
@@ -121,6 +131,10 @@ RUNTIME_FAMILY_DEFAULTS = {
 
 VALID_RUNTIME_BACKENDS = ("process", "docker")
 VALID_STOP_MODES = ("docker-stop", "exec-console")
+#  docker's built-in network modes; any other value names a user-defined network
+BUILTIN_NETWORK_MODES = ("bridge", "host", "none")
+#  shares the host's network stack: no -p mappings, the game binds host ports itself
+HOST_NETWORK_MODE = "host"
 DEFAULT_CONTAINER_WORKDIR = "/srv/server"
 RUNTIME_FAMILY_DOCKERFILES = {
     "java": os.path.join("docker", "java", "Dockerfile"),
@@ -246,6 +260,12 @@ def infer_port_definitions(server, family=None):
     return _infer_port_definitions(server, family)
 
 
+def uses_host_network(spec):
+    """Return whether a container spec runs on the host's network stack."""
+
+    return str(spec.get("network_mode") or "").strip().lower() == HOST_NETWORK_MODE
+
+
 def _build_port_specs(server, port_definitions):
     """Return Docker port mappings for the requested server data keys."""
 
@@ -315,30 +335,89 @@ def build_runtime_requirements(
     return requirements
 
 
-def _current_container_identity_mount_roots():
-    """Return same-path bind-mount roots when AlphaGSM runs inside Docker."""
+#  same-path bind-mount roots of this container, worked out once per process
+_identity_roots = None
+MOUNTINFO = "/proc/self/mountinfo"
+#  roots found with docker inspect, kept by container id in the AlphaGSM directory
+MOUNT_ROOTS_FILENAME = ".mount-roots.json"
+_CONTAINER_ID_RE = re.compile(r"/containers/([0-9a-f]{64})/")
+_MOUNTINFO_ESCAPE_RE = re.compile(r"\\([0-7]{3})")
 
-    if not os.path.exists("/.dockerenv"):
-        return []
 
-    container_name = os.environ.get("HOSTNAME", "").strip()
-    if not container_name:
-        return []
+def _read_mountinfo():
+    """Return ``[(root, mount point)]`` for this process's mounts, or ``None`` if unreadable."""
 
     try:
-        mounts_json = sp.check_output(
-            ["docker", "inspect", "-f", "{{json .Mounts}}", container_name],
-            stderr=sp.STDOUT,
-            shell=False,
-            text=True,
+        with open(MOUNTINFO, "r", encoding="utf-8", errors="surrogateescape") as fp:
+            lines = fp.read().splitlines()
+    except OSError:
+        return None
+    mounts = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 5:
+            continue
+        root, point = (
+            _MOUNTINFO_ESCAPE_RE.sub(lambda match: chr(int(match.group(1), 8)), field)
+            for field in fields[3:5]
         )
-    except (OSError, sp.SubprocessError):
-        return []
+        mounts.append((root, point))
+    return mounts
 
-    try:
-        mounts = json.loads(mounts_json or "[]")
-    except ValueError:
-        return []
+
+def _own_container_id(mounts):
+    """Return this container's id from the files Docker bind-mounts into it, if present."""
+
+    for root, _point in mounts or ():
+        match = _CONTAINER_ID_RE.search(root)
+        if match is not None:
+            return match.group(1)
+    return None
+
+
+def _mountinfo_identity_roots(mounts):
+    """Return the mounts of a directory at the same path as in its filesystem.
+
+    Only a guess at the bind mounts docker inspect would report: a host path on
+    a filesystem mounted elsewhere than ``/`` on the host can't be recognised.
+    """
+
+    roots = []
+    for root, point in mounts or ():
+        root, point = root.rstrip(os.sep), point.rstrip(os.sep)
+        if root and root == point:
+            roots.append(point)
+    return roots
+
+
+def _inspect_identity_roots(container_name):
+    """Return the same-path bind mounts docker reports for *container_name*, or ``None``."""
+
+    from server import docker_api
+
+    mounts = None
+    client = docker_api.get_client()
+    if client is not None:
+        try:
+            info = client.inspect_container(container_name)
+        except (docker_api.DockerUnavailable, docker_api.DockerAPIError):
+            info = None
+        if info is not None:
+            mounts = info.get("Mounts") or []
+    if mounts is None:
+        try:
+            mounts_json = sp.check_output(
+                ["docker", "inspect", "-f", "{{json .Mounts}}", container_name],
+                stderr=sp.STDOUT,
+                shell=False,
+                text=True,
+            )
+        except (OSError, sp.SubprocessError):
+            return None
+        try:
+            mounts = json.loads(mounts_json or "[]") or []
+        except ValueError:
+            return None
 
     roots = []
     for mount in mounts:
@@ -354,6 +433,91 @@ def _current_container_identity_mount_roots():
     return roots
 
 
+def _mount_roots_cache_path():
+    """Return the file docker inspect results are cached in, or ``None`` if disabled."""
+
+    enabled = str(settings.user.getsection("runtime").get("mount_roots_cache", "yes")).strip().lower()
+    if enabled in ("no", "off", "false", "0"):
+        return None
+    alphagsm_path = settings.user.getsection("core").get("alphagsm_path", "~/.alphagsm")
+    return os.path.join(os.path.expanduser(alphagsm_path), MOUNT_ROOTS_FILENAME)
+
+
+def _load_cached_roots(container_id):
+    """Return the cached roots of container *container_id*, or ``None``."""
+
+    path = _mount_roots_cache_path()
+    if path is None:
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as fp:
+            cached = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("container_id") != container_id:
+        return None
+    roots = cached.get("roots")
+    return [str(root) for root in roots] if isinstance(roots, list) else None
+
+
+def _save_cached_roots(container_id, roots):
+    """Cache the roots of container *container_id*, if the AlphaGSM directory exists."""
+
+    path = _mount_roots_cache_path()
+    if path is None or not os.path.isdir(os.path.dirname(path)):
+        return
+    temp_path = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        with open(temp_path, "w", encoding="utf-8") as fp:
+            json.dump({"container_id": container_id, "roots": roots}, fp)
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+
+
+def _discover_identity_mount_roots():
+    """Work out the same-path bind-mount roots, see _current_container_identity_mount_roots."""
+
+    if not os.path.exists("/.dockerenv"):
+        return []
+
+    container_name = os.environ.get("HOSTNAME", "").strip()
+    if not container_name:
+        return []
+
+    mounts = _read_mountinfo()
+    container_id = _own_container_id(mounts)
+    if container_id is not None:
+        roots = _load_cached_roots(container_id)
+        if roots is not None:
+            return roots
+    roots = _inspect_identity_roots(container_name)
+    if roots is None:
+        #  docker can't be asked from in here, make do with what the kernel says
+        return _mountinfo_identity_roots(mounts)
+    if container_id is not None:
+        _save_cached_roots(container_id, roots)
+    return roots
+
+
+def _current_container_identity_mount_roots():
+    """Return same-path bind-mount roots when AlphaGSM runs inside Docker.
+
+    The roots come from ``docker inspect`` of this container, asked once per
+    process and cached on disk for the container's lifetime (by container
+    id, see ``[runtime] mount_roots_cache``). If Docker can't be asked they
+    are guessed from /proc/self/mountinfo.
+    """
+
+    global _identity_roots  # pylint: disable=global-statement
+    if _identity_roots is None:
+        _identity_roots = _discover_identity_mount_roots()
+    return list(_identity_roots)
+
+
 def validate_mount_path_identity(mounts):
     """Reject bind mounts that are not host-visible in manager-container mode."""
 
@@ -657,9 +821,82 @@ def _get_configured_runtime_name():
     return configured
 
 
+#  (kind, server name) -> (module, fingerprint, result) kept by _memoised
+_memo = {}
+#  whether forget_cached has been added to the data store save listeners
+_memo_listening = False
+
+
+def _data_fingerprint(server):
+    """Return what identifies the current contents of *server*'s data, or ``None``."""
+
+    try:
+        return json.dumps(dict(server.data), sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+
+
+def _memoised(kind, server, build):
+    """Return ``build()``, reusing its result while *server* is unchanged.
+
+    The result is reused for the same server name and module object while the
+    server's data and the configured runtime backend stay the same. Callers
+    always get their own copy. Servers whose data can't be serialised aren't
+    memoised.
+    """
+
+    global _memo_listening  # pylint: disable=global-statement
+    fingerprint = _data_fingerprint(server)
+    if fingerprint is None:
+        return build()
+    if not _memo_listening:
+        data_module = sys.modules.get("server.data")
+        if data_module is not None:
+            data_module.JSONDataStore.save_listeners.append(_forget_saved)
+            _memo_listening = True
+    fingerprint = (fingerprint, _get_configured_runtime_name())
+    key = (kind, getattr(server, "name", None))
+    module = getattr(server, "module", None)
+    cached = _memo.get(key)
+    if cached is not None and cached[0] is module and cached[1] == fingerprint:
+        return copy.deepcopy(cached[2])
+    result = build()
+    _memo[key] = (module, fingerprint, copy.deepcopy(result))
+    return result
+
+
+def forget_cached(name=None):
+    """Drop the memoised metadata and container specs of server *name*.
+
+    Without a *name* everything memoised is dropped, including the mount
+    roots found by _current_container_identity_mount_roots.
+    """
+
+    global _identity_roots  # pylint: disable=global-statement
+    if name is None:
+        _identity_roots = None
+    for key in list(_memo):
+        if name is None or key[1] == name:
+            del _memo[key]
+
+
+def _forget_saved(filename, _data):
+    """Data store save listener: forget what was memoised for the saved server."""
+
+    basename = os.path.basename(filename)
+    if basename.endswith(".json"):
+        forget_cached(basename[:-5])
+
+
 def resolve_runtime_metadata(server):
     """Resolve the effective runtime metadata for *server*."""
 
+    return _memoised("metadata", server, lambda: _resolve_runtime_metadata(server))
+
+
+def _resolve_runtime_metadata(server):
+    """Work out the runtime metadata of *server*, see resolve_runtime_metadata."""
+
     existing = _existing_runtime_metadata(server)
     module = getattr(server, "module", None)
     if module is not None:
@@ -912,6 +1149,10 @@ def validate_set_value(server, key, *value):
         network_mode = str(value[0]).strip()
         if not network_mode:
             raise RuntimeError("network_mode cannot be empty")
+        if network_mode.lower() in BUILTIN_NETWORK_MODES:
+            network_mode = network_mode.lower()
+        if network_mode == HOST_NETWORK_MODE:
+            _validate_host_network_ports(server)
         return network_mode
 
     if top_level == "stop_mode":
@@ -930,8 +1171,43 @@ def validate_set_value(server, key, *value):
     raise RuntimeError("Unsupported runtime key: " + ".".join(key))
 
 
+def _validate_host_network_ports(server):
+    """Reject host networking for *server* if its container remaps any port.
+
+    With the host's network stack the game binds its ports on the host
+    directly, so a port published on a different host port can't be kept.
+    """
+
+    try:
+        spec = get_container_spec(server)
+    except (AttributeError, KeyError, RuntimeError, TypeError, ValueError):
+        #  nothing to check yet, starting the server reports the problem
+        return
+    remapped = [
+        "{}->{}/{}".format(entry["host"], entry["container"], entry.get("protocol", "udp"))
+        for entry in spec.get("ports", ())
+        if isinstance(entry, dict) and int(entry.get("host", 0)) != int(entry.get("container", 0))
+    ]
+    if remapped:
+        raise RuntimeError(
+            "network_mode host can't remap ports, they would be bound as their container ports: "
+            + ", ".join(remapped)
+        )
+
+
 def get_container_spec(server, *args, **kwargs):
-    """Return the effective container spec for *server*."""
+    """Return the effective container spec for *server*.
+
+    Specs built with start arguments aren't memoised.
+    """
+
+    if args or kwargs:
+        return _build_container_spec(server, *args, **kwargs)
+    return _memoised("spec", server, lambda: _build_container_spec(server))
+
+
+def _build_container_spec(server, *args, **kwargs):
+    """Build the container spec of *server*, see get_container_spec."""
 
     module = getattr(server, "module", None)
     if module is not None:
@@ -972,10 +1248,18 @@ class BaseRuntime:
         """Force-kill *server*."""
         raise NotImplementedError
 
+    def wait_stopped(self, server, timeout):
+        """Wait up to *timeout* seconds for *server* to stop. Returns whether it has."""
+        return wait_until(lambda: not self.is_running(server), timeout)
+
     def send_input(self, server, text):
         """Send console input to *server*."""
         raise NotImplementedError
 
+    def log_path(self, server):
+        """Return the console log file of *server*, or ``None`` if it hasn't one."""
+        return None
+
     def connect(self, server):
         """Connect to the live server session."""
         raise NotImplementedError
@@ -1002,9 +1286,15 @@ class ProcessRuntime(BaseRuntime):
     def kill(self, server):
         screen.send_to_screen(server.name, ["quit"])
 
+    def wait_stopped(self, server, timeout):
+        return screen.wait_for_screen_exit(server.name, timeout)
+
     def send_input(self, server, text):
         screen.send_to_server(server.name, text)
 
+    def log_path(self, server):
+        return screen.logpath(server.name)
+
     def connect(self, server):
         screen.connect_to_screen(server.name)
 
@@ -1017,13 +1307,41 @@ class ProcessRuntime(BaseRuntime):
             raise RuntimeError("Failed to read log file: " + log_file)
 
 
+#  returned by ContainerRuntime._api when the docker CLI should be used instead
+_USE_CLI = object()
+#  put on every container AlphaGSM creates, with the server name as the value
+CONTAINER_LABEL = "alphagsm.server"
+#  hash of what a container was created with, see ContainerRuntime._spec_hash
+SPEC_LABEL = "alphagsm.spec"
+
+
 class ContainerRuntime(BaseRuntime):
-    """Docker-backed runtime."""
+    """Docker-backed runtime.
+
+    Operations go through the Docker Engine API (see :mod:`server.docker_api`)
+    when the daemon socket is available and fall back to the docker CLI.
+    """
 
     runtime_name = "docker"
     running_description = "docker container is running"
     missing_description = "no docker container"
 
+    @staticmethod
+    def _api(operation, *args, **kwargs):
+        """Call a Docker API client method, or return ``_USE_CLI`` if the CLI should be used."""
+
+        from server import docker_api
+
+        client = docker_api.get_client()
+        if client is None:
+            return _USE_CLI
+        try:
+            return getattr(client, operation)(*args, **kwargs)
+        except docker_api.DockerUnavailable:
+            return _USE_CLI
+        except docker_api.DockerAPIError as ex:
+            raise RuntimeError(str(ex)) from ex
+
     @staticmethod
     def _run_check_output(command, text=False):
         """Execute a Docker CLI command and return its output."""
@@ -1041,18 +1359,59 @@ class ContainerRuntime(BaseRuntime):
         except OSError as ex:
             raise RuntimeError("Error executing docker: " + str(ex)) from ex
 
-    def _image_exists(self, image):
-        """Return whether *image* is already available locally."""
+    def _image_id(self, image):
+        """Return the id of *image* if it is available locally, else ``None``."""
 
+        image_id = self._api("image_id", image)
+        if image_id is not _USE_CLI:
+            return image_id
         try:
-            self._run_check_output(["docker", "image", "inspect", image], text=True)
+            output = self._run_check_output(
+                ["docker", "image", "inspect", "-f", "{{.Id}}", image], text=True
+            )
         except RuntimeError:
-            return False
-        return True
+            return None
+        return output.strip() or image
+
+    def _image_exists(self, image):
+        """Return whether *image* is already available locally."""
+
+        return self._image_id(image) is not None
+
+    def _build_image(self, image, dockerfile_path):
+        """Build *image* from one of the repository's runtime family Dockerfiles."""
+
+        self._run_check_output(
+            [
+                "docker",
+                "build",
+                "-f",
+                dockerfile_path,
+                "-t",
+                image,
+                REPO_ROOT,
+            ],
+            text=True,
+        )
+
+    def _pull_image(self, image):
+        """Pull *image* from its registry."""
+
+        if self._api("pull_image", image) is _USE_CLI:
+            self._run_check_output(["docker", "pull", image], text=True)
 
     def _container_running_state(self, name):
         """Return ``True``/``False`` if *name* exists, else ``None``."""
 
+        from server import container_state
+
+        try:
+            return container_state.cached_running(name)
+        except KeyError:
+            pass
+        state = self._api("container_running", name)
+        if state is not _USE_CLI:
+            return state
         try:
             output = self._run_check_output(
                 ["docker", "inspect", "-f", "{{.State.Running}}", name],
@@ -1094,45 +1453,158 @@ class ContainerRuntime(BaseRuntime):
         family = canonicalize_runtime_family(spec.get("runtime_family"))
         if not image or not family:
             return
-        if self._image_exists(image):
-            return
+        self.ensure_image(image, family)
 
-        default_image = RUNTIME_FAMILY_DEFAULTS.get(family, {}).get("image")
-        if image != default_image:
-            return
+    def ensure_image(self, image, family=None, pull=False):
+        """Make *image* available locally and return how it was found.
 
-        dockerfile_path = self._runtime_family_dockerfile(family)
-        if dockerfile_path is None:
-            return
+        Returns "recorded" if an earlier check recorded the image (see
+        :mod:`server.images`, Docker isn't asked), "present" if it was already
+        there, "built" if it is a default runtime family image that was built
+        from the repository, "pulled" if *pull* is set and it was pulled, or
+        ``None`` if it was left for ``docker run`` to pull. Concurrent calls
+        for the same image wait for one build or pull.
+        """
 
-        self._run_check_output(
-            [
-                "docker",
-                "build",
-                "-f",
-                dockerfile_path,
-                "-t",
-                image,
-                REPO_ROOT,
-            ],
-            text=True,
-        )
+        from server import images
+
+        family = canonicalize_runtime_family(family)
+        if images.recorded_id(image) is not None:
+            return "recorded"
+        with images.image_lock(image):
+            #  another command may have built or pulled it while we waited
+            if images.recorded_id(image) is not None:
+                return "recorded"
+            image_id = self._image_id(image)
+            how = "present"
+            if image_id is None:
+                default_image = RUNTIME_FAMILY_DEFAULTS.get(family, {}).get("image")
+                dockerfile_path = self._runtime_family_dockerfile(family) if image == default_image else None
+                if dockerfile_path is not None:
+                    self._build_image(image, dockerfile_path)
+                    how = "built"
+                elif pull:
+                    self._pull_image(image)
+                    how = "pulled"
+                else:
+                    return None
+                image_id = self._image_id(image)
+            if image_id is not None:
+                images.record(image, image_id, how)
+            return how
+
+    @staticmethod
+    def _reuse_containers():
+        """Return whether stopped containers are kept and started again when unchanged."""
+
+        value = str(settings.user.getsection("runtime").get("container_reuse", "no")).strip().lower()
+        return value in ("yes", "on", "true", "1")
+
+    def _spec_hash(self, spec, labels):
+        """Return a hash of everything a container for *spec* is created with.
+
+        That is the create request ``docker run`` would send, and the id of
+        the image it would use, so a rebuilt or re-pulled image also counts
+        as a change. The id is always asked of Docker rather than taken from
+        :mod:`server.images`, as the tag may have been rebuilt or re-pulled
+        outside AlphaGSM.
+        """
+
+        from server import docker_api
+
+        image_id = self._image_id(spec["image"])
+        config = docker_api.container_config(spec, labels)
+        text = json.dumps({"config": config, "image_id": image_id}, sort_keys=True)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _container_labels(self, name):
+        """Return the labels of container *name*, or ``{}`` if it can't be inspected."""
+
+        info = self._api("inspect_container", name)
+        if info is _USE_CLI:
+            try:
+                output = self._run_check_output(
+                    ["docker", "inspect", "-f", "{{json .Config.Labels}}", name], text=True
+                )
+                labels = json.loads(output or "null")
+            except (RuntimeError, ValueError):
+                return {}
+        else:
+            labels = ((info or {}).get("Config") or {}).get("Labels")
+        return labels if isinstance(labels, dict) else {}
+
+    def _start_existing(self, name):
+        """Start the stopped container *name* again. Returns whether that worked."""
+
+        try:
+            if self._api("start_container", name) is _USE_CLI:
+                self._run_check_output(["docker", "start", name], text=True)
+        except RuntimeError:
+            return False
+        return True
+
+    @staticmethod
+    def _console_attach():
+        """Return whether console input may go over a held attach connection."""
+
+        from server import docker_api
+
+        return docker_api.console_attach_enabled()
+
+    @staticmethod
+    def _forget_state(name):
+        """Stop answering for container *name* from a primed fleet snapshot."""
+
+        from server import container_state
+
+        container_state.forget(name)
 
     def start(self, server, *args, **kwargs):
         spec = get_container_spec(server, *args, **kwargs)
         self._validate_mount_path_identity(spec)
         self._ensure_runtime_image_available(spec)
         container_state = self._container_running_state(spec["container_name"])
-        if container_state is False:
-            self._run_check_output(["docker", "rm", "-f", spec["container_name"]], text=True)
-        elif container_state is True:
+        if container_state is True:
             raise RuntimeError("Docker container is already running: " + spec["container_name"])
+        self._forget_state(spec["container_name"])
+        self._api("forget_console", spec["container_name"])
+        labels = {CONTAINER_LABEL: server.name}
+        if self._reuse_containers():
+            #  the hash covers the image id, so pull now rather than leaving it to docker run
+            self.ensure_image(spec["image"], spec.get("runtime_family"), pull=True)
+            labels[SPEC_LABEL] = self._spec_hash(spec, labels)
+            if (
+                container_state is False
+                and self._container_labels(spec["container_name"]).get(SPEC_LABEL) == labels[SPEC_LABEL]
+                and self._start_existing(spec["container_name"])
+            ):
+                return
+        if container_state is False:
+            if self._api("remove_container", spec["container_name"]) is _USE_CLI:
+                self._run_check_output(["docker", "rm", "-f", spec["container_name"]], text=True)
+        try:
+            self._run_container(spec, labels)
+        except RuntimeError:
+            if spec.get("image"):
+                from server import images
+
+                #  the recorded image may have been removed since, look again next time
+                images.forget(spec["image"])
+            raise
+
+    def _run_container(self, spec, labels):
+        """Create and start the container of *spec*, like ``docker run -d``."""
+
+        if self._api("run_container", spec, labels) is not _USE_CLI:
+            return
         command = ["docker", "run", "-d"]
         if spec.get("stdin_open", False):
             command.append("-i")
         if spec.get("tty", False):
             command.append("-t")
         command.extend(["--name", spec["container_name"]])
+        for key, value in sorted(labels.items()):
+            command.extend(["--label", f"{key}={value}"])
         if spec.get("network_mode"):
             command.extend(["--network", spec["network_mode"]])
         if spec.get("working_dir"):
@@ -1144,7 +1616,7 @@ class ContainerRuntime(BaseRuntime):
                 mode = mount.get("mode", "rw")
                 mount = f"{mount['source']}:{mount['target']}:{mode}"
             command.extend(["-v", str(mount)])
-        for port in spec.get("ports", ()):
+        for port in () if uses_host_network(spec) else spec.get("ports", ()):
             if isinstance(port, dict):
                 proto = port.get("protocol", "tcp")
                 port = f"{port['host']}:{port['container']}/{proto}"
@@ -1157,13 +1629,42 @@ class ContainerRuntime(BaseRuntime):
         name = resolve_runtime_metadata(server).get("container_name", "alphagsm-" + server.name)
         return self._container_running_state(name) is True
 
+    def wait_stopped(self, server, timeout):
+        """Block in ``docker wait`` until the container stops or *timeout* passes."""
+        name = resolve_runtime_metadata(server).get("container_name", "alphagsm-" + server.name)
+        self._forget_state(name)
+        if self._api("wait_container", name, timeout) is not _USE_CLI:
+            return not self.is_running(server)
+        try:
+            sp.run(
+                ["docker", "wait", name],
+                stdout=sp.DEVNULL,
+                stderr=sp.DEVNULL,
+                timeout=max(timeout, 0),
+                check=False,
+            )
+        except sp.TimeoutExpired:
+            pass
+        except OSError:
+            #  no docker CLI to wait with, fall back to probing
+            return super().wait_stopped(server, timeout)
+        return not self.is_running(server)
+
     def kill(self, server):
         name = resolve_runtime_metadata(server).get("container_name", "alphagsm-" + server.name)
+        self._forget_state(name)
+        self._api("forget_console", name)
         try:
-            self._run_check_output(["docker", "stop", "--time", "10", name], text=True)
+            if self._api("stop_container", name, 10) is _USE_CLI:
+                self._run_check_output(["docker", "stop", "--time", "10", name], text=True)
         except RuntimeError:
             pass
-        self._run_check_output(["docker", "rm", "-f", name], text=True)
+        else:
+            if self._reuse_containers():
+                #  kept for the next start, which removes it if the spec has changed
+                return
+        if self._api("remove_container", name) is _USE_CLI:
+            self._run_check_output(["docker", "rm", "-f", name], text=True)
 
     def send_input(self, server, text):
         spec = get_container_spec(server)
@@ -1172,7 +1673,21 @@ class ContainerRuntime(BaseRuntime):
             raise RuntimeError(
                 "Runtime send_input is only supported for docker stop_mode=exec-console"
             )
+        self._forget_state(spec["container_name"])
+        if spec.get("stdin_open", False) and self._console_attach():
+            #  the attached stdin is the main process's, the one the exec below writes to
+            sent = self._api("send_console", spec["container_name"], text.encode("utf-8"))
+            if sent is True:
+                return
         shell_command = "printf '%s' {} > /proc/1/fd/0".format(shlex.quote(text))
+        result = self._api("exec_run", spec["container_name"], ["sh", "-lc", shell_command])
+        if result is not _USE_CLI:
+            exit_code, output = result
+            if exit_code != 0:
+                raise RuntimeError(
+                    output.decode(errors="replace").strip() or "Docker command failed"
+                )
+            return
         self._run_check_output(
             ["docker", "exec", spec["container_name"], "sh", "-lc", shell_command],
             text=True,
@@ -1189,6 +1704,14 @@ class ContainerRuntime(BaseRuntime):
 
     def show_logs(self, server, lines=50):
         spec = get_container_spec(server)
+        chunks = self._api("logs", spec["container_name"], lines)
+        if chunks is not _USE_CLI:
+            for stream, chunk in chunks:
+                out = sys.stderr if stream == 2 else sys.stdout
+                out.flush()
+                out.buffer.write(chunk)
+                out.buffer.flush()
+            return
         result = sp.run(
             ["docker", "logs", "--tail", str(lines), spec["container_name"]],
             check=False,
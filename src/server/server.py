@@ -12,15 +12,17 @@ import json
 import os
 import subprocess as sp
 import copy
+from . import commands
 from . import data
 from . import port_manager
+from . import readiness
 from . import runtime as runtime_module
 from .errors import ServerError
 from importlib import import_module
 import screen
 import time
-import crontab
 from types import SimpleNamespace
+from utils import progress
 from utils.cmdparse.cmdspec import CmdSpec, ArgSpec, OptSpec
 from utils.settings import settings
 from collections.abc import Mapping as MappingABC
@@ -35,6 +37,9 @@ DATAPATH = os.path.expanduser(
         ),
     )
 )
+#  how long each do_stop attempt gets before the next one, and how long a killed server gets to go
+STOP_ATTEMPT_SECONDS = 60
+KILL_WAIT_SECONDS = 5
 SERVERMODULEPACKAGE = settings.system.getsection("server").get(
     "servermodulespackage", "gamemodules."
 )
@@ -151,189 +156,9 @@ class Server(object):
         self.data: the backend data store for this server. DO NOT REPLACE
     """
 
-    default_commands = (
-        "setup",
-        "start",
-        "stop",
-        "restart",
-        "kill",
-        "activate",
-        "deactivate",
-        "status",
-        "send",
-        "message",
-        "connect",
-        "logs",
-        "dump",
-        "set",
-        "backup",
-        "restore",
-        "wipe",
-        "query",
-        "info",
-    )
-    default_command_args = {
-        "setup": CmdSpec(
-            options=(
-                OptSpec(
-                    "n",
-                    ["noask"],
-                    "Don't ask for input. Just fail if we can't cope",
-                    "ask",
-                    None,
-                    False,
-                ),
-            )
-        ),
-        "start": CmdSpec(),
-        "stop": CmdSpec(),
-        "activate": CmdSpec(
-            options=(
-                OptSpec(
-                    "d",
-                    ["delay"],
-                    "Delay starting the server just setup the crontab",
-                    "start",
-                    None,
-                    False,
-                ),
-            )
-        ),
-        "deactivate": CmdSpec(
-            options=(
-                OptSpec(
-                    "d",
-                    ["delay"],
-                    "Delay stopping the server just remove the crontab",
-                    "stop",
-                    None,
-                    False,
-                ),
-            )
-        ),
-        "status": CmdSpec(
-            options=(
-                OptSpec(
-                    "v",
-                    ["verbose"],
-                    "Verbose status. argument is the level from 0 (normal) to 3 (max)",
-                    "verbose",
-                    "LEVEL",
-                    int,
-                ),
-            )
-        ),
-        "restart": CmdSpec(),
-        "kill": CmdSpec(),
-        "send": CmdSpec(
-            requiredarguments=(
-                ArgSpec("INPUT", "The text to send to the server console", str),
-            )
-        ),
-        "message": CmdSpec(
-            requiredarguments=(ArgSpec("MESSAGE", "The message to send", str),)
-        ),
-        "connect": CmdSpec(),
-        "logs": CmdSpec(
-            options=(
-                OptSpec(
-                    "n",
-                    ["lines"],
-                    "Number of lines to show (default 50)",
-                    "lines",
-                    "N",
-                    int,
-                ),
-            )
-        ),
-        "dump": CmdSpec(),
-        "set": CmdSpec(
-            requiredarguments=(
-                ArgSpec(
-                    "KEY", "The key to set in the form of dot seperated elements", str
-                ),
-            ),
-            optionalarguments=(
-                ArgSpec(
-                    "VALUE",
-                    "The value to set. New nodes in the structure will be created as needed. "
-                    "Exactly how many values can be specified is KEY dependant.",
-                    str,
-                ),
-            ),
-            repeatable=True,
-        ),
-        "backup": CmdSpec(),
-        "restore": CmdSpec(
-            optionalarguments=(
-                ArgSpec(
-                    "BACKUP",
-                    "Backup file name or index to restore. "
-                    "If omitted, available backups are listed.",
-                    str,
-                ),
-            )
-        ),
-        "wipe": CmdSpec(),
-        "query": CmdSpec(),
-        "info": CmdSpec(
-            options=(
-                OptSpec(
-                    "j",
-                    ["json"],
-                    "Output result as JSON instead of human-readable text",
-                    "as_json",
-                    None,
-                    True,
-                ),
-                OptSpec(
-                    "d",
-                    ["detailed"],
-                    "Include extended details (e.g. TeamSpeak 3 channel list)",
-                    "detailed",
-                    None,
-                    True,
-                ),
-            )
-        ),
-    }
-    default_command_descriptions = {
-        "setup": "Setup the game server.\nThis will include processing the required settings,"
-        " downloading or copying any needed files and doing any setup task so that a"
-        " 'start' should work.\nIf noask is specified then this may fail if extra "
-        "game server dependant settings are not provided.",
-        "start": "Start the server.",
-        "stop": "Stop the server.",
-        "restart": "Stop the server and start it again.",
-        "kill": "Force-kill the server process immediately without a graceful shutdown.",
-        "activate": "Set the server to restart on reboots and start now unless --delay is specified.",
-        "deactivate": "Stop the server from restarting on reboots and stop now unless --delay is specified.",
-        "status": "Check the status of the server. At the minimum will report if the server is running.",
-        "send": "Send a line of text directly to the server console (for admin commands, not player chat).",
-        "message": "Message the server. By default sends the message to all users.",
-        "connect": "Connect to the server's console session.",
-        "logs": "Show the last lines of the server console log (default 50). Use -n to change the count.",
-        "dump": "Dump the servers data store.",
-        "set": "Set a parameter in data store to a new value.\nFor keys that index into lists the special entry 'APPEND' my be used to create a new "
-        "entry at the end of the list. Also for some keys value 'DELETE' is a value that causes the entry to be deleted.\n\n"
-        "Which values are changable is game module dependent",
-        "backup": "Backup the game server",
-        "restore": "Restore the game server from a backup.\n"
-        "With no argument, lists available backups with their index numbers.\n"
-        "Pass an index or the exact filename to restore that backup.\n"
-        "The server will be stopped first if it is running.",
-        "wipe": "Delete game-world data for supported server types.\n"
-        "The server must be stopped before wiping. "
-        "Which files are removed is defined by the game module.",
-        "query": "Query the game server to check whether it is responding.\n"
-        "Uses the Source A2S protocol when a query port is configured, "
-        "otherwise falls back to a TCP ping on the game port.",
-        "info": "Retrieve detailed server information: player count, map, version, etc.\n"
-        "For Minecraft servers uses the Server List Ping (SLP) protocol.\n"
-        "For Source/Steam servers uses A2S_INFO.  Falls back to a TCP ping.\n"
-        "Use -j / --json to emit the result as a JSON object.\n"
-        "Use -d / --detailed to include extended data (e.g. TeamSpeak 3 channel list).",
-    }
+    default_commands = commands.DEFAULT_COMMANDS
+    default_command_args = commands.DEFAULT_COMMAND_ARGS
+    default_command_descriptions = commands.DEFAULT_COMMAND_DESCRIPTIONS
 
     def __init__(self, name, module=None):
         """Initialise this Server object.
@@ -366,7 +191,8 @@ class Server(object):
                 raise ServerError("Error reading data", ex)
         if "module" not in self.data:
             raise ServerError("Invalid data store: No module specified")
-        truename, self.module = _findmodule(self.data["module"])
+        with progress.phase("module"):
+            truename, self.module = _findmodule(self.data["module"])
         metadata_changed = runtime_module.sync_runtime_metadata(self, save=False)
         if truename != self.data["module"]:
             print(
@@ -451,6 +277,8 @@ class Server(object):
                 self.query(*args, **kwargs)
             elif command == "info":
                 self.info(*args, **kwargs)
+            elif command == "ready":
+                self.wait_ready(*args, **kwargs)
         elif command in self.module.commands:
             self.module.command_functions[command](self, *args, **kwargs)
         else:
@@ -464,7 +292,8 @@ class Server(object):
         """Setup this server. Once this returns the server should be ready to start."""
         explicit_keys = self._explicit_setup_port_keys(args, kwargs)
         claim_values_before = self._claim_affecting_value_snapshot(self.data)
-        args, kwargs = self.module.configure(self, ask, *args, **kwargs)
+        with progress.phase("configure"):
+            args, kwargs = self.module.configure(self, ask, *args, **kwargs)
         if ask:
             explicit_keys.update(
                 self._interactive_setup_explicit_keys(claim_values_before, self.data)
@@ -472,28 +301,59 @@ class Server(object):
         runtime_module.sync_runtime_metadata(self, save=True)
         self._resolve_setup_port_claims(explicit_keys)
         runtime_module.sync_runtime_metadata(self, save=True)
-        self.module.install(self, *args, **kwargs)
+        with progress.phase("install"):
+            self.module.install(self, *args, **kwargs)
         runtime_module.sync_runtime_metadata(self, save=True)
 
-    def start(self, *args, **kwargs):
-        """Start a server. Won't start it if the server is already running."""
+    def start(self, *args, wait=False, wait_timeout=None, **kwargs):
+        """Start a server. Won't start it if the server is already running.
+
+        If *wait* is true this blocks until the server is ready for players
+        (see :mod:`server.readiness`), for at most *wait_timeout* seconds, and
+        records how long that took in the data store.
+        """
         runtime = runtime_module.get_runtime(self)
         if runtime.is_running(self):
             raise ServerError("Error: Can't start server that is already running")
-        self._assert_start_ports_available()
+        with progress.phase("ports"):
+            self._assert_start_ports_available()
         try:
             prestart = self.module.prestart
         except AttributeError:
             pass
         else:
-            prestart(self, *args, **kwargs)
-        runtime.start(self, *args, **kwargs)
+            with progress.phase("prestart"):
+                prestart(self, *args, **kwargs)
+        with progress.phase("runtime"):
+            runtime.start(self, *args, **kwargs)
         try:
             poststart = self.module.poststart
         except AttributeError:
             pass
         else:
-            poststart(self, *args, **kwargs)
+            with progress.phase("poststart"):
+                poststart(self, *args, **kwargs)
+        if wait:
+            self.wait_ready(runtime, wait_timeout)
+
+    def wait_ready(self, runtime=None, timeout=None):
+        """Block until the running server is ready and record the time it took."""
+        if runtime is None:
+            runtime = runtime_module.get_runtime(self)
+            if not runtime.is_running(self):
+                raise ServerError("Error: Can't wait for a server that isn't running")
+        if timeout is None:
+            timeout = readiness.DEFAULT_READY_TIMEOUT
+        print("Waiting up to " + str(timeout) + " seconds for the server to be ready")
+        with progress.phase("ready"):
+            seconds, signal = readiness.wait_until_ready(self, runtime, timeout)
+        print("Server is ready after {:.1f} seconds".format(seconds))
+        self.data["readiness"] = {
+            "seconds": round(seconds, 1),
+            "signal": signal,
+            "time": int(time.time()),
+        }
+        self.data.save()
 
     def stop(self, *args, **kwargs):
         """Stop the server. If the server can't be stopped even after multiple attempts then raises a ServerError"""
@@ -511,11 +371,8 @@ class Server(object):
                 self.module.do_stop(self, j, *args, **kwargs)
             except (screen.ProcessError, runtime_module.RuntimeError):
                 break  # backend can't send input cross-invocation; fall through to kill
-            for i in range(6):
-                if not runtime.is_running(self):
-                    return  # session doesn't exist so success
-                time.sleep(10)
-            if not runtime.is_running(self):
+            #  returns as soon as the session is gone
+            if runtime.wait_stopped(self, STOP_ATTEMPT_SECONDS):
                 return
             print("Server isn't stopping after " + str(j + 1) + " minutes")
         print("Killing Server")
@@ -523,14 +380,13 @@ class Server(object):
             runtime.kill(self)
         except runtime_module.RuntimeError as ex:
             raise ServerError(str(ex))
-        time.sleep(1)
-        if runtime.is_running(self):
+        if not runtime.wait_stopped(self, KILL_WAIT_SECONDS):
             raise ServerError("Error can't kill server")
 
-    def restart(self, *args, **kwargs):
-        """Stop then start the server."""
+    def restart(self, *args, wait=False, wait_timeout=None, **kwargs):
+        """Stop then start the server, optionally waiting for it to be ready."""
         self.stop(*args, **kwargs)
-        self.start(*args, **kwargs)
+        self.start(*args, wait=wait, wait_timeout=wait_timeout, **kwargs)
 
     def kill(self):
         """Force-kill the server by terminating the screen session immediately."""
@@ -541,16 +397,20 @@ class Server(object):
             runtime.kill(self)
         except runtime_module.RuntimeError as ex:
             raise ServerError(str(ex))
-        time.sleep(1)
-        if runtime.is_running(self):
+        if not runtime.wait_stopped(self, KILL_WAIT_SECONDS):
             raise ServerError("Error: Could not kill server")
         print("Server killed")
 
-    def status(self, *args, verbose=0, **kwargs):
-        """Print the status of the server. At the least shows if there is a server screen session running"""
+    def status(self, *args, verbose=0, check=False, **kwargs):
+        """Print the status of the server. At the least shows if there is a server screen session running
+
+        With *check* a ServerError is raised if the server isn't running.
+        """
         runtime = runtime_module.get_runtime(self)
         if not runtime.is_running(self):
             print("Server isn't running as " + runtime.missing_description)
+            if check:
+                raise ServerError("Error: Server isn't running")
         else:
             print("Server is running as " + runtime.running_description)
             if verbose > 0:
@@ -1073,6 +933,7 @@ class Server(object):
             "publicip",
             "externalip",
             "hostip",
+            "network_mode",
         )
 
     def _claim_affecting_value_snapshot(self, payload):
@@ -1279,6 +1140,7 @@ class Server(object):
     def activate(self, start=True):
         """Activate the server by enabling it in crontab and optionally starting it if not already running"""
         from core import program
+        import crontab
 
         programpath = program.PATH
         ct = crontab.CronTab(user=True)
@@ -1317,6 +1179,7 @@ class Server(object):
     def deactivate(self, stop=True):
         """Activate the server by disabling it in crontab and optionally stopping it if it is running"""
         from core import program
+        import crontab
 
         programpath = program.PATH
         if stop and runtime_module.check_server_running(self):
@@ -0,0 +1,168 @@
+"""Thin client and wire format for the optional ``alphagsmd`` daemon.
+
+The daemon (see :mod:`core.daemon`) keeps an initialised AlphaGSM interpreter
+running behind a Unix socket. This module deliberately imports nothing from
+``core`` or ``server`` so that the ``alphagsm`` entry point can try the daemon
+first and only pay for the full import chain when it has to run the command
+itself.
+
+Wire format: the client sends one JSON object terminated by a newline. The
+daemon answers with frames made of a one byte type, a four byte big-endian
+payload length and the payload:
+
+* ``o`` - bytes written to stdout by the command
+* ``e`` - bytes written to stderr by the command
+* ``x`` - the command finished; the payload is the decimal exit status
+* ``r`` - the daemon refused the request; the payload is the reason and the
+  client should run the command itself
+"""
+
+import json
+import os
+import socket
+import struct
+import sys
+
+from utils.settings import settings
+
+__all__ = [
+    "PROTOCOL_VERSION",
+    "build_request",
+    "encode_frame",
+    "read_frame",
+    "run",
+    "socket_path",
+    "write_frame",
+]
+
+PROTOCOL_VERSION = 2
+FRAME_HEADER = struct.Struct("!cI")
+FRAME_STDOUT = b"o"
+FRAME_STDERR = b"e"
+FRAME_EXIT = b"x"
+FRAME_REFUSED = b"r"
+
+#  Commands that need the caller's terminal. These always run locally.
+_INTERACTIVE_COMMANDS = ("connect",)
+_PROMPTING_COMMANDS = ("setup",)
+_NOASK_OPTIONS = ("-n", "--noask")
+
+
+def socket_path():
+    """Return the path of the daemon's control socket."""
+    configured = settings.user.getsection("daemon").get("socket", None)
+    if configured:
+        return os.path.expanduser(configured)
+    alphagsm_path = settings.user.getsection("core").get("alphagsm_path", "~/.alphagsm")
+    return os.path.join(os.path.expanduser(alphagsm_path), "alphagsmd.sock")
+
+
+def encode_frame(kind, payload=b""):
+    """Return the bytes of one response frame of type *kind*."""
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+
+def write_frame(sock, kind, payload=b""):
+    """Send one response frame of type *kind* over *sock*."""
+    sock.sendall(encode_frame(kind, payload))
+
+
+def _recv_exact(sock, size):
+    """Read exactly *size* bytes, returning ``None`` if the peer went away."""
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_frame(sock):
+    """Read one response frame, returning ``(kind, payload)`` or ``None`` at EOF."""
+    header = _recv_exact(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    kind, size = FRAME_HEADER.unpack(header)
+    payload = _recv_exact(sock, size) if size else b""
+    if payload is None:
+        return None
+    return kind, payload
+
+
+def _needs_terminal(args):
+    """Return whether the command line might need to interact with the user."""
+    lowered = [str(arg).lower() for arg in args]
+    if any(cmd in lowered for cmd in _INTERACTIVE_COMMANDS):
+        return True
+    if any(cmd in lowered for cmd in _PROMPTING_COMMANDS):
+        return not any(opt in lowered for opt in _NOASK_OPTIONS)
+    return False
+
+
+def build_request(name, args):
+    """Return the request object describing this invocation."""
+    return {
+        "version": PROTOCOL_VERSION,
+        "name": name,
+        "args": list(args),
+        "cwd": os.getcwd(),
+        "uid": os.getuid(),
+        "config": os.environ.get("ALPHAGSM_CONFIG_LOCATION"),
+        "userconfig": os.environ.get("ALPHAGSM_USERCONFIG_LOCATION"),
+        "debug": os.environ.get("ALPHAGSM_DEBUG"),
+        "env": dict(os.environ),
+    }
+
+
+def run(name, args, out=None, err=None):
+    """Run an AlphaGSM command through the daemon if one is available.
+
+    Returns the command's exit status, or ``None`` when the caller should run
+    the command itself: the daemon is disabled with ``ALPHAGSM_NO_DAEMON``, is
+    not running, refused the request, or the command needs a terminal.
+    """
+    if os.environ.get("ALPHAGSM_NO_DAEMON") or not hasattr(socket, "AF_UNIX"):
+        return None
+    if _needs_terminal(args):
+        return None
+    path = socket_path()
+    if not os.path.exists(path):
+        return None
+    out = out if out is not None else sys.stdout.buffer
+    err = err if err is not None else sys.stderr.buffer
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(path)
+            sock.sendall(json.dumps(build_request(name, args)).encode() + b"\n")
+        except OSError:
+            return None
+        started = False
+        while True:
+            try:
+                frame = read_frame(sock)
+            except OSError:
+                frame = None
+            if frame is None:
+                if not started:
+                    return None
+                #  The command may have already done things so don't rerun it.
+                err.write(b"Lost connection to alphagsmd before the command finished\n")
+                err.flush()
+                return 1
+            kind, payload = frame
+            if kind == FRAME_REFUSED and not started:
+                return None
+            started = True
+            if kind == FRAME_STDOUT:
+                out.write(payload)
+                out.flush()
+            elif kind == FRAME_STDERR:
+                err.write(payload)
+                err.flush()
+            elif kind == FRAME_EXIT:
+                return int(payload)
+    finally:
+        sock.close()
@@ -0,0 +1,278 @@
+"""Structured progress events from alphagsm-internal children to the parent.
+
+Multi-server commands used to learn about their children only from the
+``#%AlphaGSM-INTERNAL%#`` ready line and whatever the children printed. When
+the parent sets :data:`ENV_FD` to a pipe's file descriptor, the child also
+writes one JSON object per line to that pipe:
+
+* ``{"event": "phase", "phase": "runtime", "state": "start", "time": ...}``
+  and a matching ``"state": "end"`` with ``"ok"`` and ``"seconds"``
+* ``{"event": "progress", "phase": "download", "percent": 45.1, "time": ...}``
+* ``{"event": "result", "status": 0, "time": ...}``
+
+Everything here is a no-op when no channel was passed in, so game modules and
+helpers can call :func:`phase` and :func:`percent` unconditionally.
+:class:`FleetProgress` is the parent's side: it collects the events of every
+child and renders them as a status table and a per-server timing summary.
+
+This module only imports the standard library so it is cheap to load in
+children.
+"""
+
+import contextlib
+import json
+import os
+import time
+
+__all__ = [
+    "ENV_FD",
+    "FleetProgress",
+    "enabled",
+    "open_channel",
+    "passed_to_children",
+    "percent",
+    "phase",
+    "result",
+]
+
+ENV_FD = "ALPHAGSM_PROGRESS_FD"
+
+#  (value of ENV_FD the writer was opened for, writer or None)
+_writer = (None, None)
+
+
+def _get_writer():
+    """Return a file for the channel named by :data:`ENV_FD`, or ``None``.
+
+    The environment is checked on every call so forked children pick up the
+    channel their parent set up just before forking.
+    """
+    global _writer  # pylint: disable=global-statement
+    value = os.environ.get(ENV_FD)
+    if value == _writer[0]:
+        return _writer[1]
+    writer = None
+    if value:
+        try:
+            fd = int(value)
+            #  don't hand the channel on to the game server or other helpers
+            os.set_inheritable(fd, False)
+            writer = os.fdopen(fd, "w", buffering=1, closefd=False)
+        except (ValueError, OSError):
+            writer = None
+    _writer = (value, writer)
+    return writer
+
+
+def enabled():
+    """Return whether a progress channel was passed to this process."""
+    return _get_writer() is not None
+
+
+def emit(event, **fields):
+    """Write one *event* with *fields* to the progress channel if there is one."""
+    global _writer  # pylint: disable=global-statement
+    writer = _get_writer()
+    if writer is None:
+        return
+    fields["event"] = event
+    fields["time"] = time.time()
+    try:
+        writer.write(json.dumps(fields, separators=(",", ":")) + "\n")
+    except (OSError, ValueError):
+        #  the parent went away, carry on without reporting
+        _writer = (_writer[0], None)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Report the start and end of the phase *name* around a ``with`` block."""
+    emit("phase", phase=name, state="start")
+    start = time.monotonic()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        emit("phase", phase=name, state="end", ok=ok, seconds=round(time.monotonic() - start, 3))
+
+
+def percent(name, value):
+    """Report that the phase *name* is *value* percent complete."""
+    emit("progress", phase=name, percent=round(float(value), 1))
+
+
+def result(status):
+    """Report the final exit status of this child."""
+    emit("result", status=status)
+
+
+def open_channel():
+    """Return ``(reader, write_fd)`` for a new progress pipe.
+
+    *reader* is a binary file to register on the parent's multiplexer and
+    *write_fd* is handed to exactly one child, then closed by the parent.
+    """
+    read_fd, write_fd = os.pipe()
+    return os.fdopen(read_fd, "rb"), write_fd
+
+
+@contextlib.contextmanager
+def passed_to_children(write_fd):
+    """Name *write_fd* in :data:`ENV_FD` for children started in the block.
+
+    Subprocesses must also be given ``pass_fds=(write_fd,)``. Forked children
+    inherit the descriptor anyway.
+    """
+    old = os.environ.get(ENV_FD)
+    os.environ[ENV_FD] = str(write_fd)
+    try:
+        yield
+    finally:
+        if old is None:
+            del os.environ[ENV_FD]
+        else:
+            os.environ[ENV_FD] = old
+
+
+class _ServerProgress(object):
+    """What the parent knows about one child."""
+
+    def __init__(self):
+        """Start with no events seen."""
+        self.phase = None
+        self.percent = None
+        self.timings = []
+        self.status = None
+        self.failed = None
+
+
+class FleetProgress(object):
+    """Collect the progress events of several children and summarise them.
+
+    Pass :meth:`handle` as the event handler for each child's channel. When
+    *live_interval* is set a one line fleet status is printed to *file* every
+    *live_interval* seconds while children are running, as long as
+    :meth:`tick` is called at least that often.
+    """
+
+    def __init__(self, file, live_interval=None):
+        """Report to *file*, live every *live_interval* seconds if given."""
+        self.file = file
+        self.live_interval = live_interval
+        self.servers = {}
+        self.lastlive = time.monotonic()
+
+    def add(self, tag):
+        """Start tracking the child *tag*."""
+        self.servers.setdefault(tag, _ServerProgress())
+
+    def handle(self, tag, line):
+        """Update the state of *tag* from one line of its channel."""
+        try:
+            event = json.loads(line)
+        except ValueError:
+            return
+        if not isinstance(event, dict):
+            return
+        self.add(tag)
+        state = self.servers[tag]
+        kind = event.get("event")
+        if kind == "phase":
+            if event.get("state") == "start":
+                state.phase = event.get("phase")
+                state.percent = None
+            else:
+                state.timings.append((event.get("phase"), event.get("seconds", 0)))
+                if not event.get("ok", True):
+                    state.failed = event.get("phase")
+                state.phase = None
+                state.percent = None
+        elif kind == "progress":
+            state.phase = event.get("phase", state.phase)
+            state.percent = event.get("percent")
+        elif kind == "result":
+            state.status = event.get("status")
+        self._live()
+
+    def _describe(self, tag, state):
+        """Return a short description of what *tag* is doing."""
+        if state.status is not None:
+            return "{} done ({})".format(tag, state.status)
+        if state.phase is None:
+            return "{} running".format(tag)
+        text = "{} {}".format(tag, state.phase)
+        if state.percent is not None:
+            text += " {:.0f}%".format(state.percent)
+        return text
+
+    def statusline(self):
+        """Return a one line summary of the whole fleet."""
+        done = sum(1 for state in self.servers.values() if state.status is not None)
+        busy = [
+            self._describe(tag, state)
+            for tag, state in self.servers.items()
+            if state.status is None
+        ]
+        return "Progress: {}/{} finished{}".format(
+            done, len(self.servers), "; " + ", ".join(busy) if busy else ""
+        )
+
+    def _live(self):
+        """Print the fleet status if live output is on and it is due."""
+        if not self.live_interval:
+            return
+        now = time.monotonic()
+        if now - self.lastlive >= self.live_interval:
+            self.lastlive = now
+            print(self.statusline(), file=self.file, flush=True)
+
+    def tick(self):
+        """Print the fleet status if it is due, even if no events have arrived.
+
+        Meant to be called on a timer (see
+        :meth:`core.multiplexer.Multiplexer.setticker`) so a child that has
+        stalled still shows up in the live output.
+        """
+        self._live()
+
+    def summary(self):
+        """Return the per-server timing summary as a list of lines."""
+        phases = []
+        for state in self.servers.values():
+            for name, _seconds in state.timings:
+                if name not in phases:
+                    phases.append(name)
+        if not phases:
+            return []
+        rows = [["SERVER"] + phases + ["STATUS"]]
+        for tag, state in sorted(self.servers.items()):
+            seconds = {}
+            for name, value in state.timings:
+                seconds[name] = seconds.get(name, 0) + (value or 0)
+            status = "-" if state.status is None else str(state.status)
+            if state.failed is not None:
+                status += " (failed in {})".format(state.failed)
+            rows.append(
+                [tag]
+                + ["{:.1f}s".format(seconds[name]) if name in seconds else "-" for name in phases]
+                + [status]
+            )
+        return _format_rows(rows)
+
+    def printsummary(self):
+        """Print the timing summary if any child reported phases."""
+        lines = self.summary()
+        if lines:
+            print(file=self.file)
+            for line in lines:
+                print(line, file=self.file)
+
+
+def _format_rows(rows):
+    """Lay *rows* out as left aligned columns."""
+    widths = [max(len(str(row[i])) for row in rows) for i in range(len(rows[0]))]
+    return [
+        "  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip()
+        for row in rows
+    ]
@@ -0,0 +1,247 @@
+"""Blue-green updates: install into a staging tree while the server keeps running.
+
+A normal update stops the server and downloads into ``server.data["dir"]``, so
+the server is down for the whole download and validation. :func:`staged_update`
+instead clones the live install into a sibling ``<dir>.staging`` tree and runs
+the download there while the server is still up. Only then is the server
+stopped. Anything the running server wrote or deleted in the meantime
+(saves, configs, logs) is carried over into the staging tree, and the two
+trees are swapped with a pair of renames. The old tree is kept as
+``<dir>.previous`` so that :func:`rollback` can swap it back. The time of the
+swap is kept in the data store under "staged_update" so that a rollback can
+carry over what the server wrote since in the same way.
+
+The staging tree is cloned by copying by default. The ``[core]
+staged_update_clone`` setting can make it hard-link the files instead. That is
+much quicker and uses no extra disk space, but it is only safe with installers
+that replace changed files rather than rewriting them in place.
+"""
+
+import os
+import shutil
+import time
+
+from server.errors import ServerError
+from utils.settings import settings
+
+__all__ = [
+    "clone_tree",
+    "previous_dir",
+    "rollback",
+    "staged_by_default",
+    "staged_update",
+    "staging_dir",
+]
+
+STAGING_SUFFIX = ".staging"
+PREVIOUS_SUFFIX = ".previous"
+
+
+def _live_dir(server):
+    """Return the server's install directory without a trailing separator."""
+    return os.path.normpath(server.data["dir"])
+
+
+def staging_dir(server):
+    """Return the staging tree used for *server*'s next staged update."""
+    return _live_dir(server) + STAGING_SUFFIX
+
+
+def previous_dir(server):
+    """Return where the install replaced by the last staged update is kept."""
+    return _live_dir(server) + PREVIOUS_SUFFIX
+
+
+def staged_by_default():
+    """Return whether updates are staged when --staged isn't given."""
+    value = str(settings.user.getsection("core").get("staged_updates", "false"))
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _clone_mode():
+    """Return how the staging tree is cloned, "copy" or "hardlink"."""
+    mode = str(settings.user.getsection("core").get("staged_update_clone", "copy")).strip().lower()
+    if mode not in ("copy", "hardlink"):
+        print("Unknown staged_update_clone", mode, "using copy")
+        mode = "copy"
+    return mode
+
+
+def clone_tree(source, target, hardlink=False):
+    """Copy the tree *source* to the new directory *target*, keeping symlinks.
+
+    File times are preserved, which is what lets :func:`staged_update` tell
+    the files an update changed from the ones it didn't.
+    """
+    shutil.copytree(
+        source, target, symlinks=True, copy_function=os.link if hardlink else shutil.copy2
+    )
+
+
+def _carry_over(live, staged, since, deletions=True):
+    """Copy files the running server changed after *since* into *staged*.
+
+    Files the update itself replaced are left alone. With *deletions*, files
+    in *staged* that are older than *since* but no longer in *live* were
+    deleted by the server and are removed from *staged* too. Returns how many
+    files were copied and how many were removed.
+    """
+    copied = 0
+    for root, dirs, files in os.walk(live):
+        rel_root = os.path.relpath(root, live)
+        staged_root = staged if rel_root == "." else os.path.join(staged, rel_root)
+        for filename in files:
+            source = os.path.join(root, filename)
+            target = os.path.join(staged_root, filename)
+            try:
+                if os.lstat(source).st_mtime <= since:
+                    continue
+                if os.path.lexists(target):
+                    if os.path.samefile(source, target):
+                        continue  # still hard-linked, so already up to date
+                    if os.lstat(target).st_mtime > since:
+                        continue  # replaced by the update
+                    os.remove(target)
+                os.makedirs(staged_root, exist_ok=True)
+                shutil.copy2(source, target, follow_symlinks=False)
+            except OSError as ex:
+                print("Couldn't carry over", os.path.join(rel_root, filename) + ":", ex)
+                continue
+            copied += 1
+    removed = 0
+    if not deletions:
+        return copied, removed
+    for root, dirs, files in os.walk(staged):
+        rel_root = os.path.relpath(root, staged)
+        live_root = live if rel_root == "." else os.path.join(live, rel_root)
+        for filename in files:
+            target = os.path.join(root, filename)
+            try:
+                if os.path.lexists(os.path.join(live_root, filename)):
+                    continue
+                if os.lstat(target).st_mtime > since:
+                    continue  # added by the update
+                os.remove(target)
+            except OSError as ex:
+                print("Couldn't carry over", os.path.join(rel_root, filename) + ":", ex)
+                continue
+            removed += 1
+    return copied, removed
+
+
+def _report_carry_over(copied, removed, during):
+    """Print what :func:`_carry_over` copied and removed."""
+    if copied:
+        print("Carried over", copied, "files written by the server", during)
+    if removed:
+        print("Removed", removed, "files the server deleted", during)
+
+
+def _record_swap(server):
+    """Remember when *server*'s install was last swapped."""
+    server.data["staged_update"] = {"swapped": time.time()}
+    save = getattr(server.data, "save", None)
+    if save is not None:
+        save()
+
+
+def _swap(server):
+    """Make the staging tree live, keeping the old install as the previous tree."""
+    live = _live_dir(server)
+    previous = previous_dir(server)
+    if os.path.lexists(previous):
+        shutil.rmtree(previous)
+    os.rename(live, previous)
+    try:
+        os.rename(staging_dir(server), live)
+    except OSError:
+        os.rename(previous, live)
+        raise
+
+
+def _stop_if_running(server):
+    """Stop *server* if it is running and return whether it was."""
+    from server import runtime as runtime_module
+
+    if not runtime_module.get_runtime(server).is_running(server):
+        return False
+    server.stop()
+    return True
+
+
+def staged_update(server, download, restart=False):
+    """Update *server* by running ``download(path)`` on a staging copy of its install.
+
+    *path* has a trailing separator like ``server.data["dir"]``. The server
+    is only stopped once the download has finished, and is started again
+    afterwards if *restart* is true and it was running before. If the download
+    fails the live install is left untouched.
+    """
+    live = _live_dir(server)
+    staging = staging_dir(server)
+    if not os.path.isdir(live):
+        raise ServerError("Can't stage an update: '%s' isn't installed" % (live,))
+    if os.path.lexists(staging):
+        print("Removing old staging tree", staging)
+        shutil.rmtree(staging)
+    hardlink = _clone_mode() == "hardlink"
+    print("Staging the update in", staging)
+    since = time.time()
+    clone_tree(live, staging, hardlink=hardlink)
+    try:
+        download(os.path.join(staging, ""))
+    except BaseException:
+        print("Update failed, leaving the live install as it was")
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    was_running = _stop_if_running(server)
+    _report_carry_over(*_carry_over(live, staging, since), "during the update")
+    _swap(server)
+    _record_swap(server)
+    print("Update swapped in, the previous install is kept in", previous_dir(server))
+    if restart and was_running:
+        print("Starting the server up")
+        server.start()
+    elif was_running:
+        print("The server was stopped for the update, start it again with 'start'")
+
+
+def rollback(server, force=False):
+    """Swap the install kept by the last staged update back in.
+
+    Files the server wrote since the swap are carried over into the install
+    that is swapped back in. Files it deleted since then are not, as they
+    can't be told apart from files the update removed. If the time of the
+    swap isn't known this refuses, because those files would be lost, unless
+    *force* is true. The install that was live becomes the previous tree, so a
+    second rollback undoes the first. A running server is stopped and started
+    again.
+    """
+    live = _live_dir(server)
+    previous = previous_dir(server)
+    if not os.path.isdir(previous):
+        raise ServerError("There is no previous install to roll back to")
+    swapped = (server.data.get("staged_update") or {}).get("swapped")
+    if swapped is None and not force:
+        raise ServerError(
+            "Don't know when the previous install was replaced, so a rollback would lose "
+            "everything the server wrote since (saves, configs, ban lists, logs). "
+            "Use --force to roll back anyway"
+        )
+    was_running = _stop_if_running(server)
+    if swapped is not None:
+        _report_carry_over(
+            *_carry_over(live, previous, swapped, deletions=False), "since the update"
+        )
+    aside = live + ".rollback"
+    os.rename(live, aside)
+    try:
+        os.rename(previous, live)
+    except OSError:
+        os.rename(aside, live)
+        raise
+    os.rename(aside, previous)
+    _record_swap(server)
+    print("Rolled back to the previous install")
+    if was_running:
+        server.start()
@@ -2,10 +2,12 @@
 
 import os
 import os.path
+import re
 import subprocess as sp
 import time
 
 from downloadermodules.url import download as url_download
+from utils import progress
 from utils.settings import settings
 
 # if a user has already installed steam to e.g ubuntu, steamcmd prefers to be installed in the same directory (or at least when steamcmd starts, it sends the error related things there as if it wants to be installed there.
@@ -30,6 +32,8 @@ STEAMCMD_GAMEUPDATE_TEMPLATE = "steamcmd_gamescript_template.txt"
 STEAMCMD_RETRIES = 3
 STEAMCMD_RETRY_DELAY_SECONDS = 2
 STEAMCMD_RETRY_DELAY_RECONFIG_SECONDS = 5
+# e.g. " Update state (0x61) downloading, progress: 45.12 (1234 / 5678)"
+_STEAMCMD_PROGRESS_RE = re.compile(r"progress: (\d+(?:\.\d+)?) \(")
 # check if steamcmd exists, if not download it and install it via wget https://steamcdn-a.akamaihd.net/client/installer/steamcmd_linux.tar.gz
 # execute steamcmd/steamcmd.sh
 # <user> = Anonymous by default
@@ -70,6 +74,24 @@ def _steamcmd_retry_delay(output, app_id):
     return STEAMCMD_RETRY_DELAY_SECONDS
 
 
+def _run_steamcmd(proc_list):
+    """Run SteamCMD and return its completed process with the combined output.
+
+    When a progress channel is open (see :mod:`utils.progress`) the output is
+    read as it is produced so the download percentage can be reported live.
+    """
+    if not progress.enabled():
+        return sp.run(proc_list, stdout=sp.PIPE, stderr=sp.STDOUT, text=True, check=False)
+    output = []
+    with sp.Popen(proc_list, stdout=sp.PIPE, stderr=sp.STDOUT, text=True) as proc:
+        for line in proc.stdout:
+            output.append(line)
+            match = _STEAMCMD_PROGRESS_RE.search(line)
+            if match:
+                progress.percent("steamcmd", float(match.group(1)))
+    return sp.CompletedProcess(proc_list, proc.returncode, "".join(output))
+
+
 def _get_login_args(steam_anonymous_login_possible):
     """Return the SteamCMD login arguments for anonymous or owned-game installs."""
 
@@ -157,9 +179,8 @@ def download(
         proc_list.insert(-1, "validate")
     last_output = ""
     for attempt in range(STEAMCMD_RETRIES):
-        proc = sp.run(
-            proc_list, stdout=sp.PIPE, stderr=sp.STDOUT, text=True, check=False
-        )
+        with progress.phase("steamcmd"):
+            proc = _run_steamcmd(proc_list)
         print(proc.stdout, end="" if proc.stdout.endswith("\n") else "\n")
         last_output = proc.stdout
         if proc.returncode == 0 and _steamcmd_succeeded(proc.stdout, Steam_AppID):
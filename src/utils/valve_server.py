@@ -15,6 +15,7 @@ from utils.backups import backups as backup_utils
 from utils.cmdparse.cmdspec import ArgSpec, CmdSpec, OptSpec
 from utils.fileutils import make_empty_file
 from utils.settings import settings
+from utils import staged_install
 import utils.steamcmd as steamcmd
 
 STEAMCLIENT_DST = os.path.expanduser("~/.steam/sdk64/steamclient.so")
@@ -51,14 +52,48 @@ _COMMAND_ARGS = {
                 None,
                 True,
             ),
+            OptSpec(
+                "s",
+                ["staged"],
+                "Download into a staging copy while the server keeps running",
+                "staged",
+                None,
+                True,
+            ),
+            OptSpec(
+                "S",
+                ["no-staged"],
+                "Update in place even if the staged_updates setting is on",
+                "staged",
+                None,
+                False,
+            ),
         )
     ),
     "restart": CmdSpec(),
+    "rollback": CmdSpec(
+        options=(
+            OptSpec(
+                "f",
+                ["force"],
+                "Roll back even if files the server wrote since the update would be lost",
+                "force",
+                None,
+                True,
+            ),
+        )
+    ),
 }
 
 _COMMAND_DESCRIPTIONS = {
-    "update": "Update the game server to the latest version available via SteamCMD.",
+    "update": "Update the game server to the latest version available via SteamCMD.\n"
+    "With --staged (or the staged_updates core setting) the update is downloaded into a "
+    "copy of the install while the server keeps running, and the server is only stopped "
+    "to swap the new install in. --no-staged updates in place for this call.",
     "restart": "Restart the game server by stopping it and then starting it again.",
+    "rollback": "Swap back to the install that the last staged update replaced.\n"
+    "Files the server wrote since the update are carried over. Without a record of when "
+    "the update happened this refuses unless --force is given.",
 }
 
 
@@ -507,9 +542,20 @@ def define_valve_server_module(
 
         _ensure_steamclient_link()
 
-    def update(server, validate=False, restart=False):
+    def update(server, validate=False, restart=False, staged=None):
         """Update the server files and optionally restart the server."""
 
+        if staged is None:
+            staged = staged_install.staged_by_default()
+        if staged:
+            staged_install.staged_update(
+                server,
+                lambda path: steamcmd.download(
+                    path, steam_app_id, True, validate=validate, mod=app_id_mod
+                ),
+                restart=restart,
+            )
+            return
         try:
             server.stop()
         except Exception:
@@ -532,6 +578,11 @@ def define_valve_server_module(
         server.stop()
         server.start()
 
+    def rollback(server, force=False):
+        """Swap the install replaced by the last staged update back in."""
+
+        staged_install.rollback(server, force=force)
+
     def get_start_command(server):
         """Build the start command for this Valve-engine server."""
 
@@ -650,10 +701,10 @@ def define_valve_server_module(
 
     return SimpleNamespace(
         steam_app_id=steam_app_id,
-        commands=("update", "restart"),
+        commands=("update", "restart", "rollback"),
         command_args=_COMMAND_ARGS,
         command_descriptions=_COMMAND_DESCRIPTIONS,
-        command_functions={"update": update, "restart": restart},
+        command_functions={"update": update, "restart": restart, "rollback": rollback},
         max_stop_wait=1,
         configure=configure,
         install=install,
@@ -661,6 +712,7 @@ def define_valve_server_module(
         prestart=prestart,
         update=update,
         restart=restart,
+        rollback=rollback,
         get_start_command=get_start_command,
         get_runtime_requirements=get_runtime_requirements,
         get_container_spec=get_container_spec,
@@ -0,0 +1,69 @@
+"""Helpers for waiting on something to finish without sleeping longer than needed.
+
+Used to notice promptly that a server session, process or container has
+stopped. Where the platform can say when a process exits (a pidfd) that is
+used, otherwise the thing is probed with a short interval that grows the
+longer the wait goes on.
+"""
+
+import os
+import select
+import time
+
+__all__ = ["wait_for_pid", "wait_until"]
+
+#  first and longest pause between probes in wait_until
+PROBE_INTERVAL = 0.05
+MAX_PROBE_INTERVAL = 2.0
+
+
+def wait_until(check, timeout, interval=PROBE_INTERVAL, max_interval=MAX_PROBE_INTERVAL):
+    """Call *check* until it returns true or *timeout* seconds have passed.
+
+    The pause between calls starts at *interval* and doubles up to
+    *max_interval*, so something that finishes quickly is noticed quickly
+    without a long wait costing many probes. *check* is always called at
+    least once. Returns whether it succeeded.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if check():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
+
+
+def _pid_alive(pid):
+    """Return whether a process with *pid* exists."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def wait_for_pid(pid, timeout):
+    """Wait up to *timeout* seconds for the process *pid* to exit.
+
+    Uses a pidfd where the platform has one so the wait ends the moment the
+    process does, otherwise probes for it with :func:`wait_until`. Returns
+    whether the process has gone.
+    """
+    if hasattr(os, "pidfd_open"):
+        try:
+            fd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            fd = None
+        if fd is not None:
+            try:
+                return bool(select.select([fd], [], [], max(timeout, 0))[0])
+            finally:
+                os.close(fd)
+    return wait_until(lambda: not _pid_alive(pid), timeout)
@@ -31,6 +31,15 @@ def _blocked(name):
     return _fail
 
 
+@pytest.fixture(autouse=True)
+def _fresh_runtime_cache():
+    """Don't let memoised runtime metadata or specs leak from one test into another."""
+    yield
+    runtime_module = sys.modules.get("server.runtime")
+    if runtime_module is not None:
+        runtime_module.forget_cached()
+
+
 @pytest.fixture(autouse=True)
 def _block_network(monkeypatch):
     """Prevent real downloads in every unit test.
@@ -0,0 +1,147 @@
+import subprocess as sp
+import sys
+from time import time
+from unittest.mock import patch
+
+from core.asyncmultiplexer import AsyncMultiplexer, CANCELLED_STATUS, TIMEOUT_STATUS
+from core.multiplexer import addalltomultiafter, addtomultiafter
+
+
+def _child(code):
+    return [sys.executable, "-c", code]
+
+
+def _printed(mocked_print):
+    return [" ".join(str(a) for a in call.args) for call in mocked_print.call_args_list]
+
+
+def _ready(line):
+    return line.strip() == b"#READY#"
+
+
+READY_THEN_HANG = "print('#READY#', flush=True); import time; time.sleep(60)"
+SLOW_READY_THEN_HANG = "import time; time.sleep(0.8); " + READY_THEN_HANG
+IGNORE_TERM = (
+    "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); "
+    "print('#READY#', flush=True); time.sleep(60)"
+)
+
+
+def test_async_multiplexer_prints_output_and_return_values():
+    multi = AsyncMultiplexer()
+    with patch("builtins.print") as mocked_print:
+        multi.run("a", _child("print('hello'); print('part', end='')"), stdout=sp.PIPE)
+        multi.run("b", _child("import sys; sys.exit(3)"), stdout=sp.PIPE)
+        multi.processall()
+    multi.close()
+
+    printed = _printed(mocked_print)
+    assert "a:  hello" in printed
+    assert "a:  part" in printed
+    assert multi.checkreturnvalues() == {"a": 0, "b": 3}
+
+
+def test_async_multiplexer_times_out_hung_child():
+    multi = AsyncMultiplexer(timeout=0.5, kill_grace=0.5)
+    with patch("builtins.print") as mocked_print:
+        start = time()
+        multi.run("hung", _child("import time; time.sleep(60)"), stdout=sp.PIPE)
+        multi.run("quick", _child("print('done')"), stdout=sp.PIPE)
+        multi.processall()
+        elapsed = time() - start
+    multi.close()
+
+    assert "hung has timed out, stopping it" in _printed(mocked_print)
+    assert multi.checkreturnvalues() == {"hung": TIMEOUT_STATUS, "quick": 0}
+    assert elapsed < 6
+
+
+CLOSE_OUTPUT_THEN_HANG = "import os, time; os.close(1); os.close(2); time.sleep(60)"
+
+
+def test_async_multiplexer_times_out_child_that_closed_its_output():
+    multi = AsyncMultiplexer(timeout=0.5, kill_grace=0.3)
+    with patch("builtins.print"):
+        start = time()
+        multi.run("quiet", _child(CLOSE_OUTPUT_THEN_HANG), stdout=sp.PIPE, stderr=sp.PIPE)
+        multi.processall()
+        elapsed = time() - start
+    multi.close()
+
+    assert multi.checkreturnvalues() == {"quiet": TIMEOUT_STATUS}
+    assert elapsed < 6
+
+
+def test_async_multiplexer_gives_up_on_streamless_child_it_cannot_signal():
+    multi = AsyncMultiplexer(timeout=0.3, kill_grace=0.2)
+    proc = None
+    try:
+        with patch("builtins.print") as mocked_print, patch.object(multi, "_signal", return_value=False):
+            proc = multi.run("stuck", _child(CLOSE_OUTPUT_THEN_HANG), stdout=sp.PIPE, stderr=sp.PIPE)
+            start = time()
+            multi.processall()
+            elapsed = time() - start
+    finally:
+        if proc is not None:
+            proc.kill()
+            proc.wait()
+        multi.close()
+
+    assert "Giving up on stuck" in _printed(mocked_print)
+    assert multi.checkreturnvalues() == {"stuck": TIMEOUT_STATUS}
+    assert elapsed < 6
+
+
+def test_async_multiplexer_kills_child_that_ignores_sigterm():
+    multi = AsyncMultiplexer(kill_grace=0.3)
+    with patch("builtins.print") as mocked_print:
+        proc = multi.run("stubborn", _child(IGNORE_TERM), stdout=sp.PIPE, timeout=0.5)
+        multi.processall()
+    multi.close()
+
+    assert "stubborn didn't stop, killing it" in _printed(mocked_print)
+    assert proc.returncode == -9
+    assert multi.checkreturnvalues() == {"stubborn": TIMEOUT_STATUS}
+
+
+def test_async_multiplexer_stopall_reports_cancelled():
+    multi = AsyncMultiplexer(kill_grace=0.5)
+    with patch("builtins.print"):
+        multi.run("a", _child("import time; time.sleep(60)"), stdout=sp.PIPE)
+        multi.stopall()
+        multi.processall()
+    multi.close()
+
+    assert multi.checkreturnvalues() == {"a": CANCELLED_STATUS}
+
+
+def test_addalltomultiafter_with_async_multiplexer_times_out_after_ready():
+    multi = AsyncMultiplexer(timeout=0.5, kill_grace=0.5)
+    jobs = [("a", _child(READY_THEN_HANG)), ("b", _child("print('#READY#', flush=True)"))]
+    with patch("builtins.print") as mocked_print:
+        addalltomultiafter(multi, jobs, _ready, stdout=sp.PIPE, stderr=sp.STDOUT)
+        multi.processall()
+    multi.close()
+
+    printed = _printed(mocked_print)
+    assert "a is running" in printed
+    assert "b is running" in printed
+    assert multi.checkreturnvalues() == {"a": TIMEOUT_STATUS, "b": 0}
+
+
+def test_addtomultiafter_keeps_deadline_from_the_ready_wait():
+    multi = AsyncMultiplexer(timeout=2.5, kill_grace=0.5)
+    with patch("builtins.print") as mocked_print:
+        start = time()
+        start_loop = multi.loop.time()
+        addtomultiafter(multi, "a", _ready, _child(SLOW_READY_THEN_HANG), stdout=sp.PIPE)
+        # the deadline started with the child, not when it became ready
+        assert len(multi.deadlines) == 1
+        assert list(multi.deadlines.values())[0] < start_loop + 2.5 + 0.5
+        multi.processall()
+        elapsed = time() - start
+    multi.close()
+
+    assert "a is running" in _printed(mocked_print)
+    assert multi.checkreturnvalues() == {"a": TIMEOUT_STATUS}
+    assert elapsed < 6
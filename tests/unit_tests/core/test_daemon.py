@@ -0,0 +1,177 @@
+import importlib
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+from core import daemon as daemon_module
+from core import inprocess
+from utils import daemonclient
+
+pytestmark = pytest.mark.skipif(not inprocess.can_fork(), reason="requires os.fork")
+
+FLOOD_SIZE = 4 * 1024 * 1024
+
+
+def _handler(request):
+    if request["args"][0] == "flood":
+        sys.stdout.write("x" * FLOOD_SIZE)
+        return 3
+    if request["args"][0] == "linger":
+        #  close the output like a detached helper would, then keep running
+        os.close(1)
+        os.close(2)
+        time.sleep(2)
+        return 0
+    sys.stdout.write("ran " + " ".join(request["args"]) + " in " + os.getcwd() + "\n")
+    sys.stderr.write("note\n")
+    if request["args"][0] == "env":
+        sys.stdout.write(os.environ.get("DOCKER_HOST", "unset") + "\n")
+    return 7
+
+
+@pytest.fixture
+def running_daemon(tmp_path, monkeypatch):
+    path = str(tmp_path / "alphagsmd.sock")
+    monkeypatch.setattr(daemonclient, "socket_path", lambda: path)
+    monkeypatch.delenv("ALPHAGSM_NO_DAEMON", raising=False)
+    daemon = daemon_module.Daemon(path, handler=_handler)
+    daemon.bind()
+    daemon.running = True
+
+    def serve():
+        while daemon.running:
+            daemon.serve_once(0.1)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield daemon
+    daemon.shutdown()
+    thread.join(timeout=5)
+    daemon.close()
+
+
+def test_daemon_runs_command_in_fork_and_streams_result(running_daemon, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    out, err = io.BytesIO(), io.BytesIO()
+
+    ret = daemonclient.run("alphagsm", ["alpha", "status"], out=out, err=err)
+
+    assert ret == 7
+    assert out.getvalue() == ("ran alpha status in " + str(tmp_path) + "\n").encode()
+    assert err.getvalue() == b"note\n"
+
+
+@pytest.mark.parametrize("pidfd", [True, False])
+def test_daemon_serves_others_while_a_child_lingers_after_closing_output(running_daemon, tmp_path, monkeypatch, pidfd):
+    monkeypatch.chdir(tmp_path)
+    if not pidfd:
+        monkeypatch.delattr(os, "pidfd_open", raising=False)
+    lingering = {}
+    thread = threading.Thread(
+        target=lambda: lingering.update(ret=daemonclient.run("alphagsm", ["linger"], out=io.BytesIO(), err=io.BytesIO()))
+    )
+    thread.start()
+    time.sleep(0.3)
+
+    started = time.monotonic()
+    assert daemonclient.run("alphagsm", ["alpha", "status"], out=io.BytesIO(), err=io.BytesIO()) == 7
+    assert time.monotonic() - started < 1
+
+    thread.join(timeout=10)
+    assert lingering == {"ret": 0}
+
+
+def test_daemon_serves_others_while_a_client_stops_reading(running_daemon, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stalled.connect(running_daemon.path)
+    stalled.sendall(json.dumps(daemonclient.build_request("alphagsm", ["flood"])).encode() + b"\n")
+    time.sleep(0.5)
+
+    started = time.monotonic()
+    assert daemonclient.run("alphagsm", ["alpha", "status"], out=io.BytesIO(), err=io.BytesIO()) == 7
+    assert time.monotonic() - started < 1
+
+    received = 0
+    with stalled:
+        while True:
+            kind, payload = daemonclient.read_frame(stalled)
+            if kind == daemonclient.FRAME_EXIT:
+                break
+            received += len(payload)
+    assert (received, payload) == (FLOOD_SIZE, b"3")
+
+
+def test_daemon_runs_commands_with_the_client_environment(running_daemon, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DOCKER_HOST", "unix:///run/user/1000/docker.sock")
+    out = io.BytesIO()
+
+    assert daemonclient.run("alphagsm", ["env"], out=out, err=io.BytesIO()) == 7
+    assert out.getvalue().endswith(b"unix:///run/user/1000/docker.sock\n")
+
+
+def test_daemon_refuses_requests_with_other_config(running_daemon, monkeypatch):
+    build_request = daemonclient.build_request
+    monkeypatch.setattr(
+        daemonclient,
+        "build_request",
+        lambda name, args: dict(build_request(name, args), config="/somewhere/else.conf"),
+    )
+
+    assert daemonclient.run("alphagsm", ["alpha", "status"], out=io.BytesIO(), err=io.BytesIO()) is None
+
+
+def test_daemon_bind_refuses_a_live_socket_and_replaces_a_stale_one(running_daemon, tmp_path):
+    with pytest.raises(OSError, match="already running"):
+        daemon_module.Daemon(running_daemon.path).bind()
+
+    stale = tmp_path / "stale.sock"
+    stale.write_text("")
+    other = daemon_module.Daemon(str(stale))
+    other.bind()
+    try:
+        assert os.stat(str(stale)).st_mode & 0o077 == 0
+    finally:
+        other.close()
+    assert not stale.exists()
+
+
+def test_check_request_rejects_malformed_and_foreign_requests(running_daemon):
+    conn = daemon_module._Connection(None)
+    good = daemonclient.build_request("alphagsm", ["alpha", "status"])
+    daemon = running_daemon
+    original_peer_uid = daemon_module._peer_uid
+    daemon_module._peer_uid = lambda sock: os.getuid()
+    try:
+        assert daemon._check_request(conn, good) is None
+        assert daemon._check_request(conn, dict(good, version=99)) == "unsupported protocol version"
+        assert daemon._check_request(conn, dict(good, args="status")) == "malformed request"
+        assert daemon._check_request(conn, dict(good, uid=os.getuid() + 1)) == "request from a different user"
+        assert daemon._check_request(conn, dict(good, cwd="/does/not/exist")) == "working directory doesn't exist"
+        assert daemon._check_request(conn, dict(good, env={"HOME": "/elsewhere"})) == "different HOME"
+    finally:
+        daemon_module._peer_uid = original_peer_uid
+
+
+def test_run_request_changes_directory_and_dispatches_to_main(tmp_path, monkeypatch):
+    calls = []
+    main_module = importlib.import_module("core.main")
+
+    monkeypatch.setattr(main_module, "main", lambda name, args: calls.append((name, args, os.getcwd())) or 0)
+    monkeypatch.setattr(main_module, "DEBUG", False)
+    cwd = os.getcwd()
+    try:
+        request = dict(daemonclient.build_request("alphagsm", ["alpha", "status"]), cwd=str(tmp_path), debug="1")
+        assert daemon_module._run_request(request) == 0
+    finally:
+        os.chdir(cwd)
+
+    assert calls == [("alphagsm", ["alpha", "status"], str(tmp_path))]
+    assert main_module.DEBUG is True
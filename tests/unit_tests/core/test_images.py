@@ -0,0 +1,70 @@
+"""Unit tests for the images prewarm command."""
+
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import core.images as images
+import server.runtime as runtime_module
+from utils.cmdparse import cmdparse
+
+JAVA_IMAGE = runtime_module.default_runtime_image("java")
+
+
+def test_fleet_images_reads_the_docker_servers_data_stores(tmp_path):
+    servers = {
+        "alpha": {"module": "minecraft.vanilla", "runtime": "docker", "runtime_family": "java"},
+        "beta": {"module": "minecraft.vanilla", "runtime": "docker", "image": "example/game:1"},
+        "gamma": {"module": "minecraft.vanilla", "runtime": "process", "image": "example/other:1"},
+        "delta": {"module": "minecraft.vanilla", "runtime": "docker", "runtime_family": "java"},
+    }
+    for name, data in servers.items():
+        (tmp_path / (name + ".json")).write_text(json.dumps(data))
+
+    assert images.fleet_images(["alpha", "beta", "gamma"], str(tmp_path)) == {JAVA_IMAGE: "java", "example/game:1": None}
+
+
+def test_prewarm_handles_images_in_parallel_and_reports_failures():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    class FakeRuntime:
+        def ensure_image(self, image, family, pull=False):
+            with lock:
+                running.append(image)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(image)
+            if image == "bad":
+                raise runtime_module.RuntimeError("pull access denied")
+            return "pulled"
+
+    result = images.prewarm({"a": None, "b": None, "bad": None}, jobs=3, runtime=FakeRuntime())
+
+    assert result["a"] == result["b"] == "pulled"
+    assert isinstance(result["bad"], runtime_module.RuntimeError)
+    assert max(peak) > 1
+
+
+def test_run_images_prewarms_local_docker_servers(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(
+        images, "settings", SimpleNamespace(user=SimpleNamespace(getsection=lambda name: {"backend": "docker"}))
+    )
+    monkeypatch.setattr(images, "fleet_images", lambda names, datapath: {JAVA_IMAGE: "java"} if names == ["alpha"] else {})
+    monkeypatch.setattr(images, "prewarm", lambda found, jobs: {image: "built" for image in found})
+
+    assert images.run_images([(None, "alpha"), ("bob", "beta")], {}, str(tmp_path)) == 0
+    captured = capsys.readouterr()
+    assert JAVA_IMAGE + " built" in captured.out
+    assert "bob/beta" in captured.err
+
+
+def test_images_command_only_accepts_prewarm():
+    assert cmdparse.parse(["prewarm", "-j", "2"], images.IMAGES_COMMAND_ARGS) == (["prewarm"], {"jobs": 2})
+    with pytest.raises(cmdparse.OptionError):
+        cmdparse.parse(["bogus"], images.IMAGES_COMMAND_ARGS)
@@ -0,0 +1,90 @@
+import os
+import subprocess as sp
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from core import inprocess
+from core.multiplexer import Multiplexer, addalltomultiafter
+
+pytestmark = pytest.mark.skipif(not inprocess.can_fork(), reason="requires os.fork")
+
+
+def _say(text, status=0):
+    # write directly so the parent's patched print is not inherited
+    sys.stdout.write(text + "\n")
+    sys.stderr.write("to stderr\n")
+    sp.call(["echo", "from a subprocess"])
+    return status
+
+
+def test_forkcall_pipes_output_and_returns_status():
+    proc = inprocess.forkcall(_say, "hello", 3)
+
+    output = proc.stdout.read()
+    proc.stdout.close()
+
+    assert proc.wait() == 3
+    assert proc.poll() == 3
+    assert proc.stderr is None
+    assert output.splitlines() == [b"hello", b"to stderr", b"from a subprocess"]
+
+
+def test_forkcall_reports_exceptions_and_system_exit():
+    def boom():
+        raise RuntimeError("exploded")
+
+    def leave():
+        raise SystemExit(5)
+
+    crashed = inprocess.forkcall(boom)
+    output = crashed.stdout.read()
+    crashed.stdout.close()
+    exited = inprocess.forkcall(leave)
+    exited.stdout.read()
+    exited.stdout.close()
+
+    assert crashed.wait() == 3
+    assert b"RuntimeError: exploded" in output
+    assert exited.wait() == 5
+
+
+def test_forkcall_child_has_no_stdin():
+    proc = inprocess.forkcall(lambda: print(repr(sys.stdin.read())))
+
+    output = proc.stdout.read()
+    proc.stdout.close()
+
+    assert proc.wait() == 0
+    assert output.strip() == b"''"
+
+
+def test_forked_process_reaped_elsewhere_reports_failure(capsys):
+    proc = inprocess.forkcall(lambda: 0)
+    proc.stdout.read()
+    proc.stdout.close()
+    os.waitpid(proc.pid, 0)
+
+    assert proc.wait() == inprocess.LOST_STATUS
+    assert proc.poll() == inprocess.LOST_STATUS
+    assert "Exit status of process {} was lost".format(proc.pid) in capsys.readouterr().err
+
+
+def test_forked_processes_work_with_multiplexer():
+    multi = Multiplexer()
+    jobs = [
+        ("one", lambda: inprocess.forkcall(_say, "first", 0)),
+        ("two", lambda: inprocess.forkcall(_say, "second", 2)),
+    ]
+
+    with patch("builtins.print") as mocked_print:
+        addalltomultiafter(multi, jobs, lambda line: False)
+        multi.processall()
+
+    printed = [" ".join(str(a) for a in call.args) for call in mocked_print.call_args_list]
+    assert "one:  first" in printed
+    assert "two:  second" in printed
+    assert "two:  from a subprocess" in printed
+    assert not any("finished early" in line for line in printed)
+    assert multi.checkreturnvalues() == {"one": 0, "two": 2}
@@ -1,4 +1,7 @@
 import importlib
+import os
+import subprocess
+import sys
 from io import StringIO
 from types import SimpleNamespace
 
@@ -32,7 +35,7 @@ def test_split_server_name_rejects_multiple_separators():
 
 def test_get_all_all_servers_reads_running_and_saved_lists(tmp_path, monkeypatch, capsys):
     monkeypatch.chdir(tmp_path)
-    monkeypatch.setattr(main_module.screen, "list_all_screens", lambda: ["alice/one", "two"])
+    monkeypatch.setattr("screen.list_all_screens", lambda: ["alice/one", "two"])
     err = StringIO()
     monkeypatch.setattr(main_module, "stderr", err)
 
@@ -45,7 +48,7 @@ def test_get_all_all_servers_reads_running_and_saved_lists(tmp_path, monkeypatch
 
 
 def test_get_all_user_servers_reads_json_filenames(monkeypatch, capsys):
-    monkeypatch.setattr(main_module.servermodule, "DATAPATH", "/srv/conf")
+    monkeypatch.setattr("server.server.DATAPATH", "/srv/conf")
     monkeypatch.setattr(main_module.os, "listdir", lambda path: ["one.json", "two.json", "ignore.txt"])
     err = StringIO()
     monkeypatch.setattr(main_module, "stderr", err)
@@ -127,10 +130,14 @@ def test_run_multi_uses_multiplexer_and_combines_return_codes(monkeypatch):
         def checkreturnvalues(self):
             return {"one": 0, "two": 2}
 
+        def close(self):
+            pass
+
     monkeypatch.setattr(main_module.mp, "Multiplexer", FakeMultiplexer)
     monkeypatch.setattr(main_module.mp, "addtomultiafter", lambda multi, tag, fn, cmd, **kwargs: added.append((tag, cmd, kwargs)))
     monkeypatch.setattr(main_module, "get_run_as_cmd", lambda *args, **kwargs: ["remote"])
     monkeypatch.setattr(main_module, "get_run_cmd", lambda *args, **kwargs: ["local"])
+    monkeypatch.setattr(main_module, "get_multi_launch_settings", lambda: ("serial", 0))
 
     result = main_module.run_multi("alphagsm", 2, [("bob", "alpha"), (None, "beta")], ["status"])
 
@@ -140,6 +147,279 @@ def test_run_multi_uses_multiplexer_and_combines_return_codes(monkeypatch):
     assert added[2] == "processed"
 
 
+def test_run_multi_concurrent_launches_all_jobs_together(monkeypatch):
+    added = []
+
+    class FakeMultiplexer:
+        def processall(self):
+            added.append("processed")
+
+        def checkreturnvalues(self):
+            return {"one": 0, "two": 0}
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(main_module.mp, "Multiplexer", FakeMultiplexer)
+    monkeypatch.setattr(
+        main_module.mp,
+        "addalltomultiafter",
+        lambda multi, jobs, fn, limit=None, **kwargs: added.append((list(jobs), limit, kwargs)),
+    )
+    monkeypatch.setattr(main_module, "get_run_as_cmd", lambda *args, **kwargs: ["remote"])
+    monkeypatch.setattr(main_module, "get_run_cmd", lambda *args, **kwargs: ["local"])
+    monkeypatch.setattr(main_module, "get_multi_launch_settings", lambda: ("concurrent", 4))
+    monkeypatch.setattr(main_module, "get_multi_executor", lambda: "exec")
+
+    result = main_module.run_multi("alphagsm", 2, [("bob", "alpha"), (None, "beta")], ["status"])
+
+    assert result == 0
+    assert added[0][0] == [("bob/alpha", ["remote"]), ("beta", ["local"])]
+    assert added[0][1] == 4
+    assert added[0][2]["stdout"] is main_module.sp.PIPE
+    assert added[1] == "processed"
+
+
+def test_run_multi_inprocess_forks_local_servers_only(monkeypatch):
+    jobs = []
+
+    class FakeMultiplexer:
+        def processall(self):
+            pass
+
+        def checkreturnvalues(self):
+            return {"bob/alpha": 1, "beta": 1}
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(main_module.mp, "Multiplexer", FakeMultiplexer)
+    monkeypatch.setattr(
+        main_module.mp,
+        "addalltomultiafter",
+        lambda multi, new_jobs, fn, limit=None, **kwargs: jobs.extend(new_jobs),
+    )
+    monkeypatch.setattr(main_module, "get_run_as_cmd", lambda *args, **kwargs: ["remote"])
+    monkeypatch.setattr(main_module, "get_multi_launch_settings", lambda: ("concurrent", 0))
+    monkeypatch.setattr(main_module, "get_multi_executor", lambda: "inprocess")
+    forked = []
+    monkeypatch.setattr(main_module.inprocess, "forkcall", lambda fn, *args: forked.append((fn, args)))
+
+    result = main_module.run_multi("alphagsm", 2, [("bob", "alpha"), (None, "beta")], ["status"])
+
+    assert result == 1
+    assert jobs[0] == ("bob/alpha", ["remote"])
+    assert jobs[1][0] == "beta"
+    jobs[1][1]()
+    assert forked == [(main_module._run_inprocess, ("alphagsm", "beta", ["status"]))]
+
+
+def test_run_multi_primes_container_snapshot_for_forked_servers(monkeypatch):
+    import server.container_state as container_state
+
+    class FakeMultiplexer:
+        def processall(self):
+            pass
+
+        def checkreturnvalues(self):
+            return {}
+
+        def close(self):
+            pass
+
+    primed = []
+    monkeypatch.setattr(main_module.mp, "Multiplexer", FakeMultiplexer)
+    monkeypatch.setattr(main_module.mp, "addalltomultiafter", lambda *args, **kwargs: None)
+    monkeypatch.setattr(main_module, "get_run_as_cmd", lambda *args, **kwargs: ["remote"])
+    monkeypatch.setattr(main_module, "get_multi_launch_settings", lambda: ("concurrent", 0))
+    monkeypatch.setattr(main_module, "get_multi_progress", lambda: "off")
+    monkeypatch.setattr(container_state, "prime_for_fleet", lambda: primed.append(True))
+
+    monkeypatch.setattr(main_module, "get_multi_executor", lambda: "inprocess")
+    main_module.run_multi("alphagsm", 2, [("bob", "alpha"), (None, "beta")], ["status"])
+    assert primed == []
+    main_module.run_multi("alphagsm", 2, [(None, "alpha"), (None, "beta")], ["status"])
+    assert primed == [True]
+
+    monkeypatch.setattr(main_module, "get_multi_executor", lambda: "exec")
+    main_module.run_multi("alphagsm", 2, [(None, "alpha"), (None, "beta")], ["status"])
+    assert primed == [True]
+
+
+def test_run_inprocess_dispatches_through_main(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main_module, "main", lambda name, args: calls.append((name, args)) or 4)
+
+    assert main_module._run_inprocess("alphagsm", "beta", ["status", "-v", "1"]) == 4
+    assert calls == [("alphagsm", ["beta", "status", "-v", "1"])]
+
+
+def test_get_multi_executor_falls_back_to_exec_without_fork(monkeypatch):
+    values = {}
+    fake_settings = SimpleNamespace(
+        user=SimpleNamespace(getsection=lambda name: values)
+    )
+    monkeypatch.setattr(main_module, "settings", fake_settings)
+    monkeypatch.setattr(main_module.inprocess, "can_fork", lambda: True)
+
+    assert main_module.get_multi_executor() == "inprocess"
+    values["multi_executor"] = "exec"
+    assert main_module.get_multi_executor() == "exec"
+    values["multi_executor"] = "inprocess"
+    monkeypatch.setattr(main_module.inprocess, "can_fork", lambda: False)
+    assert main_module.get_multi_executor() == "exec"
+
+
+def test_run_multi_uses_async_multiplexer_when_timeout_configured(monkeypatch):
+    created = []
+
+    class FakeAsyncMultiplexer:
+        def __init__(self, timeout, kill_grace):
+            created.append((timeout, kill_grace))
+            self.closed = False
+
+        def processall(self):
+            pass
+
+        def checkreturnvalues(self):
+            return {"alpha": 124, "beta": 124}
+
+        def close(self):
+            self.closed = True
+
+    import core.asyncmultiplexer as amp
+
+    monkeypatch.setattr(amp, "AsyncMultiplexer", FakeAsyncMultiplexer)
+    monkeypatch.setattr(main_module, "get_multi_timeout", lambda: (30.0, 2.0))
+    monkeypatch.setattr(main_module.mp, "addalltomultiafter", lambda multi, jobs, fn, limit=None, **kwargs: None)
+    monkeypatch.setattr(main_module, "get_multi_launch_settings", lambda: ("concurrent", 0))
+    monkeypatch.setattr(main_module, "get_multi_executor", lambda: "exec")
+    monkeypatch.setattr(main_module, "get_run_cmd", lambda *args, **kwargs: ["local"])
+
+    result = main_module.run_multi("alphagsm", 2, [(None, "alpha"), (None, "beta")], ["stop"])
+
+    assert created == [(30.0, 2.0)]
+    assert result == amp.TIMEOUT_STATUS
+
+
+def test_run_multi_opens_progress_channel_for_local_servers_only(monkeypatch):
+    handlers = {}
+
+    class FakeMultiplexer:
+        def processall(self):
+            handlers["alpha"](b'{"event": "phase", "phase": "runtime", "state": "end", "seconds": 2.0}')
+            handlers["alpha"](b'{"event": "result", "status": 0}')
+
+        def checkreturnvalues(self):
+            return {"alpha": 0, "bob/beta": 0}
+
+        def close(self):
+            pass
+
+    def fake_addall(multi, jobs, fn, limit=None, events=None, **kwargs):
+        for tag, _cmd in jobs:
+            handlers[tag] = events(tag)
+
+    out = StringIO()
+    monkeypatch.setattr(main_module, "stdout", out)
+    monkeypatch.setattr(main_module.mp, "Multiplexer", FakeMultiplexer)
+    monkeypatch.setattr(main_module.mp, "addalltomultiafter", fake_addall)
+    monkeypatch.setattr(main_module, "get_multi_timeout", lambda: (0.0, 10.0))
+    monkeypatch.setattr(main_module, "get_multi_launch_settings", lambda: ("concurrent", 0))
+    monkeypatch.setattr(main_module, "get_multi_executor", lambda: "exec")
+    monkeypatch.setattr(main_module, "get_multi_progress", lambda: "summary")
+    monkeypatch.setattr(main_module, "get_run_as_cmd", lambda *args, **kwargs: ["remote"])
+    monkeypatch.setattr(main_module, "get_run_cmd", lambda *args, **kwargs: ["local"])
+
+    assert main_module.run_multi("alphagsm", 2, [(None, "alpha"), ("bob", "beta")], ["start"]) == 0
+
+    assert handlers["bob/beta"] is None
+    summary = out.getvalue().splitlines()
+    assert summary[1].split() == ["SERVER", "runtime", "STATUS"]
+    assert summary[2].split() == ["alpha", "2.0s", "0"]
+
+
+def test_run_multi_redraws_live_progress_on_a_timer(monkeypatch):
+    tickers = []
+
+    class FakeMultiplexer:
+        def setticker(self, interval, fn):
+            tickers.append((interval, fn))
+
+        def processall(self):
+            pass
+
+        def checkreturnvalues(self):
+            return {"alpha": 0}
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(main_module, "stdout", StringIO())
+    monkeypatch.setattr(main_module.mp, "Multiplexer", FakeMultiplexer)
+    monkeypatch.setattr(main_module.mp, "addalltomultiafter", lambda *args, **kwargs: None)
+    monkeypatch.setattr(main_module, "get_multi_timeout", lambda: (0.0, 10.0))
+    monkeypatch.setattr(main_module, "get_multi_launch_settings", lambda: ("concurrent", 0))
+    monkeypatch.setattr(main_module, "get_multi_executor", lambda: "exec")
+    monkeypatch.setattr(main_module, "get_multi_progress", lambda: "live")
+    monkeypatch.setattr(main_module, "get_run_cmd", lambda *args, **kwargs: ["local"])
+
+    assert main_module.run_multi("alphagsm", 1, [(None, "alpha")], ["start"]) == 0
+
+    assert [interval for interval, _fn in tickers] == [main_module.LIVE_PROGRESS_INTERVAL]
+    assert tickers[0][1].__self__.live_interval == main_module.LIVE_PROGRESS_INTERVAL
+
+
+def test_get_multi_progress_reads_core_section(monkeypatch):
+    section = {}
+    monkeypatch.setattr(
+        main_module, "settings", SimpleNamespace(user=SimpleNamespace(getsection=lambda name: section))
+    )
+    assert main_module.get_multi_progress() == "summary"
+
+    section["multi_progress"] = " Live "
+    assert main_module.get_multi_progress() == "live"
+
+    section["multi_progress"] = "loud"
+    err = StringIO()
+    monkeypatch.setattr(main_module, "stderr", err)
+    assert main_module.get_multi_progress() == "summary"
+    assert "Unknown multi_progress" in err.getvalue()
+
+
+def test_get_multi_timeout_reads_core_section(monkeypatch):
+    section = {"multi_timeout": "90", "multi_kill_grace": "3"}
+    monkeypatch.setattr(
+        main_module, "settings", SimpleNamespace(user=SimpleNamespace(getsection=lambda name: section))
+    )
+    assert main_module.get_multi_timeout() == (90.0, 3.0)
+
+    section.clear()
+    assert main_module.get_multi_timeout() == (0.0, 10.0)
+
+    section.update(multi_timeout="soon")
+    err = StringIO()
+    monkeypatch.setattr(main_module, "stderr", err)
+    assert main_module.get_multi_timeout() == (0.0, 10.0)
+    assert "Invalid multi_timeout" in err.getvalue()
+
+
+def test_get_multi_launch_settings_reads_core_section(monkeypatch):
+    values = {"multi_launch": "Serial", "multi_parallel": "3"}
+    fake_settings = SimpleNamespace(
+        user=SimpleNamespace(getsection=lambda name: values)
+    )
+    monkeypatch.setattr(main_module, "settings", fake_settings)
+    err = StringIO()
+    monkeypatch.setattr(main_module, "stderr", err)
+
+    assert main_module.get_multi_launch_settings() == ("serial", 3)
+
+    values.update({"multi_launch": "bogus", "multi_parallel": "many"})
+    assert main_module.get_multi_launch_settings() == ("concurrent", 0)
+    assert "Unknown multi_launch mode" in err.getvalue()
+
+
 def test_run_one_handles_remote_list_and_remote_command(monkeypatch):
     monkeypatch.setattr(main_module, "run_list_multi", lambda name, servers, args: 7)
     monkeypatch.setattr(main_module, "run_as", lambda name, user, tag, args: 9)
@@ -152,7 +432,7 @@ def test_run_one_create_requires_type_and_restricts_followup(monkeypatch, capsys
     monkeypatch.setattr(main_module, "help", lambda *args, **kwargs: None)
     err = StringIO()
     monkeypatch.setattr(main_module, "stderr", err)
-    monkeypatch.setattr(main_module, "Server", lambda tag, module=None: SimpleNamespace())
+    monkeypatch.setattr("server.Server", lambda tag, module=None: SimpleNamespace())
 
     assert main_module.run_one("alphagsm", (None, "alpha"), "create", []) == 2
     assert main_module.run_one("alphagsm", (None, "alpha"), "create", ["minecraft", "start"]) == 2
@@ -165,7 +445,7 @@ def test_run_one_parses_and_runs_local_command(monkeypatch):
         run_command=lambda cmd, *args, **opts: calls.append((cmd, args, opts)),
     )
     calls = []
-    monkeypatch.setattr(main_module, "Server", lambda tag, *rest: server)
+    monkeypatch.setattr("server.Server", lambda tag, *rest: server)
     monkeypatch.setattr(main_module.cmdparse, "parse", lambda args, spec: (["arg1"], {"flag": True}))
 
     result = main_module.run_one("alphagsm", (None, "alpha"), "status", ["raw"])
@@ -177,7 +457,7 @@ def test_run_one_parses_and_runs_local_command(monkeypatch):
 
 def test_run_one_returns_error_codes_for_parse_and_run_failures(monkeypatch):
     server = SimpleNamespace(get_command_args=lambda cmd: "spec")
-    monkeypatch.setattr(main_module, "Server", lambda tag, *rest: server)
+    monkeypatch.setattr("server.Server", lambda tag, *rest: server)
     monkeypatch.setattr(main_module, "help", lambda *args, **kwargs: None)
 
     monkeypatch.setattr(main_module.cmdparse, "parse", lambda args, spec: (_ for _ in ()).throw(main_module.cmdparse.OptionError("bad parse")))
@@ -213,6 +493,20 @@ def test_main_rejects_wrapper_subcommands_as_server_names(monkeypatch):
         assert main_module.main("alphagsm", [banned_name, "status"]) == 2
 
 
+def test_main_parses_images_commands_before_prewarming(monkeypatch):
+    images = importlib.import_module("core.images")
+    server_module = importlib.import_module("server.server")
+    calls = []
+    monkeypatch.setattr(main_module, "help", lambda *args, **kwargs: None)
+    monkeypatch.setattr(main_module, "expand_server_star", lambda user, tag, cmd: [(user, tag)])
+    monkeypatch.setattr(server_module, "DATAPATH", "/data")
+    monkeypatch.setattr(images, "run_images", lambda servers, opts, datapath: calls.append((servers, opts, datapath)) or 0)
+
+    assert main_module.main("alphagsm", ["alpha", "images", "prewarm", "-j", "2"]) == 0
+    assert main_module.main("alphagsm", ["alpha", "images", "bogus"]) == 2
+    assert calls == [([(None, "alpha")], {"jobs": 2}, "/data")]
+
+
 def test_print_handled_ex_uses_traceback_in_debug(monkeypatch):
     called = []
     monkeypatch.setattr(main_module, "DEBUG", True)
@@ -221,3 +515,39 @@ def test_print_handled_ex_uses_traceback_in_debug(monkeypatch):
     main_module.print_handled_ex(RuntimeError("boom"))
 
     assert called == [True]
+
+
+def test_report_lock_waits_prints_in_debug_or_after_a_long_wait(monkeypatch):
+    data_module = importlib.import_module("server.data")
+    stats = {"acquired": 3, "contended": 1, "wait_seconds": 0.25, "max_wait_seconds": 0.25}
+    monkeypatch.setattr(data_module, "lock_stats", stats)
+    err = StringIO()
+    monkeypatch.setattr(main_module, "stderr", err)
+
+    main_module.report_lock_waits()
+    assert err.getvalue() == ""
+
+    monkeypatch.setattr(main_module, "DEBUG", True)
+    main_module.report_lock_waits()
+    assert "3 taken, 1 waited for, 0.25 seconds waiting in total" in err.getvalue()
+
+    monkeypatch.setattr(main_module, "DEBUG", False)
+    stats.update(wait_seconds=data_module.LOCK_WAIT_WARNING)
+    err.truncate(0)
+    err.seek(0)
+    main_module.report_lock_waits()
+    assert err.getvalue().startswith("Data store locks:")
+
+
+def test_importing_core_leaves_server_runtime_unloaded():
+    src = os.path.dirname(os.path.dirname(os.path.abspath(main_module.__file__)))
+    code = (
+        "import sys, core; "
+        "print(' '.join(m for m in ('server.server', 'server.runtime', 'server.port_manager', "
+        "'screen', 'crontab') if m in sys.modules))"
+    )
+    env = dict(os.environ, PYTHONPATH=src, ALPHAGSM_CONFIG_LOCATION=os.path.abspath(os.environ["ALPHAGSM_CONFIG_LOCATION"]))
+
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == ""
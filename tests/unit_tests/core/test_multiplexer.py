@@ -1,11 +1,15 @@
+import json
+import os
+import sys
 import pytest
 from time import sleep, time
 from unittest.mock import Mock, MagicMock, patch
 import subprocess as sp
 import selectors
 from io import BytesIO
+from types import SimpleNamespace
 from multiprocessing import Process, Queue
-from core.multiplexer import Multiplexer, StreamData, OutputInteruptedException, addtomultiafter
+from core.multiplexer import Multiplexer, StreamData, OutputInteruptedException, addtomultiafter, addalltomultiafter
 
 # Mock classes
 class MockProc:
@@ -193,6 +197,68 @@ def test_process_empty_procs(multiplexer):
     assert result is None
 
 
+def test_streamdata_consumes_lines_across_appends():
+    data = StreamData(None, None, b"ab")
+    data.append(b"c\nde")
+    assert list(data.consumelines()) == [b"abc"]
+    assert data.data == b"de"
+
+    data.append(b"f\r" * 1000)
+    assert list(data.consumelines()) == []
+    data.append(b"\n\ng\n")
+    lines = list(data.consumelines())
+    assert lines == [b"de" + b"f\r" * 1000, b"", b"g"]
+    assert data.buffered() == 0
+    assert data.data == b""
+
+
+def test_streamdata_drops_consumed_prefix_and_keeps_data_assignable():
+    data = StreamData(None, None)
+    data.append(b"x" * 10 + b"\n" + b"partial")
+    assert list(data.consumelines()) == [b"x" * 10]
+    data.append(b" line\n")
+    # the consumed line has been dropped from the front of the buffer
+    assert data._start == 0
+    assert list(data.consumelines()) == [b"partial line"]
+
+    data.data = b"one\ntwo"
+    assert list(data.consumelines()) == [b"one"]
+    assert data.data == b"two"
+
+
+def test_streamdata_adapts_read_size():
+    data = StreamData(None, None)
+    data.adjustreadsize(StreamData.MIN_READ)
+    data.adjustreadsize(StreamData.MIN_READ * 2)
+    assert data.readsize == StreamData.MIN_READ * 4
+    for _ in range(30):
+        data.adjustreadsize(data.readsize)
+    assert data.readsize == StreamData.MAX_READ
+    for _ in range(30):
+        data.adjustreadsize(10)
+    assert data.readsize == StreamData.MIN_READ
+
+
+def test_process_reads_large_output_in_growing_chunks(multiplexer):
+    payload = b"".join(b"line %d\n" % i for i in range(20000))
+    stream = MockStream(payload)
+    reads = []
+    read1 = stream.read1
+    stream.read1 = lambda n: reads.append(n) or read1(n)
+    proc = MockProc(stdout=stream, returncode=0)
+    multiplexer.addproc("big", proc)
+    multiplexer.selector.select.return_value = [(SimpleNamespace(fileobj=stream), selectors.EVENT_READ)]
+
+    with patch("builtins.print") as mocked_print:
+        while multiplexer.procs:
+            multiplexer.process()
+
+    assert mocked_print.call_args_list[0].args == ("big: ", "line 0")
+    assert mocked_print.call_args_list[19999].args == ("big: ", "line 19999")
+    assert mocked_print.call_args_list[-1].args == ("big has finished with status 0",)
+    assert max(reads) > StreamData.MIN_READ
+
+
 def test_addtomultiafter_early_finish():
     multi = Multiplexer()
 
@@ -203,6 +269,146 @@ def test_addtomultiafter_early_finish():
     assert len(multi.procs) == 0  # Ensure no processes are left after running
 
 
+def _ready_child(tag, delay=0.0, status=0):
+    return [
+        "python3", "-u", "-c",
+        "import time\n"
+        f"time.sleep({delay})\n"
+        "print('#READY#')\n"
+        f"print('work {tag}')\n"
+        f"raise SystemExit({status})\n",
+    ]
+
+
+def test_addalltomultiafter_waits_for_all_children_in_one_loop():
+    multi = Multiplexer()
+    jobs = [("a", _ready_child("a", 0.3)), ("b", _ready_child("b", 0.3, 2))]
+
+    with patch("builtins.print") as mocked_print:
+        start = time()
+        addalltomultiafter(
+            multi, jobs, lambda line: line.strip() == b"#READY#",
+            stdout=sp.PIPE, stderr=sp.STDOUT,
+        )
+        multi.processall()
+        elapsed = time() - start
+
+    printed = [" ".join(str(a) for a in call.args) for call in mocked_print.call_args_list]
+    assert "a is running" in printed
+    assert "b is running" in printed
+    assert "a:  work a" in printed
+    assert not any("#READY#" in line for line in printed)
+    assert multi.checkreturnvalues() == {"a": 0, "b": 2}
+    assert elapsed < 2.0
+
+
+def test_ticker_runs_while_a_child_is_silent():
+    multi = Multiplexer()
+    ticks = []
+    multi.setticker(0.05, lambda: ticks.append(1))
+
+    with patch("builtins.print"):
+        multi.run("quiet", [sys.executable, "-c", "import time; time.sleep(0.6)"], stdout=sp.PIPE)
+        multi.processall()
+    multi.close()
+
+    assert multi.checkreturnvalues() == {"quiet": 0}
+    assert len(ticks) >= 5
+
+
+@pytest.mark.parametrize("pidfd", [True, False])
+def test_streamless_wait_ignores_untracked_children(monkeypatch, pidfd):
+    if not pidfd:
+        monkeypatch.delattr(os, "pidfd_open", raising=False)
+    zombie = sp.Popen([sys.executable, "-c", "pass"])
+    sleep(0.3)  # exited but not reaped
+    multi = Multiplexer()
+    ticks = []
+    multi.setticker(0.1, lambda: ticks.append(1))
+
+    with patch("builtins.print"):
+        multi.run("quiet", [sys.executable, "-c", "import time; time.sleep(0.6)"])
+        multi.processall()
+    multi.close()
+    zombie.wait()
+
+    assert multi.checkreturnvalues() == {"quiet": 0}
+    assert 3 <= len(ticks) < 30
+
+
+def test_addalltomultiafter_respects_limit_and_reports_early_exit():
+    multi = Multiplexer()
+    jobs = [("a", ["python3", "-c", "pass"]), ("b", _ready_child("b"))]
+
+    with patch("builtins.print") as mocked_print:
+        addalltomultiafter(
+            multi, jobs, lambda line: line.strip() == b"#READY#", limit=1,
+            stdout=sp.PIPE, stderr=sp.STDOUT,
+        )
+        # with a limit of one, b can only start after a has exited
+        multi.processall()
+
+    printed = [" ".join(str(a) for a in call.args) for call in mocked_print.call_args_list]
+    assert printed.index("Process a finished early") < printed.index("Running b")
+    assert "b is running" in printed
+    assert multi.checkreturnvalues() == {"a": 0, "b": 0}
+
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "src")
+
+
+def _event_child(tag):
+    return [
+        "python3", "-u", "-c",
+        "import os, sys\n"
+        f"sys.path.insert(0, {SRC_DIR!r})\n"
+        "from utils import progress\n"
+        "print('#READY#')\n"
+        "with progress.phase('runtime'):\n"
+        f"    print('work {tag}')\n"
+        "progress.result(0)\n",
+    ]
+
+
+def test_addalltomultiafter_routes_progress_channel_to_events():
+    multi = Multiplexer()
+    received = {"a": [], "b": []}
+    jobs = [("a", _event_child("a")), ("b", _event_child("b"))]
+
+    with patch("builtins.print") as mocked_print:
+        addalltomultiafter(
+            multi, jobs, lambda line: line.strip() == b"#READY#",
+            events=lambda tag: received[tag].append if tag == "a" else None,
+            stdout=sp.PIPE, stderr=sp.STDOUT,
+        )
+        multi.processall()
+
+    printed = [" ".join(str(a) for a in call.args) for call in mocked_print.call_args_list]
+    assert "a:  work a" in printed
+    assert not any("event" in line for line in printed)
+    events = [json.loads(line) for line in received["a"]]
+    assert [(e["event"], e.get("state")) for e in events] == [
+        ("phase", "start"), ("phase", "end"), ("result", None)
+    ]
+    assert received["b"] == []
+    assert multi.checkreturnvalues() == {"a": 0, "b": 0}
+
+
+def test_addtomultiafter_keeps_progress_channel_after_transfer():
+    multi = Multiplexer()
+    received = []
+
+    with patch("builtins.print"):
+        addtomultiafter(
+            multi, "a", lambda line: line.strip() == b"#READY#", _event_child("a"),
+            events=lambda tag: received.append, stdout=sp.PIPE,
+        )
+        multi.processall()
+
+    assert [json.loads(line)["event"] for line in received] == ["phase", "phase", "result"]
+    assert multi.checkreturnvalues() == {"a": 0}
+
+
 def test_transfer_with_remaining_streams(multiplexer):
     proc = MockProc(stdout=MockStream(b"output\n"))
     multiplexer.addproc("test", proc)
@@ -0,0 +1,180 @@
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+rolling = importlib.import_module("core.rolling")
+main_module = importlib.import_module("core.main")
+
+
+@pytest.fixture
+def core_settings(monkeypatch):
+    values = {}
+    fake_settings = SimpleNamespace(user=SimpleNamespace(getsection=lambda name: values))
+    monkeypatch.setattr(rolling, "settings", fake_settings)
+    return values
+
+
+@pytest.fixture
+def runs():
+    """Record the wave commands run, failing the servers in ``runs.fail``."""
+    record = SimpleNamespace(calls=[], fail={})
+
+    def fake_run(servers, args):
+        record.calls.append(([main_module.server_tag(u, s) for u, s in servers], args))
+        return {
+            main_module.server_tag(u, s): record.fail.get((main_module.server_tag(u, s), args[0]), 0)
+            for u, s in servers
+        }
+
+    record.run = fake_run
+    return record
+
+
+def _run_rolling(runs, cmd, opts, servers=None):
+    return rolling.run_rolling(
+        SERVERS if servers is None else servers, cmd, opts, runs.run, main_module.server_tag
+    )
+
+
+SERVERS = [(None, "a"), (None, "b"), ("bob", "c"), (None, "d"), (None, "e")]
+
+
+def test_resolve_count_handles_counts_and_percentages():
+    assert rolling.resolve_count("2", 10, 1) == 2
+    assert rolling.resolve_count("0", 10, 1) == 1
+    assert rolling.resolve_count("25%", 10, 1) == 3
+    assert rolling.resolve_count("25%", 2, 1) == 1
+    assert rolling.resolve_count("10%", 5) == 0
+    assert rolling.resolve_count("40%", 5) == 2
+    with pytest.raises(ValueError):
+        rolling.resolve_count("many", 5)
+
+
+def test_plan_waves_keeps_order():
+    assert rolling.plan_waves([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+
+
+def test_get_rolling_settings_reads_core_section(core_settings, capsys):
+    assert rolling.get_rolling_settings() == ("1", "0", 300)
+    core_settings.update(
+        rolling_max_unavailable="20%", rolling_max_failures="lots", rolling_ready_timeout="60"
+    )
+    assert rolling.get_rolling_settings() == ("20%", "0", 60)
+    assert "Invalid rolling_max_failures setting" in capsys.readouterr().err
+
+
+def test_rolling_restart_waits_for_each_wave(core_settings, runs, capsys):
+    ret = _run_rolling(runs, "rolling-restart", {"max_unavailable": "40%", "timeout": 60})
+
+    assert ret == 0
+    assert runs.calls == [
+        (["a", "b"], ["status", "--check"]),
+        (["a", "b"], ["restart", "--wait", "--timeout", "60"]),
+        (["bob/c", "d"], ["status", "--check"]),
+        (["bob/c", "d"], ["restart", "--wait", "--timeout", "60"]),
+        (["e"], ["status", "--check"]),
+        (["e"], ["restart", "--wait", "--timeout", "60"]),
+    ]
+    out = capsys.readouterr().out
+    assert "Wave 2/3: bob/c d" in out
+    assert "rolling-restart: 5 ready, 0 left stopped, 0 failed, 0 skipped" in out
+
+
+def test_rolling_restart_stops_after_failure_threshold(core_settings, runs, capsys):
+    runs.fail[("b", "restart")] = 1
+
+    ret = _run_rolling(runs, "rolling-restart", {"max_unavailable": "2"})
+
+    assert ret == 1
+    assert len(runs.calls) == 2
+    captured = capsys.readouterr()
+    assert "not touching: bob/c d e" in captured.err
+    assert "rolling-restart: 1 ready, 0 left stopped, 1 failed, 3 skipped" in captured.out
+
+
+def test_rolling_restart_tolerates_failures_up_to_threshold(core_settings, runs):
+    runs.fail[("a", "restart")] = 1
+
+    ret = _run_rolling(runs, "rolling-restart", {"max_failures": "1"})
+
+    assert ret == 1
+    assert len(runs.calls) == 10
+
+
+def test_rolling_update_only_waits_for_servers_that_updated(core_settings, runs):
+    runs.fail[("b", "update")] = 2
+
+    ret = _run_rolling(
+        runs,
+        "rolling-update",
+        {"max_unavailable": "2", "max_failures": "1", "validate": True},
+        SERVERS[:2],
+    )
+
+    assert ret == 1
+    assert runs.calls == [
+        (["a", "b"], ["status", "--check"]),
+        (["a", "b"], ["update", "--restart", "--validate"]),
+        (["a"], ["ready", "--timeout", "300"]),
+    ]
+
+
+def test_rolling_restart_leaves_stopped_servers_alone(core_settings, runs, capsys):
+    runs.fail[("a", "status")] = 1
+
+    ret = _run_rolling(runs, "rolling-restart", {"max_unavailable": "2"}, SERVERS[:2])
+
+    assert ret == 0
+    assert runs.calls == [
+        (["a", "b"], ["status", "--check"]),
+        (["b"], ["restart", "--wait", "--timeout", "300"]),
+    ]
+    out = capsys.readouterr().out
+    assert "Not running, leaving stopped: a" in out
+    assert "rolling-restart: 1 ready, 1 left stopped, 0 failed, 0 skipped" in out
+
+
+def test_rolling_update_updates_stopped_servers_without_starting_them(core_settings, runs, capsys):
+    runs.fail[("b", "status")] = 1
+
+    ret = _run_rolling(runs, "rolling-update", {"max_unavailable": "2"}, SERVERS[:2])
+
+    assert ret == 0
+    assert runs.calls == [
+        (["a", "b"], ["status", "--check"]),
+        (["b"], ["update"]),
+        (["a"], ["update", "--restart"]),
+        (["a"], ["ready", "--timeout", "300"]),
+    ]
+    assert "rolling-update: 1 ready, 1 left stopped, 0 failed, 0 skipped" in capsys.readouterr().out
+
+
+def test_main_rejects_bad_rolling_options(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main_module, "expand_server_star", lambda user, tag, cmd: [(user, tag)])
+    monkeypatch.setattr(main_module, "help", lambda *args, **kwargs: None)
+    monkeypatch.setattr(rolling, "run_rolling", lambda *args: calls.append(args) or 0)
+
+    assert main_module.main("alphagsm", ["alpha", "rolling-restart", "-u", "some"]) == 2
+    assert calls == []
+
+
+def test_main_dispatches_rolling_commands_for_single_and_multiple_servers(monkeypatch):
+    calls = []
+    runs = []
+    monkeypatch.setattr(main_module, "expand_server_star", lambda user, tag, cmd: [(user, tag)])
+    monkeypatch.setattr(
+        main_module, "run_multi_returnvalues", lambda *args: runs.append(args) or {}
+    )
+    monkeypatch.setattr(rolling, "run_rolling", lambda *args: calls.append(args) or 0)
+
+    assert main_module.main("alphagsm", ["alpha", "rolling-restart"]) == 0
+    assert main_module.main("alphagsm", ["2", "a", "b", "rolling-update", "-v"]) == 0
+    assert [call[:3] for call in calls] == [
+        ([(None, "alpha")], "rolling-restart", {}),
+        ([(None, "a"), (None, "b")], "rolling-update", {"validate": True}),
+    ]
+    assert all(call[4] is main_module.server_tag for call in calls)
+    calls[0][3]([(None, "alpha")], ["restart"])
+    assert runs == [("alphagsm", [(None, "alpha")], ["restart"])]
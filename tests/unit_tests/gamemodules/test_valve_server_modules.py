@@ -378,3 +378,37 @@ def test_hibernating_source_console_info_falls_back_to_status_heuristic_when_pro
     )
 
     assert valve_server.hibernating_source_console_info(server)["name"] == "AlphaGSM CSS Server"
+
+
+def test_valve_module_staged_update_downloads_into_staging_tree(monkeypatch, tmp_path):
+    module = importlib.import_module("gamemodules.csserver")
+    steamcmd_module = importlib.import_module("utils.steamcmd")
+    staged_module = importlib.import_module("utils.staged_install")
+    server = SimpleNamespace(name="csalpha", data={})
+    calls = []
+
+    module.configure(server, False, 27015, str(tmp_path / "cs"))
+    monkeypatch.setattr(
+        steamcmd_module,
+        "download",
+        lambda path, app_id, anon, validate=True, mod=None: calls.append((path, mod)),
+    )
+    monkeypatch.setattr(
+        staged_module,
+        "staged_update",
+        lambda server, download, restart=False: download(staged_module.staging_dir(server) + "/"),
+    )
+
+    module.update(server, staged=True)
+
+    assert calls == [(str(tmp_path / "cs.staging") + "/", "cstrike")]
+    assert "rollback" in module.commands
+
+
+def test_valve_module_no_staged_option_overrides_setting():
+    module = importlib.import_module("gamemodules.csserver")
+    cmdparse = importlib.import_module("utils.cmdparse.cmdparse")
+
+    assert cmdparse.parse(["--no-staged"], module.command_args["update"])[1] == {"staged": False}
+    assert cmdparse.parse(["-s"], module.command_args["update"])[1] == {"staged": True}
+    assert cmdparse.parse(["-f"], module.command_args["rollback"])[1] == {"force": True}
@@ -35,6 +35,9 @@ class ConcreteBackend(ProcessBackend):
     def list_sessions(self):
         yield from ()
 
+    def _session_pid(self, name):
+        return None
+
 
 def _make_backend(tmp_path, keeplogs=5):
     return ConcreteBackend("Tag#", str(tmp_path / "logs"), keeplogs)
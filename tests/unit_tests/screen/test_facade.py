@@ -34,6 +34,10 @@ class FakeBackend:
         self.calls.append(("is_running", name))
         return True
 
+    def wait_stopped(self, name, timeout):
+        self.calls.append(("wait_stopped", name, timeout))
+        return True
+
     def connect(self, name):
         self.calls.append(("connect", name))
 
@@ -75,6 +79,11 @@ def test_send_to_server_routes_to_send_input(fake_backend):
     assert fake_backend.calls == [("send_input", "srv", "hello")]
 
 
+def test_wait_for_screen_exit_routes_to_wait_stopped(fake_backend):
+    assert screen_pkg.wait_for_screen_exit("srv", 30) is True
+    assert fake_backend.calls == [("wait_stopped", "srv", 30)]
+
+
 def test_send_to_screen_quit_routes_to_kill(fake_backend):
     screen_pkg.send_to_screen("srv", ["quit"])
     assert fake_backend.calls == [("kill", "srv")]
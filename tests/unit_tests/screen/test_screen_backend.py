@@ -128,3 +128,28 @@ def test_connect_invokes_script(monkeypatch):
     assert calls[0] == [
         "script", "/dev/null", "-c", "screen -rS 'Alpha#srv1'",
     ]
+
+
+def test_session_pid_is_read_from_socket_name(tmp_path, monkeypatch):
+    backend = _make_backend(tmp_path)
+    sockets = tmp_path / "sockets"
+    sockets.mkdir()
+    (sockets / "4321.Alpha#srv1").write_text("")
+    (sockets / "999.Alpha#srv10").write_text("")
+    monkeypatch.setenv("SCREENDIR", str(sockets))
+
+    assert backend._session_pid("srv1") == 4321
+    assert backend._session_pid("srv2") is None
+
+
+def test_wait_stopped_waits_on_session_pid_then_confirms(tmp_path, monkeypatch):
+    import screen.backend as backend_module
+
+    backend = _make_backend(tmp_path)
+    waited = []
+    monkeypatch.setattr(backend, "_session_pid", lambda name: 4321)
+    monkeypatch.setattr(backend_module, "wait_for_pid", lambda pid, timeout: waited.append((pid, timeout)) or True)
+    monkeypatch.setattr(backend, "is_running", lambda name: False)
+
+    assert backend.wait_stopped("srv1", 30) is True
+    assert waited == [(4321, 30)]
@@ -171,3 +171,19 @@ def test_connect_raises_when_no_log(tmp_path):
     backend = _make_backend(tmp_path)
     with pytest.raises(ProcessError, match="No log file"):
         backend.connect("srv1")
+
+
+def test_wait_stopped_returns_when_process_exits(tmp_path):
+    backend = _make_backend(tmp_path)
+    backend.start("srv1", ["sleep", "0.2"])
+
+    assert backend.wait_stopped("srv1", 10) is True
+    assert not backend.is_running("srv1")
+
+
+def test_wait_stopped_times_out_for_running_process(tmp_path):
+    backend = _make_backend(tmp_path)
+    backend.start("srv1", ["sleep", "60"])
+
+    assert backend.wait_stopped("srv1", 0.2) is False
+    backend.kill("srv1")
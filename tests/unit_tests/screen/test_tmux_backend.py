@@ -144,3 +144,26 @@ def test_list_sessions_returns_empty_on_error(tmp_path, monkeypatch):
         ),
     )
     assert list(backend.list_sessions()) == []
+
+
+def test_session_pid_reads_pane_pid(tmp_path, monkeypatch):
+    backend = _make_backend(tmp_path)
+    calls = []
+    monkeypatch.setattr(
+        sp, "check_output",
+        lambda cmd, stderr, shell, text: calls.append(cmd) or "5150\n",
+    )
+
+    assert backend._session_pid("srv1") == 5150
+    assert calls[0] == ["tmux", "display-message", "-p", "-t", "Alpha#srv1", "#{pane_pid}"]
+
+
+def test_session_pid_is_none_without_session(tmp_path, monkeypatch):
+    backend = _make_backend(tmp_path)
+
+    def fail(cmd, stderr, shell, text):
+        raise sp.CalledProcessError(1, cmd)
+
+    monkeypatch.setattr(sp, "check_output", fail)
+
+    assert backend._session_pid("srv1") is None
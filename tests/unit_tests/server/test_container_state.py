@@ -0,0 +1,139 @@
+"""Unit tests for the batched Docker container state snapshot."""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import server.container_state as container_state
+import server.docker_api as docker_api
+import server.runtime as runtime_module
+
+
+class FakeClient:
+    """Docker API client stub answering container listings."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.calls = []
+
+    def list_containers(self, filters=None):
+        self.calls.append(("list", filters))
+        ((key, (value,)),) = filters.items()
+        if key == "label":
+            return [entry for entry in self.entries if value in entry.get("Labels", {})]
+        return [entry for entry in self.entries if any(value in name for name in entry["Names"])]
+
+
+def api_entry(name, state, labels=None):
+    return {"Id": "id-" + name, "Names": ["/" + name], "State": state, "Labels": {} if labels is None else labels}
+
+
+@pytest.fixture(autouse=True)
+def no_primed_snapshot(monkeypatch):
+    monkeypatch.setattr(container_state, "_snapshot", None)
+
+
+def test_snapshot_from_api_lists_labelled_and_prefixed_containers_once(monkeypatch):
+    client = FakeClient(
+        [
+            api_entry("alphagsm-alpha", "running", {"alphagsm.server": "alpha"}),
+            api_entry("custom-beta", "exited", {"alphagsm.server": "beta"}),
+            api_entry("alphagsm-old", "created"),
+        ]
+    )
+    monkeypatch.setattr(docker_api, "get_client", lambda: client)
+
+    snapshot = container_state.take_snapshot()
+
+    assert [call[0] for call in client.calls] == ["list", "list"]
+    assert sorted(snapshot.states) == ["alphagsm-alpha", "alphagsm-old", "custom-beta"]
+    assert snapshot.get("alphagsm-alpha") == container_state.ContainerState(
+        "alphagsm-alpha", "id-alphagsm-alpha", True, "running"
+    )
+    assert snapshot.get("custom-beta").running is False
+
+
+def test_snapshot_from_cli_uses_a_fixed_number_of_docker_runs(monkeypatch):
+    monkeypatch.setattr(docker_api, "get_client", lambda: None)
+    calls = []
+    inspected = [
+        {"Id": "a" * 64, "Name": "/alphagsm-alpha", "State": {"Running": True, "Status": "running"}},
+        {"Id": "b" * 64, "Name": "/alphagsm-beta", "State": {"Running": False, "Status": "exited"}},
+    ]
+
+    def fake_check_output(cmd, **kwargs):
+        calls.append(cmd)
+        if cmd[:2] == ["docker", "ps"]:
+            return "a" * 64 + "\n" + ("b" * 64 + "\n" if "name=alphagsm-" in cmd else "")
+        return json.dumps(inspected)
+
+    monkeypatch.setattr(container_state.sp, "check_output", fake_check_output)
+
+    snapshot = container_state.take_snapshot()
+
+    assert len(calls) == 3
+    assert calls[-1] == ["docker", "inspect", "a" * 64, "b" * 64]
+    assert snapshot.get("alphagsm-alpha").running is True
+    assert snapshot.get("alphagsm-beta").running is False
+
+
+def test_cached_running_only_answers_from_a_fresh_snapshot(monkeypatch):
+    with pytest.raises(KeyError):
+        container_state.cached_running("alphagsm-alpha")
+
+    snapshot = container_state.ContainerSnapshot(
+        [container_state.ContainerState("alphagsm-alpha", "id", True, "running")]
+    )
+    container_state.prime(snapshot)
+    assert container_state.cached_running("alphagsm-alpha") is True
+    assert container_state.cached_running("alphagsm-missing") is None
+    with pytest.raises(KeyError):
+        container_state.cached_running("other-name")
+
+    container_state.forget("alphagsm-alpha")
+    with pytest.raises(KeyError):
+        container_state.cached_running("alphagsm-alpha")
+
+    snapshot.taken -= container_state.SNAPSHOT_TTL
+    with pytest.raises(KeyError):
+        container_state.cached_running("alphagsm-missing")
+
+
+def test_prime_for_fleet_only_lists_containers_for_the_docker_backend(monkeypatch):
+    backend = {"backend": "process"}
+    monkeypatch.setattr(
+        container_state, "settings", SimpleNamespace(user=SimpleNamespace(getsection=lambda name: backend))
+    )
+    monkeypatch.setattr(container_state, "take_snapshot", lambda: container_state.ContainerSnapshot([]))
+
+    assert container_state.prime_for_fleet() is None
+    backend["backend"] = "docker"
+    snapshot = container_state.prime_for_fleet()
+    assert container_state._snapshot is snapshot
+
+
+def test_container_runtime_answers_from_primed_snapshot_until_it_acts(monkeypatch):
+    monkeypatch.setattr(docker_api, "get_client", lambda: None)
+    calls = []
+    monkeypatch.setattr(
+        runtime_module.sp, "check_output", lambda cmd, **kwargs: calls.append(cmd) or "false\n"
+    )
+    monkeypatch.setattr(runtime_module.sp, "run", lambda cmd, **kwargs: calls.append(cmd))
+    container_state.prime(
+        container_state.ContainerSnapshot(
+            [container_state.ContainerState("alphagsm-alpha", "id", True, "running")]
+        )
+    )
+    server = SimpleNamespace(
+        name="alpha", module=SimpleNamespace(), data={"runtime": "docker", "container_name": "alphagsm-alpha"}
+    )
+    runtime = runtime_module.ContainerRuntime()
+
+    assert runtime.is_running(server) is True
+    assert calls == []
+
+    runtime.kill(server)
+    calls.clear()
+    assert runtime.is_running(server) is False
+    assert calls == [["docker", "inspect", "-f", "{{.State.Running}}", "alphagsm-alpha"]]
@@ -0,0 +1,398 @@
+"""Unit tests for the Docker Engine API client, against a Unix-socket stand-in daemon."""
+
+import hashlib
+import http.server
+import json
+import os
+import socketserver
+import struct
+import threading
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import server.docker_api as docker_api
+import server.runtime as runtime_module
+
+
+def frame(stream, data):
+    return struct.pack(">BxxxI", stream, len(data)) + data
+
+
+class FakeDockerHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        return None
+
+    def _reply(self, status, body=None, raw=None):
+        data = raw if raw is not None else (json.dumps(body).encode() if body is not None else b"")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        self.server.requests.append((self.command, url.path, query, body))
+        daemon = self.server
+        parts = url.path.strip("/").split("/")
+        containers = daemon.containers
+
+        if parts[0] == "containers" and parts[1] == "create":
+            if body["Image"] not in daemon.images:
+                return self._reply(404, {"message": "No such image: " + body["Image"]})
+            containers[query["name"]] = {"Id": "id-" + query["name"], "running": False, "config": body}
+            return self._reply(201, {"Id": "id-" + query["name"]})
+        if parts[0] == "containers":
+            name = next(
+                (key for key, value in containers.items() if parts[1] in (key, value["Id"])), None
+            )
+            action = parts[2] if len(parts) > 2 else None
+            if name is None:
+                return self._reply(404, {"message": "No such container: " + parts[1]})
+            container = containers[name]
+            if self.command == "DELETE":
+                del containers[name]
+                return self._reply(204)
+            if action == "json":
+                return self._reply(
+                    200,
+                    {"Id": container["Id"], "Config": container["config"], "State": {"Running": container["running"]}},
+                )
+            if action in ("start", "stop"):
+                container["running"] = action == "start"
+                return self._reply(204)
+            if action == "wait":
+                if container["running"]:
+                    time.sleep(0.5)
+                return self._reply(200, {"StatusCode": 0})
+            if action == "exec":
+                daemon.execs.append(body["Cmd"])
+                return self._reply(201, {"Id": "exec1"})
+            if action == "attach":
+                #  hijack the connection: stdin lines come in, echoed as stdout if attached
+                self.wfile.write(b"HTTP/1.1 101 UPGRADED\r\nConnection: Upgrade\r\nUpgrade: tcp\r\n\r\n")
+                self.wfile.flush()
+                daemon.attaches += 1
+                for line in iter(self.rfile.readline, b""):
+                    daemon.console.append(line)
+                    if query.get("stdout") == "1":
+                        self.wfile.write(frame(1, b"> " + line))
+                        self.wfile.flush()
+                self.close_connection = True
+                return None
+            if action == "logs":
+                return self._reply(200, raw=frame(1, b"hello\n") + frame(2, b"oops\n"))
+        if parts[0] == "images":
+            if parts[1] == "create":
+                daemon.images.add(query["fromImage"])
+                return self._reply(200, raw=b'{"status":"Pulling"}\n{"status":"Done"}\n')
+            image = "/".join(parts[1:-1])
+            return self._reply(200 if image in daemon.images else 404, {})
+        if parts[0] == "exec" and parts[2] == "start":
+            #  the daemon hijacks the connection for the output stream and closes it after
+            self.wfile.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/vnd.docker.raw-stream\r\n\r\n"
+                + frame(1, b"sent\n")
+            )
+            self.close_connection = True
+            return None
+        if parts[0] == "exec" and parts[2] == "json":
+            return self._reply(200, {"ExitCode": daemon.exec_exit_code})
+        return self._reply(500, {"message": "unexpected request " + self.path})
+
+    do_GET = do_POST = do_DELETE = _handle
+
+
+class FakeDockerDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        super().__init__(path, FakeDockerHandler)
+        self.connections = 0
+        self.requests = []
+        self.containers = {}
+        self.images = set()
+        self.execs = []
+        self.exec_exit_code = 0
+        self.attaches = 0
+        self.console = []
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    path = str(tmp_path / "docker.sock")
+    server = FakeDockerDaemon(path)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    monkeypatch.setenv("DOCKER_HOST", "unix://" + path)
+    monkeypatch.setattr(
+        docker_api,
+        "settings",
+        SimpleNamespace(user=SimpleNamespace(getsection=lambda name: {})),
+    )
+    monkeypatch.setattr(docker_api, "_local", threading.local())
+    yield server
+    client = getattr(docker_api._local, "client", (None, None, None))[2]
+    if client is not None:
+        client.close()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def no_cli(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("the docker CLI should not be used: {}".format(args))
+
+    monkeypatch.setattr(runtime_module.sp, "check_output", fail)
+    monkeypatch.setattr(runtime_module.sp, "run", fail)
+
+
+def wait_for_console(daemon, lines):
+    deadline = time.monotonic() + 5
+    while len(daemon.console) < lines:
+        assert time.monotonic() < deadline, daemon.console
+        time.sleep(0.01)
+
+
+def docker_server(name="alpha"):
+    module = SimpleNamespace(
+        get_container_spec=lambda server: {
+            "container_name": "alphagsm-" + name,
+            "image": "example/game:1",
+            "network_mode": "bridge",
+            "working_dir": "/srv/server",
+            "stdin_open": True,
+            "stop_mode": "exec-console",
+            "env": {"EULA": "TRUE"},
+            "mounts": [{"source": "/srv/host", "target": "/srv/server", "mode": "rw"}],
+            "ports": [{"host": 27015, "container": 27015, "protocol": "udp"}, "127.0.0.1:8080:80"],
+            "command": ["./run.sh"],
+        }
+    )
+    return SimpleNamespace(
+        name=name, module=module, data={"runtime": "docker", "container_name": "alphagsm-" + name}
+    )
+
+
+def test_get_client_reuses_one_client_and_connection(daemon):
+    client = docker_api.get_client()
+
+    assert docker_api.get_client() is client
+    assert client.container_running("missing") is None
+    assert client.image_exists("example/game:1") is False
+    assert client.container_running("missing") is None
+    assert daemon.connections == 1
+
+
+def test_get_client_uses_cli_when_configured_or_socket_missing(daemon, monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        docker_api,
+        "settings",
+        SimpleNamespace(user=SimpleNamespace(getsection=lambda name: {"docker_api": "cli"})),
+    )
+    assert docker_api.get_client() is None
+
+    monkeypatch.setattr(docker_api, "settings", SimpleNamespace(user=SimpleNamespace(getsection=lambda name: {})))
+    monkeypatch.setenv("DOCKER_HOST", "unix://" + str(tmp_path / "nothing.sock"))
+    assert docker_api.get_client() is None
+    monkeypatch.setenv("DOCKER_HOST", "tcp://10.0.0.2:2375")
+    assert docker_api.get_client() is None
+
+
+def test_socket_path_follows_the_active_docker_context(monkeypatch, tmp_path):
+    monkeypatch.setattr(docker_api, "settings", SimpleNamespace(user=SimpleNamespace(getsection=lambda name: {})))
+    default = tmp_path / "default.sock"
+    default.touch()
+    monkeypatch.setattr(docker_api, "DEFAULT_SOCKET", str(default))
+    config = tmp_path / "docker-config"
+    monkeypatch.setenv("DOCKER_CONFIG", str(config))
+    monkeypatch.delenv("DOCKER_HOST", raising=False)
+    monkeypatch.delenv("DOCKER_CONTEXT", raising=False)
+
+    def add_context(name, host):
+        meta = config / "contexts" / "meta" / hashlib.sha256(name.encode()).hexdigest()
+        meta.mkdir(parents=True)
+        (meta / "meta.json").write_text(json.dumps({"Name": name, "Endpoints": {"docker": {"Host": host}}}))
+
+    assert docker_api.socket_path() == str(default)
+
+    rootless = tmp_path / "rootless.sock"
+    rootless.touch()
+    add_context("rootless", "unix://" + str(rootless))
+    add_context("remote", "ssh://admin@build-host")
+    (config / "config.json").write_text(json.dumps({"currentContext": "rootless"}))
+    assert docker_api.socket_path() == str(rootless)
+
+    monkeypatch.setenv("DOCKER_CONTEXT", "remote")
+    assert docker_api.socket_path() is None
+    monkeypatch.setenv("DOCKER_CONTEXT", "missing")
+    assert docker_api.socket_path() is None
+    monkeypatch.setenv("DOCKER_CONTEXT", "default")
+    assert docker_api.socket_path() == str(default)
+
+    monkeypatch.setenv("DOCKER_CONTEXT", "remote")
+    monkeypatch.setenv("DOCKER_HOST", "unix://" + str(rootless))
+    assert docker_api.socket_path() == str(rootless)
+
+
+def test_container_config_matches_docker_run_options():
+    config = docker_api.container_config(docker_server().module.get_container_spec(None))
+
+    assert config["Cmd"] == ["./run.sh"]
+    assert config["Env"] == ["EULA=TRUE"]
+    assert config["OpenStdin"] is True
+    assert config["HostConfig"]["Binds"] == ["/srv/host:/srv/server:rw"]
+    assert config["HostConfig"]["NetworkMode"] == "bridge"
+    assert config["HostConfig"]["PortBindings"] == {
+        "27015/udp": [{"HostIp": "", "HostPort": "27015"}],
+        "80/tcp": [{"HostIp": "127.0.0.1", "HostPort": "8080"}],
+    }
+    assert set(config["ExposedPorts"]) == {"27015/udp", "80/tcp"}
+    assert config["Labels"] == {}
+    labelled = docker_api.container_config(docker_server().module.get_container_spec(None), {"alphagsm.server": "alpha"})
+    assert labelled["Labels"] == {"alphagsm.server": "alpha"}
+
+
+def test_container_config_publishes_no_ports_on_host_network():
+    spec = dict(docker_server().module.get_container_spec(None), network_mode="host")
+
+    config = docker_api.container_config(spec)
+
+    assert config["ExposedPorts"] == {}
+    assert config["HostConfig"]["PortBindings"] == {}
+    assert config["HostConfig"]["NetworkMode"] == "host"
+
+
+def test_container_runtime_runs_containers_through_the_api(daemon, no_cli, monkeypatch):
+    monkeypatch.setattr(runtime_module, "get_container_spec", lambda server: server.module.get_container_spec(server))
+    runtime = runtime_module.ContainerRuntime()
+    server = docker_server()
+
+    runtime.start(server)
+
+    assert daemon.images == {"example/game:1"}  # pulled when create found no image
+    assert daemon.containers["alphagsm-alpha"]["config"]["Image"] == "example/game:1"
+    assert daemon.containers["alphagsm-alpha"]["config"]["Labels"] == {"alphagsm.server": "alpha"}
+    assert runtime.is_running(server) is True
+    with pytest.raises(runtime_module.RuntimeError, match="already running"):
+        runtime.start(server)
+
+    runtime.send_input(server, "say hi\n")
+    runtime.send_input(server, "list\n")
+    wait_for_console(daemon, 2)
+    assert daemon.console == [b"say hi\n", b"list\n"]
+    assert daemon.attaches == 1
+    assert daemon.execs == []
+
+    runtime.kill(server)
+    assert daemon.containers == {}
+    assert runtime.is_running(server) is False
+    assert runtime.wait_stopped(server, 1) is True
+
+
+def test_container_runtime_restarts_unchanged_container_when_reusing(daemon, no_cli, monkeypatch):
+    monkeypatch.setattr(runtime_module, "get_container_spec", lambda server: server.module.get_container_spec(server))
+    monkeypatch.setattr(
+        runtime_module,
+        "settings",
+        SimpleNamespace(user=SimpleNamespace(getsection=lambda name: {"container_reuse": "yes"})),
+    )
+    runtime = runtime_module.ContainerRuntime()
+    server = docker_server()
+
+    runtime.start(server)
+    runtime.kill(server)
+    assert daemon.containers["alphagsm-alpha"]["running"] is False
+
+    runtime.start(server)
+    creates = [request for request in daemon.requests if request[1] == "/containers/create"]
+    assert len(creates) == 1
+    assert runtime.is_running(server) is True
+
+    runtime.kill(server)
+    get_spec = server.module.get_container_spec
+    server.module.get_container_spec = lambda server: dict(get_spec(server), env={"EULA": "FALSE"})
+    runtime.start(server)
+    creates = [request for request in daemon.requests if request[1] == "/containers/create"]
+    assert len(creates) == 2
+    assert creates[0][3]["Labels"]["alphagsm.spec"] != creates[1][3]["Labels"]["alphagsm.spec"]
+    assert daemon.containers["alphagsm-alpha"]["config"]["Env"] == ["EULA=FALSE"]
+
+
+def test_send_input_reports_failed_exec(daemon, no_cli, monkeypatch):
+    monkeypatch.setattr(runtime_module, "get_container_spec", lambda server: server.module.get_container_spec(server))
+    monkeypatch.setattr(
+        docker_api,
+        "settings",
+        SimpleNamespace(user=SimpleNamespace(getsection=lambda name: {"console_attach": "no"})),
+    )
+    daemon.containers["alphagsm-alpha"] = {"Id": "id-alpha", "running": True, "config": {}}
+    daemon.exec_exit_code = 1
+
+    with pytest.raises(runtime_module.RuntimeError, match="sent"):
+        runtime_module.ContainerRuntime().send_input(docker_server(), "stop\n")
+
+
+def test_console_attaches_stdin_only_and_reattaches_after_restart(daemon):
+    daemon.containers["alphagsm-alpha"] = {"Id": "id-alpha", "running": True, "config": {}}
+    client = docker_api.get_client()
+
+    assert client.send_console("alphagsm-alpha", b"list\n") is True
+    wait_for_console(daemon, 1)
+    attach = [request for request in daemon.requests if request[1].endswith("/attach")][0]
+    assert (attach[2]["stdin"], attach[2]["stdout"], attach[2]["stderr"]) == ("1", "0", "0")
+
+    client.console("alphagsm-alpha").close()  # as if the container had restarted
+    assert client.send_console("alphagsm-alpha", b"status\n") is True
+    wait_for_console(daemon, 2)
+    assert daemon.attaches == 2
+    assert daemon.console == [b"list\n", b"status\n"]
+
+    assert client.send_console("alphagsm-missing", b"list\n") is False
+
+
+def test_show_logs_splits_stdout_and_stderr(daemon, no_cli, monkeypatch, capsys):
+    monkeypatch.setattr(runtime_module, "get_container_spec", lambda server: server.module.get_container_spec(server))
+    daemon.containers["alphagsm-alpha"] = {"Id": "id-alpha", "running": True, "config": {}}
+
+    runtime_module.ContainerRuntime().show_logs(docker_server(), lines=10)
+
+    captured = capsys.readouterr()
+    assert captured.out == "hello\n"
+    assert captured.err == "oops\n"
+    assert daemon.requests[-1][2] == {"stdout": "1", "stderr": "1", "tail": "10"}
+
+
+def test_wait_container_times_out_while_running(daemon):
+    daemon.containers["alphagsm-alpha"] = {"Id": "id-alpha", "running": True, "config": {}}
+
+    assert docker_api.get_client().wait_container("alphagsm-alpha", 0.1) is False
+
+
+def test_container_runtime_falls_back_to_cli_when_daemon_is_unreachable(daemon, monkeypatch, tmp_path):
+    dead = tmp_path / "dead.sock"
+    dead.write_text("")  # exists, but nothing listens
+    monkeypatch.setenv("DOCKER_HOST", "unix://" + str(dead))
+    calls = []
+    monkeypatch.setattr(
+        runtime_module.sp,
+        "check_output",
+        lambda cmd, **kwargs: calls.append(cmd) or "true\n",
+    )
+
+    assert runtime_module.ContainerRuntime().is_running(docker_server()) is True
+    assert calls == [["docker", "inspect", "-f", "{{.State.Running}}", "alphagsm-alpha"]]
+    assert os.path.exists(str(dead))
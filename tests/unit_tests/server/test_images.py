@@ -0,0 +1,105 @@
+"""Unit tests for runtime image records and build deduplication."""
+
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import server.images as images
+import server.runtime as runtime_module
+import server.server as server_module
+
+JAVA_IMAGE = runtime_module.default_runtime_image("java")
+
+
+@pytest.fixture
+def datapath(tmp_path, monkeypatch):
+    monkeypatch.setattr(server_module, "DATAPATH", str(tmp_path))
+    return tmp_path
+
+
+class CountingRuntime(runtime_module.ContainerRuntime):
+    """Container runtime whose docker image operations are stubbed and counted."""
+
+    def __init__(self, present=()):
+        self.present = set(present)
+        self.inspects = []
+        self.builds = []
+        self.pulls = []
+
+    def _image_id(self, image):
+        self.inspects.append(image)
+        return "sha256:" + image if image in self.present else None
+
+    def _runtime_family_dockerfile(self, family):
+        return "/repo/docker/" + family + "/Dockerfile"
+
+    def _build_image(self, image, dockerfile_path):
+        time.sleep(0.05)
+        self.builds.append(image)
+        self.present.add(image)
+
+    def _pull_image(self, image):
+        self.pulls.append(image)
+        self.present.add(image)
+
+
+def test_ensure_image_records_the_image_and_skips_docker_afterwards(datapath):
+    runtime = CountingRuntime(present=["example/game:1"])
+
+    assert runtime.ensure_image("example/game:1") == "present"
+    assert runtime.ensure_image("example/game:1") == "recorded"
+    assert runtime.inspects == ["example/game:1"]
+    stored = json.loads((datapath / images.IMAGES_FILENAME).read_text())
+    assert stored["example/game:1"]["id"] == "sha256:example/game:1"
+
+    images.forget("example/game:1")
+    assert runtime.ensure_image("example/game:1") == "present"
+    assert len(runtime.inspects) == 2
+
+
+def test_ensure_image_builds_default_family_images_and_leaves_others(datapath):
+    runtime = CountingRuntime()
+
+    assert runtime.ensure_image("example/game:1", "java") is None
+    assert runtime.ensure_image(JAVA_IMAGE, "minecraft") == "built"
+    assert runtime.ensure_image("example/game:1", "java", pull=True) == "pulled"
+    assert runtime.builds == [JAVA_IMAGE]
+    assert runtime.pulls == ["example/game:1"]
+
+
+def test_concurrent_ensure_image_calls_build_once(datapath):
+    runtime = CountingRuntime()
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(runtime.ensure_image(JAVA_IMAGE, "java")))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert runtime.builds == [JAVA_IMAGE]
+    assert sorted(results) == ["built", "recorded", "recorded", "recorded"]
+
+
+def test_failed_start_forgets_the_recorded_image(datapath, monkeypatch):
+    runtime = CountingRuntime(present=["example/game:1"])
+    images.record("example/game:1", "sha256:old", "present")
+    spec = {"container_name": "alphagsm-alpha", "image": "example/game:1", "runtime_family": "java"}
+    monkeypatch.setattr(runtime_module, "get_container_spec", lambda server: spec)
+    monkeypatch.setattr(runtime, "_container_running_state", lambda name: None)
+    monkeypatch.setattr(runtime, "_api", lambda operation, *args: runtime_module._USE_CLI)
+
+    def fail(command, text=False):
+        raise runtime_module.RuntimeError("Unable to find image")
+
+    monkeypatch.setattr(runtime, "_run_check_output", fail)
+
+    with pytest.raises(runtime_module.RuntimeError):
+        runtime.start(SimpleNamespace(name="alpha"))
+    assert runtime.inspects == []  # the record was trusted
+    assert images.recorded_id("example/game:1") is None
@@ -1,5 +1,6 @@
 import errno
 import json
+import os
 from types import SimpleNamespace
 
 import server.port_manager as port_manager
@@ -20,6 +21,13 @@ def make_server(name, payload, *, module=None):
     )
 
 
+def claims_of(*servers):
+    return {
+        server.name: list(port_manager.collect_claim_set(server).endpoints)
+        for server in servers
+    }
+
+
 def test_normalize_hosted_ip_and_overlap_handle_local_wildcards():
     assert port_manager.normalize_hosted_ip("") == "0.0.0.0"
     assert port_manager.normalize_hosted_ip("localhost") == "127.0.0.1"
@@ -118,6 +126,28 @@ def test_collect_claim_set_rebuilds_runtime_ports_from_overrides():
     assert 27016 not in runtime_ports
 
 
+def test_collect_claim_set_claims_container_ports_directly_on_host_network():
+    module = SimpleNamespace(
+        get_container_spec=lambda server: {
+            "network_mode": "host",
+            "ports": [
+                {"host": 27015, "container": 27015, "protocol": "udp"},
+                {"host": 27020, "container": 27020, "protocol": "udp"},
+            ],
+        }
+    )
+    server = make_server("alpha", {"module": "tf2", "port": 27015}, module=module)
+
+    endpoints = port_manager.collect_claim_set(server).endpoints
+
+    assert [(e.scope, e.ip, e.port, e.source_key) for e in endpoints] == [
+        ("internal", "0.0.0.0", 27015, "port"),
+        ("external", "0.0.0.0", 27015, "port"),
+        ("internal", "0.0.0.0", 27020, "runtime:ports"),
+        ("external", "0.0.0.0", 27020, "runtime:ports"),
+    ]
+
+
 def test_runtime_port_endpoints_ignores_preinstall_server_errors(monkeypatch):
     module = SimpleNamespace(
         get_start_command=lambda server: (_ for _ in ()).throw(
@@ -197,7 +227,7 @@ def test_detect_conflicts_requires_matching_scope(monkeypatch):
         {"port": 27015, "bindaddress": "10.0.0.2", "publicip": "127.0.0.1"},
     )
 
-    monkeypatch.setattr(port_manager, "iter_managed_servers", lambda server: [other])
+    monkeypatch.setattr(port_manager, "managed_claims", lambda server: claims_of(other))
     monkeypatch.setattr(port_manager, "probe_live_listener", lambda ip, port: False)
 
     conflicts = port_manager.detect_conflicts(current, include_live=False)
@@ -215,7 +245,7 @@ def test_detect_conflicts_keeps_internal_wildcard_overlap(monkeypatch):
         {"port": 27015, "bindaddress": "127.0.0.1", "publicip": "10.0.0.2"},
     )
 
-    monkeypatch.setattr(port_manager, "iter_managed_servers", lambda server: [other])
+    monkeypatch.setattr(port_manager, "managed_claims", lambda server: claims_of(other))
     monkeypatch.setattr(port_manager, "probe_live_listener", lambda ip, port: False)
 
     conflicts = port_manager.detect_conflicts(current, include_live=False)
@@ -235,7 +265,7 @@ def test_detect_conflicts_does_not_apply_wildcard_overlap_to_external_scope(
         {"port": 27015, "bindaddress": "10.0.0.2", "publicip": "127.0.0.1"},
     )
 
-    monkeypatch.setattr(port_manager, "iter_managed_servers", lambda server: [other])
+    monkeypatch.setattr(port_manager, "managed_claims", lambda server: claims_of(other))
     monkeypatch.setattr(port_manager, "probe_live_listener", lambda ip, port: False)
 
     conflicts = port_manager.detect_conflicts(current, include_live=False)
@@ -268,7 +298,7 @@ def test_detect_conflicts_reports_matching_scope_collisions(monkeypatch):
     current = make_server("alpha", {"port": 27015, "bindaddress": "127.0.0.1"})
     other = make_server("bravo", {"port": 27015, "bindaddress": "127.0.0.1"})
 
-    monkeypatch.setattr(port_manager, "iter_managed_servers", lambda server: [other])
+    monkeypatch.setattr(port_manager, "managed_claims", lambda server: claims_of(other))
     monkeypatch.setattr(port_manager, "probe_live_listener", lambda ip, port: False)
 
     conflicts = port_manager.detect_conflicts(current, include_live=False)
@@ -329,3 +359,226 @@ def test_iter_managed_servers_uses_alpha_resolution_path_and_skips_missing_modul
     assert len(managed) == 2
     assert managed[0].module is resolved
     assert managed[1].module is None
+
+
+def test_claim_index_lookup_is_wildcard_aware_for_internal_scope_only():
+    index = port_manager.ClaimIndex(
+        {
+            "bravo": [
+                port_manager.PortEndpoint("internal", "0.0.0.0", 27015, "port"),
+                port_manager.PortEndpoint("external", "0.0.0.0", 27015, "port"),
+            ],
+            "charlie": [port_manager.PortEndpoint("internal", "10.0.0.2", 27015, "port")],
+        }
+    )
+
+    def names(scope, ip, port=27015):
+        endpoint = port_manager.PortEndpoint(scope, ip, port, "port")
+        return sorted(name for name, _endpoint in index.lookup(endpoint))
+
+    assert names("internal", "127.0.0.1") == ["bravo"]
+    assert names("internal", "10.0.0.2") == ["bravo", "charlie"]
+    assert names("internal", "::") == ["bravo", "charlie"]
+    assert names("external", "10.0.0.2") == []
+    assert names("external", "0.0.0.0") == ["bravo"]
+    assert names("internal", "127.0.0.1", 27016) == []
+
+
+def test_managed_claims_only_recomputes_changed_servers(monkeypatch, tmp_path):
+    (tmp_path / "alpha.json").write_text(json.dumps({"port": 27015}))
+    (tmp_path / "bravo.json").write_text(json.dumps({"port": 27025}))
+    monkeypatch.setattr(server_module, "DATAPATH", str(tmp_path))
+    computed = []
+    collect = port_manager.collect_claim_set
+
+    def counting_collect(server, overrides=None):
+        computed.append(server.name)
+        return collect(server, overrides)
+
+    monkeypatch.setattr(port_manager, "collect_claim_set", counting_collect)
+    current = make_server("charlie", {"port": 27015})
+
+    first = port_manager.managed_claims(current)
+    assert sorted(computed) == ["alpha", "bravo"]
+    assert [e.port for e in first["alpha"]] == [27015, 27015]
+
+    computed.clear()
+    store = port_manager.data_module.JSONDataStore(str(tmp_path / "bravo.json"))
+    store["port"] = 27035
+    store.save()
+    second = port_manager.managed_claims(current)
+
+    assert computed == ["bravo"]
+    assert second["alpha"] == first["alpha"]
+    assert {e.port for e in second["bravo"]} == {27035}
+    assert any(
+        conflict.managed_server == "alpha"
+        for conflict in port_manager.detect_conflicts(current, include_live=False)
+    )
+
+
+def test_managed_claims_recomputes_everything_when_the_claims_key_changes(monkeypatch, tmp_path):
+    (tmp_path / "alpha.json").write_text(json.dumps({"port": 27015}))
+    monkeypatch.setattr(server_module, "DATAPATH", str(tmp_path))
+    modules = tmp_path / "modules"
+    (modules / "fakegames").mkdir(parents=True)
+    (modules / "fakegames" / "__init__.py").write_text("")
+    game = modules / "fakegames" / "game.py"
+    game.write_text("PORT = 1\n")
+    monkeypatch.syspath_prepend(str(modules))
+    monkeypatch.setattr(port_manager, "SERVERMODULEPACKAGE", "fakegames.")
+    backend = {"backend": "process"}
+    monkeypatch.setattr(
+        port_manager, "settings", SimpleNamespace(user=SimpleNamespace(getsection=lambda name: backend))
+    )
+    computed = []
+    collect = port_manager.collect_claim_set
+
+    def counting_collect(server, overrides=None):
+        computed.append(server.name)
+        return collect(server, overrides)
+
+    monkeypatch.setattr(port_manager, "collect_claim_set", counting_collect)
+    current = make_server("charlie", {"port": 27035})
+
+    port_manager.managed_claims(current)
+    port_manager.managed_claims(current)
+    assert computed == ["alpha"]
+
+    backend["backend"] = "docker"
+    port_manager.managed_claims(current)
+    assert computed == ["alpha", "alpha"]
+
+    stat = game.stat()
+    os.utime(game, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    port_manager.managed_claims(current)
+    assert computed == ["alpha", "alpha", "alpha"]
+
+
+def test_recommend_shift_indexes_other_servers_once(monkeypatch):
+    server = make_server("alpha", {"port": 27015, "queryport": 27016})
+    other = make_server("bravo", {"port": 27015, "queryport": 27016, "rconport": 27018})
+    calls = []
+    monkeypatch.setattr(
+        port_manager,
+        "managed_claims",
+        lambda current: calls.append(current.name) or claims_of(other),
+    )
+    monkeypatch.setattr(port_manager, "live_listeners", lambda: port_manager.ListenerSnapshot([]))
+
+    recommendation = port_manager.recommend_shift(server)
+
+    assert calls == ["alpha"]
+    assert recommendation.offset == -2
+    assert recommendation.values == {"port": 27013, "queryport": 27014}
+
+
+PROC_HEADER = "  sl  local_address rem_address   st tx_queue rx_queue\n"
+
+
+def write_proc_net(root, **files):
+    root.mkdir()
+    for name, rows in files.items():
+        lines = [
+            f"   {number}: {local} 00000000:0000 {state} 00000000:00000000\n"
+            for number, (local, state) in enumerate(rows)
+        ]
+        (root / name).write_text(PROC_HEADER + "".join(lines))
+    return str(root)
+
+
+def test_listener_snapshot_reads_listening_sockets_from_proc_net(tmp_path):
+    root = write_proc_net(
+        tmp_path / "net",
+        tcp=[("0100007F:6987", "0A"), ("00000000:6988", "01")],
+        tcp6=[("00000000000000000000000000000000:6989", "0A")],
+        udp=[("00000000:698A", "07")],
+    )
+
+    snapshot = port_manager.ListenerSnapshot.read(root)
+
+    assert snapshot.holds("127.0.0.1", 27015)
+    assert snapshot.holds("0.0.0.0", 27015)
+    assert not snapshot.holds("0.0.0.0", 27016)  # established, not listening
+    assert snapshot.holds("127.0.0.1", 27017)  # dual-stack "::" listener
+    assert snapshot.holds("localhost", 27018)
+    assert not snapshot.holds("::1", 27018)  # IPv4-only wildcard
+    assert not snapshot.holds("127.0.0.1", 27019)
+
+
+def test_listener_snapshot_ignores_addresses_this_host_does_not_have(monkeypatch, tmp_path):
+    root = write_proc_net(tmp_path / "net", tcp=[("00000000:6987", "0A")])
+    snapshot = port_manager.ListenerSnapshot.read(root)
+    binds = []
+
+    class FakeSocket:
+        def __init__(self, *args):
+            pass
+
+        def bind(self, sockaddr):
+            binds.append(sockaddr)
+            raise OSError(errno.EADDRNOTAVAIL, "Cannot assign requested address")
+
+        def close(self):
+            return None
+
+    monkeypatch.setattr(port_manager.socket, "socket", FakeSocket)
+
+    assert not snapshot.holds("203.0.113.10", 27015)
+    assert not snapshot.holds("203.0.113.10", 27015)
+    assert binds == [("203.0.113.10", 0)]
+
+
+def test_live_listeners_falls_back_to_bind_probe_without_proc_net(monkeypatch, tmp_path):
+    monkeypatch.setattr(port_manager, "PROC_NET", str(tmp_path / "missing"))
+    probed = []
+    monkeypatch.setattr(
+        port_manager, "probe_live_listener", lambda ip, port: probed.append((ip, port)) or True
+    )
+    current = make_server("alpha", {"port": 27015, "bindaddress": "127.0.0.1"})
+    monkeypatch.setattr(port_manager, "managed_claims", lambda server: {})
+
+    conflicts = port_manager.detect_conflicts(current)
+
+    assert probed == [("127.0.0.1", 27015)]
+    assert [conflict.kind for conflict in conflicts] == ["unmanaged"]
+
+
+def test_allocate_port_blocks_leases_non_overlapping_free_sets(monkeypatch, tmp_path):
+    (tmp_path / "bravo.json").write_text(json.dumps({"port": 27016}))
+    monkeypatch.setattr(server_module, "DATAPATH", str(tmp_path))
+    monkeypatch.setattr(
+        port_manager, "live_listeners", lambda: port_manager.ListenerSnapshot([("0.0.0.0", 27018)])
+    )
+    template = make_server("template", {"port": 27015, "queryport": 27016})
+
+    leases = port_manager.allocate_port_blocks(template, 3, owners=["cs1", "cs2", "cs3"])
+
+    assert [lease.offset for lease in leases] == [-1, -3, 4]
+    assert leases[0].values == {"port": 27014, "queryport": 27015}
+    assert [lease.owner for lease in leases] == ["cs1", "cs2", "cs3"]
+    stored = json.loads((tmp_path / port_manager.LEASES_FILENAME).read_text())
+    assert sorted(stored["leases"]) == sorted(lease.lease_id for lease in leases)
+
+    other = make_server("charlie", {"port": 27014})
+    conflicts = port_manager.detect_conflicts(other, include_live=False)
+    assert {conflict.managed_server for conflict in conflicts} == {"lease:" + leases[0].lease_id}
+    owner = make_server("cs1", {"port": 27014, "queryport": 27015})
+    assert port_manager.detect_conflicts(owner, include_live=False) == []
+
+    assert port_manager.release_port_leases(owner="cs1") == 1
+    assert port_manager.detect_conflicts(other, include_live=False) == []
+
+
+def test_allocate_port_blocks_leases_nothing_when_not_enough_sets_are_free(monkeypatch, tmp_path):
+    monkeypatch.setattr(server_module, "DATAPATH", str(tmp_path))
+    monkeypatch.setattr(port_manager, "live_listeners", lambda: port_manager.ListenerSnapshot([]))
+    template = make_server("template", {"port": 65534, "queryport": 65535})
+
+    try:
+        port_manager.allocate_port_blocks(template, 2, max_offset=1)
+    except port_manager.ServerError as ex:
+        assert "Only found 1 of 2" in str(ex)
+    else:
+        raise AssertionError("allocation should fail")
+    assert not (tmp_path / port_manager.LEASES_FILENAME).exists()
@@ -0,0 +1,122 @@
+"""Unit tests for the start --wait readiness gate."""
+
+from types import SimpleNamespace
+
+import pytest
+
+import server.readiness as readiness
+from server.errors import ServerError
+from utils import query as query_utils
+
+
+class FakeRuntime:
+    def __init__(self, log_path=None, running=True):
+        self._log_path = log_path
+        self.running = running
+
+    def log_path(self, server):
+        return self._log_path
+
+    def is_running(self, server):
+        return self.running
+
+
+def make_server(module=None, data=None):
+    return SimpleNamespace(
+        name="alpha",
+        module=module or SimpleNamespace(),
+        data={"port": 27015} if data is None else data,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(readiness, "READY_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(readiness, "MAX_READY_POLL_INTERVAL", 0.01)
+
+
+def test_log_watcher_only_reads_new_output_and_joins_split_lines(tmp_path):
+    log = tmp_path / "alpha.log"
+    watcher = readiness._LogWatcher(str(log), readiness.re.compile(r"Done \(\d+s\)!"))
+
+    assert watcher.check() is False  # not created yet
+    log.write_text("Loading world\n[INFO]: Do")
+    assert watcher.check() is False
+    with open(log, "a") as fh:
+        fh.write("ne (4s)! For help\n")
+    assert watcher.check() is True
+
+
+def test_ready_log_pattern_checks_module_namespace():
+    module = SimpleNamespace(MODULE=SimpleNamespace(ready_log_pattern=r"ready"))
+
+    assert readiness.ready_log_pattern(make_server(module)).search("server ready")
+    assert readiness.ready_log_pattern(make_server()) is None
+
+
+def test_wait_until_ready_uses_log_signature_when_runtime_has_a_log(tmp_path, monkeypatch):
+    log = tmp_path / "alpha.log"
+    log.write_text("[12:00:00] [Server thread/INFO]: Done (4.2s)! For help, type \"help\"\n")
+    monkeypatch.setattr(readiness, "probe", lambda server: pytest.fail("probe should not be used"))
+    srv = make_server(SimpleNamespace(ready_log_pattern=r"\]: Done \([0-9.,]+m?s\)!"))
+
+    seconds, signal = readiness.wait_until_ready(srv, FakeRuntime(str(log)), timeout=1)
+
+    assert signal == "log"
+    assert seconds < 1
+
+
+def test_wait_until_ready_falls_back_to_probe_without_log(monkeypatch):
+    answers = iter([False, False, True])
+    monkeypatch.setattr(readiness, "probe", lambda server: next(answers))
+    srv = make_server(SimpleNamespace(ready_log_pattern=r"Done"))
+
+    _seconds, signal = readiness.wait_until_ready(srv, FakeRuntime(None), timeout=1)
+
+    assert signal == "query"
+
+
+def test_wait_until_ready_fails_when_server_stops(monkeypatch):
+    monkeypatch.setattr(readiness, "probe", lambda server: False)
+
+    with pytest.raises(ServerError, match="stopped before it was ready"):
+        readiness.wait_until_ready(make_server(), FakeRuntime(running=False), timeout=1)
+
+
+def test_wait_until_ready_times_out(monkeypatch):
+    monkeypatch.setattr(readiness, "probe", lambda server: False)
+
+    with pytest.raises(ServerError, match="wasn't ready after 0.1 seconds"):
+        readiness.wait_until_ready(make_server(), FakeRuntime(), timeout=0.1)
+
+
+def test_probe_uses_module_query_address(monkeypatch):
+    calls = []
+    module = SimpleNamespace(get_query_address=lambda server: ("10.0.0.2", 9987, "udp"))
+    monkeypatch.setattr(query_utils, "udp_ping", lambda host, port, timeout: calls.append((host, port)))
+
+    assert readiness.probe(make_server(module)) is True
+    assert calls == [("10.0.0.2", 9987)]
+
+
+def test_probe_falls_back_to_tcp_ping_of_game_port_when_a2s_fails(monkeypatch):
+    pings = []
+
+    def a2s_info(host, port, timeout):
+        raise query_utils.QueryError("no answer")
+
+    monkeypatch.setattr(query_utils, "a2s_info", a2s_info)
+    monkeypatch.setattr(query_utils, "tcp_ping", lambda host, port, timeout: pings.append(port))
+
+    assert readiness.probe(make_server(data={"port": 25565, "queryport": 25566})) is True
+    assert pings == [25565]
+
+
+def test_probe_reports_not_ready_when_explicit_protocol_fails(monkeypatch):
+    def tcp_ping(host, port, timeout):
+        raise query_utils.QueryError("refused")
+
+    monkeypatch.setattr(query_utils, "tcp_ping", tcp_ping)
+    module = SimpleNamespace(get_query_address=lambda server: ("127.0.0.1", 10011, "ts3"))
+
+    assert readiness.probe(make_server(module)) is False
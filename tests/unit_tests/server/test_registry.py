@@ -0,0 +1,95 @@
+"""Unit tests for the server registry index."""
+
+import json
+import os
+
+import pytest
+
+import server.registry as registry
+from server import data as data_module
+
+
+@pytest.fixture
+def datapath(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "_connections", {})
+    #  trust directory mtimes straight away so the fast path can be tested
+    monkeypatch.setattr(registry, "RACY_NS", -(10**12))
+    (tmp_path / "alpha.json").write_text(
+        json.dumps({"module": "tf2", "dir": "/srv/alpha/", "port": "27015", "queryport": 27016})
+    )
+    (tmp_path / "bravo.json").write_text(
+        json.dumps({"module": "minecraft.vanilla", "runtime": "docker", "container_name": "b"})
+    )
+    (tmp_path / "notes.txt").write_text("not a server")
+    return str(tmp_path)
+
+
+def test_records_index_every_server(datapath):
+    records = registry.records(datapath)
+
+    assert [record.name for record in records] == ["alpha", "bravo"]
+    assert records[0].module == "tf2"
+    assert records[0].dir == "/srv/alpha/"
+    assert records[0].ports == {"port": 27015, "queryport": 27016}
+    assert records[1].runtime == "docker"
+    assert records[1].container_name == "b"
+    assert os.path.isfile(os.path.join(datapath, registry.INDEX_FILENAME))
+
+
+def test_unchanged_directory_is_not_reread(datapath, monkeypatch):
+    registry.records(datapath)
+    monkeypatch.setattr(registry, "_load_file", lambda path: pytest.fail("reparsed " + path))
+    monkeypatch.setattr(registry.os, "listdir", lambda path: pytest.fail("listed " + path))
+
+    assert registry.get(datapath, "bravo").module == "minecraft.vanilla"
+
+
+def test_files_edited_in_place_are_reparsed_without_listing(datapath, monkeypatch):
+    registry.records(datapath)
+    dirstat = os.stat(datapath)
+    with open(os.path.join(datapath, "alpha.json"), "w") as fp:
+        json.dump({"module": "tf2", "port": 29015}, fp)
+    os.utime(datapath, ns=(dirstat.st_atime_ns, dirstat.st_mtime_ns))
+    monkeypatch.setattr(registry.os, "listdir", lambda path: pytest.fail("listed " + path))
+
+    assert registry.get(datapath, "alpha").ports == {"port": 29015}
+
+
+def test_only_changed_files_are_reparsed(datapath, monkeypatch):
+    registry.records(datapath)
+    store = data_module.JSONDataStore(os.path.join(datapath, "alpha.json"))
+    #  a save from another process: this one hasn't got the listener's update
+    monkeypatch.setattr(registry, "_on_save", lambda filename, data: None)
+    monkeypatch.setattr(data_module.JSONDataStore, "save_listeners", [])
+    store["port"] = 28015
+    store.save()
+    os.remove(os.path.join(datapath, "bravo.json"))
+    loaded = []
+    real_load = registry._load_file
+    monkeypatch.setattr(registry, "_load_file", lambda path: loaded.append(path) or real_load(path))
+
+    records = registry.records(datapath)
+
+    assert [os.path.basename(path) for path in loaded] == ["alpha.json"]
+    assert [(record.name, record.ports["port"]) for record in records] == [("alpha", 28015)]
+
+
+def test_saves_in_this_process_update_the_index(datapath, monkeypatch):
+    registry.records(datapath)
+    store = data_module.JSONDataStore(os.path.join(datapath, "bravo.json"))
+    store["container_name"] = "renamed"
+    store.save()
+    monkeypatch.setattr(registry, "_load_file", lambda path: pytest.fail("reparsed " + path))
+
+    assert registry.get(datapath, "bravo").container_name == "renamed"
+
+
+def test_falls_back_to_parsing_files_when_index_is_unusable(datapath, monkeypatch):
+    def broken(path):
+        raise registry.sqlite3.OperationalError("readonly")
+
+    monkeypatch.setattr(registry, "_connect", broken)
+
+    assert [record.name for record in registry.records(datapath)] == ["alpha", "bravo"]
+    assert registry.get(datapath, "alpha").ports["queryport"] == 27016
+    assert registry.get(datapath, "missing") is None
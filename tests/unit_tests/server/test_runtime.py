@@ -1,10 +1,13 @@
 """Unit tests for runtime metadata resolution and Docker command assembly."""
 
+import json
 import os
 from types import SimpleNamespace
 
 import pytest
 
+import server.data as data_module
+import server.docker_api as docker_api
 import server.runtime as runtime_module
 
 
@@ -12,6 +15,13 @@ JAVA_RUNTIME_IMAGE = runtime_module.default_runtime_image("java")
 STEAMCMD_RUNTIME_IMAGE = runtime_module.default_runtime_image("steamcmd-linux")
 
 
+@pytest.fixture(autouse=True)
+def docker_cli_only(monkeypatch):
+    """Keep these tests on the docker CLI path even where a Docker daemon is running."""
+
+    monkeypatch.setattr(docker_api, "get_client", lambda: None)
+
+
 class FakeSection(dict):
     """Minimal settings section stub for runtime config tests."""
 
@@ -235,6 +245,7 @@ def test_container_runtime_start_builds_docker_run_command(monkeypatch):
     cmd = observed[-1]
     assert cmd[:4] == ["docker", "run", "-d", "-i"]
     assert "--name" in cmd and "alphagsm-alpha" in cmd
+    assert "--label" in cmd and "alphagsm.server=alpha" in cmd
     assert "--network" in cmd and "bridge" in cmd
     assert "-w" in cmd and "/srv/server" in cmd
     assert "-e" in cmd and "ALPHAGSM_JAVA_MAJOR=17" in cmd
@@ -356,6 +367,67 @@ def test_container_runtime_removes_stale_stopped_container_before_start(monkeypa
     assert observed[-1][:3] == ["docker", "run", "-d"]
 
 
+@pytest.mark.parametrize("changed", [False, True, "image"])
+def test_container_runtime_reuses_stopped_container_with_unchanged_spec(monkeypatch, changed):
+    monkeypatch.setattr(
+        runtime_module.settings,
+        "_user",
+        FakeSection({"runtime": FakeSection({"backend": "docker", "container_reuse": "yes"})}),
+        raising=False,
+    )
+    spec = {
+        "container_name": "alphagsm-alpha",
+        "image": JAVA_RUNTIME_IMAGE,
+        "runtime_family": "java",
+        "working_dir": "/srv/server",
+        "stdin_open": False,
+        "env": {},
+        "mounts": [],
+        "ports": [],
+        "command": ["java", "-jar", "server.jar"],
+    }
+    server = DummyServer(
+        module=SimpleNamespace(get_container_spec=lambda server: dict(spec)), data={"runtime": "docker"}
+    )
+    runtime = runtime_module.ContainerRuntime()
+    observed = []
+    image_ids = ["existing-image"]
+    #  AlphaGSM's record of the image goes stale when it is rebuilt elsewhere
+    monkeypatch.setattr("server.images.recorded_id", lambda image, datapath=None: "existing-image")
+
+    def _fake_check_output(cmd, stderr=None, shell=False, text=False):
+        observed.append(cmd)
+        if cmd[:3] == ["docker", "image", "inspect"]:
+            return image_ids[0] + "\n"
+        if cmd[:4] == ["docker", "inspect", "-f", "{{json .Config.Labels}}"]:
+            return json.dumps(labels) + "\n"
+        if cmd[:3] == ["docker", "inspect", "-f"]:
+            return "false\n"
+        return "ok\n"
+
+    monkeypatch.setattr(runtime_module.sp, "check_output", _fake_check_output)
+    labels = {runtime_module.CONTAINER_LABEL: "alpha"}
+    labels[runtime_module.SPEC_LABEL] = runtime._spec_hash(runtime_module.get_container_spec(server), dict(labels))
+    if changed == "image":
+        image_ids[0] = "rebuilt-image"
+    elif changed:
+        spec["env"] = {"JAVA_OPTS": "-Xmx2G"}
+        runtime_module.forget_cached()
+
+    runtime.start(server)
+
+    if changed:
+        assert ["docker", "rm", "-f", "alphagsm-alpha"] in observed
+        run = observed[-1]
+        assert run[:3] == ["docker", "run", "-d"]
+        assert "{}={}".format(
+            runtime_module.SPEC_LABEL, runtime._spec_hash(runtime_module.get_container_spec(server), {runtime_module.CONTAINER_LABEL: "alpha"})
+        ) in run
+    else:
+        assert observed[-1] == ["docker", "start", "alphagsm-alpha"]
+        assert not any(cmd[:2] in (["docker", "rm"], ["docker", "run"]) for cmd in observed)
+
+
 def test_container_runtime_start_rejects_running_same_name_container(monkeypatch):
     _set_runtime_backend(monkeypatch, "docker")
     module = SimpleNamespace(
@@ -828,6 +900,35 @@ def test_resolve_query_host_falls_back_for_server_stubs_without_name(monkeypatch
     assert runtime_module.resolve_query_host(server) == "127.0.0.1"
 
 
+def test_container_runtime_wait_stopped_uses_docker_wait(monkeypatch):
+    server = DummyServer(data={"runtime": "docker", "container_name": "alphagsm-alpha"})
+    runtime = runtime_module.ContainerRuntime()
+    observed = []
+
+    def _fake_run(cmd, stdout=None, stderr=None, timeout=None, check=False):
+        observed.append((cmd, timeout))
+        return runtime_module.sp.CompletedProcess(cmd, 0)
+
+    monkeypatch.setattr(runtime_module.sp, "run", _fake_run)
+    monkeypatch.setattr(runtime, "_container_running_state", lambda name: False)
+
+    assert runtime.wait_stopped(server, 60) is True
+    assert observed == [(["docker", "wait", "alphagsm-alpha"], 60)]
+
+
+def test_container_runtime_wait_stopped_times_out(monkeypatch):
+    server = DummyServer(data={"runtime": "docker", "container_name": "alphagsm-alpha"})
+    runtime = runtime_module.ContainerRuntime()
+
+    def _fake_run(cmd, stdout=None, stderr=None, timeout=None, check=False):
+        raise runtime_module.sp.TimeoutExpired(cmd, timeout)
+
+    monkeypatch.setattr(runtime_module.sp, "run", _fake_run)
+    monkeypatch.setattr(runtime, "_container_running_state", lambda name: True)
+
+    assert runtime.wait_stopped(server, 5) is False
+
+
 def test_container_runtime_kill_stops_then_removes_container(monkeypatch):
     server = DummyServer(
         data={
@@ -850,3 +951,180 @@ def test_container_runtime_kill_stops_then_removes_container(monkeypatch):
         ["docker", "stop", "--time", "10", "alphagsm-alpha"],
         ["docker", "rm", "-f", "alphagsm-alpha"],
     ]
+
+
+def test_container_runtime_kill_keeps_stopped_container_for_reuse(monkeypatch):
+    monkeypatch.setattr(
+        runtime_module.settings,
+        "_user",
+        FakeSection({"runtime": FakeSection({"container_reuse": "yes"})}),
+        raising=False,
+    )
+    server = DummyServer(data={"runtime": "docker", "container_name": "alphagsm-alpha"})
+    observed = []
+
+    def _fake_check_output(cmd, stderr=None, shell=False, text=False):
+        observed.append(cmd)
+        return ""
+
+    monkeypatch.setattr(runtime_module.sp, "check_output", _fake_check_output)
+
+    runtime_module.ContainerRuntime().kill(server)
+
+    assert observed == [["docker", "stop", "--time", "10", "alphagsm-alpha"]]
+
+
+def test_validate_set_value_accepts_host_network_without_remapped_ports(monkeypatch):
+    ports = [{"host": 27015, "container": 27015, "protocol": "udp"}]
+    monkeypatch.setattr(runtime_module, "get_container_spec", lambda server: {"ports": ports})
+    server = DummyServer(data={"runtime": "docker"})
+
+    assert runtime_module.validate_set_value(server, ["network_mode"], "Host") == "host"
+    assert runtime_module.validate_set_value(server, ["network_mode"], "game-net") == "game-net"
+
+    ports.append({"host": 27016, "container": 27015, "protocol": "tcp"})
+    with pytest.raises(runtime_module.RuntimeError, match="27016->27015/tcp"):
+        runtime_module.validate_set_value(server, ["network_mode"], "host")
+
+
+def test_container_runtime_skips_port_mappings_on_host_network(monkeypatch):
+    _set_runtime_backend(monkeypatch, "docker")
+    module = SimpleNamespace(
+        get_container_spec=lambda server: {
+            "container_name": "alphagsm-alpha",
+            "image": "example/game:1",
+            "network_mode": "host",
+            "env": {},
+            "mounts": [],
+            "ports": [{"host": 27015, "container": 27015, "protocol": "udp"}],
+            "command": ["./srcds_run"],
+        }
+    )
+    observed = []
+
+    def _fake_check_output(cmd, stderr=None, shell=False, text=False):
+        observed.append(cmd)
+        if cmd[:3] == ["docker", "inspect", "-f"]:
+            raise runtime_module.sp.CalledProcessError(1, cmd, output="No such object")
+        return "ok\n"
+
+    monkeypatch.setattr(runtime_module.sp, "check_output", _fake_check_output)
+
+    runtime_module.ContainerRuntime().start(DummyServer(module=module, data={"runtime": "docker"}))
+
+    run = observed[-1]
+    assert run[:3] == ["docker", "run", "-d"]
+    assert "-p" not in run
+    assert run[run.index("--network") + 1] == "host"
+
+
+def test_process_runtime_log_path_uses_screen_log(monkeypatch):
+    monkeypatch.setattr(runtime_module.screen, "logpath", lambda name: "/logs/" + name + ".log")
+
+    assert runtime_module.ProcessRuntime().log_path(DummyServer()) == "/logs/alpha.log"
+    assert runtime_module.BaseRuntime().log_path(DummyServer()) is None
+
+
+def test_container_specs_are_memoised_until_the_server_changes(monkeypatch, tmp_path):
+    _set_runtime_backend(monkeypatch, "docker")
+    calls = []
+
+    def get_container_spec(server, *args):
+        calls.append(args)
+        return {"image": "example/game:1", "command": ["./run.sh"] + list(args)}
+
+    module = SimpleNamespace(
+        get_runtime_requirements=lambda server: {"engine": "docker", "family": "steamcmd-linux"},
+        get_container_spec=get_container_spec,
+    )
+    store = data_module.JSONDataStore(str(tmp_path / "alpha.json"), {"port": 27015})
+    server = DummyServer(module=module, data=store)
+
+    first = runtime_module.get_container_spec(server)
+    first["command"].append("changed")
+    assert runtime_module.get_container_spec(server)["command"] == ["./run.sh"]
+    assert calls == [()]
+
+    runtime_module.get_container_spec(server, "-debug")
+    assert calls == [(), ("-debug",)]
+
+    store["port"] = 27016
+    runtime_module.get_container_spec(server)
+    assert len(calls) == 3
+
+    runtime_module.get_container_spec(DummyServer(module=SimpleNamespace(**vars(module)), data=store))
+    assert len(calls) == 4
+
+    store.save()
+    runtime_module.get_container_spec(server)
+    assert len(calls) == 5
+
+
+MANAGER_ID = "ab" * 32
+MOUNTINFO = "\n".join(
+    [
+        "612 540 0:52 / / rw,relatime master:1 - overlay overlay rw",
+        "620 612 8:1 /var/lib/docker/containers/{}/hostname /etc/hostname rw - ext4 /dev/sda1 rw".format(
+            MANAGER_ID
+        ),
+        "621 612 8:1 /srv/alpha\\040gsm /srv/alpha\\040gsm rw - ext4 /dev/sda1 rw",
+        "622 612 8:1 /home/me/other /data rw - ext4 /dev/sda1 rw",
+    ]
+)
+
+
+@pytest.fixture
+def manager_container(monkeypatch, tmp_path):
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text(MOUNTINFO + "\n", encoding="utf-8")
+    monkeypatch.setattr(runtime_module, "MOUNTINFO", str(mountinfo))
+    monkeypatch.setenv("HOSTNAME", "alphagsm-manager")
+    real_exists = os.path.exists
+    monkeypatch.setattr(
+        runtime_module.os.path, "exists", lambda path: path == "/.dockerenv" or real_exists(path)
+    )
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setattr(
+        runtime_module.settings,
+        "_user",
+        FakeSection({"core": FakeSection({"alphagsm_path": str(home)})}),
+        raising=False,
+    )
+    return home
+
+
+def test_mount_roots_are_inspected_once_and_cached_by_container_id(manager_container, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        runtime_module.sp,
+        "check_output",
+        lambda cmd, **kwargs: calls.append(cmd) or '[{"Type":"bind","Source":"/shared","Destination":"/shared"}]',
+    )
+
+    assert runtime_module._current_container_identity_mount_roots() == ["/shared"]
+    assert runtime_module._current_container_identity_mount_roots() == ["/shared"]
+    assert len(calls) == 1
+    cached = json.loads((manager_container / runtime_module.MOUNT_ROOTS_FILENAME).read_text())
+    assert cached == {"container_id": MANAGER_ID, "roots": ["/shared"]}
+
+    runtime_module.forget_cached()  # as if in a new process
+    assert runtime_module._current_container_identity_mount_roots() == ["/shared"]
+    assert len(calls) == 1
+
+    (manager_container / runtime_module.MOUNT_ROOTS_FILENAME).write_text(
+        json.dumps({"container_id": "cd" * 32, "roots": ["/old"]})
+    )
+    runtime_module.forget_cached()
+    assert runtime_module._current_container_identity_mount_roots() == ["/shared"]
+    assert len(calls) == 2
+
+
+def test_mount_roots_fall_back_to_mountinfo_without_docker(manager_container, monkeypatch):
+    def no_docker(cmd, **kwargs):
+        raise FileNotFoundError("docker")
+
+    monkeypatch.setattr(runtime_module.sp, "check_output", no_docker)
+
+    assert runtime_module._current_container_identity_mount_roots() == ["/srv/alpha gsm"]
+    assert not (manager_container / runtime_module.MOUNT_ROOTS_FILENAME).exists()
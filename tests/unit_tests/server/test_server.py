@@ -266,27 +266,33 @@ def test_start_rejects_already_running_server(monkeypatch):
 
 def test_stop_requests_module_stop_until_server_exits(monkeypatch):
     srv = make_server()
-    states = iter([True, False])
-    monkeypatch.setattr(server_module.screen, "check_screen_exists", lambda name: next(states))
-    monkeypatch.setattr(server_module.time, "sleep", lambda seconds: None)
+    waits = []
+    monkeypatch.setattr(server_module.screen, "check_screen_exists", lambda name: True)
+    monkeypatch.setattr(
+        server_module.screen, "wait_for_screen_exit", lambda name, timeout: waits.append((name, timeout)) or True
+    )
 
     srv.stop()
 
     assert srv.module.calls == [("do_stop", 0, (), {})]
+    assert waits == [("alpha", server_module.STOP_ATTEMPT_SECONDS)]
 
 
 def test_stop_kills_server_after_timeout(monkeypatch):
     srv = make_server()
-    states = iter([True] * 20)
+    waits = []
     sent = []
-    monkeypatch.setattr(server_module.screen, "check_screen_exists", lambda name: next(states))
+    monkeypatch.setattr(server_module.screen, "check_screen_exists", lambda name: True)
     monkeypatch.setattr(server_module.screen, "send_to_screen", lambda name, cmd: sent.append((name, cmd)))
-    monkeypatch.setattr(server_module.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(
+        server_module.screen, "wait_for_screen_exit", lambda name, timeout: waits.append(timeout) and False
+    )
 
     with pytest.raises(server_module.ServerError, match="can't kill server"):
         srv.stop()
 
     assert sent == [("alpha", ["quit"])]
+    assert waits == [server_module.STOP_ATTEMPT_SECONDS, server_module.KILL_WAIT_SECONDS]
 
 
 def test_status_connect_and_dump_use_screen_and_output(monkeypatch, capsys):
@@ -303,6 +309,17 @@ def test_status_connect_and_dump_use_screen_and_output(monkeypatch, capsys):
     assert any(entry[0] == "status" for entry in srv.module.calls)
 
 
+def test_status_check_fails_when_server_is_stopped(monkeypatch, capsys):
+    srv = make_server()
+    monkeypatch.setattr(server_module.screen, "check_screen_exists", lambda name: False)
+
+    srv.status()
+    with pytest.raises(server_module.ServerError, match="isn't running"):
+        srv.status(check=True)
+
+    assert "Server isn't running" in capsys.readouterr().out
+
+
 def test_doset_updates_nested_data_and_saves():
     srv = make_server(data=DummyData({"existing": {"items": []}}))
 
@@ -425,6 +442,31 @@ def test_doset_rejects_colliding_runtime_ports_append(monkeypatch):
     assert srv.data["ports"] == []
 
 
+def test_doset_checks_claims_when_switching_to_host_network(monkeypatch):
+    srv = make_server(data=DummyData({"runtime": "docker", "runtime_family": "steamcmd-linux", "port": 27015}))
+    conflict = server_module.port_manager.PortConflict(
+        "managed",
+        server_module.port_manager.PortEndpoint("internal", "0.0.0.0", 27016, "runtime:ports"),
+        "runtime:ports conflicts with bravo:port on 0.0.0.0:27016",
+        managed_server="bravo",
+    )
+    seen = {}
+
+    def fake_detect_conflicts(server, overrides=None, include_live=True):
+        seen["network_mode"] = server.data["network_mode"]
+        return [conflict]
+
+    monkeypatch.setattr(server_module.runtime_module, "get_container_spec", lambda server: {"ports": []})
+    monkeypatch.setattr(server_module.port_manager, "detect_conflicts", fake_detect_conflicts)
+    monkeypatch.setattr(server_module.port_manager, "recommend_shift", lambda server, max_offset=100, base_overrides=None: None)
+
+    with pytest.raises(server_module.ServerError, match="conflicts"):
+        srv.doset("network_mode", "HOST")
+
+    assert seen["network_mode"] == "host"
+    assert "network_mode" not in srv.data
+
+
 def test_setup_auto_shifts_default_owned_port_group_and_prints_warning(monkeypatch, capsys):
     srv = make_server(
         data=DummyData({"port": 27015, "queryport": 27016}),
@@ -684,7 +726,7 @@ def test_activate_updates_crontab_and_can_start_server(monkeypatch):
             return self.new_job
 
     cron = FakeCronTab([FakeJob("/usr/bin/alphagsm 1 other start")])
-    monkeypatch.setattr(server_module.crontab, "CronTab", lambda user=True: cron)
+    monkeypatch.setattr("crontab.CronTab", lambda user=True: cron)
     monkeypatch.setattr(server_module.screen, "check_screen_exists", lambda name: False)
     monkeypatch.setattr(server_module, "_parsecmd", lambda cmd: [cmd[0], [cmd[2]], cmd[3]])
     monkeypatch.setattr("core.program.PATH", "/usr/bin/alphagsm")
@@ -726,7 +768,7 @@ def test_deactivate_removes_or_updates_jobs_and_can_stop_server(monkeypatch):
 
     job = FakeJob("/usr/bin/alphagsm 2 alpha beta start", ["alpha", "beta"])
     cron = FakeCronTab([job])
-    monkeypatch.setattr(server_module.crontab, "CronTab", lambda user=True: cron)
+    monkeypatch.setattr("crontab.CronTab", lambda user=True: cron)
     monkeypatch.setattr(server_module.screen, "check_screen_exists", lambda name: True)
     monkeypatch.setattr("core.program.PATH", "/usr/bin/alphagsm")
     monkeypatch.setattr(server_module, "_parsecmd", lambda cmd: [cmd[0], ["alpha", "beta"], "start"])
@@ -758,10 +800,9 @@ def test_restart_stops_then_starts(monkeypatch):
 def test_kill_sends_quit_and_succeeds(monkeypatch):
     srv = make_server()
     sent = []
-    states = iter([True, False])
-    monkeypatch.setattr(server_module.screen, "check_screen_exists", lambda name: next(states))
+    monkeypatch.setattr(server_module.screen, "check_screen_exists", lambda name: True)
     monkeypatch.setattr(server_module.screen, "send_to_screen", lambda name, cmd: sent.append((name, cmd)))
-    monkeypatch.setattr(server_module.time, "sleep", lambda s: None)
+    monkeypatch.setattr(server_module.screen, "wait_for_screen_exit", lambda name, timeout: True)
 
     srv.kill()
 
@@ -780,7 +821,7 @@ def test_kill_raises_if_session_persists_after_quit(monkeypatch):
     srv = make_server()
     monkeypatch.setattr(server_module.screen, "check_screen_exists", lambda name: True)
     monkeypatch.setattr(server_module.screen, "send_to_screen", lambda name, cmd: None)
-    monkeypatch.setattr(server_module.time, "sleep", lambda s: None)
+    monkeypatch.setattr(server_module.screen, "wait_for_screen_exit", lambda name, timeout: False)
 
     with pytest.raises(server_module.ServerError, match="Could not kill"):
         srv.kill()
@@ -1521,3 +1562,57 @@ def test_info_uses_module_namespace_console_hook_for_hibernating_server(
     assert data["protocol"] == "console"
     assert data["port"] == 27015
     assert data["name"] == "Hibernate CSS"
+
+
+def test_start_wait_blocks_until_ready_and_records_time(monkeypatch, capsys):
+    srv = make_server()
+    waits = []
+    monkeypatch.setattr(server_module.screen, "check_screen_exists", lambda name: False)
+    monkeypatch.setattr(server_module.screen, "start_screen", lambda name, cmd, cwd=None: None)
+    monkeypatch.setattr(
+        server_module.readiness,
+        "wait_until_ready",
+        lambda server, runtime, timeout: waits.append(timeout) or (12.34, "log"),
+    )
+
+    srv.start(wait=True, wait_timeout=60)
+
+    assert waits == [60]
+    assert srv.data["readiness"]["seconds"] == 12.3
+    assert srv.data["readiness"]["signal"] == "log"
+    assert srv.data.saved == 1
+    assert "Server is ready after 12.3 seconds" in capsys.readouterr().out
+    assert all("wait" not in call[2] for call in srv.module.calls if call[0] == "get_start_command")
+
+
+def test_start_without_wait_doesnt_check_readiness(monkeypatch):
+    srv = make_server()
+    monkeypatch.setattr(server_module.screen, "check_screen_exists", lambda name: False)
+    monkeypatch.setattr(server_module.screen, "start_screen", lambda name, cmd, cwd=None: None)
+    monkeypatch.setattr(
+        server_module.readiness, "wait_until_ready", lambda *args: pytest.fail("should not wait")
+    )
+
+    srv.start()
+
+    assert "readiness" not in srv.data
+
+
+def test_run_command_ready_waits_for_running_server(monkeypatch):
+    srv = make_server()
+    monkeypatch.setattr(server_module.screen, "check_screen_exists", lambda name: True)
+    monkeypatch.setattr(
+        server_module.readiness, "wait_until_ready", lambda server, runtime, timeout: (3.0, "query")
+    )
+
+    srv.run_command("ready", timeout=30)
+
+    assert srv.data["readiness"]["signal"] == "query"
+
+
+def test_run_command_ready_rejects_stopped_server(monkeypatch):
+    srv = make_server()
+    monkeypatch.setattr(server_module.screen, "check_screen_exists", lambda name: False)
+
+    with pytest.raises(server_module.ServerError, match="isn't running"):
+        srv.run_command("ready")
@@ -76,6 +76,22 @@ def _write_fake_docker(bin_dir):
                 "        if not str(mapping).endswith('\\n'):",
                 "            sys.stdout.write('\\n')",
                 "    sys.exit(0)",
+                "if args[:2] == ['inspect', '--format']:",
+                "    status = 0",
+                "    for name in args[3:]:",
+                "        item = containers.get(name)",
+                "        if not item:",
+                "            sys.stderr.write('Error: No such object: ' + name + '\\n')",
+                "            status = 1",
+                "            continue",
+                "        ports = {}",
+                "        for line in str(item.get('ports', '')).splitlines():",
+                "            key, _, host = line.partition(' -> ')",
+                "            host_ip, _, host_port = host.rpartition(':')",
+                "            ports.setdefault(key, []).append({'HostIp': host_ip, 'HostPort': host_port})",
+                "        status_name = 'running' if item.get('state') == 'running' else 'exited'",
+                "        sys.stdout.write('/' + name + '\\t' + status_name + '\\t' + json.dumps(ports) + '\\n')",
+                "    sys.exit(status)",
                 "if args[:1] == ['inspect']:",
                 "    if container_name and container:",
                 "        if '-f' in args:",
@@ -847,3 +863,28 @@ def test_wrapper_ps_keeps_port_mappings_for_stopped_containers(tmp_path):
     assert server_line is not None, result.stdout
     assert "stopped" in server_line
     assert "25565/tcp -> 0.0.0.0:25565" in server_line
+
+
+def test_wrapper_ps_inspects_every_container_in_one_docker_call(tmp_path):
+    state_dir = tmp_path / "state"
+    for name in ("alpha", "beta", "gamma"):
+        _write_server_config(state_dir, name, {"runtime": "docker"})
+    result, _, log_entries = _run_wrapper(
+        tmp_path,
+        "ps",
+        fake_containers={
+            "alphagsm-alpha": {"state": "running", "ports": "27015/udp -> 0.0.0.0:27015"},
+            "alphagsm-beta": {"state": "stopped", "ports": ""},
+        },
+    )
+
+    assert result.returncode == 0, result.stderr or result.stdout
+    docker_calls = [entry["argv"] for entry in log_entries if entry["argv"][:1] in (["inspect"], ["port"])]
+    assert len(docker_calls) == 1
+    assert docker_calls[0][3:] == ["alphagsm-alpha", "alphagsm-beta", "alphagsm-gamma"]
+    lines = {line.split()[0]: line.split()[2:] for line in result.stdout.splitlines()[1:]}
+    assert lines == {
+        "alpha": ["running", "27015/udp", "->", "0.0.0.0:27015"],
+        "beta": ["stopped"],
+        "gamma": ["missing"],
+    }
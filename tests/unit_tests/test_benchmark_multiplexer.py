@@ -0,0 +1,32 @@
+"""Checks for the multiplexer throughput benchmark script."""
+
+from pathlib import Path
+
+from tests.helpers import load_module_from_repo
+
+
+BENCHMARK_SCRIPT = Path("scripts/benchmark_multiplexer.py")
+
+
+def load_benchmark_module():
+    assert BENCHMARK_SCRIPT.exists(), f"missing benchmark script: {BENCHMARK_SCRIPT}"
+    return load_module_from_repo("benchmark_multiplexer_static", str(BENCHMARK_SCRIPT))
+
+
+def test_run_benchmark_moves_all_output_from_every_producer():
+    bench = load_benchmark_module()
+
+    result = bench.run_benchmark(2, 0.25, 80)
+
+    assert result["producers"] == 2
+    assert result["megabytes"] == 0.5
+    assert result["failed"] == []
+    assert result["mb_per_second"] > 0
+
+
+def test_compare_reports_throughput_drops_over_threshold():
+    bench = load_benchmark_module()
+
+    assert bench.compare({"mb_per_second": 85.0}, {"mb_per_second": 100.0}, 20.0) == []
+    regressions = bench.compare({"mb_per_second": 70.0}, {"mb_per_second": 100.0}, 20.0)
+    assert regressions == ["throughput 70.0 MB/s vs baseline 100.0 MB/s (-30%)"]
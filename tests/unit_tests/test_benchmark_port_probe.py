@@ -0,0 +1,31 @@
+"""Checks for the live port probe benchmark script."""
+
+from pathlib import Path
+
+from tests.helpers import load_module_from_repo
+
+
+BENCHMARK_SCRIPT = Path("scripts/benchmark_port_probe.py")
+
+
+def load_benchmark_module():
+    assert BENCHMARK_SCRIPT.exists(), f"missing benchmark script: {BENCHMARK_SCRIPT}"
+    return load_module_from_repo("benchmark_port_probe_static", str(BENCHMARK_SCRIPT))
+
+
+def test_run_benchmark_agrees_with_bind_probes():
+    bench = load_benchmark_module()
+
+    result = bench.run_benchmark(40, 41000, hold_every=10)
+
+    assert result["endpoints"] == 40
+    assert result["probe_seconds"] > 0
+    assert result["mismatches"] == []
+
+
+def test_compare_reports_snapshot_slowdowns_over_threshold():
+    bench = load_benchmark_module()
+
+    assert bench.compare({"snapshot_seconds": 0.011}, {"snapshot_seconds": 0.01}, 20.0) == []
+    regressions = bench.compare({"snapshot_seconds": 0.015}, {"snapshot_seconds": 0.01}, 20.0)
+    assert regressions == ["snapshot 0.0150 s vs baseline 0.0100 s (+50%)"]
@@ -0,0 +1,64 @@
+"""Checks for the start-up benchmark helper script."""
+
+import json
+from pathlib import Path
+
+from tests.helpers import load_module_from_repo
+
+
+BENCHMARK_SCRIPT = Path("scripts/benchmark_startup.py")
+
+
+def load_benchmark_module():
+    assert BENCHMARK_SCRIPT.exists(), f"missing benchmark script: {BENCHMARK_SCRIPT}"
+    return load_module_from_repo("benchmark_startup_static", str(BENCHMARK_SCRIPT))
+
+
+def test_parse_importtime_sums_top_level_modules_only():
+    bench = load_benchmark_module()
+    stderr = "\n".join(
+        [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       100 |        100 |   json.decoder",
+            "import time:       200 |       1500 | json",
+            "import time:       300 |       2500 | core",
+            "Server isn't running",
+        ]
+    )
+
+    total, modules = bench.parse_importtime(stderr)
+
+    assert total == 4.0
+    assert modules == {"json": 1.5, "core": 2.5}
+
+
+def test_compare_reports_only_regressions_over_threshold():
+    bench = load_benchmark_module()
+    baseline = {
+        "help": {"wall_ms": {"median": 100.0}, "import_ms": 50.0},
+        "dump": {"wall_ms": {"median": 100.0}, "import_ms": 50.0},
+    }
+    results = {
+        "help": {"wall_ms": {"median": 115.0}, "import_ms": 40.0},
+        "dump": {"wall_ms": {"median": 130.0}, "import_ms": 70.0},
+        "list": {"wall_ms": {"median": 900.0}, "import_ms": 90.0},
+    }
+
+    regressions = bench.compare(results, baseline, 20.0)
+
+    assert len(regressions) == 2
+    assert regressions[0].startswith("dump: wall time 130.0 ms")
+    assert regressions[1].startswith("dump: import time 70.0 ms")
+
+
+def test_create_environment_writes_config_and_synthetic_datastore(tmp_path):
+    bench = load_benchmark_module()
+
+    env = bench.create_environment(tmp_path, 2)
+
+    assert env["ALPHAGSM_CONFIG_LOCATION"] == str(tmp_path / "alphagsm.conf")
+    assert env["ALPHAGSM_NO_DAEMON"] == "1"
+    assert "datapath = {}/conf".format(tmp_path) in (tmp_path / "alphagsm.conf").read_text()
+    stores = sorted(path.name for path in (tmp_path / "conf").iterdir())
+    assert stores == ["bench0.json", "bench1.json"]
+    assert json.loads((tmp_path / "conf" / "bench1.json").read_text())["port"] == 25566
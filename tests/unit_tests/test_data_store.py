@@ -54,3 +54,147 @@ def test_json_data_store_prettydump_is_sorted_and_indented(tmp_path):
     store = JSONDataStore(str(tmp_path / "data.json"), {"b": 2, "a": 1})
 
     assert store.prettydump() == '{\n  "a": 1,\n  "b": 2\n}'
+
+
+def test_json_data_store_save_is_atomic_and_keeps_permissions(tmp_path, monkeypatch):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({"name": "alpha"}))
+    path.chmod(0o640)
+    store = JSONDataStore(str(path))
+    store["count"] = 1
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(data_module.os, "replace", fail)
+    with pytest.raises(OSError):
+        store.save()
+    assert json.loads(path.read_text()) == {"name": "alpha"}
+    assert [p.name for p in tmp_path.iterdir() if p.name.endswith(".tmp")] == []
+
+    monkeypatch.undo()
+    store.save()
+    assert json.loads(path.read_text()) == {"name": "alpha", "count": 1}
+    assert path.stat().st_mode & 0o777 == 0o640
+
+
+def test_json_data_store_only_saves_when_changed(tmp_path, monkeypatch):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({"ports": {"game": 27015}}))
+    store = JSONDataStore(str(path))
+    writes = []
+    real_write = data_module._atomic_write
+    monkeypatch.setattr(
+        data_module, "_atomic_write", lambda name, text: writes.append(text) or real_write(name, text)
+    )
+
+    store.save()
+    assert writes == [] and not store.dirty()
+
+    store["ports"]["query"] = 27016  # nested change
+    assert store.dirty()
+    store.save()
+    store.save()
+
+    assert len(writes) == 1
+    assert json.loads(path.read_text()) == {"ports": {"game": 27015, "query": 27016}}
+
+
+def test_json_data_store_new_store_is_dirty(tmp_path):
+    path = tmp_path / "new.json"
+    store = JSONDataStore(str(path), {})
+
+    assert store.dirty()
+    store.save()
+    assert json.loads(path.read_text()) == {}
+
+
+def test_json_data_store_save_merges_changes_saved_by_another_process(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({"module": "tf2", "port": 27015, "backup": {"n": 1}, "old": 1}))
+    mine = JSONDataStore(str(path))
+    other = JSONDataStore(str(path))
+
+    other["port"] = 27115
+    del other["old"]
+    other.save()
+    mine["backup"]["n"] = 2
+    mine.save()
+
+    assert json.loads(path.read_text()) == {"module": "tf2", "port": 27115, "backup": {"n": 2}}
+    assert mine["port"] == 27115
+
+
+def test_json_data_store_lock_blocks_other_processes(tmp_path, monkeypatch):
+    import multiprocessing
+
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({"count": 0}))
+    monkeypatch.setattr(data_module, "LOCK_TIMEOUT", 0.2)
+    store = JSONDataStore(str(path))
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+
+    def try_lock(exclusive):
+        other = JSONDataStore(str(path))
+        try:
+            with other.lock(exclusive):
+                results.put("locked")
+        except DataError:
+            results.put("timed out")
+
+    with store.lock(exclusive=False):
+        for exclusive in (False, True):
+            child = ctx.Process(target=try_lock, args=(exclusive,))
+            child.start()
+            child.join()
+        assert [results.get(), results.get()] == ["locked", "timed out"]
+        with store.lock():  # upgrade in place, nested
+            pass
+    assert data_module.lock_stats["acquired"] >= 2
+    assert data_module.lock_summary().startswith("Data store locks: ")
+
+
+def test_json_data_store_locked_update_is_read_modify_write(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({"count": 1}))
+    store = JSONDataStore(str(path))
+    JSONDataStore(str(path), {"count": 5}).save()
+
+    with store.locked_update() as current:
+        current["count"] += 1
+
+    assert json.loads(path.read_text()) == {"count": 6}
+    assert not (tmp_path / "data.json.lock").exists()
+    assert (tmp_path / ".data.json.lock").exists()
+
+
+def test_json_data_store_saves_changes_made_under_its_exclusive_lock(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({"backup": {"n": 1}}))
+    store = JSONDataStore(str(path))
+
+    with store.lock():
+        store["backup"]["n"] = 2  # nested change, no save()
+    assert json.loads(path.read_text()) == {"backup": {"n": 2}}
+
+    with pytest.raises(ValueError):
+        with store.lock():
+            store["backup"]["n"] = 3
+            raise ValueError("abandoned")
+    with store.lock(exclusive=False):
+        store["backup"]["n"] = 4
+    assert json.loads(path.read_text()) == {"backup": {"n": 2}}
+
+    unloaded = JSONDataStore(str(tmp_path / "unloaded.json"), {"a": 1})
+    with unloaded.lock():
+        pass
+    assert not (tmp_path / "unloaded.json").exists()
+
+
+def test_json_data_store_update_is_the_mapping_update(tmp_path):
+    store = JSONDataStore(str(tmp_path / "data.json"), {"a": 1})
+
+    store.update({"b": 2}, c=3)
+
+    assert dict(store) == {"a": 1, "b": 2, "c": 3}
@@ -0,0 +1,104 @@
+import io
+import json
+import os
+import socket
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import utils.daemonclient as client
+
+
+@pytest.fixture
+def fake_daemon(tmp_path, monkeypatch):
+    """Listen on a socket and answer every request with the queued frames."""
+    path = str(tmp_path / "d.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+    state = SimpleNamespace(frames=[], requests=[])
+
+    def serve():
+        conn, _ = listener.accept()
+        with conn:
+            buffer = b""
+            while b"\n" not in buffer:
+                buffer += conn.recv(4096)
+            state.requests.append(json.loads(buffer))
+            for kind, payload in state.frames:
+                client.write_frame(conn, kind, payload)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    monkeypatch.setattr(client, "socket_path", lambda: path)
+    monkeypatch.delenv("ALPHAGSM_NO_DAEMON", raising=False)
+    yield state
+    listener.close()
+    thread.join(timeout=5)
+
+
+def test_socket_path_defaults_under_alphagsm_path(monkeypatch):
+    sections = {"core": {"alphagsm_path": "/srv/gsm"}, "daemon": {}}
+    monkeypatch.setattr(
+        client, "settings", SimpleNamespace(user=SimpleNamespace(getsection=lambda name: sections[name]))
+    )
+
+    assert client.socket_path() == "/srv/gsm/alphagsmd.sock"
+
+    sections["daemon"]["socket"] = "/run/gsm.sock"
+    assert client.socket_path() == "/run/gsm.sock"
+
+
+def test_run_streams_output_and_returns_exit_status(fake_daemon):
+    fake_daemon.frames = [
+        (client.FRAME_STDOUT, b"Server is running\n"),
+        (client.FRAME_STDERR, b"warning\n"),
+        (client.FRAME_EXIT, b"4"),
+    ]
+    out, err = io.BytesIO(), io.BytesIO()
+
+    assert client.run("alphagsm", ["alpha", "status"], out=out, err=err) == 4
+    assert out.getvalue() == b"Server is running\n"
+    assert err.getvalue() == b"warning\n"
+    request = fake_daemon.requests[0]
+    assert request["args"] == ["alpha", "status"]
+    assert request["cwd"] == os.getcwd()
+    assert request["version"] == client.PROTOCOL_VERSION
+
+
+def test_run_falls_back_when_refused(fake_daemon):
+    fake_daemon.frames = [(client.FRAME_REFUSED, b"different user")]
+
+    assert client.run("alphagsm", ["alpha", "status"], out=io.BytesIO(), err=io.BytesIO()) is None
+
+
+def test_run_reports_lost_connection_after_output(fake_daemon):
+    fake_daemon.frames = [(client.FRAME_STDOUT, b"partial\n")]
+    err = io.BytesIO()
+
+    assert client.run("alphagsm", ["alpha", "stop"], out=io.BytesIO(), err=err) == 1
+    assert b"Lost connection" in err.getvalue()
+
+
+def test_run_skips_daemon_when_unavailable_or_disabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(client, "socket_path", lambda: str(tmp_path / "missing.sock"))
+    monkeypatch.delenv("ALPHAGSM_NO_DAEMON", raising=False)
+    assert client.run("alphagsm", ["alpha", "status"]) is None
+
+    stale = tmp_path / "stale.sock"
+    stale.write_text("")
+    monkeypatch.setattr(client, "socket_path", lambda: str(stale))
+    assert client.run("alphagsm", ["alpha", "status"]) is None
+
+    monkeypatch.setenv("ALPHAGSM_NO_DAEMON", "1")
+    monkeypatch.setattr(client, "socket_path", lambda: pytest.fail("should not look up the socket"))
+    assert client.run("alphagsm", ["alpha", "status"]) is None
+
+
+def test_needs_terminal_for_connect_and_prompting_setup():
+    assert client._needs_terminal(["alpha", "connect"]) is True
+    assert client._needs_terminal(["alpha", "setup"]) is True
+    assert client._needs_terminal(["alpha", "setup", "-n"]) is False
+    assert client._needs_terminal(["alpha", "create", "minecraft"]) is False
+    assert client._needs_terminal(["alpha", "status"]) is False
@@ -0,0 +1,109 @@
+import json
+import os
+from io import StringIO
+
+import pytest
+
+import utils.progress as progress
+
+
+@pytest.fixture
+def channel(monkeypatch):
+    read_fd, write_fd = os.pipe()
+    monkeypatch.setenv(progress.ENV_FD, str(write_fd))
+    monkeypatch.setattr(progress, "_writer", (None, None))
+    yield os.fdopen(read_fd, "rb")
+    os.close(write_fd)
+
+
+def _events(reader, count):
+    return [json.loads(reader.readline()) for _ in range(count)]
+
+
+def test_emit_is_a_noop_without_a_channel(monkeypatch):
+    monkeypatch.delenv(progress.ENV_FD, raising=False)
+    monkeypatch.setattr(progress, "_writer", (None, None))
+
+    assert progress.enabled() is False
+    with progress.phase("runtime"):
+        progress.percent("runtime", 50)
+    progress.result(0)
+
+
+def test_phase_percent_and_result_are_written_as_json_lines(channel):
+    assert progress.enabled() is True
+    with progress.phase("download"):
+        progress.percent("download", 45.06)
+    with pytest.raises(RuntimeError):
+        with progress.phase("runtime"):
+            raise RuntimeError("boom")
+    progress.result(3)
+
+    events = _events(channel, 6)
+    assert [e["event"] for e in events] == ["phase", "progress", "phase", "phase", "phase", "result"]
+    assert events[0]["phase"] == "download" and events[0]["state"] == "start"
+    assert events[1]["percent"] == 45.1
+    assert events[2]["ok"] is True and events[2]["seconds"] >= 0
+    assert events[4]["phase"] == "runtime" and events[4]["ok"] is False
+    assert events[5]["status"] == 3
+    assert all("time" in e for e in events)
+
+
+def test_passed_to_children_restores_the_environment(monkeypatch):
+    monkeypatch.delenv(progress.ENV_FD, raising=False)
+    with progress.passed_to_children(7):
+        assert os.environ[progress.ENV_FD] == "7"
+    assert progress.ENV_FD not in os.environ
+
+
+def test_fleet_progress_tracks_phases_and_prints_summary():
+    out = StringIO()
+    fleet = progress.FleetProgress(out)
+    fleet.add("beta")
+
+    def send(tag, **event):
+        fleet.handle(tag, json.dumps(event).encode())
+
+    send("alpha", event="phase", phase="module", state="start")
+    send("alpha", event="phase", phase="module", state="end", ok=True, seconds=0.25)
+    send("alpha", event="progress", phase="download", percent=40.0)
+    assert "alpha download 40%" in fleet.statusline()
+    assert "beta running" in fleet.statusline()
+    send("alpha", event="phase", phase="runtime", state="end", ok=False, seconds=1.5)
+    send("alpha", event="result", status=1)
+    fleet.handle("beta", b"not json")
+
+    fleet.printsummary()
+    lines = out.getvalue().splitlines()
+    assert lines[1].split() == ["SERVER", "module", "runtime", "STATUS"]
+    assert lines[2].split() == ["alpha", "0.2s", "1.5s", "1", "(failed", "in", "runtime)"]
+    assert lines[3].split() == ["beta", "-", "-", "-"]
+
+
+def test_fleet_progress_live_output_is_throttled(monkeypatch):
+    out = StringIO()
+    now = [100.0]
+    monkeypatch.setattr(progress.time, "monotonic", lambda: now[0])
+    fleet = progress.FleetProgress(out, live_interval=5)
+
+    fleet.handle("alpha", b'{"event": "phase", "phase": "runtime", "state": "start"}')
+    assert out.getvalue() == ""
+    now[0] += 5
+    fleet.handle("alpha", b'{"event": "result", "status": 0}')
+    assert out.getvalue() == "Progress: 1/1 finished\n"
+
+
+def test_fleet_progress_tick_redraws_while_no_events_arrive(monkeypatch):
+    out = StringIO()
+    now = [100.0]
+    monkeypatch.setattr(progress.time, "monotonic", lambda: now[0])
+    fleet = progress.FleetProgress(out, live_interval=5)
+    fleet.handle("alpha", b'{"event": "phase", "phase": "download", "state": "start"}')
+
+    fleet.tick()
+    assert out.getvalue() == ""
+    now[0] += 5
+    fleet.tick()
+    now[0] += 5
+    fleet.tick()
+    assert out.getvalue().splitlines() == ["Progress: 0/1 finished; alpha download"] * 2
@@ -0,0 +1,182 @@
+"""Tests for blue-green staged installs."""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import utils.staged_install as staged_install
+from server.errors import ServerError
+
+
+class FakeSection(dict):
+    def getsection(self, key):
+        return self
+
+
+class FakeRuntime:
+    def __init__(self, server):
+        self.server = server
+
+    def is_running(self, server):
+        return self.server.running
+
+
+class FakeServer:
+    def __init__(self, path, running=True):
+        self.data = {"dir": str(path) + os.sep}
+        self.running = running
+        self.events = []
+
+    def stop(self):
+        self.events.append("stop")
+        self.running = False
+
+    def start(self):
+        self.events.append("start")
+        self.running = True
+
+
+@pytest.fixture
+def core_settings(monkeypatch):
+    values = FakeSection()
+    monkeypatch.setattr(staged_install, "settings", SimpleNamespace(user=values))
+    monkeypatch.setattr("server.runtime.get_runtime", lambda server: FakeRuntime(server))
+    return values
+
+
+@pytest.fixture
+def install(tmp_path):
+    live = tmp_path / "game"
+    (live / "bin").mkdir(parents=True)
+    (live / "bin" / "server").write_text("v1")
+    (live / "world.sav").write_text("save 1")
+    old = 1_000_000
+    for path in (live / "bin" / "server", live / "world.sav"):
+        os.utime(path, (old, old))
+    return live
+
+
+def test_staged_update_downloads_while_running_then_swaps(core_settings, install):
+    server = FakeServer(install)
+
+    def download(path):
+        assert path.endswith(".staging" + os.sep)
+        assert server.events == []  # still running while downloading
+        with open(os.path.join(path, "bin", "server"), "w") as fh:
+            fh.write("v2")
+        #  the live server saves during the download
+        (install / "world.sav").write_text("save 2")
+        (install / "new.sav").write_text("new")
+
+    staged_install.staged_update(server, download, restart=True)
+
+    assert server.events == ["stop", "start"]
+    assert (install / "bin" / "server").read_text() == "v2"
+    assert (install / "world.sav").read_text() == "save 2"
+    assert (install / "new.sav").read_text() == "new"
+    assert (install.parent / "game.previous" / "bin" / "server").read_text() == "v1"
+    assert not (install.parent / "game.staging").exists()
+
+
+def test_staged_update_restart_leaves_stopped_server_stopped(core_settings, install):
+    server = FakeServer(install, running=False)
+
+    staged_install.staged_update(server, lambda path: None, restart=True)
+
+    assert server.events == []
+    assert "swapped" in server.data["staged_update"]
+
+
+def test_staged_update_drops_files_deleted_during_download(core_settings, install):
+    server = FakeServer(install)
+    (install / "banned.txt").write_text("griefer")
+    os.utime(install / "banned.txt", (1_000_000, 1_000_000))
+
+    def download(path):
+        with open(os.path.join(path, "bin", "added"), "w") as fh:
+            fh.write("new in v2")
+        (install / "banned.txt").unlink()
+
+    staged_install.staged_update(server, download)
+
+    assert not (install / "banned.txt").exists()
+    assert (install / "bin" / "added").read_text() == "new in v2"
+    assert (install / "world.sav").read_text() == "save 1"
+
+
+def test_staged_update_hardlink_clone_shares_unchanged_files(core_settings, install):
+    core_settings["staged_update_clone"] = "hardlink"
+    server = FakeServer(install, running=False)
+    seen = []
+
+    def download(path):
+        seen.append(os.path.samefile(os.path.join(path, "world.sav"), install / "world.sav"))
+
+    staged_install.staged_update(server, download)
+
+    assert seen == [True]
+    assert server.events == []
+
+
+def test_failed_download_leaves_live_install_alone(core_settings, install):
+    server = FakeServer(install)
+
+    def download(path):
+        raise RuntimeError("steamcmd failed")
+
+    with pytest.raises(RuntimeError):
+        staged_install.staged_update(server, download)
+
+    assert server.events == []
+    assert (install / "bin" / "server").read_text() == "v1"
+    assert not (install.parent / "game.staging").exists()
+
+
+def test_rollback_swaps_previous_back_and_restarts(core_settings, install):
+    server = FakeServer(install)
+    staged_install.staged_update(
+        server, lambda path: open(os.path.join(path, "bin", "server"), "w").write("v2"), restart=True
+    )
+    server.events = []
+
+    staged_install.rollback(server)
+
+    assert server.events == ["stop", "start"]
+    assert (install / "bin" / "server").read_text() == "v1"
+    assert (install.parent / "game.previous" / "bin" / "server").read_text() == "v2"
+
+
+def test_rollback_carries_over_files_written_since_the_update(core_settings, install):
+    server = FakeServer(install)
+    staged_install.staged_update(
+        server, lambda path: open(os.path.join(path, "bin", "server"), "w").write("v2")
+    )
+    later = server.data["staged_update"]["swapped"] + 10
+    (install / "world.sav").write_text("save 3")
+    os.utime(install / "world.sav", (later, later))
+
+    staged_install.rollback(server)
+
+    assert (install / "bin" / "server").read_text() == "v1"
+    assert (install / "world.sav").read_text() == "save 3"
+
+
+def test_rollback_without_swap_time_needs_force(core_settings, install):
+    server = FakeServer(install, running=False)
+    previous = install.parent / "game.previous"
+    (previous / "bin").mkdir(parents=True)
+    (previous / "bin" / "server").write_text("v0")
+
+    with pytest.raises(ServerError, match="--force"):
+        staged_install.rollback(server)
+    assert (install / "bin" / "server").read_text() == "v1"
+
+    staged_install.rollback(server, force=True)
+
+    assert (install / "bin" / "server").read_text() == "v0"
+
+
+def test_rollback_without_previous_install_fails(core_settings, install):
+    with pytest.raises(ServerError, match="no previous install"):
+        staged_install.rollback(FakeServer(install))
@@ -190,6 +190,23 @@ def test_download_does_not_add_platform_flag_by_default(monkeypatch):
     assert "+@sSteamCmdForcePlatformType" not in cmd
 
 
+def test_run_steamcmd_reports_progress_when_channel_is_open(monkeypatch):
+    reported = []
+    monkeypatch.setattr(steamcmd_module.progress, "enabled", lambda: True)
+    monkeypatch.setattr(steamcmd_module.progress, "percent", lambda name, value: reported.append((name, value)))
+    script = (
+        "print(' Update state (0x61) downloading, progress: 12.50 (125 / 1000)');"
+        "print(' Update state (0x61) downloading, progress: 100.00 (1000 / 1000)');"
+        "print(\"Success! App '1' fully installed.\")"
+    )
+
+    proc = steamcmd_module._run_steamcmd(["python3", "-c", script])
+
+    assert proc.returncode == 0
+    assert reported == [("steamcmd", 12.5), ("steamcmd", 100.0)]
+    assert "fully installed" in proc.stdout
+
+
 def test_get_autoupdate_script_writes_template(tmp_path, monkeypatch):
     scripts_dir = tmp_path / "scripts"
     template = tmp_path / "steamcmd_gamescript_template.txt"
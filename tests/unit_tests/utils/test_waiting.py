@@ -0,0 +1,57 @@
+import subprocess as sp
+import sys
+import time
+
+import utils.waiting as waiting
+
+
+def test_wait_until_backs_off_and_respects_timeout(monkeypatch):
+    now = [0.0]
+    sleeps = []
+    monkeypatch.setattr(waiting.time, "monotonic", lambda: now[0])
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(waiting.time, "sleep", fake_sleep)
+
+    assert waiting.wait_until(lambda: False, 1.0, interval=0.1, max_interval=0.4) is False
+    assert sleeps[:3] == [0.1, 0.2, 0.4]
+    assert max(sleeps) == 0.4
+    assert abs(sum(sleeps) - 1.0) < 1e-9
+
+
+def test_wait_until_checks_once_without_waiting(monkeypatch):
+    monkeypatch.setattr(waiting.time, "sleep", lambda seconds: (_ for _ in ()).throw(AssertionError))
+
+    assert waiting.wait_until(lambda: True, 10) is True
+    assert waiting.wait_until(lambda: False, 0) is False
+
+
+def test_wait_for_pid_returns_when_process_exits():
+    proc = sp.Popen([sys.executable, "-c", "import time; time.sleep(0.2)"])
+    start = time.monotonic()
+    try:
+        assert waiting.wait_for_pid(proc.pid, 10) is True
+    finally:
+        proc.wait()
+    assert time.monotonic() - start < 5
+
+
+def test_wait_for_pid_times_out_on_running_process():
+    proc = sp.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        assert waiting.wait_for_pid(proc.pid, 0.2) is False
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def test_wait_for_pid_probes_without_pidfd(monkeypatch):
+    monkeypatch.delattr(waiting.os, "pidfd_open", raising=False)
+    states = iter([True, True, False])
+    monkeypatch.setattr(waiting, "_pid_alive", lambda pid: next(states))
+    monkeypatch.setattr(waiting.time, "sleep", lambda seconds: None)
+
+    assert waiting.wait_for_pid(1234, 10) is True